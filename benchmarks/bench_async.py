@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compara muchos lotes a la vez con los dos motores de OdooClient: 'threads'
+y 'asyncio'
+
+Levanta el servidor Odoo de pega (tests/odoo_stand_in.py) y procesa N lotes
+pequeños a la vez, cada uno en su hilo: autenticación, validación del token,
+descarga y subida en bloque. Con 'threads' cada hilo hace sus llamadas con
+su propia conexión; con 'asyncio' las hacen todas el event loop compartido
+(ver odoo_async_client). Mide el tiempo total, los hilos del proceso y el
+pico de memoria de Python (tracemalloc, sin las pilas de los hilos)
+
+El limitador de OdooClient (ver odoo_rate_limiter) se abre del todo para
+comparar sólo los motores
+
+Uso: python benchmarks/bench_async.py [--batches N] [--docs D]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+root = Path(__file__).parent.parent
+sys.path.insert(0, str(root / "src"))
+sys.path.insert(0, str(root / "tests"))
+
+from odoo_client import OdooClient, clear_session_cache, ENGINE_THREADS, ENGINE_ASYNCIO
+from odoo_rate_limiter import OdooRateLimiter, reset_rate_limiters, _LIMITERS
+from odoo_stand_in import OdooStandIn
+
+def signed_documents(documents):
+  return [{"document_id": doc["id"], "signed_pdf_bytes": doc["pdf_bytes"],
+           "res_model": doc["res_model"], "res_id": doc["res_id"]} for doc in documents]
+
+def run_batches(stand_in: OdooStandIn, batch_ids, engine: str) -> int:
+  peak_threads = 0
+
+  def run_batch(batch_id):
+    nonlocal peak_threads
+    client = OdooClient(stand_in.url, stand_in.db, stand_in.username, stand_in.password,
+                        batch_token=f"tok_{batch_id}", engine=engine)
+    client.authenticate()
+    documents = client.download_unsigned_pdfs(batch_id, chunked=True)
+    peak_threads = max(peak_threads, threading.active_count())
+    client.upload_signed_pdfs(batch_id, signed_documents(documents))
+
+  with ThreadPoolExecutor(max_workers=len(batch_ids)) as executor:
+    list(executor.map(run_batch, batch_ids))
+  return peak_threads
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark de los motores threads y asyncio")
+  parser.add_argument("--batches", type=int, default=200, help="Lotes a la vez")
+  parser.add_argument("--docs", type=int, default=3, help="Documentos por lote")
+  args = parser.parse_args()
+
+  pdf = b"%PDF-1.4\n" + os.urandom(8 * 1024)
+
+  print(f"{'motor':>8} {'total (s)':>10} {'hilos':>6} {'memoria (MB)':>13}")
+
+  batch_id = 0
+  with OdooStandIn() as stand_in:
+    for name in (ENGINE_THREADS, ENGINE_ASYNCIO):
+      batch_ids = list(range(batch_id + 1, batch_id + args.batches + 1))
+      batch_id += args.batches
+      for i in batch_ids:
+        stand_in.add_batch(i, f"tok_{i}", [pdf] * args.docs)
+      clear_session_cache()
+      reset_rate_limiters()
+      _LIMITERS[stand_in.url] = OdooRateLimiter(rate=1e6, burst=10 ** 6, initial=args.batches,
+                                                maximum=args.batches)
+
+      # los hilos del servidor de pega cuentan igual en los dos casos
+      tracemalloc.start()
+      start = time.perf_counter()
+      peak_threads = run_batches(stand_in, batch_ids, name)
+      elapsed = time.perf_counter() - start
+      _, peak = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+
+      print(f"{name:>8} {elapsed:>10.2f} {peak_threads:>6} {peak / 1024 / 1024:>13.1f}")
+
+if __name__ == "__main__":
+  main()
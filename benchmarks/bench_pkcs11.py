@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Mide la firma de un lote de PDFs con un token PKCS#11 de SoftHSM en una y en 
+varias sesiones (ver PyHankoSigner.pkcs11_sessions)
+
+Crea un token de SoftHSM en un directorio temporal con una clave y su 
+certificado autofirmado, con las etiquetas del DNIe, y firma el lote con 
+PyHankoSigner.sign_pdf_batch. También mide lo que tarda en configurarse el 
+firmante, buscando en el token la primera vez y con la caché PKCS#11 después. 
+Necesita softhsm2-util y libsofthsm2.so (o su ruta en SOFTHSM2_MODULE)
+
+Uso: python benchmarks/bench_pkcs11.py [--docs N] [--pages P] [--sessions K]
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from io import BytesIO
+from pathlib import Path
+
+root = Path(__file__).parent.parent
+sys.path.insert(0, str(root / "src"))
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from pyhanko.pdf_utils import generic
+from pyhanko.pdf_utils.writer import PdfFileWriter, PageObject
+
+SOFTHSM_MODULES = [
+  "/usr/lib/softhsm/libsofthsm2.so",
+  "/usr/lib/x86_64-linux-gnu/softhsm/libsofthsm2.so",
+  "/usr/local/lib/softhsm/libsofthsm2.so",
+  "/opt/homebrew/lib/softhsm/libsofthsm2.so",
+]
+
+def make_token(directory: Path, module: str, pin: str) -> int:
+  """
+  Crea el token y guarda en él la clave y el certificado
+
+  Returns:
+    Posición de la ranura del token
+  """
+  import pkcs11
+  from pkcs11 import Attribute
+  from pkcs11.util.rsa import decode_rsa_private_key
+  from pkcs11.util.x509 import decode_x509_certificate
+
+  (directory / "tokens").mkdir()
+  (directory / "softhsm2.conf").write_text(
+    f"directories.tokendir = {directory / 'tokens'}\nobjectstore.backend = file\n")
+  os.environ["SOFTHSM2_CONF"] = str(directory / "softhsm2.conf")
+  subprocess.run(["softhsm2-util", "--init-token", "--free", "--label", "bench",
+                  "--pin", pin, "--so-pin", "4321"], check=True, capture_output=True)
+
+  key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+  name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Benchmark")])
+  now = datetime.datetime.now(datetime.timezone.utc)
+  certificate = (x509.CertificateBuilder()
+                 .subject_name(name).issuer_name(name).public_key(key.public_key())
+                 .serial_number(x509.random_serial_number())
+                 .not_valid_before(now - datetime.timedelta(days=1))
+                 .not_valid_after(now + datetime.timedelta(days=1))
+                 .sign(key, hashes.SHA256()))
+
+  slots = pkcs11.lib(module).get_slots(token_present=True)
+  slot_no = next(i for i, slot in enumerate(slots) if slot.get_token().label == "bench")
+  with slots[slot_no].get_token().open(rw=True, user_pin=pin) as session:
+    private_key = decode_rsa_private_key(key.private_bytes(
+      serialization.Encoding.DER, serialization.PrivateFormat.TraditionalOpenSSL,
+      serialization.NoEncryption()))
+    private_key.update({Attribute.LABEL: "KprivFirmaDigital", Attribute.TOKEN: True,
+                        Attribute.PRIVATE: True})
+    session.create_object(private_key)
+    cert = decode_x509_certificate(certificate.public_bytes(serialization.Encoding.DER))
+    cert.update({Attribute.LABEL: "CertFirmaDigital", Attribute.TOKEN: True})
+    session.create_object(cert)
+  return slot_no
+
+def make_pdf(pages: int) -> bytes:
+  writer = PdfFileWriter()
+  for _ in range(pages):
+    writer.insert_page(PageObject(contents=[], media_box=generic.ArrayObject(
+      [generic.NumberObject(x) for x in (0, 0, 595, 842)])))
+  out = BytesIO()
+  writer.write(out)
+  return out.getvalue()
+
+def run(pdf: bytes, docs: int, sessions: int):
+  """
+  Firma el lote en el token
+
+  Returns:
+    Sesiones abiertas, segundos que ha tardado en configurar el firmante y 
+    segundos que ha tardado en firmar
+  """
+  from hanko_signer import PyHankoSigner
+
+  start = time.perf_counter()
+  signer = PyHankoSigner(cert_password="1234", use_dnie=True, pkcs11_sessions=sessions)
+  setup = time.perf_counter() - start
+  try:
+    start = time.perf_counter()
+    results = signer.sign_pdf_batch([pdf] * docs)
+    elapsed = time.perf_counter() - start
+    opened = len(signer._pool_sessions) + 1
+  finally:
+    signer.close()
+
+  if not all(isinstance(result, bytes) for result in results):
+    raise RuntimeError("No se ha firmado todo el lote")
+  return opened, setup, elapsed
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark de la firma en varias sesiones PKCS#11")
+  parser.add_argument("--docs", type=int, default=200, help="Documentos del lote")
+  parser.add_argument("--pages", type=int, default=5, help="Páginas por documento")
+  parser.add_argument("--sessions", type=int, default=4, help="Sesiones PKCS#11")
+  args = parser.parse_args()
+
+  module = os.environ.get("SOFTHSM2_MODULE") or next(
+    (path for path in SOFTHSM_MODULES if os.path.exists(path)), None)
+  if not module or not shutil.which("softhsm2-util"):
+    sys.exit("SoftHSM no está instalado (softhsm2-util y libsofthsm2.so)")
+
+  base = Path(tempfile.mkdtemp(prefix="maya_bench_"))
+  try:
+    slot_no = make_token(base, module, "1234")
+    os.environ["PKCS11_MODULE"] = module
+    os.environ["PKCS11_SLOT"] = str(slot_no)
+    import hanko_signer
+    hanko_signer.PKCS11_CACHE_FILE = base / "pkcs11_cache.json"
+    pdf = make_pdf(args.pages)
+
+    # la primera vez se busca en el token; después, con la caché
+    print(f"{'sesiones':>9} {'inicio (s)':>11} {'total (s)':>10} {'docs/s':>8}")
+    for sessions in sorted({1, args.sessions}):
+      opened, setup, elapsed = run(pdf, args.docs, sessions)
+      print(f"{opened:>9} {setup:>11.3f} {elapsed:>10.2f} {args.docs / elapsed:>8.1f}")
+  finally:
+    shutil.rmtree(base, ignore_errors=True)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Mide la firma de un lote de PDFs en el worker con un certificado P12
+
+Genera un certificado autofirmado y N PDFs en un directorio de trabajo y
+ejecuta el worker (SignatureWorker, en este proceso) en un único proceso y
+repartiendo los documentos entre varios (ver signer_worker.P12_PROCESSES)
+
+Uso: python benchmarks/bench_signing.py [--docs N] [--pages P] [--processes K]
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from io import BytesIO
+from pathlib import Path
+
+root = Path(__file__).parent.parent
+sys.path.insert(0, str(root / "src"))
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from pyhanko.pdf_utils import generic
+from pyhanko.pdf_utils.writer import PdfFileWriter, PageObject
+
+import signer_worker
+
+def make_p12(path: Path, password: bytes):
+  key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+  name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Benchmark")])
+  now = datetime.datetime.now(datetime.timezone.utc)
+  certificate = (x509.CertificateBuilder()
+                 .subject_name(name).issuer_name(name).public_key(key.public_key())
+                 .serial_number(x509.random_serial_number())
+                 .not_valid_before(now - datetime.timedelta(days=1))
+                 .not_valid_after(now + datetime.timedelta(days=1))
+                 .sign(key, hashes.SHA256()))
+  path.write_bytes(pkcs12.serialize_key_and_certificates(
+    b"benchmark", key, certificate, None, serialization.BestAvailableEncryption(password)))
+
+def make_pdf(pages: int) -> bytes:
+  writer = PdfFileWriter()
+  for _ in range(pages):
+    writer.insert_page(PageObject(contents=[], media_box=generic.ArrayObject(
+      [generic.NumberObject(x) for x in (0, 0, 595, 842)])))
+  out = BytesIO()
+  writer.write(out)
+  return out.getvalue()
+
+def run(work_dir: Path, cert_path: Path, pdf: bytes, docs: int, processes: int) -> float:
+  """
+  Firma el lote con el worker
+
+  Returns:
+    Segundos que ha tardado
+  """
+  for path in work_dir.iterdir():
+    path.unlink()
+
+  documents = []
+  for doc_id in range(1, docs + 1):
+    (work_dir / f"unsigned_{doc_id}.pdf").write_bytes(pdf)
+    documents.append({"document_id": doc_id, "filename": f"doc_{doc_id}.pdf"})
+  (work_dir / "input.json").write_text(json.dumps({
+    "cert_path": str(cert_path), "cert_password": "1234", "use_dnie": False, "documents": documents}))
+
+  signer_worker.P12_PROCESSES = processes
+  signer_worker.PARALLEL_MIN_DOCUMENTS = 2
+
+  start = time.perf_counter()
+  if signer_worker.SignatureWorker(work_dir).sign_documents() != 0:
+    raise RuntimeError("El worker no ha firmado el lote")
+  return time.perf_counter() - start
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark de la firma con P12 en el worker")
+  parser.add_argument("--docs", type=int, default=200, help="Documentos del lote")
+  parser.add_argument("--pages", type=int, default=5, help="Páginas por documento")
+  parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+  args = parser.parse_args()
+
+  base = Path(tempfile.mkdtemp(prefix="maya_bench_"))
+  try:
+    cert_path = base / "bench.p12"
+    make_p12(cert_path, b"1234")
+    work_dir = base / "work"
+    work_dir.mkdir()
+    pdf = make_pdf(args.pages)
+
+    rows = []
+    for processes in sorted({1, args.processes}):
+      elapsed = run(work_dir, cert_path, pdf, args.docs, processes)
+      # el worker deja el logging apuntando a su directorio
+      logging.getLogger().handlers.clear()
+      rows.append((processes, elapsed))
+
+    # al final, para no mezclarlo con el log del worker
+    print(f"{'procesos':>9} {'total (s)':>10} {'docs/s':>8}")
+    for processes, elapsed in rows:
+      print(f"{processes:>9} {elapsed:>10.2f} {args.docs / elapsed:>8.1f}")
+  finally:
+    shutil.rmtree(base, ignore_errors=True)
+
+if __name__ == "__main__":
+  main()
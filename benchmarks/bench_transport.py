@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compara los transportes XML-RPC y JSON-RPC de OdooClient
+
+Levanta el servidor Odoo de pega (tests/odoo_stand_in.py) y mide, para cada 
+tamaño de documento, la descarga de un lote y su subida con cada protocolo.
+Incluye el coste de serializar en el servidor, igual que pasaría con Odoo
+
+Uso: python benchmarks/bench_transport.py [--docs N] [--sizes 100,1024,5120] [--repeat R]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from pathlib import Path
+
+root = Path(__file__).parent.parent
+sys.path.insert(0, str(root / "src"))
+sys.path.insert(0, str(root / "tests"))
+
+from odoo_client import OdooClient
+from odoo_stand_in import OdooStandIn
+
+def run_cycle(stand_in: OdooStandIn, protocol: str, batch_id: int) -> tuple:
+  """
+  Descarga y sube un lote
+
+  Returns:
+    (segundos de descarga, segundos de subida)
+  """
+  client = OdooClient(stand_in.url, stand_in.db, stand_in.username, stand_in.password,
+                      batch_token=f"tok_{batch_id}", protocol=protocol)
+  client.authenticate()
+
+  start = time.perf_counter()
+  documents = client.download_unsigned_pdfs(batch_id, chunked=True)
+  download = time.perf_counter() - start
+
+  signed = [
+    {"document_id": doc["id"], "signed_pdf_bytes": doc["pdf_bytes"],
+     "signed_filename": doc["filename"], "res_model": doc["res_model"], "res_id": doc["res_id"]}
+    for doc in documents
+  ]
+
+  start = time.perf_counter()
+  client.upload_signed_pdfs(batch_id, signed)
+  upload = time.perf_counter() - start
+
+  return download, upload
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark XML-RPC vs JSON-RPC")
+  parser.add_argument("--docs", type=int, default=20, help="Documentos por lote")
+  parser.add_argument("--sizes", default="100,1024,5120", help="Tamaños de documento en KB")
+  parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medida")
+  args = parser.parse_args()
+
+  sizes = [int(size) for size in args.sizes.split(",")]
+
+  print(f"{'tamaño':>8} {'protocolo':>9} {'descarga (s)':>13} {'subida (s)':>11} {'MB/s':>8}")
+
+  batch_id = 0
+  with OdooStandIn() as stand_in:
+    for size_kb in sizes:
+      pdf = b"%PDF-1.4\n" + os.urandom(size_kb * 1024)
+
+      for protocol in ("xmlrpc", "jsonrpc"):
+        best = None
+        for _ in range(args.repeat):
+          batch_id += 1
+          stand_in.add_batch(batch_id, f"tok_{batch_id}", [pdf] * args.docs)
+          result = run_cycle(stand_in, protocol, batch_id)
+          if best is None or sum(result) < sum(best):
+            best = result
+
+        megabytes = 2 * args.docs * len(pdf) / (1024 * 1024)
+        print(f"{size_kb:>6}KB {protocol:>9} {best[0]:>13.3f} {best[1]:>11.3f} {megabytes / sum(best):>8.1f}")
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
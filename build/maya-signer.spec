@@ -46,6 +46,8 @@ service_a = Analysis(
         'pyhanko.pdf_utils.incremental_writer',
         'cryptography',
         'cryptography.hazmat.primitives.serialization',
+        'cryptography.fernet',
+        'keyring',
         'xmlrpc.client',
         'http.server',
     ],
@@ -8,13 +8,100 @@ logger = logging.getLogger("signer_worker")
 from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
 from pyhanko.sign.fields import SigFieldSpec
 
+from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.serialization import pkcs12
 from cryptography.hazmat import backends
 
+from asn1crypto import cms, keys, tsp, x509
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from io import BytesIO
+from pathlib import Path
+import asyncio
+import hashlib
+import json
 import os
+import threading
+
+from typing import Callable, List, Optional, Union
+
+# Firma por resumen: diferencia máxima (segundos) entre la hora de firma que
+# ponen los atributos del servidor, si la ponen, y la del equipo
+REMOTE_SIGNING_TIME_TOLERANCE = 3600
+
+# Firma por lotes: hilos que preparan y calculan el resumen de los PDFs 
+# (hashlib libera el GIL mientras resume)
+BATCH_PREPARE_WORKERS = min(8, os.cpu_count() or 1)
+
+# PKCS#11: ranura del token y sesiones que se abren para firmar en paralelo 
+# con los tokens que lo admiten (HSM, SoftHSM). Se pueden cambiar con las 
+# variables de entorno PKCS11_SLOT y PKCS11_SESSIONS, como PKCS11_MODULE
+PKCS11_SLOT = 0
+PKCS11_SESSIONS = 4
+
+# Módulos PKCS#11 que se prueban si no hay PKCS11_MODULE, etiquetas de los 
+# certificados de firma (en orden) y de la clave del DNIe
+PKCS11_MODULES = [
+  "/usr/lib/x86_64-linux-gnu/opensc-pkcs11.so",
+  "/usr/lib/opensc-pkcs11.so",
+  "/usr/local/lib/opensc-pkcs11.so",
+  "C:\\Windows\\System32\\opensc-pkcs11.dll",  # Windows
+]
+PKCS11_CERT_LABELS = ["CertFirmaDigital", "CertAutenticacion"]
+PKCS11_KEY_LABEL = "KprivFirmaDigital"
+
+# Caché de lo que se encontró en el token la última vez (ver _setup_dnie)
+PKCS11_CACHE_FILE = Path.home() / '.maya_signer' / 'pkcs11_cache.json'
+
+def load_pkcs11_cache(path: Path) -> Optional[dict]:
+  """
+  Lee la caché del token: módulo, ranura, número de serie del token, 
+  etiquetas del certificado y de la clave y huella SHA-256 del certificado
 
-from typing import Optional
+  Returns:
+    La caché o None si no hay o no se puede leer
+  """
+  try:
+    cache = json.loads(Path(path).read_text(encoding='utf-8'))
+  except (OSError, ValueError):
+    return None
+
+  fields = ('module', 'slot', 'token_serial', 'cert_label', 'key_label', 'fingerprint')
+  if not isinstance(cache, dict) or any(field not in cache for field in fields):
+    return None
+  return cache
+
+def save_pkcs11_cache(path: Path, cache: dict):
+  """
+  Guarda la caché del token. Si no se puede, la próxima vez se vuelve a 
+  buscar en el token
+  """
+  path = Path(path)
+  partial = path.with_name(f".{path.name}.{os.getpid()}")
+  try:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial.write_text(json.dumps(cache), encoding='utf-8')
+    os.replace(partial, path)
+  except OSError as e:
+    logger.warning(f"No se pudo guardar la caché PKCS#11: {e}")
+
+def certificate_fingerprint(certificate: x509.Certificate) -> str:
+  return hashlib.sha256(certificate.dump()).hexdigest()
+
+def token_allows_parallel_sessions(token) -> bool:
+  """
+  Indica si un token PKCS#11 puede firmar en varias sesiones a la vez
+
+  python-pkcs11 no expone el máximo de sesiones del token (ulMaxSessionCount),
+  y tampoco bastaría: una tarjeta en un lector (el DNIe) admite varias 
+  sesiones pero firma de una en una. Las tarjetas van en ranuras hardware 
+  extraíbles; los HSM y los tokens software no
+  """
+  from pkcs11 import SlotFlag
+
+  flags = token.slot.flags
+  return not (flags & SlotFlag.HW_SLOT and flags & SlotFlag.REMOVABLE_DEVICE)
 
 
 class PKCS11Error(Exception):
@@ -35,16 +122,30 @@ class PyHankoSigner:
   """
   
   def __init__(self,  cert_path: Optional[str] = None, cert_password: Optional[str] = None, 
-               cert_label: Optional[str] = None, use_dnie: bool = False):
+               cert_label: Optional[str] = None, use_dnie: bool = False,
+               pkcs11_sessions: Optional[int] = None):
+    """
+    Args:
+      pkcs11_sessions: Sesiones PKCS#11 en las que se reparten las firmas de 
+        sign_pdf_batch, si el token lo admite. Por defecto PKCS11_SESSIONS
+    """
     
     self.cert_path = cert_path
     self.cert_label = cert_label
     self.cert_password = cert_password
     self.use_dnie = use_dnie
+    self.pkcs11_sessions = pkcs11_sessions or int(os.environ.get('PKCS11_SESSIONS', PKCS11_SESSIONS))
+    self.key_label = PKCS11_KEY_LABEL
     self.signer = None
 
-    # sesion pkcs11 para controlar su cierre
+    # sesion pkcs11 para controlar su cierre, y su módulo y ranura
     self._pkcs11_session = None
+    self._pkcs11_module = None
+    self._pkcs11_slot = None
+
+    # sesiones adicionales del token y su firmante (ver _open_session_pool)
+    self._pool_sessions = []
+    self._pool_signers = []
     
     if not use_dnie and cert_path:
       self._load_certificate()
@@ -54,77 +155,184 @@ class PyHankoSigner:
   def _setup_dnie(self):
     """
     Configura firma con DNIe usando PKCS#11
+
+    Buscar el módulo, abrir la ranura y probar las etiquetas cuesta segundos 
+    de conversación con el token, así que lo encontrado se guarda en 
+    PKCS11_CACHE_FILE. Las siguientes veces se comprueba contra la caché el 
+    número de serie del token (antes del PIN) y la huella del certificado, y 
+    sólo si no coinciden se vuelve a buscar
     """
     try:
-      from pyhanko.sign import pkcs11
-
-      # Busco el módulo PKCS#11
-      pkcs11_lib = os.environ.get('PKCS11_MODULE')
-          
-      if not pkcs11_lib or not os.path.exists(pkcs11_lib):
-        alternatives = [
-            "/usr/lib/x86_64-linux-gnu/opensc-pkcs11.so",
-            "/usr/lib/opensc-pkcs11.so",
-            "/usr/local/lib/opensc-pkcs11.so",
-            "C:\\Windows\\System32\\opensc-pkcs11.dll",  # Windows
-        ]
-              
-        for alt in alternatives:
-          if os.path.exists(alt):
-              pkcs11_lib = alt
-              break
-        else:
-          raise FileNotFoundError(
-              "No se encontró el módulo PKCS#11 del DNIe.\n"
-              "- Linux: sudo apt-get install opensc\n"
-              "- Windows: Instala el software del DNIe"
-          )
-          
-      logger.info(f"Módulo PKCS#11: {pkcs11_lib}")
-          
-      # Abro sesión PKCS#11
-      session= pkcs11.open_pkcs11_session(lib_location=pkcs11_lib, slot_no=0, user_pin=self.cert_password)
-      self._pkcs11_session = session
-        
-      # Intento detectar etiqueta del certificado
-      if self.cert_label is None:
-        possible_labels = [
-          "CertFirmaDigital",
-          "CertAutenticacion", 
-        ]
-          
-        for label in possible_labels:
-          try:
-            logger.info(f"   Probando etiqueta: {label}")
-            _ = pkcs11.PKCS11Signer(pkcs11_session=session, cert_label=label)
-            self.cert_label = label
-            logger.info(f"Certificado encontrado: {label}")
-            break
-          except Exception:
-            continue
-          
-        if self.cert_label is None:
-          raise ValueError(
-            "No se encontró certificado de firma en el DNIe.\n"
-            "Ejecuta: pkcs11-tool --list-objects --type cert"
-          )
-      
-        # Crear firmante
-        self.signer = pkcs11.PKCS11Signer(pkcs11_session=session, cert_label=self.cert_label,
-                                          key_label="KprivFirmaDigital")
-        
-        logger.info(f"DNIe configurado con certificado: {self.cert_label}")
+      cache = load_pkcs11_cache(PKCS11_CACHE_FILE)
+
+      if cache is None or not self._setup_from_cache(cache):
+        self._discover_pkcs11()
+        save_pkcs11_cache(PKCS11_CACHE_FILE, {
+          'module': self._pkcs11_module,
+          'slot': self._pkcs11_slot,
+          'token_serial': self._pkcs11_session.token.serial.hex(),
+          'cert_label': self.cert_label,
+          'key_label': self.key_label,
+          'fingerprint': certificate_fingerprint(self.signer.signing_cert),
+        })
+
+      logger.info(f"DNIe configurado con certificado: {self.cert_label}")
+
+      self._open_session_pool(self._pkcs11_session)
         
     except Exception as e:
       logger.error(f"Error configurando DNIe: {str(e)}")
       raise
 
+  def _setup_from_cache(self, cache: dict) -> bool:
+    """
+    Configura el firmante con lo que dice la caché
+
+    Returns:
+      False si la caché no vale (otro módulo, otro token, otro certificado...)
+      y hay que buscar en el token
+    """
+    from pyhanko.sign import pkcs11
+    from pkcs11 import lib as pkcs11_lib
+
+    module = os.environ.get('PKCS11_MODULE')
+    slot_no = os.environ.get('PKCS11_SLOT')
+    if (not os.path.exists(cache['module'])
+        or (module and module != cache['module'])
+        or (slot_no is not None and int(slot_no) != cache['slot'])
+        or (self.cert_label is not None and self.cert_label != cache['cert_label'])):
+      logger.info("La caché PKCS#11 no corresponde a la configuración")
+      return False
+
+    # antes de enviar el PIN: que sea el mismo token
+    try:
+      token = pkcs11_lib(cache['module']).get_slots()[cache['slot']].get_token()
+    except Exception as e:
+      logger.info(f"Token de la caché PKCS#11 no disponible: {e}")
+      return False
+    if token.serial.hex() != cache['token_serial']:
+      logger.info("Otro token en la ranura de la caché PKCS#11")
+      return False
+
+    # los errores del PIN no se arreglan buscando otra vez
+    session = token.open(user_pin=self.cert_password)
+
+    try:
+      signer = pkcs11.PKCS11Signer(pkcs11_session=session, cert_label=cache['cert_label'],
+                                   key_label=cache['key_label'])
+      valid = certificate_fingerprint(signer.signing_cert) == cache['fingerprint']
+    except Exception as e:
+      logger.info(f"Objetos de la caché PKCS#11 no encontrados: {e}")
+      valid = False
+
+    if not valid:
+      logger.info("El certificado del token no es el de la caché PKCS#11")
+      session.close()
+      return False
+
+    logger.info(f"Módulo PKCS#11 (caché): {cache['module']}")
+    self._pkcs11_module, self._pkcs11_slot = cache['module'], cache['slot']
+    self._pkcs11_session = session
+    self.cert_label, self.key_label = cache['cert_label'], cache['key_label']
+    self.signer = signer
+    return True
+
+  def _discover_pkcs11(self):
+    """
+    Busca el módulo PKCS#11, abre la sesión y encuentra el certificado de firma
+    """
+    from pyhanko.sign import pkcs11
+
+    # Busco el módulo PKCS#11
+    pkcs11_lib = os.environ.get('PKCS11_MODULE')
+        
+    if not pkcs11_lib or not os.path.exists(pkcs11_lib):
+      for alt in PKCS11_MODULES:
+        if os.path.exists(alt):
+            pkcs11_lib = alt
+            break
+      else:
+        raise FileNotFoundError(
+            "No se encontró el módulo PKCS#11 del DNIe.\n"
+            "- Linux: sudo apt-get install opensc\n"
+            "- Windows: Instala el software del DNIe"
+        )
+        
+    logger.info(f"Módulo PKCS#11: {pkcs11_lib}")
+        
+    # Abro sesión PKCS#11
+    slot_no = int(os.environ.get('PKCS11_SLOT', PKCS11_SLOT))
+    session= pkcs11.open_pkcs11_session(lib_location=pkcs11_lib, slot_no=slot_no, user_pin=self.cert_password)
+    self._pkcs11_session = session
+    self._pkcs11_module, self._pkcs11_slot = pkcs11_lib, slot_no
+      
+    # Intento detectar etiqueta del certificado. El firmante carga la clave 
+    # y el certificado al pedirle el certificado: el que los encuentra es 
+    # el que se usa
+    labels = [self.cert_label] if self.cert_label is not None else PKCS11_CERT_LABELS
+    for label in labels:
+      try:
+        logger.info(f"   Probando etiqueta: {label}")
+        signer = pkcs11.PKCS11Signer(pkcs11_session=session, cert_label=label,
+                                     key_label=self.key_label)
+        _ = signer.signing_cert
+      except Exception:
+        continue
+
+      self.cert_label = label
+      self.signer = signer
+      logger.info(f"Certificado encontrado: {label}")
+      break
+    else:
+      raise ValueError(
+        "No se encontró certificado de firma en el DNIe.\n"
+        "Ejecuta: pkcs11-tool --list-objects --type cert"
+      )
+
+  def _open_session_pool(self, session):
+    """
+    Abre sesiones adicionales en el token, cada una con su firmante, para que 
+    sign_pdf_batch reparta las firmas entre ellas. Con tokens que firman de 
+    uno en uno (ver token_allows_parallel_sessions) no se abre ninguna, y se 
+    abren hasta pkcs11_sessions o hasta que el token no admita más
+    """
+    from pyhanko.sign import pkcs11
+
+    if self.pkcs11_sessions <= 1 or not token_allows_parallel_sessions(session.token):
+      logger.info("Firma PKCS#11 en una sesión")
+      return
+
+    # el certificado se lee una vez, en la sesión principal
+    signing_cert = self.signer.signing_cert
+
+    for _ in range(self.pkcs11_sessions - 1):
+      extra = None
+      try:
+        # el login es de la aplicación, no de la sesión: las nuevas ya están 
+        # autenticadas
+        extra = session.token.open()
+        signer = pkcs11.PKCS11Signer(pkcs11_session=extra, cert_label=self.cert_label,
+                                     key_label=self.key_label, signing_cert=signing_cert)
+        # busca la clave ahora, no al firmar
+        _ = signer.signing_cert
+      except Exception as e:
+        logger.info(f"El token no admite más sesiones: {e}")
+        if extra is not None:
+          extra.close()
+        break
+
+      self._pool_sessions.append(extra)
+      self._pool_signers.append(signer)
+
+    logger.info(f"Firma PKCS#11 en {len(self._pool_signers) + 1} sesiones")
+
   def _load_certificate(self):
     """
     Carga certificado .p12/.pfx
     """
     try:
       from pyhanko.sign import signers
+      from pyhanko_certvalidator.registry import SimpleCertificateStore
 
       with open(self.cert_path, 'rb') as f:
         cert_data = f.read()
@@ -136,12 +344,15 @@ class PyHankoSigner:
           backend=backends.default_backend()
       )
       
-      # Creo el firmante
+      # Creo el firmante (pyHanko trabaja con los objetos de asn1crypto)
       self.signer = signers.SimpleSigner(
-        signing_cert=certificate,
-        signing_key=private_key,
-        cert_registry=signers.SimpleCertificateStore.from_certs(
-            additional_certs or []
+        signing_cert=self._asn1_certificate(certificate),
+        signing_key=keys.PrivateKeyInfo.load(private_key.private_bytes(
+          serialization.Encoding.DER, serialization.PrivateFormat.PKCS8,
+          serialization.NoEncryption()
+        )),
+        cert_registry=SimpleCertificateStore.from_certs(
+            [self._asn1_certificate(cert) for cert in additional_certs or []]
         )
       )
       
@@ -151,6 +362,45 @@ class PyHankoSigner:
       logger.error(f"Error cargando certificado: {str(e)}")
       raise
 
+  @staticmethod
+  def _asn1_certificate(certificate) -> x509.Certificate:
+    return x509.Certificate.load(certificate.public_bytes(serialization.Encoding.DER))
+
+  @staticmethod
+  def _signature_field(writer: IncrementalPdfFileWriter) -> SigFieldSpec:
+    """
+    Campo de la firma: una banda al pie de la última página
+    """
+    # Calculo donde irá la firma... ultima página la final
+    page_count = len(writer.root['/Pages']['/Kids'])
+    last_page_ref = writer.root['/Pages']['/Kids'][page_count - 1]
+    last_page = last_page_ref.get_object()
+    
+    media_box = last_page['/MediaBox']
+    page_width = float(media_box[2])
+    
+    margin = 15
+    signature_height = 50
+    
+    return SigFieldSpec(
+      sig_field_name='Signature',
+      box=(margin, margin, page_width - margin, margin + signature_height),
+      on_page=page_count - 1
+    )
+
+  @staticmethod
+  def _signature_metadata(reason: str, location: str, contact_info: Optional[str]):
+    """
+    Metadatos de la firma
+    """
+    from pyhanko.sign import signers
+
+    return signers.PdfSignatureMetadata(
+      field_name='Signature',
+      location=location, reason=reason,
+      contact_info=contact_info, md_algorithm='sha256',
+    )
+
   def sign_pdf(self, pdf_bytes: bytes, reason: str = "Firmado electrónicamente",
       location: str = "España", contact_info: Optional[str] = None) -> bytes:
     """
@@ -175,30 +425,8 @@ class PyHankoSigner:
       pdf_stream = BytesIO(pdf_bytes)
       writer = IncrementalPdfFileWriter(pdf_stream)
       
-      # Calculo donde irá la firma... ultima página la final
-      page_count = len(writer.root['/Pages']['/Kids'])
-      last_page_ref = writer.root['/Pages']['/Kids'][page_count - 1]
-      last_page = last_page_ref.get_object()
-      
-      media_box = last_page['/MediaBox']
-      page_width = float(media_box[2])
-      page_height = float(media_box[1])
-      
-      margin = 15
-      signature_height = 50
-      
-      sig_field_spec = SigFieldSpec(
-        sig_field_name='Signature',
-        box=(margin, margin, page_width - margin, margin + signature_height),
-        on_page=page_count - 1
-      )
-      
-      # Metadatos de la firma
-      signature_meta = signers.PdfSignatureMetadata(
-        field_name='Signature',
-        location=location, reason=reason,
-        contact_info=contact_info, md_algorithm='sha256',
-      )
+      sig_field_spec = self._signature_field(writer)
+      signature_meta = self._signature_metadata(reason, location, contact_info)
       
       # Se firma el documento
       signed_pdf = signers.sign_pdf(
@@ -216,10 +444,222 @@ class PyHankoSigner:
       logger.error(f"Error firmando PDF: {e}")
       raise
 
+  def sign_pdf_batch(self, pdfs: List[bytes], reason: str = "Firmado electrónicamente",
+                     location: str = "España", contact_info: Optional[str] = None,
+                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                     max_workers: int = BATCH_PREPARE_WORKERS) -> List[Union[bytes, Exception]]:
+    """
+    Firma varios PDFs en dos fases, para que la tarjeta no espere a Python:
+
+    1. En un pool de hilos se prepara cada PDF (campo de firma y hueco del 
+       CMS), se calcula el resumen del rango de bytes y sus atributos firmados
+    2. Las firmas se hacen seguidas en la sesión PKCS#11 (o con la clave del 
+       P12) y después se incrusta cada CMS en su PDF, otra vez en el pool. 
+       Si el token admite varias sesiones (ver _open_session_pool), cada una 
+       firma su parte en un hilo
+
+    El resultado es el mismo que el de sign_pdf con cada PDF
+
+    Args:
+        pdfs:               Contenido de los PDFs en bytes
+        reason:             Razón de la firma
+        location:           Ubicación
+        contact_info:       Información de contacto
+        progress_callback:  Se llama con (firmados, total) tras cada firma
+        max_workers:        Hilos de la preparación y la incrustación
+
+    Returns:
+        Por cada PDF, el PDF firmado en bytes o la excepción con la que falló
+    """
+    from pyhanko.sign.signers.pdf_signer import PdfTBSDocument
+
+    if self.signer is None:
+      raise ValueError("No hay firmante configurado")
+
+    # los objetos de la tarjeta (certificados, clave) se cargan antes de 
+    # repartir el trabajo, así los hilos no hablan con ella
+    _ = self.signer.signing_cert
+
+    def prepare(pdf_bytes):
+      try:
+        return asyncio.run(self._prepare_signature(pdf_bytes, reason, location, contact_info))
+      except Exception as e:
+        logger.error(f"Error preparando PDF: {e}")
+        return e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+      prepared = list(executor.map(prepare, pdfs))
+
+      signers = [self.signer] + self._pool_signers
+      signatures: List[object] = [None] * len(prepared)
+      progress_lock = threading.Lock()
+      done = 0
+
+      # cada sesión firma su parte, un resumen detrás de otro
+      def sign_share(signer, indexes):
+        async def sign_all():
+          nonlocal done
+          for i in indexes:
+            item = prepared[i]
+            if isinstance(item, Exception):
+              signatures[i] = item
+            else:
+              try:
+                signatures[i] = await signer.async_sign_prescribed_attributes(
+                  'sha256', signed_attrs=item['signed_attrs'])
+              except Exception as e:
+                logger.error(f"Error firmando PDF: {e}")
+                signatures[i] = e
+            with progress_lock:
+              done += 1
+              if progress_callback:
+                progress_callback(done, len(prepared))
+
+        asyncio.run(sign_all())
+
+      if len(signers) == 1:
+        sign_share(self.signer, range(len(prepared)))
+      else:
+        shares = [range(i, len(prepared), len(signers)) for i in range(len(signers))]
+        with ThreadPoolExecutor(max_workers=len(signers)) as sign_executor:
+          list(sign_executor.map(sign_share, signers, shares))
+
+      def embed(item, signature):
+        if isinstance(signature, Exception):
+          return signature
+        try:
+          asyncio.run(PdfTBSDocument.async_finish_signing(
+            item['output'], prepared_digest=item['prepared_digest'], signature_cms=signature,
+            post_sign_instr=item['post_sign_instructions']))
+          return item['output'].getvalue()
+        except Exception as e:
+          logger.error(f"Error incrustando la firma: {e}")
+          return e
+
+      results = list(executor.map(embed, prepared, signatures))
+
+    logger.info(f"{len([r for r in results if isinstance(r, bytes)])}/{len(pdfs)} PDFs firmados por lotes")
+    return results
+
+  async def _prepare_signature(self, pdf_bytes: bytes, reason: str, location: str,
+                               contact_info: Optional[str]) -> dict:
+    """
+    Primera fase de sign_pdf_batch: prepara el PDF para la firma y calcula 
+    sus atributos firmados, sin usar la clave
+    """
+    from pyhanko.sign import signers
+    from pyhanko.sign.signers.pdf_cms import PdfCMSSignedAttributes
+
+    writer = IncrementalPdfFileWriter(BytesIO(pdf_bytes))
+    pdf_signer = signers.PdfSigner(
+      self._signature_metadata(reason, location, contact_info),
+      signer=self.signer,
+      new_field_spec=self._signature_field(writer)
+    )
+
+    prepared_digest, tbs_document, output = await pdf_signer.async_digest_doc_for_signing(writer)
+    signed_attrs = await self.signer.signed_attrs(
+      prepared_digest.document_digest, 'sha256',
+      attr_settings=PdfCMSSignedAttributes(), use_pades=tbs_document.use_pades
+    )
+
+    return {
+      'prepared_digest': prepared_digest,
+      'post_sign_instructions': tbs_document.post_sign_instructions,
+      'output': output,
+      'signed_attrs': signed_attrs,
+    }
+
+  def signing_certificate(self) -> bytes:
+    """
+    Certificado de firma en DER, el que necesita el servidor para preparar 
+    la firma por resumen (ver sign_signed_attributes)
+    """
+    if self.signer is None:
+      raise ValueError("No hay firmante configurado")
+    return self.signer.signing_cert.dump()
+
+  def sign_signed_attributes(self, signed_attrs: bytes, md_algorithm: str = 'sha256') -> bytes:
+    """
+    Firma por resumen: el servidor prepara el PDF con el hueco de la firma y 
+    envía los atributos firmados del CMS, que incluyen el resumen del rango 
+    de bytes del documento. Aquí sólo se firman esos atributos (con el P12 o 
+    con la tarjeta) y se devuelve el CMS, que el servidor incrusta en su PDF
+
+    El cliente no tiene el PDF preparado, así que no puede comprobar qué 
+    documento firma: firma el resumen que le envía el servidor (autenticado 
+    con la sesión del usuario y el token del lote). Sí comprueba lo que 
+    controla él (ver _check_signed_attributes): que la firma se atribuye a 
+    su certificado, que es de un documento (content-type data) y la hora
+
+    Args:
+      signed_attrs: Atributos firmados (CMSAttributes) en DER
+      md_algorithm: Algoritmo del resumen
+
+    Returns:
+      CMS (ContentInfo con el SignedData) en DER
+
+    Raises:
+      ValueError: Si los atributos no son los de una firma de un documento 
+        con este certificado
+    """
+    if self.signer is None:
+      raise ValueError("No hay firmante configurado")
+
+    attrs = cms.CMSAttributes.load(signed_attrs)
+    self._check_signed_attributes(attrs, md_algorithm)
+
+    signature = asyncio.run(self.signer.async_sign_prescribed_attributes(md_algorithm, signed_attrs=attrs))
+
+    logger.info("Resumen firmado correctamente")
+    return signature.dump()
+
+  def _check_signed_attributes(self, attrs: cms.CMSAttributes, md_algorithm: str):
+    """
+    Raises:
+      ValueError: Si los atributos firmados no son los de una firma de un 
+        documento con el certificado de este firmante
+    """
+    values = {}
+    for attr in attrs:
+      values.setdefault(attr['type'].native, []).extend(attr['values'])
+
+    if [value.native for value in values.get('content_type', [])] != ['data']:
+      raise ValueError("Los atributos firmados no son de un documento")
+
+    digests = values.get('message_digest', [])
+    if len(digests) != 1 or len(digests[0].native) != hashlib.new(md_algorithm).digest_size:
+      raise ValueError(f"Los atributos firmados no llevan un resumen {md_algorithm}")
+
+    # el certificado que dicen los atributos (PAdES lo exige) tiene que ser el nuestro
+    references = values.get('signing_certificate_v2', []) + values.get('signing_certificate', [])
+    if len(references) != 1:
+      raise ValueError("Los atributos firmados no indican el certificado de firma")
+    reference = references[0]['certs'][0]
+    hash_algorithm = reference['hash_algorithm']['algorithm'].native \
+      if isinstance(reference, tsp.ESSCertIDv2) else 'sha1'
+    certificate = self.signer.signing_cert
+    if reference['cert_hash'].native != hashlib.new(hash_algorithm, certificate.dump()).digest():
+      raise ValueError("Los atributos firmados son de otro certificado")
+
+    for signing_time in values.get('signing_time', []):
+      delta = abs((signing_time.native - datetime.now(timezone.utc)).total_seconds())
+      if delta > REMOTE_SIGNING_TIME_TOLERANCE:
+        raise ValueError("La hora de firma de los atributos no es la actual")
+
   def close(self):
     """
     Cierra la sesión de PKCS#11.
     """
+    # las adicionales antes: cerrar la principal cierra el login del token
+    for session in self._pool_sessions:
+      try:
+        session.close()
+      except Exception as e:
+        logger.warning(f"Error al cerrar una sesión PKCS#11 adicional: {e}")
+    self._pool_sessions = []
+    self._pool_signers = []
+
     if self._pkcs11_session:
       try:
         self._pkcs11_session.close()
@@ -49,7 +49,18 @@ def parse_protocol_url(url):
     'batch': params.get('batch', [None])[0],
     'url': params.get('url', [None])[0],
     'database': params.get('db', [''])[0],
-    'token': params.get('token', [None])[0]
+    'token': params.get('token', [None])[0],
+    # protocolo con Odoo ('xmlrpc' o 'jsonrpc'), lo decide cada servidor en el enlace
+    'protocol': params.get('protocol', [None])[0],
+    # transferencia de los PDFs: 'rpc' (base64 dentro de las llamadas) o 'http' (binario en crudo)
+    'transfer': params.get('transfer', ['rpc'])[0],
+    # autenticación de las llamadas: 'password', 'api_key' o 'session' (ver odoo_client)
+    'auth': params.get('auth', [None])[0],
+    # peticiones RPC comprimidas con gzip: sólo si el proxy del servidor las descomprime
+    'gzip': params.get('gzip', ['0'])[0] == '1',
+    # firma: 'pdf' (se descargan y suben los PDFs) o 'digest' (el servidor 
+    # prepara los PDFs y sólo viajan los resúmenes y los CMS)
+    'sign': params.get('sign', ['pdf'])[0]
   }
 
 def handle_protocol_call(url):
@@ -30,6 +30,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from manifest import __version__
 
 SERVICE_PORT = 50304                    ## inventado
+TRANSFER_WORKERS = 4                    # peticiones simultáneas con Odoo en descargas/subidas
 LOCK_FILE = Path.home() / ".maya-signer.lock"
 
 logger = setup_logger("service.log", "maya_signer")
@@ -39,6 +40,7 @@ class SignalEmitter(QObject):
   Emisor de señales (eventos) para comunicación con Qt
   """
   show_credentials_dialog = Signal(str, str)  # odoo_url, database
+  spool_changed = Signal()                    # cambia la cola de subida (ver upload_spool)
 
 class MayaServiceHandler(BaseHTTPRequestHandler):
   """
@@ -147,12 +149,17 @@ class MayaSignerService(QObject):
     # pero permite varias por si hubiera diferentes servidores para diferentes tareas 
     # (Gestion documental/Gestion alumnos)
     self.credentials_store = {}  
+
+    # cola cifrada de los lotes firmados que no se pudieron subir (ver upload_spool)
+    self.spool = None
+    self.spool_flusher = None
   
     self.version = __version__
 
     # Señales para Qt
     self.signals = SignalEmitter()
     self.signals.show_credentials_dialog.connect(self._show_credentials_dialog)
+    self.signals.spool_changed.connect(self.update_tray_menu)
 
   def get_credentials(self, odoo_url):
     """
@@ -175,6 +182,10 @@ class MayaSignerService(QObject):
     
     self.update_tray_menu()
 
+    # con credenciales puede que ya se puedan subir los lotes de la cola
+    if self.spool_flusher:
+      self.spool_flusher.wake()
+
   def _show_credentials_dialog(self, odoo_url: str, database: str):
     """
     Muestra diálogo de credenciales
@@ -278,6 +289,13 @@ class MayaSignerService(QObject):
     connections_action = self.tray_menu.addAction(f"Conexiones activas: {'OK' if self.credentials_store else 'Ninguna'} ({len(self.credentials_store)})")
     connections_action.setEnabled(False)
 
+    if self.spool is not None:
+      pending = self.spool.document_count()
+      if pending:
+        spool_action = self.tray_menu.addAction(
+          f"Pendientes de subir: {pending} documentos ({len(self.spool)} lotes)")
+        spool_action.setEnabled(False)
+
     clear_action = self.tray_menu.addAction("Borrar credenciales")
     clear_action.triggered.connect(self.clear_credentials)
 
@@ -322,9 +340,12 @@ class MayaSignerService(QObject):
 
   def clear_credentials(self):
     """
-    Borra todas las credenciales almacenadas
+    Borra todas las credenciales almacenadas (y las sesiones de Odoo abiertas con ellas)
     """
+    from odoo_client import clear_session_cache
+
     self.credentials_store.clear()
+    clear_session_cache()
     self.update_tray_menu()
     
   def quit_service(self):
@@ -332,6 +353,8 @@ class MayaSignerService(QObject):
     Cierra el servicio
     """
     self.running = False
+    if self.spool_flusher:
+      self.spool_flusher.stop()
     if self.server:
       self.server.shutdown()
     
@@ -345,6 +368,8 @@ class MayaSignerService(QObject):
     logger.info("=" * 60)
     logger.info("  MAYA SIGNER SERVICE")
     logger.info("=" * 60)
+
+    self.init_spool()
         
     # Icono en tray
     self.init_tray()
@@ -361,6 +386,106 @@ class MayaSignerService(QObject):
     # Ejecuto la aplicación Qt
     return self.app.exec()
   
+  def init_spool(self):
+    """
+    Abre la cola de subida y arranca el hilo que la sube
+    """
+    try:
+      from upload_spool import UploadSpool, SpoolFlusher
+
+      self.spool = UploadSpool()
+      self.spool.on_change = self.signals.spool_changed.emit
+      self.spool_flusher = SpoolFlusher(self.spool, self._spool_client)
+      self.spool_flusher.start()
+
+      if len(self.spool):
+        logger.info(f"Cola de subida: {self.spool.document_count()} documentos pendientes")
+    except Exception as e:
+      # sin cola, los lotes que no se puedan subir se pierden como antes
+      logger.error(f"No se pudo abrir la cola de subida: {e}")
+      self.spool = None
+      self.spool_flusher = None
+
+  def _spool_client(self, job):
+    """
+    Cliente de Odoo para subir un lote de la cola, con las credenciales 
+    guardadas para su servidor (None si no las hay)
+    """
+    from odoo_client import OdooClient
+    from odoo_transport import GZIP_THRESHOLD
+
+    credentials = self.get_credentials(job['url'])
+    if not isinstance(credentials, dict) or credentials['username'] != job['username']:
+      return None
+
+    return OdooClient(
+      url=job['url'],
+      db=job['db'],
+      username=credentials['username'],
+      password=credentials['password'],
+      batch_token=job['token'],
+      max_workers=TRANSFER_WORKERS,
+      protocol=job['protocol'],
+      auth_mode=job['auth_mode'],
+      gzip_threshold=GZIP_THRESHOLD if job.get('gzip') else None
+    )
+
+  def _spool_upload(self, client, data, signed_documents, transfer, confirmed, error=None) -> bool:
+    """
+    Si la subida ha fallado porque el servidor no responde, guarda en la 
+    cola de subida los documentos firmados que el servidor no llegó a 
+    confirmar, para subirlos cuando vuelva
+
+    Args:
+      confirmed: document_id que el servidor ya confirmó (ver 
+        OdooClient.upload_signed_pdfs)
+      error: Excepción de la subida, o None si upload_signed_pdfs devolvió False
+
+    Returns:
+      bool: True si el lote ha quedado en la cola
+    """
+    from odoo_retry import get_circuit_breaker
+    from upload_spool import server_unreachable
+
+    if self.spool is None:
+      return False
+
+    if error is not None:
+      unreachable = server_unreachable(error)
+    else:
+      unreachable = get_circuit_breaker(client.url).is_open or not client.test_connection()['success']
+    if not unreachable:
+      return False
+
+    job = {
+      'url': client.url,
+      'db': client.db,
+      'username': client.username,
+      'batch_id': int(data['batch']),
+      'token': client.batch_token,
+      'protocol': client.protocol,
+      'auth_mode': client.auth_mode,
+      'gzip': client.gzip_threshold is not None,
+      'transfer': transfer,
+      # se cuentan como firmados al finalizar el lote desde la cola
+      'confirmed': sorted(confirmed),
+    }
+    pending = [doc for doc in signed_documents if doc['document_id'] not in confirmed]
+    try:
+      self.spool.add(job, pending)
+    except Exception as e:
+      logger.error(f"\tNo se pudo guardar el lote en la cola de subida: {e}")
+      return False
+
+    if self.tray_icon:
+      self.tray_icon.showMessage(
+        'Odoo no responde',
+        f'{len(pending)} documentos firmados guardados. Se subirán cuando vuelva el servidor',
+        QSystemTrayIcon.Warning,
+        5000
+      )
+    return True
+
   def update_progress_ui(self, message):
     """
     Actualiza el estado de la firma en la bandeja de sistema
@@ -368,12 +493,113 @@ class MayaSignerService(QObject):
     self.status_action.setText(f"{message}")
     self.tray_icon.setToolTip(f"Maya Signer - {message}")
       
+  def _show_signing_error(self, error_msg: str):
+    """
+    Avisa de un error del worker de firma
+    """
+    logger.error(f"\tError en firma: {error_msg}")
+
+    if "ERROR CRÍTICO" in error_msg.upper():
+      self.clear_credentials()
+      QMessageBox.critical(
+          None,
+          "Error de firma",
+          f"""Error firmando documentos: ¡Error crítico!. Comprueba:\n 
+            - Las credenciales del certificado
+            - El estado de pcsc_scan en sistemas linux
+            - La conexión al lector de tarjetas
+            - El estado del servicio de firma (drivers, aplicación DNIe...)
+           """
+      )
+    else:
+      QMessageBox.critical(
+          None,
+          "Error de firma",
+          f"Error firmando documentos: {error_msg}"
+      )
+
+  def _sign_remote_digests(self, client, manager, data, credentials) -> bool:
+    """
+    Firma por resumen: el servidor prepara los PDFs y envía los atributos 
+    firmados de cada uno, el worker los firma con el certificado o el DNIe y 
+    sólo se devuelven los CMS. Con el DNIe y una conexión lenta se ahorra la 
+    descarga y la subida de los PDFs, que la tarjeta no necesita
+
+    Returns:
+      bool: False si el servidor no admite la firma por resumen (hay que 
+      firmar los PDFs completos); True si el lote se ha procesado (o ha 
+      fallado y ya se ha avisado)
+
+    Raises:
+      OdooTokenError: Si el servidor rechaza el token
+    """
+    batch_id = int(data['batch'])
+
+    # el certificado entra en los atributos firmados: se lee una vez por credenciales
+    if not credentials.get('certificate'):
+      logger.info("** (4) => Leyendo el certificado de firma... **")
+      result = manager.get_signing_certificate(
+        cert_path=credentials.get('cert_path'),
+        cert_password=credentials['cert_password'],
+        use_dnie=credentials.get('use_dnie', False)
+      )
+      if not result['success']:
+        self._show_signing_error(result['error'])
+        return True
+      credentials['certificate'] = result['certificate']
+
+    logger.info("** (4) => Preparando la firma por resumen en el servidor... **")
+    prepared = client.prepare_remote_signatures(batch_id, credentials['certificate'])
+    if prepared is None:
+      return False
+
+    if not prepared:
+      raise Exception("No hay documentos para firmar")
+
+    logger.info("** (5) => Firmando los resúmenes con subproceso... **")
+    result = manager.sign_digests(
+      prepared,
+      cert_path=credentials.get('cert_path'),
+      cert_password=credentials['cert_password'],
+      use_dnie=credentials.get('use_dnie', False),
+      progress_callback=self.update_progress_ui
+    )
+    if not result['success']:
+      self._show_signing_error(result.get('error', 'Error desconocido'))
+      return True
+
+    if not result['signatures']:
+      raise Exception("No se firmó ningún documento")
+
+    logger.info("** (6) => Enviando las firmas a Odoo... **")
+    if client.finish_remote_signatures(batch_id, result['signatures']):
+      logger.info(f"\t{len(result['signatures'])} documentos firmados por resumen")
+      if self.tray_icon:
+        self.tray_icon.showMessage(
+          'Firma completada',
+          f"{len(result['signatures'])} documentos firmados correctamente",
+          QSystemTrayIcon.Information,
+          4000
+        )
+    else:
+      QMessageBox.critical(
+        None,
+        "Error de subida",
+        "Error al guardar las firmas en Odoo"
+      )
+
+    return True
+
   def process_signature(self, data, credentials):
     """
     Procesa la firma de documentos usando subproceso
     """
+    manager = None
+    work_dir = None
+
     try:
       from odoo_client import OdooClient, OdooTokenError, OdooAuthenticationError
+      from odoo_transport import GZIP_THRESHOLD
       from subprocess_signature_manager import SubprocessSignatureManager
 
       logger.info(f"** (1) => Iniciando proceso de firma del lote {data['batch']}... **")
@@ -392,7 +618,11 @@ class MayaSignerService(QObject):
           username=credentials['username'],
           password=credentials['password'],
           batch_token=data.get('token'),
-          progress_callback=self.update_progress_ui
+          progress_callback=self.update_progress_ui,
+          max_workers=TRANSFER_WORKERS,
+          protocol=data.get('protocol') or 'xmlrpc',
+          auth_mode=data.get('auth') or 'password',
+          gzip_threshold=GZIP_THRESHOLD if data.get('gzip') else None
       )
           
       if not client.authenticate():
@@ -414,8 +644,22 @@ class MayaSignerService(QObject):
         )
         return
 
+      manager = SubprocessSignatureManager()
+
+      # firma por resumen: si el servidor la admite, los PDFs no se descargan
+      if data.get('sign') == 'digest' and self._sign_remote_digests(client, manager, data, credentials):
+        return
+
       logger.info("** (4) => Descargando PDFs sin firmar... **")
-      documents = client.download_unsigned_pdfs(int(data['batch']))
+
+      # con una clave API no hay sesión web: los PDFs van por RPC
+      http_transfer = data.get('transfer') == 'http' and client.auth_mode != 'api_key'
+
+      # los PDFs se descargan directamente al directorio del worker: en crudo 
+      # por HTTP, o por RPC decodificando el base64 según llega
+      work_dir = manager.create_work_directory()
+      documents = client.download_unsigned_pdfs(int(data['batch']), target_dir=work_dir,
+                                                transfer='http' if http_transfer else 'rpc')
           
       if not documents:
         raise Exception("No hay documentos para firmar")
@@ -424,40 +668,21 @@ class MayaSignerService(QObject):
 
       logger.info("** (5) => Iniciando firma con subproceso... **")
       
-      manager = SubprocessSignatureManager()
-      
       result = manager.sign_documents(
         documents=documents,
         cert_path=credentials.get('cert_path'),
         cert_password=credentials['cert_password'],
         use_dnie=credentials.get('use_dnie', False),
         progress_callback=self.update_progress_ui,
-        cleanup=True  # solo ponerlo a False en entornos de pruebas!!
+        # los firmados se suben desde disco (por HTTP o codificándolos por 
+        # trozos en la petición RPC) y el directorio se limpia al terminar
+        cleanup=False,
+        work_dir=work_dir,
+        load_signed=False
       )
       
       if not result['success']:
-        error_msg = result.get('error', 'Error desconocido')
-        logger.error(f"\tError en firma: {error_msg}")
-
-        if "ERROR CRÍTICO" in error_msg.upper():
-          self.clear_credentials()
-          QMessageBox.critical(
-              None,
-              "Error de firma",
-              f"""Error firmando documentos: ¡Error crítico!. Comprueba:\n 
-                - Las credenciales del certificado
-                - El estado de pcsc_scan en sistemas linux
-                - La conexión al lector de tarjetas
-                - El estado del servicio de firma (drivers, aplicación DNIe...)
-               """
-          )
-        else:
-          QMessageBox.critical(
-              None,
-              "Error de firma",
-              f"Error firmando documentos: {error_msg}"
-          )
-            
+        self._show_signing_error(result.get('error', 'Error desconocido'))
         return
       
       signed_documents = result['signed_documents']
@@ -478,8 +703,16 @@ class MayaSignerService(QObject):
       
       logger.info("** (6) => Subiendo documentos firmados a Odoo... **")
 
+      transfer = 'http' if http_transfer else 'rpc'
+      confirmed = set()
       try:
-        upload_correct = client.upload_signed_pdfs(int(data['batch']), signed_documents)
+        upload_correct = client.upload_signed_pdfs(int(data['batch']), signed_documents,
+                                                   transfer=transfer, confirmed=confirmed)
+
+        # si Odoo no responde, lo que falta por subir queda en la cola en lugar de perderse
+        if not upload_correct and self._spool_upload(client, data, signed_documents, transfer,
+                                                     confirmed):
+          return
         
         if upload_correct:
           logger.info("\tTodos los documentos subidos correctamente")
@@ -503,6 +736,9 @@ class MayaSignerService(QObject):
           return
               
       except OdooTokenError as e:
+        if self._spool_upload(client, data, signed_documents, transfer, confirmed, e):
+          return
+
         logger.error(f"\tToken expiró durante la subida: {str(e)}")
         
         QMessageBox.critical(
@@ -511,6 +747,10 @@ class MayaSignerService(QObject):
             "El token expiró durante la subida. Algunos documentos pueden no haberse guardado."
         )
         return
+      except Exception as e:
+        if self._spool_upload(client, data, signed_documents, transfer, confirmed, e):
+          return
+        raise
       
       logger.info("=" * 60)
       logger.info("    PROCESO COMPLETADO CON ÉXITO")
@@ -530,6 +770,18 @@ class MayaSignerService(QObject):
       )
      
     finally:
+      # directorio de trabajo de la transferencia http (o creado pero no usado)
+      if manager and work_dir:
+        manager.cleanup(work_dir)
+
+      # las conexiones con Odoo quedan abiertas en el pool para el siguiente lote
+      from odoo_transport import connection_pool_stats
+      from odoo_rate_limiter import rate_limiter_stats
+      for server, stats in connection_pool_stats().items():
+        logger.debug(f"Pool de conexiones {server}: {stats}")
+      for server, stats in rate_limiter_stats().items():
+        logger.debug(f"Limitador de peticiones {server}: {stats}")
+
       self.quit_action.setEnabled(True)
       self.status_action.setText("Servicio Listo")  
       self.tray_icon.setToolTip("Maya Signer - Servicio Listo")
@@ -0,0 +1,728 @@
+# -*- coding: utf-8 -*-
+
+"""
+Llamadas RPC a Odoo con asyncio
+
+OdooClient dedica un hilo a cada lote y otro a cada descarga o subida en
+paralelo (ver odoo_transfer), cada uno con su conexión. AsyncServerProxy
+hace las llamadas a un servicio de Odoo (common, object) como corrutinas de
+un único event loop: cada llamada en vuelo cuesta unos pocos KB
+
+Sólo usa la librería estándar: las peticiones HTTP/1.1 van por un pool de
+conexiones keep-alive por servidor (AsyncConnectionPool) con un máximo de
+conexiones abiertas a la vez, y el resto de llamadas esperan su turno
+
+AsyncOdooOperations tiene las operaciones de un lote (authenticate,
+validate_batch_token, descarga por bloques y subida de los firmados) como
+corrutinas, con las transferencias en paralelo en el mismo event loop y sin
+hilos. Un OdooClient con engine='asyncio' las ejecuta en el event loop
+compartido del proceso (ver run_sync) y el resto de sus llamadas van por
+AsyncBridgeProxy. El estado (sesión, validaciones del token, métodos que
+tiene el servidor) y la lógica sin E/S (bloques por tamaño, decodificación)
+son los del OdooClient
+
+Cubre la autenticación por contraseña o clave API y los PDFs en memoria:
+las descargas a disco, la transferencia por HTTP, los deltas y la sesión
+web siguen siendo síncronos (OdooClient). Por eso el servicio, que firma
+desde disco, sigue con engine='threads'
+"""
+
+import asyncio
+import base64
+import itertools
+import logging
+import ssl
+import threading
+import time
+import weakref
+import xmlrpc.client
+
+from datetime import datetime
+from typing import Coroutine, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from odoo_client import (OdooClient, OdooAuthenticationError, OdooTokenError,
+                         DOWNLOAD_CHUNK_BYTES, SUBMIT_CHUNK_BYTES)
+from odoo_retry import call_with_retry_async, is_transient, is_unprocessed, new_idempotency_key
+from odoo_transport import (PROTOCOL_XMLRPC, PROTOCOL_JSONRPC, PROTOCOLS, POOL_IDLE_TIMEOUT,
+                            encode_jsonrpc_call, decode_jsonrpc_reply)
+
+logger = logging.getLogger("maya_signer")
+
+# Conexiones abiertas a la vez con un servidor (por event loop)
+ASYNC_MAX_CONNECTIONS = 32
+
+# Errores de una conexión keep-alive que el servidor ya había cerrado
+ASYNC_DISCONNECT_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+class _AsyncConnection:
+  """
+  Conexión HTTP/1.1 keep-alive sobre los streams de asyncio
+  """
+
+  def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    self.reader = reader
+    self.writer = writer
+    # instante en que se devolvió al pool (None si aún no se ha usado)
+    self.released_at: Optional[float] = None
+    self.reusable = True
+
+  async def request(self, host: str, path: str, body: bytes,
+                    headers: Dict[str, str]) -> Tuple[int, str, Dict[str, str], bytes]:
+    """
+    Envía un POST y lee la respuesta completa
+
+    Returns:
+      (estado, motivo, cabeceras en minúsculas, cuerpo)
+    """
+    head = [f"POST {path} HTTP/1.1", f"Host: {host}", f"Content-Length: {len(body)}"]
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+    self.writer.write(body)
+    await self.writer.drain()
+
+    try:
+      status_line = await self.reader.readline()
+      if not status_line:
+        raise ConnectionResetError("El servidor cerró la conexión sin responder")
+      version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+
+      response_headers = {}
+      while True:
+        line = await self.reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+          break
+        name, _, value = line.decode('latin-1').partition(':')
+        response_headers[name.strip().lower()] = value.strip()
+
+      if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+        data = await self._read_chunked()
+      elif 'content-length' in response_headers:
+        data = await self.reader.readexactly(int(response_headers['content-length']))
+      else:
+        data = await self.reader.read()
+        self.reusable = False
+    except asyncio.IncompleteReadError as e:
+      raise ConnectionResetError("Respuesta incompleta del servidor") from e
+
+    connection = response_headers.get('connection', '').lower()
+    if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+      self.reusable = False
+
+    return int(status), reason, response_headers, data
+
+  async def _read_chunked(self) -> bytes:
+    parts = []
+    while True:
+      size = int((await self.reader.readline()).split(b';')[0].strip() or b'0', 16)
+      if not size:
+        # trailers
+        while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+          pass
+        return b''.join(parts)
+      parts.append(await self.reader.readexactly(size))
+      await self.reader.readexactly(2)
+
+  def close(self):
+    self.writer.close()
+
+class AsyncConnectionPool:
+  """
+  Pool de conexiones keep-alive con un servidor, para las corrutinas de un
+  event loop
+
+  Como mucho max_connections peticiones en vuelo: las demás esperan a que
+  quede una conexión libre
+  """
+
+  def __init__(self, url: str, max_connections: int = ASYNC_MAX_CONNECTIONS,
+               idle_timeout: float = POOL_IDLE_TIMEOUT):
+    """
+    Args:
+      url: URL del servidor (sólo se usan el esquema y el host)
+      max_connections: Conexiones abiertas a la vez como máximo
+      idle_timeout: Segundos que se guarda una conexión ociosa
+    """
+    parts = urlsplit(url)
+    self.scheme = parts.scheme
+    self.host = parts.netloc
+    self.max_connections = max_connections
+    self.idle_timeout = idle_timeout
+    self.ssl_context = ssl.create_default_context() if parts.scheme == 'https' else None
+
+    self._hostname = parts.hostname
+    self._port = parts.port or (443 if parts.scheme == 'https' else 80)
+    self._slots = asyncio.Semaphore(max_connections)
+    self._idle: List[_AsyncConnection] = []
+    self._stats = {'created': 0, 'reused': 0, 'discarded': 0, 'expired': 0, 'in_use': 0}
+
+  async def _acquire(self) -> _AsyncConnection:
+    now = time.monotonic()
+    while self._idle:
+      connection = self._idle.pop()
+      if now - connection.released_at > self.idle_timeout or connection.reader.at_eof():
+        self._stats['expired'] += 1
+        connection.close()
+        continue
+      self._stats['reused'] += 1
+      return connection
+
+    reader, writer = await asyncio.open_connection(self._hostname, self._port, ssl=self.ssl_context)
+    self._stats['created'] += 1
+    return _AsyncConnection(reader, writer)
+
+  def _release(self, connection: _AsyncConnection):
+    if not connection.reusable:
+      self._discard(connection)
+      return
+    connection.released_at = time.monotonic()
+    self._idle.append(connection)
+
+  def _discard(self, connection: _AsyncConnection):
+    self._stats['discarded'] += 1
+    connection.close()
+
+  async def request(self, path: str, body: bytes, headers: Dict[str, str],
+                    timeout: Optional[float] = None) -> Tuple[int, str, Dict[str, str], bytes]:
+    """
+    Envía un POST por una conexión del pool
+
+    Si la conexión keep-alive la cerró el servidor, se reintenta una vez con
+    una nueva
+
+    Args:
+      timeout: Segundos para conectar y recibir la respuesta
+
+    Returns:
+      Ver _AsyncConnection.request
+    """
+    async with self._slots:
+      self._stats['in_use'] += 1
+      try:
+        for attempt in range(2):
+          connection = await asyncio.wait_for(self._acquire(), timeout)
+          reused = connection.released_at is not None
+          try:
+            response = await asyncio.wait_for(connection.request(self.host, path, body, headers), timeout)
+          except ASYNC_DISCONNECT_ERRORS:
+            self._discard(connection)
+            if attempt or not reused:
+              raise
+            continue
+          except BaseException:
+            self._discard(connection)
+            raise
+
+          self._release(connection)
+          return response
+      finally:
+        self._stats['in_use'] -= 1
+
+  def stats(self) -> Dict[str, int]:
+    return dict(self._stats, idle=len(self._idle))
+
+  def close(self):
+    """
+    Cierra las conexiones ociosas
+    """
+    while self._idle:
+      self._idle.pop().close()
+
+# Pools de cada event loop, por URL del servidor
+_POOLS: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncConnectionPool]]' = \
+  weakref.WeakKeyDictionary()
+_POOLS_LOCK = threading.Lock()
+
+def get_async_pool(url: str) -> AsyncConnectionPool:
+  """
+  Pool de conexiones de un servidor en el event loop en curso
+  """
+  parts = urlsplit(url)
+  key = f"{parts.scheme}://{parts.netloc}"
+  loop = asyncio.get_running_loop()
+
+  with _POOLS_LOCK:
+    pools = _POOLS.setdefault(loop, {})
+    pool = pools.get(key)
+    if pool is None:
+      pool = pools[key] = AsyncConnectionPool(key)
+    return pool
+
+def close_async_pools():
+  """
+  Cierra las conexiones ociosas de los pools del event loop en curso
+  """
+  with _POOLS_LOCK:
+    pools = list(_POOLS.get(asyncio.get_running_loop(), {}).values())
+  for pool in pools:
+    pool.close()
+
+class AsyncServerProxy:
+  """
+  Proxy asyncio de un servicio de Odoo por XML-RPC o JSON-RPC
+
+  await proxy.call('execute_kw', ...) o await proxy.execute_kw(...). Los
+  errores son los mismos que con los proxies de odoo_transport
+  (xmlrpc.client.Fault, ProtocolError)
+  """
+
+  def __init__(self, url: str, service: str, protocol: str = PROTOCOL_XMLRPC, timeout: int = 60):
+    """
+    Args:
+      url: URL base de Odoo
+      service: Servicio de Odoo ('common', 'object')
+      protocol: 'xmlrpc' o 'jsonrpc'
+      timeout: Timeout de cada petición, en segundos
+    """
+    if protocol not in PROTOCOLS:
+      raise ValueError(f"Protocolo desconocido: {protocol}. Disponibles: {', '.join(PROTOCOLS)}")
+
+    parts = urlsplit(url)
+    base_path = parts.path.rstrip('/')
+    self._url = url
+    self._host = parts.netloc
+    self._service = service
+    self._protocol = protocol
+    self._timeout = timeout
+    self._ids = itertools.count(1)
+
+    if protocol == PROTOCOL_JSONRPC:
+      self._path = f"{base_path}/jsonrpc"
+      self._headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+    else:
+      self._path = f"{base_path}/xmlrpc/2/{service}"
+      self._headers = {'Content-Type': 'text/xml'}
+
+  async def call(self, method: str, *args):
+    """
+    Llama a un método del servicio
+    """
+    if self._protocol == PROTOCOL_JSONRPC:
+      body = encode_jsonrpc_call(self._service, method, args, next(self._ids))
+    else:
+      body = xmlrpc.client.dumps(args, method, allow_none=True).encode('utf-8', 'xmlcharrefreplace')
+
+    status, reason, headers, data = await get_async_pool(self._url).request(
+      self._path, body, self._headers, self._timeout)
+
+    if status != 200:
+      raise xmlrpc.client.ProtocolError(f"{self._host}{self._path}", status, reason, headers)
+
+    if self._protocol == PROTOCOL_JSONRPC:
+      return decode_jsonrpc_reply(data)
+
+    response = xmlrpc.client.loads(data)[0]
+    return response[0] if len(response) == 1 else response
+
+  def __getattr__(self, name: str):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return lambda *args: self.call(name, *args)
+
+# Event loop compartido por los clientes síncronos con engine='asyncio'
+_SHARED_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_SHARED_THREAD: Optional[threading.Thread] = None
+_SHARED_LOOP_LOCK = threading.Lock()
+
+def get_shared_loop() -> asyncio.AbstractEventLoop:
+  """
+  Event loop del proceso para las llamadas de los clientes síncronos, que
+  corre en su propio hilo (se arranca la primera vez)
+  """
+  global _SHARED_LOOP, _SHARED_THREAD
+
+  with _SHARED_LOOP_LOCK:
+    if _SHARED_LOOP is None:
+      _SHARED_LOOP = asyncio.new_event_loop()
+      _SHARED_THREAD = threading.Thread(target=_SHARED_LOOP.run_forever,
+                                        name='odoo-asyncio', daemon=True)
+      _SHARED_THREAD.start()
+    return _SHARED_LOOP
+
+def run_sync(coro: Coroutine):
+  """
+  Ejecuta una corrutina en el event loop compartido y espera su resultado
+
+  Raises:
+    RuntimeError: Si se llama desde el propio event loop (se bloquearía)
+  """
+  loop = get_shared_loop()
+  if threading.current_thread() is _SHARED_THREAD:
+    coro.close()
+    raise RuntimeError("run_sync no se puede llamar desde el event loop compartido")
+  return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+class AsyncBridgeProxy:
+  """
+  Proxy síncrono de un servicio de Odoo (misma interfaz que ServerProxy)
+  que hace cada llamada con AsyncServerProxy en el event loop compartido
+
+  El hilo que llama espera al resultado, pero las conexiones y la E/S de
+  todos los clientes están en el event loop
+  """
+
+  def __init__(self, url: str, service: str, protocol: str = PROTOCOL_XMLRPC, timeout: int = 60):
+    self._proxy = AsyncServerProxy(url, service, protocol, timeout)
+
+  def call(self, method: str, *args):
+    return run_sync(self._proxy.call(method, *args))
+
+  def __getattr__(self, name: str):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return lambda *args: self.call(name, *args)
+
+class AsyncOdooOperations:
+  """
+  Operaciones de un lote de un OdooClient como corrutinas (ver el 
+  docstring del módulo)
+
+  await ops.authenticate(), await ops.download_unsigned_pdfs(batch_id)... 
+  en cualquier event loop. Las llamadas no pasan por el limitador de 
+  OdooClient (que bloquea el hilo): las limitan el pool de conexiones y, en 
+  las transferencias, max_workers del cliente
+  """
+
+  def __init__(self, client: OdooClient):
+    """
+    Args:
+      client: Cliente con la configuración y el estado (autenticación por 
+        contraseña o clave API)
+    """
+    self.client = client
+    self.common = AsyncServerProxy(client.url, 'common', client.protocol, timeout=60)
+    self.models = AsyncServerProxy(client.url, 'object', client.protocol, timeout=60)
+
+  async def execute(self, model: str, method: str, args=None, kwargs=None,
+                    retry: bool = False, idempotent: bool = True):
+    """
+    Ejecuta un método en Odoo (ver OdooClient.execute)
+    """
+    client = self.client
+    if not client.uid:
+      raise OdooAuthenticationError("No autenticado. Hay que ejecutar previamente authenticate()")
+
+    args = args or []
+    kwargs = kwargs or {}
+
+    if retry:
+      kwargs = dict(kwargs, context=dict(kwargs.get('context') or {}, idempotency_key=new_idempotency_key()))
+
+    def call():
+      return self.models.execute_kw(client.db, client.uid, client.password, model, method, args, kwargs)
+
+    try:
+      if retry:
+        return await call_with_retry_async(call, client.url, f"{model}.{method}",
+                                           retry_if=is_transient if idempotent else is_unprocessed)
+      return await call()
+    except xmlrpc.client.Fault as e:
+      logger.error(f"Error RPC en {model}.{method}: {e.faultString}")
+      if client._is_access_denied(e):
+        client.invalidate_session()
+      raise
+
+  async def authenticate(self, use_cache: bool = True) -> bool:
+    """
+    Ver OdooClient.authenticate
+    """
+    client = self.client
+    if use_cache and client._reuse_session():
+      return True
+
+    try:
+      uid = await self.common.authenticate(client.db, client.username, client.password, {})
+    except xmlrpc.client.Fault as e:
+      client.invalidate_session()
+      raise OdooAuthenticationError(f"Error XML-RPC: {e.faultString}")
+
+    return client._login(uid)
+
+  async def validate_batch_token(self, batch_id: int, force: bool = False) -> Dict:
+    """
+    Ver OdooClient.validate_batch_token
+    """
+    client = self.client
+    validation = client._valid_token(batch_id, force)
+    if validation is not None:
+      return validation
+
+    try:
+      result = await self.execute('maya_core.signature.batch', 'validate_session_token',
+                                  args=[batch_id, client.batch_token])
+    except Exception as e:
+      client.invalidate_batch_token(batch_id)
+      raise OdooTokenError(f"Error validando token: {str(e)}")
+
+    return client._store_token_validation(batch_id, result)
+
+  async def download_unsigned_pdfs(self, batch_id: int,
+                                   max_chunk_bytes: int = DOWNLOAD_CHUNK_BYTES) -> List[Dict]:
+    """
+    Descarga por bloques los PDFs pendientes del lote, max_workers bloques 
+    a la vez (ver OdooClient.iter_unsigned_pdfs)
+
+    Returns:
+      Documentos con 'pdf_bytes', en el orden del lote
+    """
+    client = self.client
+    logger.info(f"\tDescargando PDFs del lote {batch_id} por bloques...")
+
+    await self.validate_batch_token(batch_id)
+    batch = await self.execute('maya_core.signature.batch', 'read', args=[[batch_id]],
+                               kwargs={'fields': ['name', 'document_ids', 'state']})
+    if not batch:
+      raise ValueError(f"Lote {batch_id} no encontrado")
+    if batch[0]['state'] == 'done':
+      raise ValueError(f"Lote {batch_id} ya está firmado")
+    document_ids = batch[0].get('document_ids', [])
+    if not document_ids:
+      raise ValueError(f"Lote {batch_id} no tiene documentos")
+
+    documents = await self.execute(
+      'maya_core.signature.batch_document',
+      'search_read',
+      args=[[('id', 'in', document_ids), ('state', '!=', 'signed')]],
+      kwargs={
+        'fields': ['id', 'filename', 'state', 'res_model', 'res_id', 'pdf_content'],
+        'context': {'bin_size': True},
+      }
+    )
+    pending = client._parse_pending_documents(documents)
+    chunks = client._plan_download_chunks(pending, max_chunk_bytes)
+
+    logger.info(f"\t{len(pending)} documentos pendientes en {len(chunks)} bloques")
+
+    slots = asyncio.Semaphore(client.max_workers)
+    downloaded = 0
+
+    async def download(chunk):
+      nonlocal downloaded
+      async with slots:
+        contents = await self.execute('maya_core.signature.batch_document', 'read',
+                                      args=[[doc['id'] for doc in chunk]],
+                                      kwargs={'fields': ['id', 'pdf_content']})
+      contents = {doc['id']: doc.get('pdf_content') for doc in contents}
+
+      valid = []
+      for doc in chunk:
+        doc['pdf_content'] = contents.pop(doc['id'], None)
+        if client._decode_document(doc):
+          valid.append(doc)
+        # el base64 ya no hace falta, no lo mantengo en memoria
+        doc.pop('pdf_content', None)
+
+      downloaded += len(chunk)
+      if client.progress_callback:
+        client.progress_callback(f'Descargando de Maya:  {downloaded}/{len(pending)} documentos')
+      return valid
+
+    results = await asyncio.gather(*(download(chunk) for chunk in chunks))
+
+    logger.info(f"\tDescarga por bloques del lote {batch_id} terminada")
+    return [doc for chunk in results for doc in chunk]
+
+  async def upload_signed_pdfs(self, batch_id: int, signed_documents: List[Dict],
+                               confirmed: Optional[Set[int]] = None) -> bool:
+    """
+    Sube los PDFs firmados en memoria ('signed_pdf_bytes'): en bloque si 
+    bulk_submit y el servidor lo permite o, si no, max_workers documentos a 
+    la vez, y finaliza el lote (ver OdooClient.upload_signed_pdfs)
+
+    Returns:
+      bool: True si todos se subieron correctamente
+    """
+    client = self.client
+    if client.bulk_submit:
+      submitted = await self._submit_signed_documents(batch_id, signed_documents, confirmed)
+      if submitted is not None:
+        return submitted
+
+    logger.info(f"\tSubiendo {len(signed_documents)} PDFs firmados al lote {batch_id}...")
+
+    await self.validate_batch_token(batch_id)
+
+    slots = asyncio.Semaphore(client.max_workers)
+    done = 0
+
+    async def upload(doc):
+      nonlocal done
+      async with slots:
+        try:
+          uploaded = await self.upload_document(doc)
+        except Exception as e:
+          logger.error(f"\tError procesando documento {doc['document_id']}: {str(e)}")
+          uploaded = False
+
+      done += 1
+      if client.progress_callback:
+        client.progress_callback(f'Subiendo a Maya:  {done}/{len(signed_documents)} documentos')
+      if uploaded and confirmed is not None:
+        confirmed.add(doc['document_id'])
+      return uploaded
+
+    results = await asyncio.gather(*(upload(doc) for doc in signed_documents))
+    success_count = sum(1 for uploaded in results if uploaded)
+    failed_count = len(results) - success_count
+
+    await self.finalize_batch(batch_id, success_count, failed_count)
+
+    logger.info(f"\tSubidos {success_count}/{len(signed_documents)} PDFs")
+    return failed_count == 0
+
+  async def upload_document(self, doc: Dict) -> bool:
+    """
+    Sube un documento firmado en memoria y actualiza su registro original 
+    (ver OdooClient.upload_document)
+    """
+    client = self.client
+    document_id = doc['document_id']
+    signed_filename = doc.get('signed_filename', f'signed_{document_id}.pdf')
+    signed_content = base64.b64encode(doc['signed_pdf_bytes']).decode('utf-8')
+
+    try:
+      await self.execute(
+        'maya_core.signature.batch_document',
+        'write',
+        args=[[document_id], {
+          'signed_pdf': signed_content,
+          'signed_pdf_filename': signed_filename,
+          'state': 'signed',
+          'sign_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }],
+        retry=True
+      )
+    except Exception as e:
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {e}")
+      return False
+
+    if doc.get('res_model') and doc.get('res_id'):
+      try:
+        if not (client.single_upload and await self._propagate_signed_pdf(document_id)):
+          await self.execute(
+            doc['res_model'],
+            'write',
+            args=[[doc['res_id']], {
+              'signed_pdf': signed_content,
+              'signed_pdf_filename': signed_filename,
+              'signature_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+              'signature_user_id': client.uid
+            }],
+            retry=True
+          )
+      except Exception as e:
+        logger.warning(f"\tNo se pudo actualizar registro original: {str(e)}")
+
+    return True
+
+  async def _propagate_signed_pdf(self, document_id: int) -> bool:
+    """
+    Ver OdooClient.propagate_signed_pdf
+    """
+    client = self.client
+    if client._server_supports('propagate_signed_pdf') is False:
+      return False
+
+    try:
+      await self.execute('maya_core.signature.batch_document', 'propagate_signed_pdf',
+                         args=[[document_id]], retry=True, idempotent=False)
+    except xmlrpc.client.Fault as e:
+      if client._is_missing_method(e, 'propagate_signed_pdf'):
+        logger.info("\tEl servidor no copia el PDF firmado al registro origen, se sube de nuevo")
+        client._set_server_support('propagate_signed_pdf', False)
+        return False
+      raise
+
+    client._set_server_support('propagate_signed_pdf', True)
+    return True
+
+  async def _submit_signed_documents(self, batch_id: int, signed_documents: List[Dict],
+                                     confirmed: Optional[Set[int]] = None,
+                                     max_chunk_bytes: int = SUBMIT_CHUNK_BYTES) -> Optional[bool]:
+    """
+    Subida en bloque (ver OdooClient.submit_signed_documents). Las llamadas 
+    van de una en una: la última finaliza el lote
+
+    Returns:
+      bool: True si todos se subieron correctamente
+      None si el servidor no tiene el método
+    """
+    client = self.client
+    if not signed_documents or client._server_supports('submit_signed_documents') is False:
+      return None
+
+    logger.info(f"\tSubiendo {len(signed_documents)} PDFs firmados al lote {batch_id} en bloque...")
+
+    groups = client._group_by_size(signed_documents,
+                                   [len(doc['signed_pdf_bytes']) for doc in signed_documents],
+                                   max_chunk_bytes)
+    failed_count = 0
+
+    for i, group in enumerate(groups):
+      payload = [
+        {
+          'document_id': doc['document_id'],
+          'signed_pdf': base64.b64encode(doc['signed_pdf_bytes']).decode('utf-8'),
+          'signed_pdf_filename': doc.get('signed_filename', f"signed_{doc['document_id']}.pdf"),
+          'res_model': doc.get('res_model') or False,
+          'res_id': doc.get('res_id') or False,
+        }
+        for doc in group
+      ]
+
+      try:
+        result = await self.execute('maya_core.signature.batch', 'submit_signed_documents',
+                                    args=[batch_id, client.batch_token, payload],
+                                    kwargs={'finalize': i == len(groups) - 1},
+                                    retry=True, idempotent=False)
+      except xmlrpc.client.Fault as e:
+        if i == 0 and client._is_missing_method(e, 'submit_signed_documents'):
+          logger.info("\tEl servidor no permite la subida en bloque, se sube documento a documento")
+          client._set_server_support('submit_signed_documents', False)
+          return None
+        raise
+
+      client._set_server_support('submit_signed_documents', True)
+
+      if result.get('error'):
+        client.invalidate_batch_token(batch_id)
+        raise OdooTokenError(f"\tSubida en bloque rechazada: {result['error']}")
+
+      errors = result.get('errors') or {}
+      for document_id, error in errors.items():
+        logger.error(f"\tError subiendo PDF firmado {document_id}: {error}")
+      if confirmed is not None:
+        confirmed.update(doc['document_id'] for doc in group if str(doc['document_id']) not in errors)
+      failed_count += result.get('failed_count', 0)
+
+    logger.info(f"\tLote {batch_id} subido en bloque: {failed_count} errores")
+    return failed_count == 0
+
+  async def finalize_batch(self, batch_id: int, success_count: int, failed_count: int):
+    """
+    Ver OdooClient.finalize_batch
+    """
+    client = self.client
+    try:
+      result = await self.execute('maya_core.signature.batch', 'finalize_batch',
+                                  args=[batch_id, client.batch_token, success_count, failed_count],
+                                  retry=True, idempotent=False)
+    except Exception as e:
+      logger.error(f"Error finalizando lote: {e}")
+      # como OdooClient: se deja el estado del lote
+      state = 'done' if failed_count == 0 else 'error'
+      try:
+        await self.execute('maya_core.signature.batch', 'write',
+                           args=[[batch_id], {'state': state,
+                                              'sign_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}],
+                           retry=True)
+        logger.info(f"\tLote {batch_id} -> {state}")
+      except Exception as e:
+        logger.error(f"Error actualizando estado del lote: {e}")
+      return None
+
+    if isinstance(result, dict) and result.get('error'):
+      client.invalidate_batch_token(batch_id)
+
+    logger.info(f"\tLote {batch_id} finalizado: {success_count} firmados, {failed_count} errores")
+    return result
@@ -2,25 +2,76 @@
 
 import logging
 import base64
+import hashlib
+import re
+import threading
+import time
 
 import xmlrpc.client
 
-from typing import Dict, List, Optional, Callable
+from typing import Dict, List, Optional, Callable, Iterator, Set, Tuple
 
 logger = logging.getLogger("maya_signer")
 
-import xmlrpc.client
-from datetime import datetime
+# Descarga por bloques: tamaño máximo (aprox.) de PDF decodificado por petición
+DOWNLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+# Máximo de documentos por bloque, aunque sean muy pequeños
+DOWNLOAD_CHUNK_MAX_DOCS = 50
+# Tamaño supuesto para los documentos de los que el servidor no informa
+DEFAULT_DOCUMENT_SIZE = 512 * 1024
+
+# Subida en bloque: tamaño máximo (aprox.) de PDF firmado por llamada
+SUBMIT_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Firma por resumen: datos de la firma que prepara el servidor (los mismos 
+# que pone el worker al firmar el PDF completo)
+SIGNATURE_REASON = "Firmado electrónicamente desde Maya Signer"
+SIGNATURE_LOCATION = "España"
+
+# Métodos opcionales de servidor disponibles, o no: (url, método) -> bool
+_SERVER_METHOD_SUPPORT: Dict[Tuple[str, str], bool] = {}
+
+# Sesiones autenticadas que se reutilizan entre lotes, en segundos
+SESSION_TTL = 30 * 60
+
+# Caché de sesiones: (url, db, usuario) -> {'uid', 'password', 'http_session_id', 'expires'}
+_SESSION_CACHE: Dict[Tuple[str, str, str], Dict] = {}
+_SESSION_CACHE_LOCK = threading.Lock()
+
+# Modos de autenticación de las llamadas a los modelos:
+# - password: execute_kw con la contraseña (Odoo la verifica en cada llamada)
+# - api_key: execute_kw con una clave API de Odoo en lugar de la contraseña 
+#   (su hash es mucho más barato de verificar). No abre sesiones web
+# - session: se autentica una vez y llama con la cookie de sesión (/web/dataset/call_kw)
+AUTH_PASSWORD = 'password'
+AUTH_API_KEY = 'api_key'
+AUTH_SESSION = 'session'
+AUTH_MODES = (AUTH_PASSWORD, AUTH_API_KEY, AUTH_SESSION)
+
+# Transferencia de los PDFs a disco: 'rpc' (base64 dentro de las llamadas) 
+# o 'http' (binario en crudo, ver odoo_http)
+TRANSFER_RPC = 'rpc'
+TRANSFER_HTTP = 'http'
 
-class TimeoutTransport(xmlrpc.client.Transport):
-  def __init__(self, timeout=30):
-    super().__init__()
-    self.timeout = timeout
+# Motor de las llamadas RPC: 'threads' (transportes síncronos de odoo_transport)
+# o 'asyncio' (cada llamada se hace en el event loop compartido, ver odoo_async_client)
+ENGINE_THREADS = 'threads'
+ENGINE_ASYNCIO = 'asyncio'
+ENGINES = (ENGINE_THREADS, ENGINE_ASYNCIO)
 
-  def make_connection(self, host):
-    conn = super().make_connection(host)
-    conn.timeout = self.timeout
-    return conn
+# Unidades que devuelve Odoo para los binarios leídos con bin_size
+_SIZE_UNITS = {
+  '': 1, 'b': 1, 'bytes': 1,
+  'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3, 'tb': 1024 ** 4,
+}
+
+import xmlrpc.client
+from datetime import datetime, timezone
+from pathlib import Path
+
+from odoo_transport import make_server_proxy, PROTOCOL_XMLRPC
+from odoo_retry import call_with_retry, is_transient, is_unprocessed, new_idempotency_key
+from odoo_rate_limiter import get_rate_limiter
 
 class OdooConnectionError(Exception):
   """
@@ -40,14 +91,55 @@ class OdooTokenError(Exception):
   """
   pass
 
+def clear_session_cache(url: Optional[str] = None):
+  """
+  Olvida las sesiones autenticadas guardadas (todas, o las de un servidor)
+  """
+  with _SESSION_CACHE_LOCK:
+    for key in list(_SESSION_CACHE):
+      if url is None or key[0] == url.rstrip('/'):
+        del _SESSION_CACHE[key]
+
+class _SessionModels:
+  """
+  Servicio object de un cliente en modo session: mismo execute_kw que el 
+  proxy XML-RPC, pero con la sesión web del cliente (db, uid y contraseña 
+  no se envían)
+  """
+
+  def __init__(self, client: 'OdooClient'):
+    self._client = client
+
+  def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+    from odoo_http import SESSION_EXPIRED_CODE
+
+    try:
+      return self._client._get_http_session().call_kw(model, method, args, kwargs)
+    except xmlrpc.client.Fault as e:
+      if e.faultCode != SESSION_EXPIRED_CODE:
+        raise
+
+    logger.info("\tLa sesión web ha caducado, se abre otra")
+    self._client._store_session(http_session_id=None)
+    self._client._http_session = None
+    return self._client._get_http_session().call_kw(model, method, args, kwargs)
+
 class OdooClient(object):
   """
-  Cliente para comunicación con Maya (Odoo) vía XML-RPC
+  Cliente para comunicación con Maya (Odoo) vía XML-RPC o JSON-RPC
   """
     
   def __init__(self, url: str, db: str, username: str, 
                password: str, batch_token: Optional[str] = None,
-               progress_callback: Optional[Callable] = None,):
+               progress_callback: Optional[Callable] = None,
+               max_workers: int = 1,
+               bulk_submit: bool = True,
+               single_upload: bool = True,
+               protocol: str = PROTOCOL_XMLRPC,
+               auth_mode: str = AUTH_PASSWORD,
+               gzip_threshold: Optional[int] = None,
+               delta_upload: bool = True,
+               engine: str = ENGINE_THREADS):
     """
       Args:
         url: URL base de Odoo
@@ -56,7 +148,29 @@ class OdooClient(object):
         password: Contraseña de Odoo
         batch_token: Token de sesión del batch
         progress_callback: Callback de progreso
+        max_workers: Peticiones simultáneas en las transferencias de documentos
+        bulk_submit: Si True, intenta subir los documentos firmados en bloque
+          (ver submit_signed_documents)
+        single_upload: Si True, el PDF firmado se sube sólo al documento del lote 
+          y el servidor lo copia al registro origen (ver propagate_signed_pdf)
+        protocol: Protocolo con el servidor, 'xmlrpc' o 'jsonrpc' (ver odoo_transport)
+        auth_mode: 'password', 'api_key' (password es una clave API) o 'session' 
+          (ver AUTH_MODES)
+        gzip_threshold: Si se indica, las peticiones RPC de más de ese tamaño se 
+          envían comprimidas con gzip (sólo si el servidor las descomprime, ver 
+          odoo_transport.GZIP_THRESHOLD)
+        delta_upload: Si True, de los PDFs firmados en disco con su original se 
+          sube sólo lo que la firma añade al original (ver upload_signed_delta)
+        engine: 'threads' o 'asyncio' (ver ENGINES). Con 'asyncio' la autenticación, 
+          la validación del token y las transferencias de PDFs en memoria son 
+          corrutinas del event loop compartido (ver odoo_async_client), y las 
+          peticiones de common y object van sin gzip
     """
+    if auth_mode not in AUTH_MODES:
+      raise ValueError(f"Modo de autenticación desconocido: {auth_mode}. Disponibles: {', '.join(AUTH_MODES)}")
+    if engine not in ENGINES:
+      raise ValueError(f"Motor desconocido: {engine}. Disponibles: {', '.join(ENGINES)}")
+
     self.url = url.rstrip('/')
     self.db = db
     self.username = username
@@ -65,77 +179,302 @@ class OdooClient(object):
     self.batch_token = batch_token
 
     self.progress_callback = progress_callback
+    self.max_workers = max(1, max_workers)
+    self.bulk_submit = bulk_submit
+    self.single_upload = single_upload
+    self.protocol = protocol
+    self.auth_mode = auth_mode
+    self.gzip_threshold = gzip_threshold
+    self.delta_upload = delta_upload
+    self.engine = engine
 
-    transport = TimeoutTransport(timeout=60)
+    # validaciones del token: (lote, token) -> {'result', 'expires'}
+    self._token_validations: Dict[Tuple[int, str], Dict] = {}
+
+    # sesión web para las transferencias por HTTP (ver odoo_http)
+    self._http_session = None
+
+    # operaciones como corrutinas, con engine='asyncio' (ver odoo_async_client)
+    self._async = None
     
-    # Endpoints XML-RPC
+    # Endpoints de los servicios de Odoo
     try:
-      self.common = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/common',  transport=transport, allow_none=True)
-      self.models = xmlrpc.client.ServerProxy(f'{self.url}/xmlrpc/2/object', transport=transport, allow_none=True)
+      if engine == ENGINE_ASYNCIO:
+        from odoo_async_client import AsyncBridgeProxy
+
+        self.common = AsyncBridgeProxy(self.url, 'common', protocol, timeout=60)
+        self.models = AsyncBridgeProxy(self.url, 'object', protocol, timeout=60)
+      else:
+        self.common = make_server_proxy(self.url, 'common', protocol, timeout=60, gzip_threshold=gzip_threshold)
+        self.models = make_server_proxy(self.url, 'object', protocol, timeout=60, gzip_threshold=gzip_threshold)
+    except ValueError:
+      raise
     except Exception as e:
       raise OdooConnectionError(f"No se pudo conectar a {self.url}: {str(e)}")
     
-  def authenticate(self) -> bool:
+  def clone(self) -> 'OdooClient':
+    """
+    Crea un cliente con las mismas credenciales, uid y token pero con su 
+    propia sesión web (misma cookie, otra conexión), para poder usarlo desde 
+    otro hilo
+
+    Returns:
+      Nuevo OdooClient (sin progress_callback)
+    """
+    client = OdooClient(
+      url=self.url,
+      db=self.db,
+      username=self.username,
+      password=self.password,
+      batch_token=self.batch_token,
+      max_workers=self.max_workers,
+      bulk_submit=self.bulk_submit,
+      single_upload=self.single_upload,
+      protocol=self.protocol,
+      auth_mode=self.auth_mode,
+      gzip_threshold=self.gzip_threshold,
+      delta_upload=self.delta_upload,
+      engine=self.engine
+    )
+    client.uid = self.uid
+    # los clones comparten las validaciones del token
+    client._token_validations = self._token_validations
+    if self._http_session is not None:
+      client._http_session = self._http_session.clone()
+    if self.auth_mode == AUTH_SESSION:
+      client.models = _SessionModels(client)
+
+    return client
+
+  def authenticate(self, use_cache: bool = True) -> bool:
     """
     Autentica con Odoo y obtiene el uid del usuario
+
+    Si hay una sesión de un lote anterior con las mismas credenciales y no ha 
+    caducado (SESSION_TTL), se reutiliza sin llamar al servidor
+
+    Args:
+      use_cache: Si False, se autentica siempre contra el servidor
     """
+    if self.auth_mode == AUTH_SESSION:
+      return self._authenticate_session(use_cache)
+
+    if self._runs_async():
+      from odoo_async_client import run_sync
+
+      return run_sync(self._async_operations().authenticate(use_cache))
+
+    if use_cache and self._reuse_session():
+      return True
+
     try:
-      self.uid = self.common.authenticate(
+      uid = self.common.authenticate(
         self.db,  
         self.username, 
         self.password, 
         {}
       ) 
-
-      if not self.uid:
-        raise OdooAuthenticationError(
-            f"Credenciales inválidas para {self.username} en {self.db}"
-        )
-            
-      logger.info(f"\tAutenticación correcta (UID: {self.uid})")
-      return True
-            
     except xmlrpc.client.Fault as e:
+      self.invalidate_session()
       raise OdooAuthenticationError(f"Error XML-RPC: {e.faultString}")
+
+    return self._login(uid)
+
+  def _reuse_session(self) -> bool:
+    """
+    Toma el uid de la sesión guardada, si sigue vigente
+
+    Returns:
+      bool: True si había sesión
+    """
+    session = self._cached_session()
+    if not session:
+      return False
+    self.uid = session['uid']
+    logger.info(f"\tSesión reutilizada (UID: {self.uid})")
+    return True
+
+  def _login(self, uid) -> bool:
+    """
+    Guarda el uid devuelto por common.authenticate y la sesión
+
+    Raises:
+      OdooAuthenticationError: Si el servidor no ha aceptado las credenciales
+    """
+    self.uid = uid
+    if not self.uid:
+      self.invalidate_session()
+      raise OdooAuthenticationError(
+          f"Credenciales inválidas para {self.username} en {self.db}"
+      )
+
+    self._store_session(uid=self.uid, http_session_id=None)
+    logger.info(f"\tAutenticación correcta (UID: {self.uid})")
+    return True
+
+  def _authenticate_session(self, use_cache: bool) -> bool:
+    """
+    Autenticación en modo session: abre (o reutiliza) la sesión web y las 
+    llamadas a los modelos pasan a usar su cookie
+    """
+    from odoo_http import OdooHttpSession, OdooHttpError
+
+    session = self._cached_session() if use_cache else None
+    if session and session['http_session_id']:
+      self.uid = session['uid']
+      logger.info(f"\tSesión reutilizada (UID: {self.uid})")
+    else:
+      http_session = OdooHttpSession(self.url, self.db, self.username, self.password)
+      try:
+        self.uid = http_session.authenticate()
+      except OdooHttpError as e:
+        self.invalidate_session()
+        raise OdooAuthenticationError(str(e))
+
+      self._http_session = http_session
+      self._store_session(uid=self.uid, http_session_id=http_session.session_id)
+      logger.info(f"\tAutenticación correcta (UID: {self.uid})")
+
+    self.models = _SessionModels(self)
+    return True
+
+  def _async_operations(self):
+    """
+    Operaciones del cliente como corrutinas (AsyncOdooOperations), que con 
+    engine='asyncio' se ejecutan en el event loop compartido del proceso
+    """
+    if self._async is None:
+      from odoo_async_client import AsyncOdooOperations
+
+      self._async = AsyncOdooOperations(self)
+    return self._async
+
+  def _runs_async(self) -> bool:
+    # la sesión web (y su cookie) es la de odoo_http, síncrona
+    return self.engine == ENGINE_ASYNCIO and self.auth_mode != AUTH_SESSION
+
+  def _session_key(self) -> Tuple[str, str, str]:
+    return (self.url, self.db, self.username)
+
+  def _password_digest(self) -> str:
+    # la caché no guarda la contraseña, sólo su huella para detectar cambios
+    return hashlib.sha256(self.password.encode('utf-8')).hexdigest()
+
+  def _cached_session(self) -> Optional[Dict]:
+    """
+    Sesión guardada para las credenciales del cliente, si sigue vigente
+    """
+    with _SESSION_CACHE_LOCK:
+      session = _SESSION_CACHE.get(self._session_key())
+      if not session:
+        return None
+      if session['expires'] < time.monotonic() or session['password'] != self._password_digest():
+        del _SESSION_CACHE[self._session_key()]
+        return None
+      return dict(session)
+
+  def _store_session(self, **values):
+    """
+    Guarda (o actualiza) la sesión de las credenciales del cliente
+    """
+    with _SESSION_CACHE_LOCK:
+      session = _SESSION_CACHE.get(self._session_key())
+      if 'uid' in values:
+        session = _SESSION_CACHE[self._session_key()] = {
+          'password': self._password_digest(),
+          'expires': time.monotonic() + SESSION_TTL,
+          'http_session_id': None,
+        }
+      elif session is None:
+        return
+      session.update(values)
+
+  def invalidate_session(self):
+    """
+    Olvida la sesión guardada para las credenciales del cliente
+    """
+    with _SESSION_CACHE_LOCK:
+      _SESSION_CACHE.pop(self._session_key(), None)
+
+  @staticmethod
+  def _is_access_denied(error: xmlrpc.client.Fault) -> bool:
+    """
+    Comprueba si un Fault de Odoo es un AccessDenied (credenciales o sesión no válidas)
+    """
+    return error.faultCode == 3 or 'Access Denied' in str(error.faultString) \
+      or 'AccessDenied' in str(error.faultString)
     
-  def execute(self, model: str, method: str, args = None, kwargs = None):
+  def execute(self, model: str, method: str, args = None, kwargs = None, models = None,
+              retry: bool = False, idempotent: bool = True, transfer: bool = False):
     """
     Ejecuta un método en Odoo
+
+    Args:
+      models: Proxy del servicio object que se usa en lugar de self.models
+      retry: Si True, la llamada se reintenta si falla por un error pasajero 
+        (ver odoo_retry) y lleva una clave de idempotencia en el contexto 
+        (idempotency_key), la misma en todos los reintentos. La clave sólo 
+        evita que se aplique dos veces en un servidor que la tenga en cuenta: 
+        el write de Odoo y finalize_batch de maya_core la ignoran
+      idempotent: Si la llamada es idempotente por construcción (lecturas y 
+        write de los mismos valores). Si es False, sólo se reintenta si el 
+        error garantiza que el servidor no la procesó (ver 
+        odoo_retry.is_unprocessed)
+      transfer: Si la llamada descarga o sube PDFs completos: su duración no 
+        cuenta como señal de saturación (ver odoo_rate_limiter)
     """
     if not self.uid:
       raise OdooAuthenticationError("No autenticado. Hay que ejecutar previamente authenticate()")
     
     args = args or []
     kwargs = kwargs or {}
+
+    if retry:
+      kwargs = dict(kwargs, context=dict(kwargs.get('context') or {}, idempotency_key=new_idempotency_key()))
+
+    def call():
+      # el limitador del servidor es común a todos los trabajos del servicio
+      with get_rate_limiter(self.url).slot(transfer=transfer):
+        return (models or self.models).execute_kw(
+            self.db,
+            self.uid,
+            self.password,
+            model,
+            method,
+            args,
+            kwargs
+        )
     
     try:
       #logger.info(f"Ejecutando {self.db} {model}.{method}  args: {args} ({type(args)}), kwargs: {kwargs}")
      
-      result = self.models.execute_kw(
-          self.db,
-          self.uid,
-          self.password,
-          model,
-          method,
-          args,
-          kwargs
-      )
-   
-      return result
+      if retry:
+        return call_with_retry(call, self.url, f"{model}.{method}",
+                               retry_if=is_transient if idempotent else is_unprocessed)
+      return call()
       
     except xmlrpc.client.Fault as e:
-      logger.error(f"Error XML-RPC en {model}.{method}: {e.faultString}")
+      logger.error(f"Error RPC en {model}.{method}: {e.faultString}")
+      if self._is_access_denied(e):
+        # la sesión guardada ya no sirve (contraseña cambiada, usuario desactivado...)
+        self.invalidate_session()
       raise
     except Exception as e:
       logger.error(f"Error ejecutando {model}.{method}: {str(e)}")
       raise
 
-  def validate_batch_token(self, batch_id: int) -> Dict:
+  def validate_batch_token(self, batch_id: int, force: bool = False) -> Dict:
     """
     Valida el token de sesión del batch
+
+    Una validación correcta se recuerda durante todo el trabajo (o hasta la 
+    caducidad que indique el servidor con expires_in/expires_at), y sólo se 
+    vuelve a consultar al servidor si una llamada falla por el token 
+    (ver invalidate_batch_token)
     
     Args:
         batch_id: ID del lote
+        force: Si True, valida contra el servidor aunque ya esté validado
         
     Returns:
         Dict con información de validación
@@ -143,29 +482,90 @@ class OdooClient(object):
     Raises:
         OdooTokenError: Si el token es inválido o expiró
     """
-    if not self.batch_token:
-      raise OdooTokenError("No hay token de sesión configurado")
-    
+    if self._runs_async():
+      from odoo_async_client import run_sync
+
+      return run_sync(self._async_operations().validate_batch_token(batch_id, force))
+
+    validation = self._valid_token(batch_id, force)
+    if validation is not None:
+      return validation
+
     try:
       result = self.execute(
           'maya_core.signature.batch',
           'validate_session_token',
           args=[batch_id, self.batch_token]
       )
-      
-      # si el campo valida es False
-      if not result.get('valid'):
-        error = result.get('error', 'Token inválido')
-        raise OdooTokenError(f"\tValidación falló: {error}")
-    
-      logger.info(f"\tToken validado para lote {batch_id}")
-      return result
-        
-    except OdooTokenError:
-      raise
     except Exception as e:
+      self.invalidate_batch_token(batch_id)
       raise OdooTokenError(f"Error validando token: {str(e)}")
 
+    return self._store_token_validation(batch_id, result)
+
+  def _valid_token(self, batch_id: int, force: bool = False) -> Optional[Dict]:
+    """
+    Validación del token del lote ya hecha y vigente, o None si hay que 
+    validarlo contra el servidor
+
+    Raises:
+      OdooTokenError: Si no hay token
+    """
+    if not self.batch_token:
+      raise OdooTokenError("No hay token de sesión configurado")
+
+    validation = self._token_validations.get((batch_id, self.batch_token))
+    if validation and not force:
+      if validation['expires'] is None or validation['expires'] > time.monotonic():
+        logger.debug(f"\tToken ya validado para lote {batch_id}")
+        return validation['result']
+    return None
+
+  def _store_token_validation(self, batch_id: int, result) -> Dict:
+    """
+    Recuerda la respuesta de validate_session_token si el token es válido
+
+    Raises:
+      OdooTokenError: Si el servidor lo rechaza
+    """
+    # si el campo valida es False
+    if not isinstance(result, dict) or not result.get('valid'):
+      self.invalidate_batch_token(batch_id)
+      error = result.get('error', 'Token inválido') if isinstance(result, dict) else 'Token inválido'
+      raise OdooTokenError(f"\tValidación falló: {error}")
+
+    logger.info(f"\tToken validado para lote {batch_id}")
+    self._token_validations[(batch_id, self.batch_token)] = {'result': result,
+                                                             'expires': self._token_expiry(result)}
+    return result
+
+  def invalidate_batch_token(self, batch_id: int):
+    """
+    Olvida la validación del token del lote: la siguiente validación irá al servidor
+    """
+    self._token_validations.pop((batch_id, self.batch_token), None)
+
+  @staticmethod
+  def _token_expiry(result: Dict) -> Optional[float]:
+    """
+    Instante (time.monotonic) en que caduca una validación de token según el 
+    servidor: expires_in (segundos) o expires_at (fecha UTC de Odoo). None si 
+    no lo indica
+    """
+    if result.get('expires_in') is not None:
+      return time.monotonic() + float(result['expires_in'])
+
+    if result.get('expires_at'):
+      try:
+        expires_at = datetime.strptime(str(result['expires_at']), '%Y-%m-%d %H:%M:%S')
+      except ValueError:
+        logger.warning(f"\tCaducidad del token no válida: {result['expires_at']}")
+        return None
+      remaining = (expires_at - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+      return time.monotonic() + remaining
+
+    return None
+
   def get_batch_info(self, batch_id: int, validate_token: bool = False) -> Dict | None:
     """
     Obtiene información del lote de firma
@@ -201,12 +601,74 @@ class OdooClient(object):
     
     return batch[0] if batch else None
     
-  def download_unsigned_pdfs(self, batch_id: int) -> List[Dict]:
+  def _get_batch_document_ids(self, batch_id: int) -> List[int]:
+    """
+    Valida el token y obtiene los ids de los documentos del lote
+
+    Args:
+      batch_id: ID del lote
+
+    Returns:
+      Lista de ids de maya_core.signature.batch_document
+    """
+    self.validate_batch_token(batch_id)
+
+    # obtengo info del lote
+    batch = self.get_batch_info(batch_id, validate_token = False)
+    if not batch:
+      raise ValueError(f"Lote {batch_id} no encontrado")
+    
+    if batch['state'] == 'done':
+      raise ValueError(f"Lote {batch_id} ya está firmado")
+    
+    document_ids = batch.get('document_ids', [])
+    if not document_ids:
+      raise ValueError(f"Lote {batch_id} no tiene documentos")
+
+    return document_ids
+
+  @staticmethod
+  def _decode_document(doc: Dict) -> bool:
+    """
+    Decodifica el pdf_content (base64) de un documento en doc['pdf_bytes']
+
+    Returns:
+      bool: True si el documento es válido para firmar
+    """
+    if not doc.get('pdf_content'):
+      logger.warning(f"\tDocumento {doc['id']} no tiene contenido PDF")
+      return False
+    
+    try:
+      doc['pdf_bytes'] = base64.b64decode(doc['pdf_content'])
+      logger.debug(f"\tPDF descargado: {doc['filename']} ({len(doc['pdf_bytes'])} bytes)")
+      return True
+    except Exception as e:
+      logger.error(f"\tError decodificando PDF {doc['id']}: {e}")
+      return False
+
+  def download_unsigned_pdfs(self, batch_id: int, chunked: bool = False,
+                             max_chunk_bytes: int = DOWNLOAD_CHUNK_BYTES,
+                             target_dir: Optional[Path] = None,
+                             transfer: str = TRANSFER_RPC) -> List[Dict]:
     """
     Descarga los PDFs sin firmar del lote
 
     Args:
       batch_id: ID del lote
+      chunked: Si True, descarga por bloques sólo los documentos pendientes
+        (ver iter_unsigned_pdfs). Si además max_workers > 1, los bloques
+        se descargan en paralelo (ver OdooDownloadPool). Sólo limita el 
+        tamaño de cada llamada: la lista devuelta tiene todos los PDFs en 
+        memoria. Para que la memoria no dependa del lote hay que usar 
+        iter_unsigned_pdfs o target_dir
+      max_chunk_bytes: Tamaño máximo de cada bloque en modo chunked
+      target_dir: Si se indica, los PDFs se descargan directamente a ficheros 
+        de este directorio
+      transfer: Con target_dir, 'rpc' (por defecto) para descargarlos por 
+        bloques decodificando el base64 según llega (ver download_chunk) o 
+        'http' para descargarlos en crudo con la sesión web (ver 
+        stream_unsigned_pdfs)
 
     Returns:
       Lista de diccionarios con información de documentos:
@@ -221,28 +683,39 @@ class OdooClient(object):
           },
           ...
       ]
+      En modo chunked no se conserva 'pdf_content'
+      Con target_dir, en lugar de 'pdf_content' y 'pdf_bytes' hay 'pdf_path'
     """
-    logger.info(f"\tDescargando PDFs del lote {batch_id}...")
+    if target_dir is not None and transfer == TRANSFER_HTTP:
+      return self.stream_unsigned_pdfs(batch_id, target_dir)
 
-    self.validate_batch_token(batch_id)
+    if target_dir is not None:
+      chunked = True
 
-    # obtengo info del lote
-    batch = self.get_batch_info(batch_id, validate_token = False)
-    if not batch:
-      raise ValueError(f"Lote {batch_id} no encontrado")
-    
-    if batch['state'] == 'done':
-      raise ValueError(f"Lote {batch_id} ya está firmado")
-    
-    document_ids = batch.get('document_ids', [])
-    if not document_ids:
-      raise ValueError(f"Lote {batch_id} no tiene documentos")
+    if chunked and target_dir is None and self._runs_async():
+      from odoo_async_client import run_sync
+
+      return run_sync(self._async_operations().download_unsigned_pdfs(batch_id, max_chunk_bytes))
+
+    if chunked and self.max_workers > 1:
+      from odoo_transfer import OdooDownloadPool
+
+      pool = OdooDownloadPool(self, max_workers=self.max_workers, max_chunk_bytes=max_chunk_bytes)
+      return pool.download_unsigned_pdfs(batch_id, target_dir)
+
+    if chunked:
+      return list(self.iter_unsigned_pdfs(batch_id, max_chunk_bytes, target_dir))
+
+    logger.info(f"\tDescargando PDFs del lote {batch_id}...")
+
+    document_ids = self._get_batch_document_ids(batch_id)
     
     documents = self.execute(
       'maya_core.signature.batch_document',
       'read',
       args = [document_ids],
-      kwargs = {'fields': ['id', 'filename', 'state','res_model', 'res_id', 'pdf_content']}
+      kwargs = {'fields': ['id', 'filename', 'state','res_model', 'res_id', 'pdf_content']},
+      transfer=True
     )
         
     # Decodifico los PDFs
@@ -255,130 +728,1068 @@ class OdooClient(object):
         logger.warning(f"\tDocumento {doc['id']} ya está firmado, omitiendo...")
         continue
     
-      if not doc.get('pdf_content'):
-        logger.warning(f"\tDocumento {doc['id']} no tiene contenido PDF")
-        continue
-      
-      try:
-        doc['pdf_bytes'] = base64.b64decode(doc['pdf_content'])
+      if self._decode_document(doc):
         unsigned_docs.append(doc)
-        logger.debug(f"\tPDF descargado: {doc['filename']} ({len(doc['pdf_bytes'])} bytes)")
-      except Exception as e:
-        logger.error(f"\tError decodificando PDF {doc['id']}: {e}")
         
     logger.info(f"\tDescargados {len(unsigned_docs)} PDFs del lote {batch_id}")
 
     return unsigned_docs
-  
-  def upload_signed_pdf(self, document_id: int, signed_pdf_bytes: bytes, 
-                          signed_filename: str) -> bool:
+
+  def iter_unsigned_pdfs(self, batch_id: int,
+                         max_chunk_bytes: int = DOWNLOAD_CHUNK_BYTES,
+                         target_dir: Optional[Path] = None) -> Iterator[Dict]:
     """
-    Sube un PDF firmado individual
-    
+    Descarga por bloques los PDFs sin firmar del lote
+
+    Primero se piden sólo los metadatos de los documentos pendientes
+    (state != 'signed'), con el tamaño de cada PDF si el servidor lo da, 
+    y después el contenido en bloques de como mucho max_chunk_bytes. 
+    Los documentos se van devolviendo según llega cada bloque, 
+    así que la memoria no depende del tamaño del lote
+
     Args:
-      document_id: ID del documento en el lote
-      signed_pdf_bytes: Bytes del PDF firmado
-      signed_filename: Nombre del archivo firmado
-        
-    Returns:
-      bool: True si se subió correctamente
+      batch_id: ID del lote
+      max_chunk_bytes: Tamaño máximo (aprox.) del PDF decodificado por bloque
+      target_dir: Si se indica, los PDFs se decodifican a ficheros de este 
+        directorio (ver download_chunk)
+
+    Yields:
+      Diccionario del documento con 'pdf_bytes' (sin 'pdf_content'), o con 
+      'pdf_path' si se indica target_dir
+    """
+    logger.info(f"\tDescargando PDFs del lote {batch_id} por bloques...")
+
+    document_ids = self._get_batch_document_ids(batch_id)
+    pending = self._get_pending_documents(document_ids)
+    chunks = self._plan_download_chunks(pending, max_chunk_bytes)
+
+    logger.info(f"\t{len(pending)} documentos pendientes en {len(chunks)} bloques")
+
+    downloaded = 0
+    for chunk in chunks:
+      documents = self.download_chunk(chunk, target_dir)
+
+      downloaded += len(chunk)
+      if self.progress_callback:
+        self.progress_callback(f'Descargando de Maya:  {downloaded}/{len(pending)} documentos')
+
+      yield from documents
+
+    logger.info(f"\tDescarga por bloques del lote {batch_id} terminada")
+
+  def _get_http_session(self):
+    """
+    Sesión web para las transferencias por HTTP, se abre la primera vez 
+    (o se reutiliza la cookie de la sesión guardada de un lote anterior)
+    """
+    if self._http_session is None:
+      from odoo_http import OdooHttpSession
+
+      if self.auth_mode == AUTH_API_KEY:
+        raise OdooAuthenticationError("Con una clave API no se puede abrir una sesión web")
+
+      session = OdooHttpSession(self.url, self.db, self.username, self.password)
+      cached = self._cached_session()
+      if cached and cached['http_session_id']:
+        session.session_id = cached['http_session_id']
+      else:
+        session.authenticate()
+        if cached:
+          self._store_session(http_session_id=session.session_id)
+      self._http_session = session
+
+    return self._http_session
+
+  def _with_http_session(self, action: Callable):
+    """
+    Ejecuta action(sesión web), con turno en el limitador del servidor (ver 
+    odoo_rate_limiter). Si el servidor rechaza la sesión (caducada), abre otra 
+    y lo reintenta una vez
+
+    Por la sesión web sólo se descargan y suben PDFs completos: cuentan como 
+    transferencias para el limitador
     """
+    from odoo_http import OdooHttpError
+
+    limiter = get_rate_limiter(self.url)
+
     try:
-      # Lo paso a base64
-      signed_content = base64.b64encode(signed_pdf_bytes).decode('utf-8')
-      
-      # Actualizo documento en el lote
-      self.execute(
-        'maya_core.signature.batch_document',
-        'write',
-        args=[[document_id], {  # ← Lista con [ids, valores]
-                'signed_pdf': signed_content,
-                'signed_pdf_filename': signed_filename,
-                'state': 'signed',
-                'sign_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }],
-        kwargs={}
-      )
-        
-      logger.debug(f"\tPDF firmado subido: {signed_filename}")
-      return True
-        
-    except Exception as e:
-      logger.error(f"\tError subiendo PDF firmado {document_id}: {e}")
-      return False
-    
-  def upload_signed_pdfs(self, batch_id: int, signed_documents: List[Dict]) -> bool:
+      session = self._get_http_session()
+      with limiter.slot(transfer=True):
+        return action(session)
+    except OdooHttpError as e:
+      if e.status not in (401, 403):
+        raise
+      logger.info("\tLa sesión web ha caducado, se abre otra")
+
+    self._store_session(http_session_id=None)
+    self._http_session = None
+    session = self._get_http_session()
+    with limiter.slot(transfer=True):
+      return action(session)
+
+  def stream_unsigned_pdfs(self, batch_id: int, target_dir: Path) -> List[Dict]:
     """
-    Sube múltiples PDFs firmados a Odoo
-    
+    Descarga los PDFs sin firmar del lote por HTTP (/web/content), directamente 
+    a target_dir/unsigned_<id>.pdf
+
+    Los bytes llegan tal cual, sin base64, y se escriben en disco por trozos, 
+    así que ningún PDF llega a estar entero en memoria
+
     Args:
       batch_id: ID del lote
-      signed_documents: Lista de diccionarios:
-        [
+      target_dir: Directorio de destino (normalmente el directorio de trabajo del worker)
+
+    Returns:
+      Lista de documentos con 'pdf_path' y 'pdf_size' en lugar del contenido
+    """
+    if self.max_workers > 1:
+      from odoo_transfer import OdooDownloadPool
+
+      pool = OdooDownloadPool(self, max_workers=self.max_workers)
+      return pool.stream_unsigned_pdfs(batch_id, target_dir)
+
+    logger.info(f"\tDescargando PDFs del lote {batch_id} por HTTP...")
+
+    document_ids = self._get_batch_document_ids(batch_id)
+    pending = self._get_pending_documents(document_ids)
+
+    unsigned_docs = []
+    for i, doc in enumerate(pending):
+      if self.progress_callback:
+        self.progress_callback(f'Descargando de Maya:  {i+1}/{len(pending)} documentos')
+
+      if self.stream_document(doc, target_dir):
+        unsigned_docs.append(doc)
+
+    logger.info(f"\tDescargados {len(unsigned_docs)} PDFs del lote {batch_id}")
+
+    return unsigned_docs
+
+  def stream_document(self, doc: Dict, target_dir: Path) -> bool:
+    """
+    Descarga por HTTP el PDF de un documento a target_dir/unsigned_<id>.pdf
+
+    Args:
+      doc: Metadatos del documento (ver _get_pending_documents). Se le añade 'pdf_path'
+      target_dir: Directorio de destino
+
+    Returns:
+      bool: True si el documento se descargó
+    """
+    from odoo_http import OdooHttpError
+
+    pdf_path = Path(target_dir) / f"unsigned_{doc['id']}.pdf"
+    # si no se puede abrir la sesión web falla todo el lote, no sólo el documento
+    self._get_http_session()
+
+    try:
+      doc['pdf_size'] = self._with_http_session(lambda session: session.download_field(
+        'maya_core.signature.batch_document', doc['id'], 'pdf_content', pdf_path))
+    except OdooHttpError as e:
+      logger.error(f"\tError descargando PDF {doc['id']}: {e}")
+      return False
+
+    if not doc['pdf_size']:
+      logger.warning(f"\tDocumento {doc['id']} no tiene contenido PDF")
+      pdf_path.unlink(missing_ok=True)
+      return False
+
+    doc['pdf_path'] = str(pdf_path)
+    logger.debug(f"\tPDF descargado: {doc['filename']} ({doc['pdf_size']} bytes)")
+    return True
+
+  def _get_pending_documents(self, document_ids: List[int]) -> List[Dict]:
+    """
+    Obtiene los metadatos de los documentos pendientes de firma, sin su contenido
+
+    Con el contexto bin_size Odoo devuelve el tamaño del binario 
+    en lugar del binario, que se guarda en 'pdf_size' (None si no se conoce)
+
+    Args:
+      document_ids: IDs de los documentos del lote
+
+    Returns:
+      Lista de diccionarios con los metadatos de los documentos
+    """
+    documents = self.execute(
+      'maya_core.signature.batch_document',
+      'search_read',
+      args = [[('id', 'in', document_ids), ('state', '!=', 'signed')]],
+      kwargs = {
+        'fields': ['id', 'filename', 'state', 'res_model', 'res_id', 'pdf_content'],
+        'context': {'bin_size': True},
+      }
+    )
+
+    return self._parse_pending_documents(documents)
+
+  @staticmethod
+  def _parse_pending_documents(documents: List[Dict]) -> List[Dict]:
+    """
+    Pasa el pdf_content leído con bin_size de cada documento a 'pdf_size' y
+    descarta los documentos sin contenido
+    """
+    pending = []
+    for doc in documents:
+      size = doc.pop('pdf_content', None)
+      if size is False:
+        logger.warning(f"\tDocumento {doc['id']} no tiene contenido PDF")
+        continue
+
+      doc['pdf_size'] = OdooClient._parse_bin_size(size)
+      pending.append(doc)
+
+    return pending
+
+  @staticmethod
+  def _parse_bin_size(value) -> Optional[int]:
+    """
+    Convierte el tamaño devuelto por Odoo con bin_size ("1.50 Mb", "300 bytes", 1234...) a bytes
+
+    Returns:
+      Tamaño en bytes o None si no se puede interpretar
+    """
+    if isinstance(value, bool) or value is None:
+      return None
+    
+    if isinstance(value, (int, float)):
+      return int(value)
+    
+    match = re.match(r'^\s*([\d.]+)\s*([a-zA-Z]*)\s*$', str(value))
+    if not match:
+      return None
+    
+    unit = _SIZE_UNITS.get(match.group(2).lower())
+    if unit is None:
+      return None
+
+    try:
+      return int(float(match.group(1)) * unit)
+    except ValueError:
+      return None
+
+  @staticmethod
+  def _group_by_size(items: List[Dict], sizes: List[int], max_chunk_bytes: int,
+                     max_items: int = DOWNLOAD_CHUNK_MAX_DOCS) -> List[List[Dict]]:
+    """
+    Agrupa los elementos en bloques de como mucho max_chunk_bytes y max_items
+    elementos. Un elemento más grande que max_chunk_bytes va solo en su bloque
+
+    Returns:
+      Lista de bloques (listas de elementos)
+    """
+    chunks = []
+    current = []
+    current_size = 0
+
+    for item, size in zip(items, sizes):
+      if current and (current_size + size > max_chunk_bytes 
+                      or len(current) >= max_items):
+        chunks.append(current)
+        current = []
+        current_size = 0
+
+      current.append(item)
+      current_size += size
+
+    if current:
+      chunks.append(current)
+
+    return chunks
+
+  @staticmethod
+  def _plan_download_chunks(documents: List[Dict],
+                            max_chunk_bytes: int = DOWNLOAD_CHUNK_BYTES) -> List[List[Dict]]:
+    """
+    Agrupa los documentos a descargar en bloques según su 'pdf_size'. 
+    Si no se conoce se supone DEFAULT_DOCUMENT_SIZE
+
+    Returns:
+      Lista de bloques (listas de documentos)
+    """
+    sizes = [doc.get('pdf_size') or DEFAULT_DOCUMENT_SIZE for doc in documents]
+    return OdooClient._group_by_size(documents, sizes, max_chunk_bytes)
+
+  def download_chunk(self, chunk: List[Dict], target_dir: Optional[Path] = None) -> List[Dict]:
+    """
+    Descarga y decodifica el contenido de un bloque de documentos
+
+    Args:
+      chunk: Metadatos de los documentos del bloque (ver _get_pending_documents)
+      target_dir: Si se indica, cada PDF se decodifica a target_dir/unsigned_<id>.pdf
+
+    Returns:
+      Documentos válidos del bloque con 'pdf_bytes' (sin 'pdf_content'), 
+      o con 'pdf_path' y 'pdf_size' si se indica target_dir
+    """
+    if target_dir is not None:
+      return self._download_chunk_to_files(chunk, Path(target_dir))
+
+    contents = self._read_documents_content([doc['id'] for doc in chunk])
+
+    documents = []
+    for doc in chunk:
+      doc['pdf_content'] = contents.pop(doc['id'], None)
+      valid = self._decode_document(doc)
+      # el base64 ya no hace falta, no lo mantengo en memoria
+      doc.pop('pdf_content', None)
+      if valid:
+        documents.append(doc)
+
+    return documents
+
+  def _download_chunk_to_files(self, chunk: List[Dict], target_dir: Path) -> List[Dict]:
+    """
+    Descarga un bloque decodificando cada pdf_content a su fichero
+
+    Con XML-RPC el base64 se decodifica según llega la respuesta (ver 
+    xmlrpc_streaming), sin tener nunca el PDF entero en memoria. Con los 
+    demás transportes se decodifica el bloque en memoria y se escribe a disco
+    """
+    document_ids = [doc['id'] for doc in chunk]
+
+    if self.protocol == PROTOCOL_XMLRPC and self.auth_mode != AUTH_SESSION:
+      files = self._read_documents_to_files(document_ids, target_dir)
+    else:
+      files = {}
+      for document_id, content in self._read_documents_content(document_ids).items():
+        if content:
+          path = target_dir / f"unsigned_{document_id}.pdf"
+          path.write_bytes(base64.b64decode(content))
+          files[document_id] = (path, path.stat().st_size)
+
+    documents = []
+    for doc in chunk:
+      path, size = files.pop(doc['id'], (None, 0))
+      if not size:
+        logger.warning(f"\tDocumento {doc['id']} no tiene contenido PDF")
+        if path:
+          path.unlink(missing_ok=True)
+        continue
+
+      pdf_path = target_dir / f"unsigned_{doc['id']}.pdf"
+      if path != pdf_path:
+        path.replace(pdf_path)
+
+      doc['pdf_path'] = str(pdf_path)
+      doc['pdf_size'] = size
+      logger.debug(f"\tPDF descargado: {doc['filename']} ({size} bytes)")
+      documents.append(doc)
+
+    # ficheros de documentos que no se pidieron (no debería haberlos)
+    for path, _ in files.values():
+      path.unlink(missing_ok=True)
+
+    return documents
+
+  def _read_documents_to_files(self, document_ids: List[int], target_dir: Path) -> Dict[int, Tuple[Path, int]]:
+    """
+    Lee el pdf_content de un bloque de documentos decodificándolo a ficheros 
+    de target_dir según llega la respuesta XML-RPC
+
+    Returns:
+      Diccionario id -> (fichero, tamaño), sólo de los documentos con contenido
+    """
+    from xmlrpc_streaming import make_streaming_proxy, StreamedFile
+
+    models = make_streaming_proxy(self.url, 'object', target_dir, ['pdf_content'], timeout=60,
+                                  gzip_threshold=self.gzip_threshold)
+    documents = self.execute(
+      'maya_core.signature.batch_document',
+      'read',
+      args = [document_ids],
+      kwargs = {'fields': ['id', 'pdf_content']},
+      models = models,
+      transfer=True
+    )
+
+    files = {}
+    for doc in documents:
+      content = doc.get('pdf_content')
+      if isinstance(content, StreamedFile):
+        files[doc['id']] = (content.path, content.size)
+
+    return files
+
+  def _read_documents_content(self, document_ids: List[int]) -> Dict[int, str]:
+    """
+    Lee el pdf_content (base64) de un bloque de documentos
+
+    Returns:
+      Diccionario id -> pdf_content
+    """
+    documents = self.execute(
+      'maya_core.signature.batch_document',
+      'read',
+      args = [document_ids],
+      kwargs = {'fields': ['id', 'pdf_content']},
+      transfer=True
+    )
+
+    return {doc['id']: doc.get('pdf_content') for doc in documents}
+  
+  def upload_signed_pdf(self, document_id: int, signed_pdf_bytes: bytes, 
+                          signed_filename: str, signed_content = None, models = None) -> bool:
+    """
+    Sube un PDF firmado individual
+    
+    Args:
+      document_id: ID del documento en el lote
+      signed_pdf_bytes: Bytes del PDF firmado
+      signed_filename: Nombre del archivo firmado
+      signed_content: PDF firmado ya codificado en base64, para no repetir la 
+        codificación (o un Base64File, que se codifica al enviarlo con models)
+      models: Proxy del servicio object a usar (ver execute)
+        
+    Returns:
+      bool: True si se subió correctamente
+    """
+    try:
+      # Lo paso a base64
+      if signed_content is None:
+        signed_content = base64.b64encode(signed_pdf_bytes).decode('utf-8')
+      
+      # Actualizo documento en el lote
+      self.execute(
+        'maya_core.signature.batch_document',
+        'write',
+        args=[[document_id], {  # ← Lista con [ids, valores]
+                'signed_pdf': signed_content,
+                'signed_pdf_filename': signed_filename,
+                'state': 'signed',
+                'sign_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }],
+        kwargs={},
+        models=models,
+        retry=True,
+        transfer=True
+      )
+        
+      logger.debug(f"\tPDF firmado subido: {signed_filename}")
+      return True
+        
+    except Exception as e:
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {e}")
+      return False
+
+  def propagate_signed_pdf(self, document_id: int) -> bool:
+    """
+    Pide al servidor que copie el PDF firmado ya subido al documento del lote
+    a su registro origen (res_model/res_id), para no subir el PDF dos veces
+
+    Args:
+      document_id: ID del documento en el lote
+
+    Returns:
+      bool: True si el servidor lo ha copiado. False si no tiene el método 
+      maya_core.signature.batch_document.propagate_signed_pdf
+    """
+    if self._server_supports('propagate_signed_pdf') is False:
+      return False
+
+    try:
+      self.execute(
+        'maya_core.signature.batch_document',
+        'propagate_signed_pdf',
+        args=[[document_id]],
+        retry=True,
+        idempotent=False
+      )
+    except xmlrpc.client.Fault as e:
+      if self._is_missing_method(e, 'propagate_signed_pdf'):
+        logger.info("\tEl servidor no copia el PDF firmado al registro origen, se sube de nuevo")
+        self._set_server_support('propagate_signed_pdf', False)
+        return False
+      raise
+
+    self._set_server_support('propagate_signed_pdf', True)
+    return True
+    
+  def upload_signed_delta(self, doc: Dict) -> Optional[bool]:
+    """
+    Sube sólo la actualización incremental que la firma añade al PDF original 
+    (doc['original_pdf_path']), con maya_core.signature.batch_document.upload_signed_delta
+
+    El servidor comprueba que su original tiene el mismo SHA-256, le añade la 
+    cola, verifica el SHA-256 del PDF firmado reconstruido y lo guarda en el 
+    documento del lote y en su registro origen
+
+    Args:
+      doc: Documento firmado en disco (ver upload_signed_pdfs)
+
+    Returns:
+      bool: True si se subió correctamente
+      None si no se puede subir como delta (el firmado no es una actualización 
+      incremental del original, el servidor no tiene el método o su original 
+      es distinto). Hay que subir el PDF completo
+    """
+    from pdf_delta import incremental_delta
+
+    if self._server_supports('upload_signed_delta') is False:
+      return None
+
+    document_id = doc['document_id']
+    signed_filename = doc.get('signed_filename', f'signed_{document_id}.pdf')
+
+    try:
+      delta = incremental_delta(doc['original_pdf_path'], doc['signed_pdf_path'])
+    except OSError as e:
+      logger.warning(f"\tNo se pudo comparar el PDF firmado {document_id} con su original: {e}")
+      return None
+
+    if delta is None:
+      return None
+
+    try:
+      result = self.execute(
+        'maya_core.signature.batch_document',
+        'upload_signed_delta',
+        args=[[document_id], self.batch_token or '', {
+          'original_sha256': delta.original_sha256,
+          'original_size': delta.original_size,
+          'signed_sha256': delta.signed_sha256,
+          'tail': base64.b64encode(delta.tail).decode('utf-8'),
+          'signed_pdf_filename': signed_filename,
+        }],
+        retry=True,
+        idempotent=False
+      )
+    except xmlrpc.client.Fault as e:
+      if self._is_missing_method(e, 'upload_signed_delta'):
+        logger.info("\tEl servidor no admite la subida de deltas, se sube el PDF completo")
+        self._set_server_support('upload_signed_delta', False)
+        return None
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {e}")
+      return False
+    except Exception as e:
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {e}")
+      return False
+
+    self._set_server_support('upload_signed_delta', True)
+
+    if not result.get('success'):
+      if result.get('code') == 'original_mismatch':
+        logger.warning(f"\tEl original del documento {document_id} ha cambiado en el servidor, se sube el PDF completo")
+        return None
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {result.get('error')}")
+      return False
+
+    logger.debug(f"\tPDF firmado subido como delta: {signed_filename} "
+                 f"({len(delta.tail)} de {delta.original_size + len(delta.tail)} bytes)")
+    return True
+
+  def upload_signed_file(self, doc: Dict) -> Optional[bool]:
+    """
+    Sube en crudo por HTTP el PDF firmado de disco (doc['signed_pdf_path']) 
+    al controlador /maya_signer/upload, sin base64 y leyéndolo por trozos
+
+    El controlador valida el token, guarda el PDF en el documento del lote 
+    y lo copia a su registro origen
+
+    Args:
+      doc: Documento firmado (ver upload_signed_pdfs)
+
+    Returns:
+      bool: True si se subió correctamente
+      None si el servidor no tiene el controlador. Hay que subirlo por RPC
+    """
+    from odoo_http import OdooHttpError, UPLOAD_PATH
+
+    if self._server_supports('upload_controller') is False or self.auth_mode == AUTH_API_KEY:
+      return None
+
+    document_id = doc['document_id']
+    signed_filename = doc.get('signed_filename', f'signed_{document_id}.pdf')
+
+    fields = {
+      'document_id': document_id,
+      'token': self.batch_token or '',
+      'signed_pdf_filename': signed_filename,
+      'idempotency_key': new_idempotency_key(),
+    }
+
+    try:
+      result = call_with_retry(lambda: self._with_http_session(lambda session: session.upload_file(
+        UPLOAD_PATH,
+        doc['signed_pdf_path'],
+        fields=fields,
+        filename=signed_filename
+      )), self.url, f"Subida de {signed_filename}")
+    except OdooHttpError as e:
+      if e.status == 404:
+        logger.info("\tEl servidor no tiene el controlador de subida, se sube por RPC")
+        self._set_server_support('upload_controller', False)
+        return None
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {e}")
+      return False
+    except Exception as e:
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {e}")
+      return False
+
+    self._set_server_support('upload_controller', True)
+
+    if not result.get('success'):
+      logger.error(f"\tError subiendo PDF firmado {document_id}: {result.get('error')}")
+      return False
+
+    logger.debug(f"\tPDF firmado subido: {signed_filename}")
+    return True
+
+  def upload_document(self, doc: Dict, transfer: str = TRANSFER_RPC) -> bool:
+    """
+    Sube un documento firmado y actualiza su registro original, si lo tiene
+
+    Si el documento trae 'signed_pdf_path' en lugar de 'signed_pdf_bytes' 
+    se sube desde disco: sólo la cola que la firma añade al original, si se 
+    tiene (ver upload_signed_delta), o entero, en crudo por HTTP (ver 
+    upload_signed_file) o por XML-RPC, codificando el base64 según se envía 
+    (ver xmlrpc_streaming)
+    
+    Args:
+      doc: Diccionario del documento firmado (ver upload_signed_pdfs)
+      transfer: 'rpc' (por defecto) o 'http', para los documentos en disco
+        
+    Returns:
+      bool: True si el PDF firmado se subió correctamente
+    """
+    document_id = doc['document_id']
+    signed_filename = doc.get('signed_filename', f'signed_{document_id}.pdf')
+    models = None
+
+    if doc.get('signed_pdf_path') and doc.get('signed_pdf_bytes') is None:
+      if self.delta_upload and doc.get('original_pdf_path'):
+        uploaded = self.upload_signed_delta(doc)
+        if uploaded is not None:
+          return uploaded
+
+      if transfer == TRANSFER_HTTP:
+        uploaded = self.upload_signed_file(doc)
+        if uploaded is not None:
+          return uploaded
+      
+      # por RPC (o el servidor no tiene el controlador de subida)
+      signed_pdf_bytes = None
+      if self.protocol == PROTOCOL_XMLRPC and self.auth_mode != AUTH_SESSION:
+        from xmlrpc_streaming import StreamingServerProxy, Base64File
+
+        models = StreamingServerProxy(self.url, 'object', timeout=60)
+        signed_content = Base64File(doc['signed_pdf_path'])
+      else:
+        signed_pdf_bytes = Path(doc['signed_pdf_path']).read_bytes()
+        signed_content = base64.b64encode(signed_pdf_bytes).decode('utf-8')
+    else:
+      signed_pdf_bytes = doc['signed_pdf_bytes']
+      signed_content = base64.b64encode(signed_pdf_bytes).decode('utf-8')
+    
+    # Subir PDF firmado
+    if not self.upload_signed_pdf(document_id, signed_pdf_bytes, signed_filename,
+                                  signed_content=signed_content, models=models):
+      return False
+
+    logger.info(f"\tDocumento vinculado {doc.get('res_id')} del modelo {doc.get('res_model')}")
+    # Si se proporciona modelo y res_id, actualizar el registro original
+    if doc.get('res_model') and doc.get('res_id'):
+      try:
+        if not (self.single_upload and self.propagate_signed_pdf(document_id)):
+          self.execute(
+            doc['res_model'],
+            'write',
+            # los datos se añaden al registro principal a traves de SignatureMixin
+            args=[[doc['res_id']], { 
+              'signed_pdf': signed_content,
+              'signed_pdf_filename': signed_filename,
+              'signature_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+              'signature_user_id': self.uid
+            }],   
+            kwargs={},
+            models=models,
+            retry=True,
+            transfer=True
+          )
+      except Exception as e:
+        logger.warning(f"\tNo se pudo actualizar registro original: {str(e)}")
+
+    return True
+    
+  def upload_signed_pdfs(self, batch_id: int, signed_documents: List[Dict],
+                         transfer: str = TRANSFER_RPC,
+                         confirmed: Optional[Set[int]] = None) -> bool:
+    """
+    Sube múltiples PDFs firmados a Odoo
+
+    Si bulk_submit, se suben en bloque (ver submit_signed_documents). Los 
+    documentos en disco que se pueden subir sin el PDF completo en base64 
+    (como delta del original o, con transfer 'http', en crudo) o que no se 
+    pueden enviar por trozos (JSON-RPC o sesión web) quedan fuera del bloque 
+    y se suben uno a uno (ver upload_document); el lote se finaliza al 
+    final con todos. Si el servidor no permite la subida en bloque, todos se 
+    suben uno a uno, en paralelo si max_workers > 1 (ver OdooUploadPool)
+    
+    Args:
+      batch_id: ID del lote
+      signed_documents: Lista de diccionarios:
+        [
             {
                 'document_id': int,
                 'signed_pdf_bytes': bytes,
+                'signed_pdf_path': str (en lugar de signed_pdf_bytes),
+                'original_pdf_path': str (opcional, PDF sin firmar, con signed_pdf_path),
                 'signed_filename': str,
                 'res_model': str (opcional),
                 'res_id': int (opcional)
             },
             ...
         ]
+      transfer: 'rpc' (por defecto) o 'http', para los documentos en disco 
+        (ver upload_document)
+      confirmed: Si se pasa, se le añaden los document_id que el servidor 
+        confirma según se suben, también si la subida falla a medias
             
     Returns:
       bool: True si todos se subieron correctamente
     """
+    if self._runs_async() and all(doc.get('signed_pdf_bytes') is not None for doc in signed_documents):
+      from odoo_async_client import run_sync
+
+      return run_sync(self._async_operations().upload_signed_pdfs(batch_id, signed_documents, confirmed))
+
+    if self.bulk_submit:
+      separate = [doc for doc in signed_documents if self._upload_separately(doc, transfer)]
+      bulk = [doc for doc in signed_documents if not any(doc is other for other in separate)]
+
+      if bulk:
+        counts = self._submit_signed_documents(batch_id, bulk, finalize=not separate,
+                                               confirmed=confirmed)
+        if counts is not None and not separate:
+          return counts[1] == 0
+        if counts is not None:
+          success_count, failed_count = self._upload_each(separate, transfer, confirmed)
+          success_count += counts[0]
+          failed_count += counts[1]
+          self.finalize_batch(batch_id, success_count, failed_count)
+          logger.info(f"\tSubidos {success_count}/{len(signed_documents)} PDFs")
+          return failed_count == 0
+
+    if self.max_workers > 1 and len(signed_documents) > 1:
+      from odoo_transfer import OdooUploadPool
+
+      pool = OdooUploadPool(self, max_workers=self.max_workers)
+      return pool.upload_signed_pdfs(batch_id, signed_documents, transfer, confirmed)
+
     logger.info(f"\tSubiendo {len(signed_documents)} PDFs firmados al lote {batch_id}...")
 
     self.validate_batch_token(batch_id)
+
+    success_count, failed_count = self._upload_each(signed_documents, transfer, confirmed)
+    
+    # Actualizo el estado del lote si todos se firmaron
+    self.finalize_batch(batch_id, success_count, failed_count)
+    
+    logger.info(f"\tSubidos {success_count}/{len(signed_documents)} PDFs")
     
+    return failed_count == 0
+
+  def _upload_separately(self, doc: Dict, transfer: str) -> bool:
+    """
+    Indica si un documento firmado se sube fuera de la subida en bloque: 
+    está en disco y se puede subir como delta del original o, con transfer 
+    'http', en crudo al controlador, o no se puede enviar por trozos dentro 
+    de la llamada (JSON-RPC o sesión web)
+    """
+    if doc.get('signed_pdf_bytes') is not None:
+      return False
+    if self.delta_upload and doc.get('original_pdf_path') \
+       and self._server_supports('upload_signed_delta') is not False:
+      return True
+    if transfer == TRANSFER_HTTP and self.auth_mode != AUTH_API_KEY \
+       and self._server_supports('upload_controller') is not False:
+      return True
+    return self.protocol != PROTOCOL_XMLRPC or self.auth_mode == AUTH_SESSION
+
+  def _upload_each(self, signed_documents: List[Dict], transfer: str,
+                   confirmed: Optional[Set[int]] = None) -> Tuple[int, int]:
+    """
+    Sube los documentos uno a uno (en paralelo si max_workers > 1), sin 
+    finalizar el lote
+
+    Returns:
+      Documentos subidos y fallidos
+    """
+    if self.max_workers > 1 and len(signed_documents) > 1:
+      from odoo_transfer import OdooUploadPool
+
+      pool = OdooUploadPool(self, max_workers=self.max_workers)
+      return pool.upload_documents(signed_documents, transfer, confirmed)
+
     success_count = 0
     failed_count = 0
-    
+
     for i, doc in enumerate(signed_documents):
       try:
         if self.progress_callback:
           self.progress_callback(f'Subiendo a Maya:  {i+1}/{len(signed_documents)} documentos')
 
-        document_id = doc['document_id']
-        signed_pdf_bytes = doc['signed_pdf_bytes']
-        signed_filename = doc.get('signed_filename', f'signed_{document_id}.pdf')
-        
-        # Subir PDF firmado
-        if self.upload_signed_pdf(document_id, signed_pdf_bytes, signed_filename):
+        if self.upload_document(doc, transfer):
           success_count += 1
-          logger.info(f"\tDocumento vinculado {doc.get('res_id')} del modelo {doc.get('res_model')}")
-          # Si se proporciona modelo y res_id, actualizar el registro original
-          if doc.get('res_model') and doc.get('res_id'):
-            try:
-              self.execute(
-                doc['res_model'],
-                'write',
-                # los datos se añaden al registro principal a traves de SignatureMixin
-                args=[[doc['res_id']], { 
-                  'signed_pdf': base64.b64encode(signed_pdf_bytes).decode(),
-                  'signed_pdf_filename': signed_filename,
-                  'signature_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                  'signature_user_id': self.uid
-                }],   
-                kwargs={},
-              )
-            except Exception as e:
-              logger.warning(f"\tNo se pudo actualizar registro original: {str(e)}")
+          if confirmed is not None:
+            confirmed.add(doc['document_id'])
         else:
-            failed_count += 1
+          failed_count += 1
               
       except Exception as e:
         logger.error(f"\tError procesando documento: {str(e)}")
         failed_count += 1
+
+    return success_count, failed_count
     
-    # Actualizo el estado del lote si todos se firmaron
-    self.finalize_batch(batch_id, success_count, failed_count)
-    
-    logger.info(f"\tSubidos {success_count}/{len(signed_documents)} PDFs")
-    
-    return failed_count == 0
+  def _server_supports(self, method: str) -> Optional[bool]:
+    """
+    Indica si el servidor expone un método opcional (None si aún no se sabe)
+    """
+    return _SERVER_METHOD_SUPPORT.get((self.url, method))
+
+  def _set_server_support(self, method: str, supported: bool):
+    _SERVER_METHOD_SUPPORT[(self.url, method)] = supported
+
+  @staticmethod
+  def _is_missing_method(error: xmlrpc.client.Fault, method: str) -> bool:
+    """
+    Comprueba si un Fault de Odoo indica que el método no existe en el servidor
+    """
+    fault = error.faultString or ''
+    return method in fault and ('does not exist' in fault or 'has no attribute' in fault)
+
+  def submit_signed_documents(self, batch_id: int, signed_documents: List[Dict],
+                              max_chunk_bytes: int = SUBMIT_CHUNK_BYTES) -> Optional[bool]:
+    """
+    Sube los PDFs firmados en bloque con maya_core.signature.batch.submit_signed_documents
+
+    Cada llamada lleva varios documentos con su res_model/res_id y el servidor 
+    valida el token, guarda cada PDF en el documento del lote y en el registro 
+    origen y, en la última llamada, finaliza el lote. Así un lote cuesta unas 
+    pocas llamadas en lugar de dos por documento
+
+    Los documentos en disco ('signed_pdf_path') se envían enteros, por 
+    XML-RPC codificando el base64 según se envía (ver xmlrpc_streaming). 
+    Nunca se leen enteros en memoria: con JSON-RPC o sesión web, o si se 
+    pueden subir como delta o en crudo, upload_signed_pdfs los sube uno a uno
+
+    Args:
+      batch_id: ID del lote
+      signed_documents: Documentos firmados (ver upload_signed_pdfs)
+      max_chunk_bytes: Tamaño máximo (aprox.) de PDF por llamada
+
+    Returns:
+      bool: True si todos se subieron correctamente
+      None si el servidor no tiene el método. Hay que usar la subida por documento
+
+    Raises:
+      OdooTokenError: Si el servidor rechaza el token
+      ValueError: Si hay documentos en disco y no se pueden enviar por trozos
+    """
+    counts = self._submit_signed_documents(batch_id, signed_documents, max_chunk_bytes)
+    return None if counts is None else counts[1] == 0
+
+  def _submit_signed_documents(self, batch_id: int, signed_documents: List[Dict],
+                               max_chunk_bytes: int = SUBMIT_CHUNK_BYTES,
+                               finalize: bool = True,
+                               confirmed: Optional[Set[int]] = None) -> Optional[Tuple[int, int]]:
+    """
+    submit_signed_documents, con los documentos subidos y fallidos
+
+    Args:
+      finalize: Si el servidor finaliza el lote con la última llamada
+      confirmed: Si se pasa, se le añaden los document_id subidos en cada llamada
+
+    Returns:
+      Documentos subidos y fallidos, o None si el servidor no tiene el método
+    """
+    if not signed_documents or self._server_supports('submit_signed_documents') is False:
+      return None
     
+    logger.info(f"\tSubiendo {len(signed_documents)} PDFs firmados al lote {batch_id} en bloque...")
+
+    sizes = [len(doc['signed_pdf_bytes']) if doc.get('signed_pdf_bytes') is not None
+             else Path(doc['signed_pdf_path']).stat().st_size
+             for doc in signed_documents]
+    groups = self._group_by_size(signed_documents, sizes, max_chunk_bytes)
+
+    # como en upload_document: los PDFs en disco, por trozos
+    models = None
+    if any(doc.get('signed_pdf_bytes') is None for doc in signed_documents):
+      if self.protocol != PROTOCOL_XMLRPC or self.auth_mode == AUTH_SESSION:
+        raise ValueError("Los PDFs en disco sólo se suben en bloque por XML-RPC")
+
+      from xmlrpc_streaming import StreamingServerProxy
+
+      models = StreamingServerProxy(self.url, 'object', timeout=60)
+
+    def signed_content(doc):
+      if doc.get('signed_pdf_bytes') is not None:
+        return base64.b64encode(doc['signed_pdf_bytes']).decode('utf-8')
+      from xmlrpc_streaming import Base64File
+
+      return Base64File(doc['signed_pdf_path'])
+
+    success_count = 0
+    failed_count = 0
+
+    for i, group in enumerate(groups):
+      payload = [
+        {
+          'document_id': doc['document_id'],
+          'signed_pdf': signed_content(doc),
+          'signed_pdf_filename': doc.get('signed_filename', f"signed_{doc['document_id']}.pdf"),
+          'res_model': doc.get('res_model') or False,
+          'res_id': doc.get('res_id') or False,
+        }
+        for doc in group
+      ]
+
+      try:
+        result = self.execute(
+          'maya_core.signature.batch',
+          'submit_signed_documents',
+          args=[batch_id, self.batch_token, payload],
+          kwargs={'finalize': finalize and i == len(groups) - 1},
+          models=models,
+          retry=True,
+          idempotent=False,
+          transfer=True
+        )
+      except xmlrpc.client.Fault as e:
+        if i == 0 and self._is_missing_method(e, 'submit_signed_documents'):
+          logger.info("\tEl servidor no permite la subida en bloque, se sube documento a documento")
+          self._set_server_support('submit_signed_documents', False)
+          return None
+        raise
+
+      self._set_server_support('submit_signed_documents', True)
+
+      if result.get('error'):
+        self.invalidate_batch_token(batch_id)
+        raise OdooTokenError(f"\tSubida en bloque rechazada: {result['error']}")
+
+      errors = result.get('errors') or {}
+      for document_id, error in errors.items():
+        logger.error(f"\tError subiendo PDF firmado {document_id}: {error}")
+      if confirmed is not None:
+        # las claves de un dict de XML-RPC son siempre cadenas
+        confirmed.update(doc['document_id'] for doc in group if str(doc['document_id']) not in errors)
+
+      success_count += result.get('success_count', 0)
+      failed_count += result.get('failed_count', 0)
+
+      if self.progress_callback:
+        done = sum(len(g) for g in groups[:i + 1])
+        self.progress_callback(f'Subiendo a Maya:  {done}/{len(signed_documents)} documentos')
+
+    if finalize:
+      logger.info(
+        f"\tLote {batch_id} finalizado: {success_count} firmados, "
+        f"{failed_count} errores"
+      )
+
+    return success_count, failed_count
+
+  def prepare_remote_signatures(self, batch_id: int, certificate: bytes,
+                                reason: str = SIGNATURE_REASON,
+                                location: str = SIGNATURE_LOCATION) -> Optional[List[Dict]]:
+    """
+    Firma por resumen: pide al servidor que prepare la firma de los documentos 
+    pendientes del lote con maya_core.signature.batch.prepare_remote_signatures
+
+    El servidor añade a cada PDF el campo de firma con el hueco para el CMS, 
+    calcula el resumen del rango de bytes firmado y devuelve los atributos 
+    firmados del CMS. Los PDFs no viajan: sólo unos cientos de bytes por 
+    documento, a la ida y a la vuelta (ver finish_remote_signatures)
+
+    Args:
+      batch_id: ID del lote
+      certificate: Certificado de firma en DER, que va en los atributos firmados
+      reason, location: Datos de la firma
+
+    Returns:
+      [{'document_id', 'signed_attrs' (base64), 'document_digest' (hex), 
+        'md_algorithm'}, ...], o None si el servidor no tiene el método. Hay 
+      que firmar los PDFs completos
+
+    Raises:
+      OdooTokenError: Si el servidor rechaza el token
+    """
+    if self._server_supports('prepare_remote_signatures') is False:
+      return None
+
+    try:
+      result = self.execute(
+        'maya_core.signature.batch',
+        'prepare_remote_signatures',
+        args=[batch_id, self.batch_token or '', base64.b64encode(certificate).decode('utf-8')],
+        kwargs={'reason': reason, 'location': location},
+        retry=True,
+        idempotent=False
+      )
+    except xmlrpc.client.Fault as e:
+      if self._is_missing_method(e, 'prepare_remote_signatures'):
+        logger.info("\tEl servidor no admite la firma por resumen, se firman los PDFs completos")
+        self._set_server_support('prepare_remote_signatures', False)
+        return None
+      raise
+
+    self._set_server_support('prepare_remote_signatures', True)
+
+    if result.get('error'):
+      self.invalidate_batch_token(batch_id)
+      raise OdooTokenError(f"\tFirma por resumen rechazada: {result['error']}")
+
+    for document_id, error in (result.get('errors') or {}).items():
+      logger.error(f"\tError preparando la firma del documento {document_id}: {error}")
+
+    documents = result.get('documents') or []
+    logger.info(f"\t{len(documents)} documentos preparados para la firma por resumen")
+    return documents
+
+  def finish_remote_signatures(self, batch_id: int, signatures: List[Dict]) -> bool:
+    """
+    Envía los CMS de la firma por resumen con 
+    maya_core.signature.batch.finish_remote_signatures: el servidor los 
+    incrusta en los PDFs que preparó, los guarda en los documentos del lote 
+    y en los registros origen y finaliza el lote
+
+    Args:
+      batch_id: ID del lote
+      signatures: [{'document_id', 'signature_cms' (base64)}, ...]
+
+    Returns:
+      bool: True si todos se guardaron correctamente
+
+    Raises:
+      OdooTokenError: Si el servidor rechaza el token
+    """
+    result = self.execute(
+      'maya_core.signature.batch',
+      'finish_remote_signatures',
+      args=[batch_id, self.batch_token or '', signatures],
+      kwargs={'finalize': True},
+      retry=True,
+      idempotent=False
+    )
+
+    if result.get('error'):
+      self.invalidate_batch_token(batch_id)
+      raise OdooTokenError(f"\tFirma por resumen rechazada: {result['error']}")
+
+    for document_id, error in (result.get('errors') or {}).items():
+      logger.error(f"\tError guardando la firma del documento {document_id}: {error}")
+
+    logger.info(
+      f"\tLote {batch_id} finalizado: {result.get('success_count', 0)} firmados, "
+      f"{result.get('failed_count', 0)} errores"
+    )
+
+    return result.get('failed_count', 0) == 0
+
   def update_batch_state(self, batch_id: int, state: str) -> bool:
     """
     Actualiza el estado del lote
@@ -395,7 +1806,8 @@ class OdooClient(object):
           'maya_core.signature.batch',
           'write',
           args=[[batch_id], {'state': state, 'sign_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ,
-          kwargs={}
+          kwargs={},
+          retry=True
       )
       logger.info(f"\tLote {batch_id} -> {state}")
       return True
@@ -426,8 +1838,13 @@ class OdooClient(object):
       result = self.execute(
           'maya_core.signature.batch',
           'finalize_batch',
-          args=[batch_id, self.batch_token, success_count, failed_count]
+          args=[batch_id, self.batch_token, success_count, failed_count],
+          retry=True,
+          idempotent=False
       )
+
+      if isinstance(result, dict) and result.get('error'):
+        self.invalidate_batch_token(batch_id)
         
       logger.info(
           f"\tLote {batch_id} finalizado: {success_count} firmados, "
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+"""
+Transferencia de PDFs con Odoo por HTTP plano, sin base64 ni XML
+
+Se autentica una sesión web (/web/session/authenticate) y con su cookie se 
+descargan los binarios de /web/content directamente a disco y se suben los 
+PDFs firmados como multipart/form-data, leyéndolos de disco, ambos por trozos, 
+sin pasar nunca el documento completo por memoria
+"""
+
+import logging
+import json
+import os
+import secrets
+import http.client
+import xmlrpc.client
+
+from odoo_transport import get_connection_pool, DISCONNECT_ERRORS
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit, quote
+
+logger = logging.getLogger("maya_signer")
+
+# Tamaño de los trozos leídos/escritos en disco
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Controlador de Maya para subir un PDF firmado en crudo
+UPLOAD_PATH = '/maya_signer/upload'
+
+# Código de error JSON de Odoo con la sesión web caducada (SessionExpiredException)
+SESSION_EXPIRED_CODE = 100
+
+class OdooHttpError(Exception):
+  """
+  Error en una transferencia HTTP con Odoo
+  """
+  def __init__(self, message: str, status: Optional[int] = None):
+    super().__init__(message)
+    self.status = status
+
+class OdooHttpSession:
+  """
+  Sesión web de Odoo para transferir ficheros por HTTP
+
+  No se puede compartir entre hilos. Para otro hilo, usar clone(), que 
+  reutiliza la cookie. Las conexiones salen del pool keep-alive del servidor
+  """
+
+  def __init__(self, url: str, db: str, username: str, password: str, timeout: int = 60):
+    """
+    Args:
+      url: URL base de Odoo
+      db: Nombre de la base de datos
+      username: Usuario de Odoo
+      password: Contraseña de Odoo
+      timeout: Timeout de cada operación de red, en segundos
+    """
+    parts = urlsplit(url)
+    self.url = url.rstrip('/')
+    self.db = db
+    self.username = username
+    self.password = password
+    self.timeout = timeout
+
+    self._pool = get_connection_pool(url)
+    self._base_path = parts.path.rstrip('/')
+    self._connection = None
+
+    self.session_id: Optional[str] = None
+
+  def clone(self) -> 'OdooHttpSession':
+    """
+    Misma sesión web (cookie) con su propia conexión
+    """
+    session = OdooHttpSession(self.url, self.db, self.username, self.password, self.timeout)
+    session.session_id = self.session_id
+    return session
+
+  def _get_connection(self) -> http.client.HTTPConnection:
+    if self._connection is None:
+      self._connection = self._pool.acquire(self.timeout)
+    return self._connection
+
+  def _release(self):
+    # respuesta leída completa: la conexión vuelve al pool
+    if self._connection is not None:
+      self._pool.release(self._connection)
+      self._connection = None
+
+  def close(self):
+    if self._connection is not None:
+      self._pool.discard(self._connection)
+      self._connection = None
+
+  def _headers(self, extra: Optional[dict] = None) -> dict:
+    headers = dict(extra or {})
+    if self.session_id:
+      headers['Cookie'] = f'session_id={self.session_id}'
+    return headers
+
+  def _send(self, method: str, path: str, body=None, headers: Optional[dict] = None) -> http.client.HTTPResponse:
+    """
+    Envía una petición y devuelve la respuesta sin leer su cuerpo
+
+    Si la conexión keep-alive la cerró el servidor, se reintenta una vez 
+    (sólo si el cuerpo se puede volver a enviar: bytes, o una función que 
+    genera el cuerpo). Hay que llamar a _release() al terminar de leer la 
+    respuesta
+    """
+    for attempt in range(2):
+      connection = self._get_connection()
+      try:
+        connection.request(method, f"{self._base_path}{path}", body=body() if callable(body) else body,
+                           headers=self._headers(headers))
+        return connection.getresponse()
+      except DISCONNECT_ERRORS:
+        self.close()
+        if attempt or not (body is None or isinstance(body, bytes) or callable(body)):
+          raise
+      except Exception:
+        self.close()
+        raise
+
+  def authenticate(self) -> int:
+    """
+    Abre la sesión web y guarda su cookie
+
+    Returns:
+      uid del usuario
+
+    Raises:
+      OdooHttpError: Si las credenciales no son válidas o el servidor responde con error
+    """
+    body = json.dumps({
+      'jsonrpc': '2.0',
+      'method': 'call',
+      'params': {'db': self.db, 'login': self.username, 'password': self.password},
+    }).encode('utf-8')
+
+    response = self._send('POST', '/web/session/authenticate', body=body,
+                          headers={'Content-Type': 'application/json'})
+    data = response.read()
+    self._release()
+
+    if response.status != 200:
+      raise OdooHttpError(f"Error HTTP {response.status} autenticando la sesión web", response.status)
+
+    reply = json.loads(data)
+    result = reply.get('result') or {}
+    if reply.get('error') or not result.get('uid'):
+      error = (reply.get('error') or {}).get('data', {}).get('message', 'credenciales inválidas')
+      raise OdooHttpError(f"No se pudo abrir la sesión web: {error}")
+
+    for header, value in response.getheaders():
+      if header.lower() == 'set-cookie' and value.startswith('session_id='):
+        self.session_id = value.split(';', 1)[0].split('=', 1)[1]
+
+    if not self.session_id:
+      raise OdooHttpError("El servidor no devolvió la cookie de sesión")
+
+    logger.info(f"\tSesión web abierta (UID: {result['uid']})")
+    return result['uid']
+
+  def call_kw(self, model: str, method: str, args: list, kwargs: Optional[dict] = None):
+    """
+    Llama a un método de un modelo con la sesión web (/web/dataset/call_kw)
+
+    El servidor sólo comprueba la cookie, sin volver a verificar la 
+    contraseña en cada llamada como hace execute_kw
+
+    Raises:
+      xmlrpc.client.Fault: Con el error de Odoo (SESSION_EXPIRED_CODE si la 
+        sesión ha caducado)
+      OdooHttpError: Si el servidor responde con un error HTTP
+    """
+    body = json.dumps({
+      'jsonrpc': '2.0',
+      'method': 'call',
+      'params': {'model': model, 'method': method, 'args': args, 'kwargs': kwargs or {}},
+    }).encode('utf-8')
+
+    response = self._send('POST', f'/web/dataset/call_kw/{quote(model)}/{quote(method)}', body=body,
+                          headers={'Content-Type': 'application/json'})
+    data = response.read()
+    self._release()
+
+    if response.status != 200:
+      raise OdooHttpError(f"Error HTTP {response.status} en {model}.{method}", response.status)
+
+    reply = json.loads(data)
+    if reply.get('error'):
+      error = reply['error']
+      raise xmlrpc.client.Fault(error.get('code', 1), (error.get('data') or {}).get('message') or error.get('message', ''))
+
+    return reply.get('result')
+
+  def download_to_file(self, path: str, destination: Path, chunk_size: int = STREAM_CHUNK_SIZE) -> int:
+    """
+    Descarga una URL del servidor directamente a un fichero, por trozos
+
+    Args:
+      path: Ruta en el servidor (p.e. /web/content/...)
+      destination: Fichero de destino
+      chunk_size: Tamaño de cada trozo
+
+    Returns:
+      Bytes descargados
+    """
+    response = self._send('GET', path)
+
+    if response.status != 200:
+      response.read()
+      self._release()
+      raise OdooHttpError(f"Error HTTP {response.status} descargando {path}", response.status)
+
+    size = 0
+    try:
+      with open(destination, 'wb') as f:
+        while True:
+          chunk = response.read(chunk_size)
+          if not chunk:
+            break
+          f.write(chunk)
+          size += len(chunk)
+    except Exception:
+      # la respuesta a medias deja la conexión inservible
+      self.close()
+      Path(destination).unlink(missing_ok=True)
+      raise
+
+    self._release()
+    return size
+
+  def download_field(self, model: str, record_id: int, field: str, destination: Path) -> int:
+    """
+    Descarga el binario de un campo (/web/content/<modelo>/<id>/<campo>) a un fichero
+
+    Returns:
+      Bytes descargados
+    """
+    path = f"/web/content/{quote(model)}/{record_id}/{quote(field)}?download=true"
+    return self.download_to_file(path, destination)
+
+  def upload_file(self, path: str, file_path: Path, fields: dict, file_field: str = 'file',
+                  filename: Optional[str] = None, chunk_size: int = STREAM_CHUNK_SIZE) -> dict:
+    """
+    Sube un fichero como multipart/form-data, leyéndolo de disco por trozos
+
+    El tamaño total se calcula antes de enviar, así que la petición lleva 
+    Content-Length y no hace falta codificación chunked
+
+    Args:
+      path: Ruta en el servidor
+      file_path: Fichero a subir
+      fields: Campos de formulario que acompañan al fichero
+      file_field: Nombre del campo del fichero
+      filename: Nombre con el que se envía el fichero
+      chunk_size: Tamaño de cada trozo
+
+    Returns:
+      Respuesta JSON del servidor
+
+    Raises:
+      OdooHttpError: Si el servidor responde con un error HTTP
+    """
+    boundary = secrets.token_hex(16)
+    filename = filename or Path(file_path).name
+
+    preamble = b''.join(
+      f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+      for name, value in fields.items()
+    )
+    preamble += (
+      f'--{boundary}\r\n'
+      f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+      f'Content-Type: application/pdf\r\n\r\n'
+    ).encode('utf-8')
+    epilogue = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+    size = len(preamble) + os.path.getsize(file_path) + len(epilogue)
+
+    def body():
+      yield preamble
+      with open(file_path, 'rb') as f:
+        while True:
+          chunk = f.read(chunk_size)
+          if not chunk:
+            break
+          yield chunk
+      yield epilogue
+
+    try:
+      response = self._send('POST', path, body=body, headers={
+        'Content-Type': f'multipart/form-data; boundary={boundary}',
+        'Content-Length': str(size),
+      })
+      data = response.read()
+    except Exception:
+      self.close()
+      raise
+
+    self._release()
+
+    if response.status != 200:
+      raise OdooHttpError(f"Error HTTP {response.status} subiendo {filename}", response.status)
+
+    return json.loads(data) if data else {}
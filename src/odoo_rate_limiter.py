@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""
+Limitador de peticiones a Odoo compartido por todos los trabajos del servicio
+
+Varios usuarios firmando a la vez, cada uno con descargas y subidas en
+paralelo, pueden saturar los workers de Odoo. Todas las llamadas a un
+servidor pasan por su OdooRateLimiter, común a todo el proceso:
+
+- Token bucket: como mucho RATE_LIMIT peticiones por segundo (con ráfagas
+  de hasta RATE_BURST)
+- Concurrencia AIMD: el número de peticiones en vuelo crece de uno en uno
+  mientras el servidor responde bien y se reduce a la mitad con un timeout,
+  un 5xx/429 o una respuesta lenta (SLOW_CALL_SECONDS), como el control de
+  congestión de TCP. Las transferencias de PDFs completos no cuentan como
+  lentas: su duración depende del tamaño y de la red, no de la carga del
+  servidor
+"""
+
+import logging
+import threading
+import time
+import xmlrpc.client
+
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger("maya_signer")
+
+# Peticiones por segundo a un servidor y ráfaga máxima
+RATE_LIMIT = 50.0
+RATE_BURST = 50
+
+# Peticiones simultáneas a un servidor: al empezar, mínimo y máximo
+CONCURRENCY_INITIAL = 4
+CONCURRENCY_MIN = 1
+CONCURRENCY_MAX = 16
+# Factor con el que se reduce la concurrencia si el servidor se satura
+CONCURRENCY_BACKOFF = 0.5
+
+# Segundos a partir de los que una respuesta se considera lenta (servidor saturado).
+# No se aplica a las transferencias (ver OdooRateLimiter.slot)
+SLOW_CALL_SECONDS = 20.0
+
+def is_overload(error: BaseException) -> bool:
+  """
+  Indica si un error es señal de que el servidor está saturado
+  """
+  if isinstance(error, xmlrpc.client.ProtocolError):
+    return error.errcode >= 500 or error.errcode == 429
+  # OdooHttpError lleva el estado HTTP, si lo hay
+  status = getattr(error, 'status', None)
+  if isinstance(status, int):
+    return status >= 500 or status == 429
+  return isinstance(error, TimeoutError)
+
+class TokenBucket:
+  """
+  Token bucket: rate fichas por segundo, hasta burst acumuladas
+  """
+
+  def __init__(self, rate: float = RATE_LIMIT, burst: int = RATE_BURST):
+    self.rate = rate
+    self.burst = burst
+    self._tokens = float(burst)
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def acquire(self) -> float:
+    """
+    Toma una ficha, esperando a que haya una si hace falta
+
+    Si no quedan fichas se reserva la siguiente (el saldo queda negativo)
+    y se espera a que llegue, así los hilos que esperan salen en orden
+
+    Returns:
+      Segundos de espera
+    """
+    with self._lock:
+      now = time.monotonic()
+      self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+      self._updated = now
+      self._tokens -= 1
+      wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    if wait:
+      time.sleep(wait)
+    return wait
+
+class AimdConcurrency:
+  """
+  Límite de peticiones en vuelo con aumento aditivo y reducción multiplicativa
+  """
+
+  def __init__(self, initial: int = CONCURRENCY_INITIAL, minimum: int = CONCURRENCY_MIN,
+               maximum: int = CONCURRENCY_MAX, backoff: float = CONCURRENCY_BACKOFF):
+    self.limit = float(initial)
+    self.minimum = minimum
+    self.maximum = maximum
+    self.backoff = backoff
+    self.in_flight = 0
+    self.decreases = 0
+    self._last_decrease = float('-inf')
+    self._cond = threading.Condition()
+
+  def acquire(self) -> float:
+    """
+    Espera a que haya hueco y ocupa uno
+
+    Returns:
+      Instante (time.monotonic) en que empieza la petición, para release()
+    """
+    with self._cond:
+      while self.in_flight >= int(self.limit):
+        self._cond.wait()
+      self.in_flight += 1
+    return time.monotonic()
+
+  def release(self, started: float, overloaded: bool):
+    """
+    Libera el hueco de una petición terminada y ajusta el límite
+
+    Args:
+      started: Lo que devolvió acquire()
+      overloaded: Si la petición indica que el servidor está saturado
+    """
+    with self._cond:
+      self.in_flight -= 1
+      if overloaded:
+        # las peticiones que ya estaban en vuelo al reducir no vuelven a reducir
+        if started >= self._last_decrease:
+          self.limit = max(self.minimum, self.limit * self.backoff)
+          self._last_decrease = time.monotonic()
+          self.decreases += 1
+          logger.warning(f"\tOdoo saturado, peticiones simultáneas: {int(self.limit)}")
+      else:
+        # +1 por cada ronda completa de peticiones
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+      self._cond.notify_all()
+
+class OdooRateLimiter:
+  """
+  Token bucket y concurrencia AIMD de un servidor
+  """
+
+  def __init__(self, rate: float = RATE_LIMIT, burst: int = RATE_BURST,
+               slow_call: float = SLOW_CALL_SECONDS, **concurrency):
+    """
+    Args:
+      rate, burst: Ver TokenBucket
+      slow_call: Segundos a partir de los que una respuesta se considera lenta
+      concurrency: initial, minimum, maximum y backoff de AimdConcurrency
+    """
+    self.bucket = TokenBucket(rate, burst)
+    self.concurrency = AimdConcurrency(**concurrency)
+    self.slow_call = slow_call
+    self._stats = {'calls': 0, 'overloaded': 0, 'throttled_seconds': 0.0}
+    self._lock = threading.Lock()
+
+  @contextmanager
+  def slot(self, transfer: bool = False) -> Iterator[None]:
+    """
+    Contexto de una petición al servidor: espera su turno al entrar y, al
+    salir, ajusta la concurrencia según cómo haya ido
+
+    Args:
+      transfer: Si la petición descarga o sube PDFs completos. Sólo sus
+        errores indican saturación, no su duración
+    """
+    waited = self.bucket.acquire()
+    started = self.concurrency.acquire()
+    overloaded = False
+    try:
+      yield
+    except BaseException as e:
+      overloaded = is_overload(e)
+      raise
+    finally:
+      elapsed = time.monotonic() - started
+      overloaded = overloaded or (not transfer and elapsed > self.slow_call)
+      self.concurrency.release(started, overloaded)
+      with self._lock:
+        self._stats['calls'] += 1
+        self._stats['overloaded'] += overloaded
+        self._stats['throttled_seconds'] += waited
+
+  def stats(self) -> Dict:
+    """
+    Estadísticas del limitador
+    """
+    with self._lock:
+      stats = dict(self._stats)
+    stats.update(limit=int(self.concurrency.limit), in_flight=self.concurrency.in_flight,
+                 decreases=self.concurrency.decreases)
+    return stats
+
+# Limitadores por URL del servidor
+_LIMITERS: Dict[str, OdooRateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+def get_rate_limiter(url: str) -> OdooRateLimiter:
+  """
+  Limitador de un servidor, compartido en todo el proceso
+  """
+  with _LIMITERS_LOCK:
+    limiter = _LIMITERS.get(url)
+    if limiter is None:
+      limiter = _LIMITERS[url] = OdooRateLimiter()
+    return limiter
+
+def rate_limiter_stats() -> Dict[str, Dict]:
+  """
+  Estadísticas de todos los limitadores, por URL del servidor
+  """
+  with _LIMITERS_LOCK:
+    limiters = dict(_LIMITERS)
+  return {url: limiter.stats() for url, limiter in limiters.items()}
+
+def reset_rate_limiters():
+  """
+  Olvida los limitadores de todos los servidores
+  """
+  with _LIMITERS_LOCK:
+    _LIMITERS.clear()
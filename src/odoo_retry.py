@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reintentos de las llamadas de subida a Odoo
+
+Un corte de red o un 502/503 del proxy durante la subida ya no obliga a
+repetir el lote entero (descarga, firma y subida): la llamada se reintenta
+con espera exponencial y jitter. Si el servidor sigue fallando, el circuit
+breaker del servidor se abre y las llamadas siguientes fallan en el acto,
+sin esperar a agotar los reintentos de cada documento
+
+Reintentar una llamada que sí llegó pero cuya respuesta se perdió la
+aplica dos veces. Las llamadas llevan una clave de idempotencia
+(new_idempotency_key), pero sólo evita la repetición en un servidor que la
+tenga en cuenta: el write de Odoo y finalize_batch de maya_core la ignoran.
+Por eso sólo se reintenta ante cualquier error pasajero lo que es
+idempotente por construcción (lecturas y write de los mismos valores); el
+resto sólo si el error garantiza que el servidor no procesó la petición
+(ver is_unprocessed)
+"""
+
+import asyncio
+import http.client
+import logging
+import random
+import socket
+import threading
+import time
+import uuid
+import xmlrpc.client
+
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger("maya_signer")
+
+# Intentos de cada llamada (el primero y los reintentos)
+RETRY_ATTEMPTS = 4
+# Espera antes del primer reintento y máxima, en segundos (se dobla en cada uno)
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+# Estados HTTP que indican un fallo pasajero del servidor o del proxy
+RETRY_STATUS = (429, 502, 503, 504)
+# Estados HTTP con los que el servidor rechaza la petición sin procesarla
+UNPROCESSED_STATUS = (429, 503)
+
+# Fallos pasajeros seguidos que abren el circuito de un servidor
+BREAKER_THRESHOLD = 5
+# Segundos que el circuito queda abierto antes de dejar pasar una llamada de prueba
+BREAKER_COOLDOWN = 30.0
+
+class CircuitOpenError(Exception):
+  """
+  El circuito del servidor está abierto: la llamada no se intenta
+  """
+  pass
+
+def is_transient(error: Exception) -> bool:
+  """
+  Indica si un error es un fallo pasajero que merece reintentar la llamada
+
+  Los Fault son respuestas del servidor (token inválido, AccessDenied...) y
+  no se reintentan
+  """
+  if isinstance(error, (xmlrpc.client.Fault, CircuitOpenError)):
+    return False
+  if isinstance(error, xmlrpc.client.ProtocolError):
+    return error.errcode in RETRY_STATUS
+  # OdooHttpError lleva el estado HTTP, si lo hay
+  status = getattr(error, 'status', None)
+  if status is not None:
+    return status in RETRY_STATUS
+  return isinstance(error, (ConnectionError, TimeoutError, socket.gaierror, http.client.HTTPException))
+
+def is_unprocessed(error: Exception) -> bool:
+  """
+  Indica si un error garantiza que el servidor no procesó la petición: la
+  conexión se rechazó, el nombre no se resolvió o el servidor la rechazó
+  por saturación (429/503). Un corte o un timeout a mitad de la llamada no
+  lo garantizan
+  """
+  if isinstance(error, xmlrpc.client.ProtocolError):
+    return error.errcode in UNPROCESSED_STATUS
+  status = getattr(error, 'status', None)
+  if status is not None:
+    return status in UNPROCESSED_STATUS
+  return isinstance(error, (ConnectionRefusedError, socket.gaierror))
+
+def backoff_delay(retry: int) -> float:
+  """
+  Espera antes del reintento retry (0, 1, ...): exponencial, con la mitad
+  aleatoria para que los hilos que fallan a la vez no reintenten a la vez
+  """
+  delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** retry)
+  return delay / 2 + random.uniform(0, delay / 2)
+
+def new_idempotency_key() -> str:
+  """
+  Clave de idempotencia de una escritura, la misma en todos sus reintentos
+  """
+  return uuid.uuid4().hex
+
+class CircuitBreaker:
+  """
+  Circuit breaker de un servidor
+
+  Se abre tras BREAKER_THRESHOLD fallos pasajeros seguidos. Pasado el
+  cooldown deja pasar una única llamada de prueba: si va bien se cierra y
+  si falla se vuelve a abrir
+  """
+
+  def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+    self.threshold = threshold
+    self.cooldown = cooldown
+    self.failures = 0
+    self._opened_at: Optional[float] = None
+    self._probing = False
+    self._lock = threading.Lock()
+
+  @property
+  def is_open(self) -> bool:
+    with self._lock:
+      return self._opened_at is not None
+
+  def before_call(self):
+    """
+    Raises:
+      CircuitOpenError: Si el circuito está abierto
+    """
+    with self._lock:
+      if self._opened_at is None:
+        return
+      if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+        raise CircuitOpenError("El servidor no responde, se ha dejado de intentar")
+      self._probing = True
+
+  def record_success(self):
+    with self._lock:
+      self.failures = 0
+      self._opened_at = None
+      self._probing = False
+
+  def record_failure(self):
+    with self._lock:
+      self.failures += 1
+      if self._probing or self.failures >= self.threshold:
+        if self._opened_at is None or self._probing:
+          logger.warning(f"\tCircuito abierto tras {self.failures} fallos seguidos")
+        self._opened_at = time.monotonic()
+        self._probing = False
+
+# Circuit breakers por URL del servidor
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+  """
+  Circuit breaker de un servidor, compartido en todo el proceso
+  """
+  with _BREAKERS_LOCK:
+    breaker = _BREAKERS.get(url)
+    if breaker is None:
+      breaker = _BREAKERS[url] = CircuitBreaker()
+    return breaker
+
+def reset_circuit_breakers():
+  """
+  Olvida los fallos de todos los servidores
+  """
+  with _BREAKERS_LOCK:
+    _BREAKERS.clear()
+
+def call_with_retry(action: Callable, url: str, description: str = '',
+                    attempts: Optional[int] = None, retry_if: Callable = is_transient):
+  """
+  Ejecuta action() reintentándola si falla por un error pasajero
+
+  Args:
+    action: Llamada a ejecutar. Si escribe, debe llevar su clave de
+      idempotencia (ver new_idempotency_key)
+    url: URL del servidor, para su circuit breaker
+    description: Descripción de la llamada para el log
+    attempts: Intentos como máximo (RETRY_ATTEMPTS por defecto)
+    retry_if: Errores pasajeros que se reintentan. is_transient sólo es
+      seguro si action() es idempotente; si no, is_unprocessed
+
+  Returns:
+    Lo que devuelva action()
+
+  Raises:
+    CircuitOpenError: Si el circuito del servidor está abierto
+    El error de action() si no es pasajero o se agotan los intentos
+  """
+  breaker = get_circuit_breaker(url)
+  attempts = attempts or RETRY_ATTEMPTS
+
+  for attempt in range(attempts):
+    breaker.before_call()
+    try:
+      result = action()
+    except Exception as e:
+      if not is_transient(e):
+        # el servidor ha respondido: está disponible
+        breaker.record_success()
+        raise
+      breaker.record_failure()
+      if attempt == attempts - 1 or breaker.is_open or not retry_if(e):
+        raise
+      delay = backoff_delay(attempt)
+      logger.warning(f"\t{description or 'Llamada'} falló ({type(e).__name__}: {e}), "
+                     f"reintento {attempt + 1}/{attempts - 1} en {delay:.1f} s")
+      time.sleep(delay)
+      continue
+
+    breaker.record_success()
+    return result
+
+async def call_with_retry_async(action: Callable[[], Awaitable], url: str, description: str = '',
+                                attempts: Optional[int] = None, retry_if: Callable = is_transient):
+  """
+  call_with_retry para corrutinas: action() devuelve la corrutina de cada 
+  intento y la espera entre intentos no bloquea el event loop
+  """
+  breaker = get_circuit_breaker(url)
+  attempts = attempts or RETRY_ATTEMPTS
+
+  for attempt in range(attempts):
+    breaker.before_call()
+    try:
+      result = await action()
+    except Exception as e:
+      if not is_transient(e):
+        breaker.record_success()
+        raise
+      breaker.record_failure()
+      if attempt == attempts - 1 or breaker.is_open or not retry_if(e):
+        raise
+      delay = backoff_delay(attempt)
+      logger.warning(f"\t{description or 'Llamada'} falló ({type(e).__name__}: {e}), "
+                     f"reintento {attempt + 1}/{attempts - 1} en {delay:.1f} s")
+      await asyncio.sleep(delay)
+      continue
+
+    breaker.record_success()
+    return result
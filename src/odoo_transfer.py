@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""
+Transferencias de documentos con Maya (Odoo) en paralelo
+
+Cada hilo del pool trabaja con su propio clon de OdooClient (ver 
+OdooClient.clone). Los proxies RPC sí se podrían compartir (el transporte de 
+odoo_transport guarda la conexión en curso por hilo), pero la sesión web de 
+las transferencias por HTTP (OdooHttpSession) tiene una única conexión y 
+estado propio: cada clon usa la misma cookie con su propia conexión del pool
+"""
+
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from odoo_client import DOWNLOAD_CHUNK_BYTES, TRANSFER_RPC
+
+logger = logging.getLogger("maya_signer")
+
+# Peticiones simultáneas por defecto
+DEFAULT_MAX_WORKERS = 4
+
+class _ThreadLocalClients:
+  """
+  Reparte un clon del cliente por hilo
+  """
+
+  def __init__(self, client):
+    self.client = client
+    self._local = threading.local()
+
+  def get(self):
+    """
+    Devuelve el cliente del hilo actual, creándolo si hace falta
+    """
+    worker_client = getattr(self._local, 'client', None)
+    if worker_client is None:
+      worker_client = self.client.clone()
+      self._local.client = worker_client
+
+    return worker_client
+
+class OdooDownloadPool:
+  """
+  Descarga los bloques de documentos de un lote con concurrencia limitada
+  """
+
+  def __init__(self, client, max_workers: int = DEFAULT_MAX_WORKERS,
+               max_chunk_bytes: int = DOWNLOAD_CHUNK_BYTES):
+    """
+    Args:
+      client: OdooClient autenticado. Se usa para los metadatos y para informar del progreso
+      max_workers: Número máximo de bloques descargándose a la vez
+      max_chunk_bytes: Tamaño máximo de cada bloque
+    """
+    self.client = client
+    self.max_workers = max(1, max_workers)
+    self.max_chunk_bytes = max_chunk_bytes
+    self._clients = _ThreadLocalClients(client)
+
+  def _download_chunk(self, chunk: List[Dict], target_dir: Optional[Path] = None) -> List[Dict]:
+    """
+    Descarga un bloque con el cliente del hilo actual
+    """
+    return self._clients.get().download_chunk(chunk, target_dir)
+
+  def download_unsigned_pdfs(self, batch_id: int, target_dir: Optional[Path] = None) -> List[Dict]:
+    """
+    Descarga los PDFs sin firmar del lote en paralelo
+
+    Args:
+      batch_id: ID del lote
+      target_dir: Si se indica, los PDFs se decodifican a ficheros de este 
+        directorio (ver OdooClient.download_chunk)
+
+    Returns:
+      Lista de documentos con 'pdf_bytes' (o 'pdf_path'), en el mismo orden que en el lote
+    """
+    logger.info(f"\tDescargando PDFs del lote {batch_id} en paralelo ({self.max_workers} hilos)...")
+
+    client = self.client
+    document_ids = client._get_batch_document_ids(batch_id)
+    pending = client._get_pending_documents(document_ids)
+    chunks = client._plan_download_chunks(pending, self.max_chunk_bytes)
+
+    logger.info(f"\t{len(pending)} documentos pendientes en {len(chunks)} bloques")
+
+    if not chunks:
+      return []
+
+    results = [None] * len(chunks)
+    downloaded = 0
+
+    with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks)),
+                            thread_name_prefix="maya_download") as executor:
+      futures = {executor.submit(self._download_chunk, chunk, target_dir): i for i, chunk in enumerate(chunks)}
+
+      try:
+        for future in as_completed(futures):
+          i = futures[future]
+          results[i] = future.result()
+
+          # el progreso se informa desde el hilo que llama, no desde los del pool
+          downloaded += len(chunks[i])
+          if client.progress_callback:
+            client.progress_callback(f'Descargando de Maya:  {downloaded}/{len(pending)} documentos')
+      except Exception:
+        for future in futures:
+          future.cancel()
+        raise
+
+    unsigned_docs = [doc for chunk_docs in results for doc in chunk_docs]
+
+    logger.info(f"\tDescargados {len(unsigned_docs)} PDFs del lote {batch_id}")
+
+    return unsigned_docs
+
+  def _stream_document(self, doc: Dict, target_dir: Path) -> bool:
+    """
+    Descarga por HTTP un documento con el cliente del hilo actual
+    """
+    return self._clients.get().stream_document(doc, target_dir)
+
+  def stream_unsigned_pdfs(self, batch_id: int, target_dir: Path) -> List[Dict]:
+    """
+    Descarga por HTTP los PDFs sin firmar del lote en paralelo, directamente 
+    a ficheros de target_dir (ver OdooClient.stream_unsigned_pdfs)
+
+    Args:
+      batch_id: ID del lote
+      target_dir: Directorio de destino
+
+    Returns:
+      Lista de documentos con 'pdf_path', en el mismo orden que en el lote
+    """
+    logger.info(f"\tDescargando PDFs del lote {batch_id} por HTTP en paralelo ({self.max_workers} hilos)...")
+
+    client = self.client
+    document_ids = client._get_batch_document_ids(batch_id)
+    pending = client._get_pending_documents(document_ids)
+
+    if not pending:
+      return []
+
+    # abro la sesión web antes de repartir, para que los hilos compartan la cookie
+    client._get_http_session()
+
+    downloaded = set()
+    with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                            thread_name_prefix="maya_download") as executor:
+      futures = {executor.submit(self._stream_document, doc, target_dir): doc for doc in pending}
+
+      try:
+        for i, future in enumerate(as_completed(futures), 1):
+          if future.result():
+            downloaded.add(futures[future]['id'])
+
+          if client.progress_callback:
+            client.progress_callback(f'Descargando de Maya:  {i}/{len(pending)} documentos')
+      except Exception:
+        for future in futures:
+          future.cancel()
+        raise
+
+    unsigned_docs = [doc for doc in pending if doc['id'] in downloaded]
+
+    logger.info(f"\tDescargados {len(unsigned_docs)} PDFs del lote {batch_id}")
+
+    return unsigned_docs
+
+class OdooUploadPool:
+  """
+  Sube los documentos firmados de un lote con concurrencia limitada
+  """
+
+  def __init__(self, client, max_workers: int = DEFAULT_MAX_WORKERS):
+    """
+    Args:
+      client: OdooClient autenticado. Se usa para validar y finalizar el lote 
+        y para informar del progreso
+      max_workers: Número máximo de documentos subiéndose a la vez
+    """
+    self.client = client
+    self.max_workers = max(1, max_workers)
+    self._clients = _ThreadLocalClients(client)
+
+  def _upload_document(self, doc: Dict, transfer: str = TRANSFER_RPC) -> bool:
+    """
+    Sube un documento con el cliente del hilo actual
+    """
+    return self._clients.get().upload_document(doc, transfer)
+
+  def upload_signed_pdfs(self, batch_id: int, signed_documents: List[Dict],
+                         transfer: str = TRANSFER_RPC,
+                         confirmed: Optional[Set[int]] = None) -> bool:
+    """
+    Sube los PDFs firmados en paralelo y finaliza el lote cuando 
+    han terminado todas las subidas
+
+    Args:
+      batch_id: ID del lote
+      signed_documents: Documentos firmados (ver OdooClient.upload_signed_pdfs)
+      transfer: 'http' o 'rpc', para los documentos en disco
+      confirmed: Si se pasa, se le añaden los document_id subidos
+
+    Returns:
+      bool: True si todos se subieron correctamente
+    """
+    client = self.client
+    client.validate_batch_token(batch_id)
+
+    success_count, failed_count = self.upload_documents(signed_documents, transfer, confirmed)
+
+    client.finalize_batch(batch_id, success_count, failed_count)
+
+    logger.info(f"\tSubidos {success_count}/{len(signed_documents)} PDFs")
+
+    return failed_count == 0
+
+  def upload_documents(self, signed_documents: List[Dict], transfer: str = TRANSFER_RPC,
+                       confirmed: Optional[Set[int]] = None) -> Tuple[int, int]:
+    """
+    Sube los PDFs firmados en paralelo, sin validar ni finalizar el lote
+
+    Args:
+      confirmed: Si se pasa, se le añaden los document_id subidos
+
+    Returns:
+      Documentos subidos y fallidos, cuando han terminado todas las subidas
+    """
+    logger.info(f"\tSubiendo {len(signed_documents)} PDFs firmados "
+                f"en paralelo ({self.max_workers} hilos)...")
+
+    client = self.client
+    success_count = 0
+    failed_count = 0
+
+    if signed_documents:
+      with ThreadPoolExecutor(max_workers=min(self.max_workers, len(signed_documents)),
+                              thread_name_prefix="maya_upload") as executor:
+        futures = {executor.submit(self._upload_document, doc, transfer): doc for doc in signed_documents}
+
+        for future in as_completed(futures):
+          try:
+            if future.result():
+              success_count += 1
+              if confirmed is not None:
+                confirmed.add(futures[future]['document_id'])
+            else:
+              failed_count += 1
+          except Exception as e:
+            logger.error(f"\tError procesando documento {futures[future].get('document_id')}: {str(e)}")
+            failed_count += 1
+
+          if client.progress_callback:
+            client.progress_callback(
+              f'Subiendo a Maya:  {success_count + failed_count}/{len(signed_documents)} documentos')
+
+    # al salir del with no queda ninguna subida en curso
+    return success_count, failed_count
@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+
+"""
+Capa de transporte de OdooClient
+
+Cada protocolo ofrece un proxy por servicio de Odoo (common, object) con la 
+misma interfaz que xmlrpc.client.ServerProxy: proxy.execute_kw(...), 
+proxy.authenticate(...), etc. Los errores del servidor se lanzan siempre como 
+xmlrpc.client.Fault, sea cual sea el protocolo
+
+Todas las conexiones salen de un pool keep-alive por servidor, compartido por 
+todos los clientes e hilos del proceso: los lotes sucesivos (y la prueba de 
+conexión del diálogo de credenciales) no repiten el handshake TCP ni el TLS
+"""
+
+import logging
+import json
+import itertools
+import ssl
+import time
+import threading
+import zlib
+import http.client
+import xmlrpc.client
+
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("maya_signer")
+
+# Protocolos disponibles
+PROTOCOL_XMLRPC = 'xmlrpc'
+PROTOCOL_JSONRPC = 'jsonrpc'
+PROTOCOLS = (PROTOCOL_XMLRPC, PROTOCOL_JSONRPC)
+
+# Conexiones ociosas que se guardan por servidor
+POOL_MAX_IDLE = 8
+# Segundos que una conexión puede estar ociosa antes de descartarla 
+# (por debajo del keepalive_timeout por defecto de nginx, 75 s)
+POOL_IDLE_TIMEOUT = 60
+
+# Errores de una conexión keep-alive que el servidor ya había cerrado
+DISCONNECT_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+# Tamaño mínimo (bytes) de las peticiones que se comprimen con gzip, si se activa.
+# Por debajo la cabecera gzip y el tiempo de CPU no compensan
+GZIP_THRESHOLD = 1024
+
+def _log_compression(direction: str, path: str, size: int, compressed: int):
+  ratio = compressed / size if size else 1.0
+  logger.debug(f"gzip {direction} {path}: {size} -> {compressed} bytes ({ratio:.0%})")
+
+def gzip_request_body(body: bytes, threshold: Optional[int], path: str) -> Optional[bytes]:
+  """
+  Comprime con gzip el cuerpo de una petición
+
+  Returns:
+    El cuerpo comprimido, o None si la compresión está desactivada 
+    (threshold None) o el cuerpo no supera el umbral
+  """
+  if threshold is None or not isinstance(body, bytes) or len(body) <= threshold:
+    return None
+
+  compressed = xmlrpc.client.gzip_encode(body)
+  _log_compression('petición', path, len(body), len(compressed))
+  return compressed
+
+class GzipResponseReader:
+  """
+  Lee descomprimido el cuerpo gzip de una respuesta, por trozos
+
+  A diferencia de xmlrpc.client.GzipDecodedResponse no carga antes la 
+  respuesta entera en memoria. Al cerrarlo se registra la compresión
+  """
+
+  def __init__(self, response: http.client.HTTPResponse, path: str = ''):
+    self._response = response
+    self._path = path
+    self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    # bytes recibidos y bytes descomprimidos
+    self.wire_size = 0
+    self.size = 0
+
+  def read(self, size: int = -1) -> bytes:
+    if size is None or size < 0:
+      return b''.join(iter(lambda: self.read(64 * 1024), b''))
+
+    while True:
+      data = self._decompressor.unconsumed_tail
+      if not data:
+        data = self._response.read(size)
+        self.wire_size += len(data)
+        if not data:
+          if not self._decompressor.eof:
+            raise xmlrpc.client.ResponseError("respuesta gzip incompleta")
+          return b''
+      decoded = self._decompressor.decompress(data, size)
+      if decoded:
+        self.size += len(decoded)
+        return decoded
+
+  def close(self):
+    _log_compression('respuesta', self._path, self.size, self.wire_size)
+
+class PooledHTTPSConnection(http.client.HTTPSConnection):
+  """
+  Conexión https que reanuda la sesión TLS del pool en el handshake
+  """
+
+  def __init__(self, host: str, pool: 'ConnectionPool', **kwargs):
+    super().__init__(host, context=pool.ssl_context, **kwargs)
+    self._pool = pool
+
+  def connect(self):
+    # mismo connect() de HTTPSConnection, pasando la sesión TLS guardada
+    http.client.HTTPConnection.connect(self)
+    server_hostname = self._tunnel_host or self.host
+    self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname,
+                                          session=self._pool.tls_session)
+    self._pool._count_handshake(self.sock.session_reused)
+
+class ConnectionPool:
+  """
+  Pool de conexiones keep-alive con un servidor
+
+  Es seguro entre hilos: cada petición toma una conexión con acquire() y la 
+  devuelve con release() cuando ha leído la respuesta completa, o con 
+  discard() si la conexión ha quedado inservible
+  """
+
+  def __init__(self, scheme: str, host: str, max_idle: int = POOL_MAX_IDLE,
+               idle_timeout: float = POOL_IDLE_TIMEOUT):
+    """
+    Args:
+      scheme: 'http' o 'https'
+      host: host[:puerto] del servidor
+      max_idle: Conexiones ociosas que se guardan como máximo
+      idle_timeout: Segundos que se guarda una conexión ociosa
+    """
+    self.scheme = scheme
+    self.host = host
+    self.max_idle = max_idle
+    self.idle_timeout = idle_timeout
+
+    # un único contexto, para que el servidor acepte la sesión TLS guardada
+    self.ssl_context = ssl.create_default_context() if scheme == 'https' else None
+    self.tls_session: Optional[ssl.SSLSession] = None
+
+    self._idle: List[Tuple[http.client.HTTPConnection, float]] = []
+    self._lock = threading.Lock()
+    self._stats = {
+      'created': 0,         # conexiones abiertas
+      'reused': 0,          # peticiones servidas con una conexión ya abierta
+      'discarded': 0,       # conexiones cerradas por error o por exceso
+      'expired': 0,         # conexiones cerradas por estar ociosas demasiado tiempo
+      'tls_handshakes': 0,  # handshakes TLS completos
+      'tls_resumed': 0,     # handshakes TLS que reanudaron la sesión
+      'in_use': 0,
+    }
+
+  def _new_connection(self, timeout: Optional[float]) -> http.client.HTTPConnection:
+    if self.scheme == 'https':
+      return PooledHTTPSConnection(self.host, self, timeout=timeout)
+    return http.client.HTTPConnection(self.host, timeout=timeout)
+
+  def _count_handshake(self, resumed: bool):
+    with self._lock:
+      self._stats['tls_resumed' if resumed else 'tls_handshakes'] += 1
+
+  def acquire(self, timeout: Optional[float] = None) -> http.client.HTTPConnection:
+    """
+    Toma una conexión ociosa (la más reciente) o abre una nueva
+
+    Args:
+      timeout: Timeout de las operaciones de la conexión, en segundos
+    """
+    now = time.monotonic()
+    expired = []
+    connection = None
+
+    with self._lock:
+      while self._idle:
+        candidate, released_at = self._idle.pop()
+        if now - released_at > self.idle_timeout:
+          expired.append(candidate)
+          continue
+        connection = candidate
+        self._stats['reused'] += 1
+        break
+      else:
+        self._stats['created'] += 1
+      self._stats['expired'] += len(expired)
+      self._stats['in_use'] += 1
+
+    for candidate in expired:
+      candidate.close()
+
+    if connection is None:
+      return self._new_connection(timeout)
+
+    connection.timeout = timeout
+    if connection.sock is not None:
+      connection.sock.settimeout(timeout)
+    return connection
+
+  def release(self, connection: http.client.HTTPConnection):
+    """
+    Devuelve al pool una conexión con la respuesta ya leída
+    """
+    sock = connection.sock
+    if isinstance(sock, ssl.SSLSocket) and sock.session is not None:
+      # con TLS 1.3 el ticket llega después del handshake, con la primera respuesta
+      self.tls_session = sock.session
+
+    with self._lock:
+      self._stats['in_use'] -= 1
+      if sock is None:
+        # el servidor respondió con "Connection: close"
+        return
+      if len(self._idle) < self.max_idle:
+        self._idle.append((connection, time.monotonic()))
+        return
+      self._stats['discarded'] += 1
+
+    connection.close()
+
+  def discard(self, connection: http.client.HTTPConnection):
+    """
+    Cierra una conexión que ha quedado inservible
+    """
+    connection.close()
+    with self._lock:
+      self._stats['in_use'] -= 1
+      self._stats['discarded'] += 1
+
+  def close(self):
+    """
+    Cierra las conexiones ociosas
+    """
+    with self._lock:
+      idle, self._idle = self._idle, []
+    for connection, _ in idle:
+      connection.close()
+
+  def stats(self) -> Dict[str, int]:
+    """
+    Estadísticas del pool
+    """
+    with self._lock:
+      return dict(self._stats, idle=len(self._idle))
+
+# Pools por servidor: (esquema, host) -> ConnectionPool
+_POOLS: Dict[Tuple[str, str], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_connection_pool(url: str) -> ConnectionPool:
+  """
+  Pool de conexiones del servidor de una URL, compartido en todo el proceso
+  """
+  parts = urlsplit(url)
+  key = (parts.scheme, parts.netloc.rpartition('@')[2])
+  with _POOLS_LOCK:
+    pool = _POOLS.get(key)
+    if pool is None:
+      pool = _POOLS[key] = ConnectionPool(*key)
+    return pool
+
+def connection_pool_stats() -> Dict[str, Dict[str, int]]:
+  """
+  Estadísticas de todos los pools, por URL del servidor
+  """
+  with _POOLS_LOCK:
+    pools = list(_POOLS.values())
+  return {f"{pool.scheme}://{pool.host}": pool.stats() for pool in pools}
+
+def close_connection_pools():
+  """
+  Cierra las conexiones ociosas de todos los pools
+  """
+  with _POOLS_LOCK:
+    pools = list(_POOLS.values())
+  for pool in pools:
+    pool.close()
+
+class _PooledTransportMixin:
+  """
+  Transporte XML-RPC que toma una conexión del pool para cada petición
+
+  La conexión en curso se guarda por hilo, así que un mismo ServerProxy se 
+  puede usar desde varios hilos a la vez
+
+  Las respuestas gzip se aceptan siempre. Las peticiones se comprimen sólo 
+  con gzip_threshold: Odoo no descomprime las peticiones por sí mismo, 
+  hace falta que lo haga el proxy inverso del servidor
+  """
+  scheme = 'http'
+
+  def __init__(self, timeout=30, gzip_threshold: Optional[int] = None):
+    self._local = threading.local()
+    super().__init__()
+    self.timeout = timeout
+    self.gzip_threshold = gzip_threshold
+
+  @property
+  def _connection(self):
+    return getattr(self._local, 'connection', (None, None))
+
+  @_connection.setter
+  def _connection(self, value):
+    self._local.connection = value
+
+  def make_connection(self, host):
+    connection = self._connection[1]
+    if connection is None:
+      chost, self._extra_headers, x509 = self.get_host_info(host)
+      pool = get_connection_pool(f"{self.scheme}://{chost}")
+      connection = pool.acquire(self.timeout)
+      self._connection = host, connection
+    return connection
+
+  def _release_connection(self, reusable: bool):
+    host, connection = self._connection
+    if connection is None:
+      return
+    self._connection = None, None
+    pool = get_connection_pool(f"{self.scheme}://{self.get_host_info(host)[0]}")
+    if reusable:
+      pool.release(connection)
+    else:
+      pool.discard(connection)
+
+  def close(self):
+    self._release_connection(reusable=False)
+
+  def send_content(self, connection, request_body):
+    # igual que Transport.send_content, con gzip_threshold en lugar de 
+    # encode_threshold (los cuerpos que no son bytes, en streaming, van sin comprimir)
+    compressed = gzip_request_body(request_body, self.gzip_threshold, self._local.handler)
+    if compressed is not None:
+      connection.putheader('Content-Encoding', 'gzip')
+      request_body = compressed
+
+    connection.putheader('Content-Type', 'text/xml')
+    connection.putheader('Content-Length', str(len(request_body)))
+    connection.endheaders(request_body)
+
+  def _response_stream(self, response):
+    """
+    Cuerpo de la respuesta, descomprimido si llega con gzip
+    """
+    if response.getheader('Content-Encoding', '') == 'gzip':
+      return GzipResponseReader(response, self._local.handler)
+    return response
+
+  def parse_response(self, response):
+    stream = self._response_stream(response)
+    parser, unmarshaller = self.getparser()
+
+    while True:
+      data = stream.read(1024)
+      if not data:
+        break
+      if self.verbose:
+        print("body:", repr(data))
+      parser.feed(data)
+
+    if stream is not response:
+      stream.close()
+    parser.close()
+    return unmarshaller.close()
+
+  def single_request(self, host, handler, request_body, verbose=False):
+    self._local.handler = handler
+    try:
+      result = super().single_request(host, handler, request_body, verbose)
+    except xmlrpc.client.Fault:
+      # el Fault llega con la respuesta completa: la conexión sigue sirviendo
+      self._release_connection(reusable=True)
+      raise
+    except Exception:
+      self._release_connection(reusable=False)
+      raise
+    self._release_connection(reusable=True)
+    return result
+
+class TimeoutTransport(_PooledTransportMixin, xmlrpc.client.Transport):
+  pass
+
+class TimeoutSafeTransport(_PooledTransportMixin, xmlrpc.client.SafeTransport):
+  """
+  TimeoutTransport para servidores https
+  """
+  scheme = 'https'
+
+def encode_jsonrpc_call(service: str, method: str, args: tuple, request_id: int) -> bytes:
+  """
+  Cuerpo de la petición /jsonrpc de una llamada a un método de un servicio
+  """
+  return json.dumps({
+    'jsonrpc': '2.0',
+    'method': 'call',
+    'params': {'service': service, 'method': method, 'args': list(args)},
+    'id': request_id,
+  }).encode('utf-8')
+
+def decode_jsonrpc_reply(data: bytes):
+  """
+  Resultado de una respuesta /jsonrpc
+
+  Raises:
+    xmlrpc.client.Fault: Si la respuesta es un error, igual que con XML-RPC
+  """
+  reply = json.loads(data)
+
+  if reply.get('error'):
+    error = reply['error']
+    details = error.get('data') or {}
+    raise xmlrpc.client.Fault(error.get('code', 1), details.get('message') or error.get('message', ''))
+
+  return reply.get('result')
+
+class JsonRpcProxy:
+  """
+  Proxy de un servicio de Odoo a través del endpoint /jsonrpc
+
+  El base64 de los PDFs viaja como una cadena JSON normal, que se serializa 
+  mucho más rápido que con xmlrpc.client (y que con el marshaller de Odoo)
+  """
+
+  def __init__(self, url: str, service: str, timeout: int = 60,
+               gzip_threshold: Optional[int] = None):
+    """
+    Args:
+      url: URL base de Odoo
+      service: Servicio de Odoo ('common', 'object', 'db')
+      timeout: Timeout de cada petición, en segundos
+      gzip_threshold: Tamaño a partir del que se comprimen las peticiones 
+        (None = sin comprimir, ver _PooledTransportMixin)
+    """
+    parts = urlsplit(url)
+    self._pool = get_connection_pool(url)
+    self._host = parts.netloc
+    self._path = f"{parts.path.rstrip('/')}/jsonrpc"
+    self._service = service
+    self._timeout = timeout
+    self._gzip_threshold = gzip_threshold
+    self._ids = itertools.count(1)
+
+  def _request(self, body: bytes) -> bytes:
+    headers = {
+      'Content-Type': 'application/json',
+      'Accept': 'application/json',
+      'Accept-Encoding': 'gzip',
+    }
+    compressed = gzip_request_body(body, self._gzip_threshold, self._path)
+    if compressed is not None:
+      headers['Content-Encoding'] = 'gzip'
+      body = compressed
+
+    # Si la conexión keep-alive la cerró el servidor, se reintenta una vez con una nueva
+    for attempt in range(2):
+      connection = self._pool.acquire(self._timeout)
+      try:
+        connection.request('POST', self._path, body=body, headers=headers)
+        response = connection.getresponse()
+        if response.getheader('Content-Encoding', '') == 'gzip':
+          stream = GzipResponseReader(response, self._path)
+          data = stream.read()
+          stream.close()
+        else:
+          data = response.read()
+        break
+      except DISCONNECT_ERRORS:
+        self._pool.discard(connection)
+        if attempt:
+          raise
+      except Exception:
+        self._pool.discard(connection)
+        raise
+
+    self._pool.release(connection)
+
+    if response.status != 200:
+      raise xmlrpc.client.ProtocolError(
+        f"{self._host}{self._path}", response.status, response.reason, dict(response.getheaders()))
+
+    return data
+
+  def call(self, method: str, *args):
+    """
+    Llama a un método del servicio
+    """
+    body = encode_jsonrpc_call(self._service, method, args, next(self._ids))
+    return decode_jsonrpc_reply(self._request(body))
+
+  def __getattr__(self, name: str):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return lambda *args: self.call(name, *args)
+
+def make_server_proxy(url: str, service: str, protocol: str = PROTOCOL_XMLRPC, timeout: int = 60,
+                      gzip_threshold: Optional[int] = None):
+  """
+  Crea el proxy de un servicio de Odoo con el protocolo indicado
+
+  Args:
+    url: URL base de Odoo
+    service: Servicio de Odoo ('common', 'object')
+    protocol: 'xmlrpc' o 'jsonrpc'
+    timeout: Timeout de cada petición, en segundos
+    gzip_threshold: Tamaño a partir del que se comprimen las peticiones 
+      (None = sin comprimir)
+
+  Returns:
+    Proxy con la interfaz de xmlrpc.client.ServerProxy
+  """
+  if protocol == PROTOCOL_JSONRPC:
+    return JsonRpcProxy(url, service, timeout=timeout, gzip_threshold=gzip_threshold)
+
+  if protocol != PROTOCOL_XMLRPC:
+    raise ValueError(f"Protocolo desconocido: {protocol}. Disponibles: {', '.join(PROTOCOLS)}")
+
+  if url.startswith('https://'):
+    transport = TimeoutSafeTransport(timeout=timeout, gzip_threshold=gzip_threshold)
+  else:
+    transport = TimeoutTransport(timeout=timeout, gzip_threshold=gzip_threshold)
+
+  return xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/{service}', transport=transport, allow_none=True)
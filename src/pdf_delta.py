@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+Subida de los PDFs firmados como delta del original
+
+pyHanko firma con IncrementalPdfFileWriter: el PDF firmado son los bytes del
+original tal cual más una actualización incremental añadida al final (la
+firma, su campo y la nueva tabla xref), de unos pocos KB. El servidor ya
+tiene el original, así que basta con subir esa cola y el SHA-256 del
+original: el servidor comprueba que su copia es la misma, añade la cola y
+verifica el SHA-256 del PDF firmado reconstruido
+"""
+
+import hashlib
+
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+# Tamaño de los trozos leídos de disco
+READ_CHUNK_SIZE = 64 * 1024
+
+class PdfDelta(NamedTuple):
+  """
+  Diferencia entre un PDF firmado y su original
+  """
+  original_size: int
+  original_sha256: str
+  signed_sha256: str
+  tail: bytes
+
+def incremental_delta(original_path: Path, signed_path: Path,
+                      chunk_size: int = READ_CHUNK_SIZE) -> Optional[PdfDelta]:
+  """
+  Calcula la cola que el firmado añade al original, leyendo ambos por trozos
+
+  Returns:
+    El delta, o None si el firmado no empieza por el original (no es una
+    actualización incremental)
+  """
+  original_hash = hashlib.sha256()
+  signed_hash = hashlib.sha256()
+  original_size = 0
+
+  with open(original_path, 'rb') as original, open(signed_path, 'rb') as signed:
+    while True:
+      chunk = original.read(chunk_size)
+      if not chunk:
+        break
+      if signed.read(len(chunk)) != chunk:
+        return None
+      original_hash.update(chunk)
+      signed_hash.update(chunk)
+      original_size += len(chunk)
+
+    tail = signed.read()
+
+  if not tail:
+    return None
+
+  signed_hash.update(tail)
+  return PdfDelta(original_size, original_hash.hexdigest(), signed_hash.hexdigest(), tail)
@@ -9,12 +9,121 @@ Comunicación realizadavía archivos JSON
 """
 
 import sys
+import base64
 import json
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 import traceback
 
+# qué hace el worker (input.json 'mode'): firmar los PDFs completos, devolver 
+# el certificado de firma o firmar los resúmenes preparados por el servidor
+MODE_PDF = 'pdf'
+MODE_CERTIFICATE = 'certificate'
+MODE_DIGEST = 'digest'
+
+# PDFs que se preparan y firman juntos (ver PyHankoSigner.sign_pdf_batch); 
+# limita la memoria, porque todo el grupo está en memoria a la vez
+SIGN_BATCH_SIZE = 50
+
+# Firma con certificado P12 en varios procesos: uno por CPU, a partir de 
+# PARALLEL_MIN_DOCUMENTS documentos (arrancar los procesos cuesta)
+P12_PROCESSES = os.cpu_count() or 1
+PARALLEL_MIN_DOCUMENTS = 20
+
+# firmante de cada proceso del pool (ver _init_process_signer)
+_process_signer = None
+
+def sign_pdf_group(work_dir: Path, signer, documents: List[Dict],
+                   progress_callback: Optional[Callable[[int, int], None]] = None,
+                   max_workers: Optional[int] = None) -> Tuple[List[Dict], int]:
+  """
+  Firma un grupo de PDFs del directorio de trabajo con PyHankoSigner.sign_pdf_batch
+
+  Args:
+    max_workers: Hilos de sign_pdf_batch (por defecto los suyos)
+
+  Returns:
+    Resultados por documento y número de fallos
+  """
+  logger = logging.getLogger("sign_worker")
+  results = []
+  failed_count = 0
+
+  group = []
+  for doc in documents:
+    pdf_path = work_dir / f"unsigned_{doc['document_id']}.pdf"
+
+    if not pdf_path.exists():
+      logger.error(f"Archivo no encontrado: {pdf_path}")
+      failed_count += 1
+      continue
+
+    with open(pdf_path, 'rb') as f:
+      group.append((doc, f.read()))
+
+  if not group:
+    return results, failed_count
+
+  # Firmo
+  options = {'max_workers': max_workers} if max_workers else {}
+  signed_pdfs = signer.sign_pdf_batch(
+    [pdf_bytes for _, pdf_bytes in group],
+    reason="Firmado electrónicamente desde Maya Signer",
+    location="España",
+    progress_callback=progress_callback,
+    **options
+  )
+
+  for (doc, _), signed_pdf in zip(group, signed_pdfs):
+    doc_id = doc['document_id']
+    filename = doc['filename']
+
+    if isinstance(signed_pdf, Exception):
+      logger.error(f"Error firmando {filename}: {signed_pdf}")
+      failed_count += 1
+
+      results.append({
+        'document_id': doc_id,
+        'original_filename': filename,
+        'success': False,
+        'error': str(signed_pdf)
+      })
+      continue
+
+    signed_filename = f"signed_{doc_id}.pdf"
+    signed_path = work_dir / signed_filename
+
+    with open(signed_path, 'wb') as f:
+      f.write(signed_pdf)
+
+    results.append({
+      'document_id': doc_id,
+      'res_model': doc.get('res_model', ''),
+      'res_id': doc.get('res_id', ''),
+      'signed_filename': signed_filename,
+      'original_filename': filename,
+      'success': True
+    })
+
+    logger.info(f"Firmado: {filename}")
+
+  return results, failed_count
+
+def _init_process_signer(cert_path: str, cert_password: Optional[str]):
+  """
+  Inicializa un proceso del pool: carga el certificado una sola vez
+  """
+  global _process_signer
+  from hanko_signer import PyHankoSigner
+  _process_signer = PyHankoSigner(cert_path=cert_path, cert_password=cert_password)
+
+def _sign_group_in_process(work_dir: str, documents: List[Dict]) -> Tuple[List[Dict], int]:
+  # el reparto ya lo hacen los procesos: sin hilos para preparar los PDFs
+  return sign_pdf_group(Path(work_dir), _process_signer, documents, max_workers=1)
+
 # Configurar logging ANTES de importar cualquier otra cosa
 def setup_worker_logging(work_dir: Path):
   """
@@ -89,6 +198,133 @@ class SignatureWorker:
       self.logger.error(f"Error guardando output: {e}")
       raise
     
+  def sign_pdfs(self, signer, documents: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    Firma los PDFs completos (unsigned_<id>.pdf -> signed_<id>.pdf), por 
+    grupos de SIGN_BATCH_SIZE con PyHankoSigner.sign_pdf_batch: la tarjeta 
+    firma un resumen tras otro sin esperar a que se prepare el siguiente PDF
+
+    Returns:
+      Resultados por documento y número de fallos
+    """
+    results = []
+    failed_count = 0
+
+    for start in range(0, len(documents), SIGN_BATCH_SIZE):
+      group = documents[start:start + SIGN_BATCH_SIZE]
+      self.logger.info(f"Firmando {start + 1}-{start + len(group)}/{len(documents)}")
+
+      def progress(signed, total):
+        self.update_status(
+          'working',
+          progress=start + signed,
+          total=len(documents),
+          message=f"Firmando {signed}/{total} del grupo..."
+        )
+
+      group_results, group_failed = sign_pdf_group(self.work_dir, signer, group, progress)
+      results.extend(group_results)
+      failed_count += group_failed
+
+    return results, failed_count
+
+  def sign_pdfs_parallel(self, cert_path: str, cert_password: Optional[str],
+                         documents: List[Dict], processes: int) -> Tuple[List[Dict], int]:
+    """
+    Firma los PDFs completos con un certificado P12 en varios procesos: la 
+    clave está en memoria y no hay tarjeta que haga de cuello de botella. 
+    Cada proceso carga el certificado una vez y firma los grupos que le 
+    tocan; los resultados se juntan en el orden de los documentos
+
+    Returns:
+      Resultados por documento y número de fallos
+    """
+    # grupos pequeños para repartir bien el trabajo entre los procesos
+    size = max(1, min(SIGN_BATCH_SIZE, -(-len(documents) // (processes * 4))))
+    groups = [documents[start:start + size] for start in range(0, len(documents), size)]
+
+    self.logger.info(f"Firmando en {processes} procesos ({len(groups)} grupos de hasta {size})")
+
+    group_results = [None] * len(groups)
+    failed_count = 0
+    done = 0
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_process_signer,
+                             initargs=(cert_path, cert_password)) as executor:
+      futures = {executor.submit(_sign_group_in_process, str(self.work_dir), group): i
+                 for i, group in enumerate(groups)}
+
+      for future in as_completed(futures):
+        i = futures[future]
+        try:
+          group_results[i], group_failed = future.result()
+        except Exception as e:
+          # el proceso no pudo firmar el grupo (p.e. ha muerto)
+          self.logger.error(f"Error firmando el grupo {i + 1}: {e}")
+          group_results[i] = [{
+            'document_id': doc.get('document_id'),
+            'original_filename': doc.get('filename'),
+            'success': False,
+            'error': str(e)
+          } for doc in groups[i]]
+          group_failed = len(groups[i])
+
+        failed_count += group_failed
+        done += len(groups[i])
+        self.update_status(
+          'working',
+          progress=done,
+          total=len(documents),
+          message=f"Firmados {done}/{len(documents)} documentos..."
+        )
+
+    return [result for results in group_results for result in results], failed_count
+
+  def sign_digests(self, signer, documents: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    Firma por resumen: cada documento trae los atributos firmados que ha 
+    preparado el servidor ('signed_attrs', en base64) y el algoritmo del 
+    resumen ('md_algorithm'). Sólo se devuelve el CMS
+
+    Returns:
+      Resultados por documento ('signature_cms' en base64) y número de fallos
+    """
+    results = []
+    failed_count = 0
+
+    for i, doc in enumerate(documents, 1):
+      doc_id = doc.get('document_id')
+      try:
+        self.update_status(
+          'working',
+          progress=i,
+          total=len(documents),
+          message=f"Firmando documento {doc_id}..."
+        )
+
+        signature = signer.sign_signed_attributes(
+          base64.b64decode(doc['signed_attrs']),
+          md_algorithm=doc.get('md_algorithm', 'sha256')
+        )
+
+        results.append({
+          'document_id': doc_id,
+          'signature_cms': base64.b64encode(signature).decode('ascii'),
+          'success': True
+        })
+
+      except Exception as e:
+        self.logger.error(f"Error firmando el resumen del documento {doc_id}: {e}")
+        failed_count += 1
+
+        results.append({
+          'document_id': doc_id,
+          'success': False,
+          'error': str(e)
+        })
+
+    return results, failed_count
+
   def sign_documents(self):
     """
     Proceso principal de firma
@@ -115,8 +351,9 @@ class SignatureWorker:
       cert_password = input_data.get('cert_password')
       use_dnie = input_data.get('use_dnie', False)
       documents = input_data.get('documents', [])
+      mode = input_data.get('mode', MODE_PDF)
         
-      if not documents:
+      if not documents and mode != MODE_CERTIFICATE:
         raise ValueError("No hay documentos para firmar")
         
       self.logger.info(f"Documentos a firmar: {len(documents)}")
@@ -154,66 +391,25 @@ class SignatureWorker:
         return 1
         
         
-      results = []
-      failed_count = 0
-    
-      for i, doc in enumerate(documents, 1):
+      if mode == MODE_CERTIFICATE:
         try:
-          doc_id = doc['document_id']
-          filename = doc['filename']
-          pdf_path = self.work_dir / f"unsigned_{doc_id}.pdf"
-            
-          self.logger.info(f"Firmando {i}/{len(documents)}: {filename}")
-          self.update_status(
-            'working', 
-            progress=i, 
-            total=len(documents),
-            message=f"Firmando {filename}..."
-          )
-            
-          if not pdf_path.exists():
-            self.logger.error(f"Archivo no encontrado: {pdf_path}")
-            failed_count += 1
-            continue
-            
-          with open(pdf_path, 'rb') as f:
-            pdf_bytes = f.read()
-            
-          # Firmo
-          signed_pdf = signer.sign_pdf(
-            pdf_bytes,
-            reason="Firmado electrónicamente desde Maya Signer",
-            location="España"
-          )   
-            
-          signed_filename = f"signed_{doc_id}.pdf"
-          signed_path = self.work_dir / signed_filename
-        
-          with open(signed_path, 'wb') as f:
-            f.write(signed_pdf)
-        
-          results.append({
-            'document_id': doc_id,
-            'res_model': doc.get('res_model', ''),
-            'res_id': doc.get('res_id', ''),
-            'signed_filename': signed_filename,
-            'original_filename': filename,
-            'success': True
-          })
-        
-          self.logger.info(f"Firmado: {filename}")
-            
-        except Exception as e:
-          self.logger.error(f"Error firmando {filename}: {e}")
-          failed_count += 1
-            
-          results.append({
-            'document_id': doc.get('document_id'),
-            'original_filename': doc.get('filename'),
-            'success': False,
-            'error': str(e)
-          })
-        
+          certificate = signer.signing_certificate()
+        finally:
+          signer.close()
+        self.save_output([{'certificate': base64.b64encode(certificate).decode('ascii'), 'success': True}])
+        self.update_status('success', message="Certificado de firma leído")
+        return 0
+
+      if mode == MODE_DIGEST:
+        results, failed_count = self.sign_digests(signer, documents)
+      elif not use_dnie and P12_PROCESSES > 1 and len(documents) >= PARALLEL_MIN_DOCUMENTS:
+        # el firmante del proceso principal sólo ha servido para validar el certificado
+        signer.close()
+        results, failed_count = self.sign_pdfs_parallel(cert_path, cert_password, documents,
+                                                        min(P12_PROCESSES, len(documents)))
+      else:
+        results, failed_count = self.sign_pdfs(signer, documents)
+
       try:
         self.logger.info("Cerrando firmador...")
         signer.close()
@@ -288,4 +484,7 @@ def main():
 
 
 if __name__ == "__main__":
+  # el ejecutable congelado también arranca los procesos de la firma con P12
+  import multiprocessing
+  multiprocessing.freeze_support()
   sys.exit(main())
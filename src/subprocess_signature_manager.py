@@ -5,6 +5,7 @@
 Gestor de firma mediante subprocesos externos al servidor
 """
 
+import base64
 import logging
 import subprocess
 import json
@@ -12,9 +13,11 @@ import sys
 import time
 import shutil
 from pathlib import Path
-from typing import Dict, List, Optional, Callable
+from typing import Dict, List, Optional, Callable, Tuple
 from tempfile import mkdtemp
 
+from signer_worker import MODE_CERTIFICATE, MODE_DIGEST
+
 logger = logging.getLogger("maya_signer")
 
 class SubprocessSignatureManager:
@@ -49,20 +52,35 @@ class SubprocessSignatureManager:
     self.work_dir = None
     self.process = None
     
-  def prepare_work_directory(self, documents: List[Dict]) -> Path:
+  def create_work_directory(self) -> Path:
+    """
+    Crea el directorio temporal de trabajo vacío. Permite descargar los PDFs 
+    directamente en él antes de llamar a sign_documents
+
+    Returns:
+      Path al directorio de trabajo
+    """
+    # Creo el directorio temporal donde almacenaré los ficheros a firmar
+    work_dir = Path(mkdtemp(prefix="maya_signer_"))
+        
+    logger.info(f"\tDirectorio de trabajo: {work_dir}")
+
+    return work_dir
+
+  def prepare_work_directory(self, documents: List[Dict], work_dir: Optional[Path] = None) -> Path:
     """
     Prepara directorio temporal con los documentos
         
     Args:
-        documents: Lista con 'document_id', 'pdf_bytes', 'filename'
+        documents: Lista con 'document_id', 'pdf_bytes', 'filename'. 
+                   En lugar de 'pdf_bytes' puede venir 'pdf_path' con el PDF ya en disco
+        work_dir: Directorio de trabajo ya creado (ver create_work_directory)
             
     Returns:
         Path al directorio de trabajo
     """
-    # Creo el directorio temporal donde almacenaré los ficheros a firmar
-    work_dir = Path(mkdtemp(prefix="maya_signer_"))
-        
-    logger.info(f"\tDirectorio de trabajo: {work_dir}")
+    if work_dir is None:
+      work_dir = self.create_work_directory()
         
     try:
       # Guardo los PDFs sin firmar
@@ -70,9 +88,14 @@ class SubprocessSignatureManager:
         doc_id = doc['id']
               
         pdf_path = work_dir / f"unsigned_{doc_id}.pdf"
-                
-        with open(pdf_path, 'wb') as f:
-          f.write(doc['pdf_bytes'])
+
+        if doc.get('pdf_path'):
+          # ya descargado a disco: sólo lo muevo si no está en su sitio
+          if Path(doc['pdf_path']) != pdf_path:
+            shutil.move(doc['pdf_path'], pdf_path)
+        else:
+          with open(pdf_path, 'wb') as f:
+            f.write(doc['pdf_bytes'])
         
         logger.debug(f"\tGuardado: {pdf_path.name}")
             
@@ -224,12 +247,15 @@ class SubprocessSignatureManager:
         # espero un poco antes de la siguiente comprobación
         time.sleep(0.5)
     
-  def read_results(self, work_dir: Path) -> List[Dict]:
+  def read_results(self, work_dir: Path, load_signed: bool = True) -> List[Dict]:
     """
     Lee los resultados del worker
     
     Args:
       work_dir: Directorio de trabajo
+      load_signed: Si False, no se cargan los PDFs firmados en memoria y
+        cada documento lleva 'signed_pdf_path' en lugar de 'signed_pdf_bytes' 
+        (y 'original_pdf_path' con el PDF sin firmar)
         
     Returns:
       Lista de documentos firmados
@@ -264,16 +290,24 @@ class SubprocessSignatureManager:
           logger.error(f"\tPDF firmado no encontrado: {signed_path}")
           continue
         
-        with open(signed_path, 'rb') as f:
-          signed_pdf_bytes = f.read()
-        
-        signed_documents.append({
+        signed_document = {
           'document_id': result['document_id'],
           'res_model': result.get('res_model', ''),
           'res_id': result.get('res_id', ''), # documento vinculado
-          'signed_pdf_bytes': signed_pdf_bytes,
           'signed_filename': result['original_filename'].replace('.pdf', '_firmado.pdf')
-        })
+        }
+
+        if load_signed:
+          with open(signed_path, 'rb') as f:
+            signed_document['signed_pdf_bytes'] = f.read()
+        else:
+          signed_document['signed_pdf_path'] = str(signed_path)
+          # el original, para subir sólo lo que le añade la firma (ver pdf_delta)
+          original_path = work_dir / f"unsigned_{result['document_id']}.pdf"
+          if original_path.exists():
+            signed_document['original_pdf_path'] = str(original_path)
+        
+        signed_documents.append(signed_document)
         
         logger.info(f"\tLeído PDF firmado: {result['original_filename']}")
         
@@ -302,23 +336,26 @@ class SubprocessSignatureManager:
                       cert_password: Optional[str] = None,
                       use_dnie: bool = False,
                       progress_callback: Optional[Callable] = None,
-                      cleanup: bool = True) -> Dict:
+                      cleanup: bool = True,
+                      work_dir: Optional[Path] = None,
+                      load_signed: bool = True) -> Dict:
     """
     Firma documentos usando un subproceso
     
     Args:
-        documents: Lista con 'id', 'pdf_bytes', 'filename'
+        documents: Lista con 'id', 'pdf_bytes' (o 'pdf_path'), 'filename'
         cert_path: Ruta al certificado
         cert_password: Contraseña
         use_dnie: Si hay que usar DNIe
         progress_callback: Callback de progreso
         cleanup: Si limpiar archivos temporales al terminar
+        work_dir: Directorio de trabajo ya creado, con los PDFs descargados en él
+        load_signed: Si False, los firmados se devuelven como 'signed_pdf_path'. 
+          Hay que usar cleanup=False y limpiar el directorio tras la subida
         
     Returns:
         Dict con 'success', 'signed_documents', 'error'
     """
-    work_dir = None
-    
     try:
       logger.info("=" * 60)
       logger.info("INICIANDO FIRMA CON SUBPROCESO")
@@ -327,7 +364,7 @@ class SubprocessSignatureManager:
       logger.info("=" * 60)
         
       logger.info("***** Preparando directorio de trabajo... *****")
-      work_dir = self.prepare_work_directory(documents)
+      work_dir = self.prepare_work_directory(documents, work_dir)
       self.work_dir = work_dir
         
       logger.info("***** Creando configuración... *****")
@@ -351,7 +388,7 @@ class SubprocessSignatureManager:
         
       if final_status.get('status') == 'success':
         logger.info("***** Leyendo documentos firmados... *****")
-        signed_documents = self.read_results(work_dir)
+        signed_documents = self.read_results(work_dir, load_signed)
         
         logger.info("=" * 60)
         logger.info(f"   FIRMA COMPLETADA")
@@ -396,3 +433,140 @@ class SubprocessSignatureManager:
         if cleanup and work_dir:
           self.cleanup(work_dir)
 
+
+  def run_worker(self, input_data: Dict, progress_callback: Optional[Callable] = None,
+                 timeout: int = 300) -> Tuple[Dict, List[Dict]]:
+    """
+    Ejecuta el worker en un directorio de trabajo propio, que se borra al 
+    terminar. Para los modos sin PDFs en disco (certificado y firma por resumen)
+
+    Args:
+      input_data: Contenido de input.json
+      progress_callback: Callback de progreso
+      timeout: Timeout en segundos
+
+    Returns:
+      Estado final del worker y sus resultados
+    """
+    work_dir = self.create_work_directory()
+    self.work_dir = work_dir
+
+    try:
+      with open(work_dir / "input.json", 'w') as f:
+        json.dump(input_data, f, indent=2)
+
+      self.process = self.start_worker(work_dir)
+      final_status = self.monitor_progress(work_dir, progress_callback, timeout=timeout)
+
+      try:
+        self.process.wait(timeout=10)
+      except subprocess.TimeoutExpired:
+        logger.warning("\tWorker no terminó en 10s, forzando...")
+        self.process.kill()
+
+      results = []
+      output_file = work_dir / "output.json"
+      if final_status.get('status') == 'success' and output_file.exists():
+        with open(output_file, 'r') as f:
+          results = json.load(f).get('results', [])
+
+      return final_status, results
+
+    finally:
+      if self.process and self.process.poll() is None:
+        self.process.kill()
+      self.cleanup(work_dir)
+
+  def get_signing_certificate(self, cert_path: Optional[str] = None,
+                              cert_password: Optional[str] = None,
+                              use_dnie: bool = False) -> Dict:
+    """
+    Lee el certificado de firma (del P12 o de la tarjeta) con el worker, 
+    para la firma por resumen
+
+    Returns:
+      Dict con 'success', 'certificate' (DER), 'error'
+    """
+    try:
+      final_status, results = self.run_worker({
+        'mode': MODE_CERTIFICATE,
+        'cert_path': cert_path,
+        'cert_password': cert_password,
+        'use_dnie': use_dnie,
+        'documents': []
+      }, timeout=120)
+    except Exception as e:
+      logger.error(f"Error crítico en SubprocessSignatureManager: {str(e)}")
+      return {'success': False, 'certificate': None, 'error': str(e)}
+
+    if final_status.get('status') != 'success' or not results:
+      error_msg = final_status.get('message', 'Error desconocido')
+      logger.error(f"\tError leyendo el certificado de firma: {error_msg}")
+      return {'success': False, 'certificate': None, 'error': error_msg}
+
+    return {'success': True, 'certificate': base64.b64decode(results[0]['certificate']), 'error': None}
+
+  def sign_digests(self, prepared: List[Dict],
+                   cert_path: Optional[str] = None,
+                   cert_password: Optional[str] = None,
+                   use_dnie: bool = False,
+                   progress_callback: Optional[Callable] = None) -> Dict:
+    """
+    Firma por resumen: firma los atributos que ha preparado el servidor para 
+    cada documento (ver OdooClient.prepare_remote_signatures) sin descargar 
+    ni subir los PDFs
+
+    Args:
+      prepared: Lista con 'document_id', 'signed_attrs' (base64) y 
+        'md_algorithm'
+      cert_path: Ruta al certificado
+      cert_password: Contraseña
+      use_dnie: Si hay que usar DNIe
+      progress_callback: Callback de progreso
+
+    Returns:
+      Dict con 'success', 'signatures' ([{'document_id', 'signature_cms' 
+      (base64)}]), 'total_signed', 'total_failed', 'error'
+    """
+    logger.info("=" * 60)
+    logger.info("INICIANDO FIRMA POR RESUMEN CON SUBPROCESO")
+    logger.info(f"  Documentos: {len(prepared)}")
+    logger.info(f"  Modo: {'DNIe' if use_dnie else 'Certificado'}")
+    logger.info("=" * 60)
+
+    try:
+      final_status, results = self.run_worker({
+        'mode': MODE_DIGEST,
+        'cert_path': cert_path,
+        'cert_password': cert_password,
+        'use_dnie': use_dnie,
+        'documents': [
+          {'document_id': doc['document_id'], 'signed_attrs': doc['signed_attrs'],
+           'md_algorithm': doc.get('md_algorithm', 'sha256')} for doc in prepared
+        ]
+      }, progress_callback)
+    except Exception as e:
+      logger.error(f"Error crítico en SubprocessSignatureManager: {str(e)}")
+      return {'success': False, 'signatures': [], 'error': str(e)}
+
+    if final_status.get('status') != 'success':
+      error_msg = final_status.get('message', 'Error desconocido')
+      logger.error(f"\tError en firma: {error_msg}")
+      return {'success': False, 'signatures': [], 'error': error_msg}
+
+    for result in results:
+      if not result.get('success'):
+        logger.warning(f"\tDocumento en lote {result.get('document_id')} ha fallado: {result.get('error')}")
+
+    signatures = [{'document_id': result['document_id'], 'signature_cms': result['signature_cms']}
+                  for result in results if result.get('success')]
+
+    logger.info(f"\tFirmados {len(signatures)}/{len(prepared)} resúmenes")
+
+    return {
+      'success': True,
+      'signatures': signatures,
+      'total_signed': len(signatures),
+      'total_failed': len(prepared) - len(signatures),
+      'error': None
+    }
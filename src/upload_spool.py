@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cola local cifrada de los documentos firmados pendientes de subir
+
+Si Odoo deja de responder entre la firma y la subida, los PDFs firmados se
+perdían al borrar el directorio de trabajo (con el DNIe, minutos de firma).
+Ahora se guardan en la cola (UploadSpool) junto con el lote, su token y los
+datos de conexión, cifrados con Fernet (AES-128-CBC + HMAC-SHA256) con una
+clave local, y SpoolFlusher los sube en segundo plano cuando el servidor
+vuelve
+
+Para subirlos hacen falta las credenciales de Odoo del usuario, que el
+servicio sólo guarda en memoria: tras reiniciar el servicio, los lotes de la
+cola esperan a que el usuario vuelva a firmar en ese servidor
+
+La clave no está junto a la cola: va en el llavero del sistema (keyring, si
+está instalado y hay llavero) o en ~/.maya_signer/spool.key, sólo legible por
+el usuario. Así una copia del directorio de la cola (una copia de seguridad,
+una carpeta sincronizada) no basta para leer los PDFs ni los tokens. No
+protege de un programa que se ejecute como el propio usuario o de un
+administrador del equipo, que pueden leer el llavero o el fichero de la
+clave; con la clave en fichero, tampoco de una copia de todo
+~/.maya_signer
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+
+try:
+  import keyring
+except ImportError:
+  keyring = None
+
+from odoo_client import OdooTokenError
+from odoo_retry import CircuitOpenError, is_transient
+
+logger = logging.getLogger("maya_signer")
+
+# Directorio de la cola y fichero de su clave sin llavero del sistema (junto
+# al directorio de la cola, no dentro)
+SPOOL_DIR = Path.home() / '.maya_signer' / 'spool'
+SPOOL_KEY_FILE = 'spool.key'
+
+# Entrada de la clave en el llavero del sistema
+SPOOL_KEYRING_SERVICE = 'maya_signer'
+SPOOL_KEYRING_USER = 'upload_spool'
+
+# Segundos entre intentos de subir la cola
+SPOOL_FLUSH_INTERVAL = 60
+
+# Intentos fallidos (con el servidor respondiendo) tras los que se descarta
+# un lote, y espera máxima entre ellos (se dobla en cada uno)
+SPOOL_MAX_ATTEMPTS = 8
+SPOOL_MAX_BACKOFF = 6 * 3600
+
+class SpoolError(Exception):
+  """
+  Entrada de la cola que no se puede leer (dañada o cifrada con otra clave)
+  """
+  pass
+
+def server_unreachable(error: BaseException) -> bool:
+  """
+  Indica si un error (o el que lo provocó) es de que el servidor no responde
+
+  OdooClient envuelve algunos errores de red (p.e. en validate_batch_token
+  un corte de conexión se convierte en OdooTokenError), así que se
+  recorre la cadena de excepciones
+  """
+  while error is not None:
+    if isinstance(error, CircuitOpenError) or (isinstance(error, Exception) and is_transient(error)):
+      return True
+    error = error.__cause__ or error.__context__
+  return False
+
+def _keyring_key(new_key: Optional[bytes] = None) -> Optional[bytes]:
+  """
+  Clave de la cola en el llavero del sistema. Si no está, guarda new_key o
+  una clave nueva
+
+  Returns:
+    La clave, o None si keyring no está instalado o no hay llavero
+  """
+  if keyring is None:
+    return None
+
+  try:
+    stored = keyring.get_password(SPOOL_KEYRING_SERVICE, SPOOL_KEYRING_USER)
+    if stored:
+      return stored.encode('ascii')
+    key = new_key or Fernet.generate_key()
+    keyring.set_password(SPOOL_KEYRING_SERVICE, SPOOL_KEYRING_USER, key.decode('ascii'))
+    return key
+  except Exception as e:
+    # cada backend (Secret Service, KWallet, llavero de macOS...) falla a su manera
+    logger.info(f"\tSin llavero del sistema para la clave de la cola ({type(e).__name__}: {e}), "
+                f"se guarda en fichero")
+    return None
+
+class UploadSpool:
+  """
+  Cola de lotes firmados pendientes de subir
+
+  Cada lote es un directorio con su descripción (job.enc: servidor, base
+  de datos, usuario, lote, token...) y un fichero cifrado por documento
+  (<id>.pdf.enc, con su descripción en <id>.json.enc). El directorio se
+  escribe aparte y se renombra al final, así que nunca hay lotes a medias
+  """
+
+  def __init__(self, directory: Path = SPOOL_DIR, key: Optional[bytes] = None,
+               key_file: Optional[Path] = None):
+    """
+    Args:
+      directory: Directorio de la cola
+      key: Clave Fernet. Por defecto la del llavero del sistema o, si no
+        hay, la de key_file. Se crea la primera vez
+      key_file: Fichero de la clave sin llavero (sólo legible por el
+        usuario). Por defecto spool.key junto al directorio de la cola
+    """
+    self.directory = Path(directory)
+    self.directory.mkdir(parents=True, exist_ok=True)
+    self.key_file = Path(key_file) if key_file else self.directory.parent / SPOOL_KEY_FILE
+    self._fernet = Fernet(key or self._load_key())
+
+    # se llama (sin argumentos) cada vez que cambia el contenido de la cola
+    self.on_change: Optional[Callable[[], None]] = None
+
+  def _load_key(self) -> bytes:
+    # las versiones anteriores guardaban la clave dentro de la cola: se mueve
+    legacy = self.directory / SPOOL_KEY_FILE
+    legacy_key = legacy.read_bytes() if legacy.is_file() else None
+
+    key = _keyring_key(legacy_key) or self._file_key(legacy_key)
+    if legacy_key is not None and key == legacy_key:
+      legacy.unlink()
+    return key
+
+  def _file_key(self, new_key: Optional[bytes] = None) -> bytes:
+    """
+    Clave de key_file. Si no existe, lo crea (sólo legible por el usuario)
+    con new_key o con una clave nueva
+    """
+    self.key_file.parent.mkdir(parents=True, exist_ok=True)
+    try:
+      fd = os.open(self.key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+      return self.key_file.read_bytes()
+
+    key = new_key or Fernet.generate_key()
+    with os.fdopen(fd, 'wb') as f:
+      f.write(key)
+    return key
+
+  def _changed(self):
+    if self.on_change:
+      self.on_change()
+
+  def add(self, job: Dict, documents: List[Dict]) -> str:
+    """
+    Guarda un lote firmado
+
+    Args:
+      job: Datos para subirlo (url, db, username, batch_id, token, protocol,
+        auth_mode, transfer...). Sólo tipos JSON
+      documents: Documentos firmados (ver OdooClient.upload_signed_pdfs), con
+        'signed_pdf_bytes' o 'signed_pdf_path'
+
+    Returns:
+      Identificador de la entrada
+    """
+    entry_id = f"{time.time_ns()}_{job['batch_id']}_{uuid.uuid4().hex[:8]}"
+    partial = Path(tempfile.mkdtemp(prefix='.partial_', dir=self.directory))
+
+    try:
+      self._write(partial / 'job.enc', json.dumps(job).encode('utf-8'))
+      for doc in documents:
+        content = doc.get('signed_pdf_bytes')
+        if content is None:
+          content = Path(doc['signed_pdf_path']).read_bytes()
+        # sin las rutas del directorio de trabajo, que se va a borrar
+        info = {key: value for key, value in doc.items()
+                if key not in ('signed_pdf_bytes', 'signed_pdf_path', 'original_pdf_path')}
+        self._write(partial / f"{doc['document_id']}.json.enc", json.dumps(info).encode('utf-8'))
+        self._write(partial / f"{doc['document_id']}.pdf.enc", content)
+
+      partial.rename(self.directory / entry_id)
+    except BaseException:
+      shutil.rmtree(partial, ignore_errors=True)
+      raise
+
+    logger.warning(f"\tLote {job['batch_id']}: {len(documents)} documentos firmados guardados "
+                   f"en la cola de subida")
+    self._changed()
+    return entry_id
+
+  def _write(self, path: Path, data: bytes):
+    path.write_bytes(self._fernet.encrypt(data))
+
+  def _read(self, path: Path) -> bytes:
+    try:
+      return self._fernet.decrypt(path.read_bytes())
+    except (OSError, InvalidToken) as e:
+      raise SpoolError(f"No se puede leer {path.name} de la cola: {type(e).__name__}")
+
+  def entries(self) -> List[str]:
+    """
+    Entradas de la cola, de la más antigua a la más reciente
+    """
+    entries = [path for path in self.directory.iterdir()
+               if path.is_dir() and not path.name.startswith('.')]
+    return sorted((path.name for path in entries), key=lambda name: int(name.split('_')[0]))
+
+  def __len__(self) -> int:
+    return len(self.entries())
+
+  def document_count(self) -> int:
+    """
+    Documentos pendientes de subir en toda la cola
+    """
+    return sum(len(list((self.directory / entry_id).glob('*.pdf.enc'))) for entry_id in self.entries())
+
+  def read_job(self, entry_id: str) -> Dict:
+    """
+    Datos del lote de una entrada
+
+    Raises:
+      SpoolError: Si la entrada no se puede leer
+    """
+    try:
+      return json.loads(self._read(self.directory / entry_id / 'job.enc'))
+    except ValueError as e:
+      raise SpoolError(f"Entrada {entry_id} dañada: {e}")
+
+  def update_job(self, entry_id: str, job: Dict):
+    """
+    Reescribe los datos del lote de una entrada (p.e. sus intentos)
+    """
+    path = self.directory / entry_id / 'job.enc'
+    partial = path.with_name('.job.enc.partial')
+    self._write(partial, json.dumps(job).encode('utf-8'))
+    os.replace(partial, path)
+
+  def document_ids(self, entry_id: str) -> List[int]:
+    """
+    Documentos pendientes de subir de una entrada
+    """
+    return sorted(int(path.name.split('.')[0])
+                  for path in (self.directory / entry_id).glob('*.json.enc'))
+
+  def read_document(self, entry_id: str, document_id: int, target_dir: Path) -> Dict:
+    """
+    Descifra un documento de una entrada a target_dir. Se descifran de uno 
+    en uno según se suben, para que los PDFs en claro no pasen en disco más 
+    que lo que tarda su subida
+
+    Returns:
+      Documento con 'signed_pdf_path' (ver OdooClient.upload_signed_pdfs)
+
+    Raises:
+      SpoolError: Si la entrada no se puede leer
+    """
+    entry = self.directory / entry_id
+    try:
+      doc = json.loads(self._read(entry / f"{document_id}.json.enc"))
+    except ValueError as e:
+      raise SpoolError(f"Entrada {entry_id} dañada: {e}")
+
+    pdf_path = Path(target_dir) / f"signed_{document_id}.pdf"
+    fd = os.open(pdf_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+      f.write(self._read(entry / f"{document_id}.pdf.enc"))
+    doc['signed_pdf_path'] = str(pdf_path)
+    return doc
+
+  def remove_document(self, entry_id: str, document_id: int):
+    """
+    Borra un documento ya subido de una entrada
+    """
+    for suffix in ('.pdf.enc', '.json.enc'):
+      (self.directory / entry_id / f"{document_id}{suffix}").unlink(missing_ok=True)
+    self._changed()
+
+  def remove(self, entry_id: str):
+    """
+    Borra una entrada (subida o que ya no se puede subir)
+    """
+    shutil.rmtree(self.directory / entry_id, ignore_errors=True)
+    self._changed()
+
+class SpoolFlusher:
+  """
+  Hilo que sube los lotes de la cola cada SPOOL_FLUSH_INTERVAL segundos (o
+  al llamar a wake()), en orden
+
+  Un lote se borra de la cola cuando se ha subido o cuando el servidor
+  rechaza su token (ya no se puede subir: hay que volver a firmarlo). Si el
+  servidor sigue sin responder, sus lotes esperan al siguiente intento. Si
+  responde pero la subida falla o queda a medias, el lote espera cada vez
+  el doble (hasta SPOOL_MAX_BACKOFF) y se descarta tras SPOOL_MAX_ATTEMPTS
+  intentos
+  """
+
+  def __init__(self, spool: UploadSpool, client_factory: Callable[[Dict], Optional[object]],
+               interval: float = SPOOL_FLUSH_INTERVAL):
+    """
+    Args:
+      spool: Cola a subir
+      client_factory: Crea el OdooClient (sin autenticar) de los datos de un
+        lote, o devuelve None si no hay credenciales para su servidor
+      interval: Segundos entre intentos
+    """
+    self.spool = spool
+    self.client_factory = client_factory
+    self.interval = interval
+    self._wake = threading.Event()
+    self._stop = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+
+  def start(self):
+    self._thread = threading.Thread(target=self._run, name='upload-spool', daemon=True)
+    self._thread.start()
+
+  def stop(self):
+    self._stop.set()
+    self._wake.set()
+
+  def wake(self):
+    """
+    Intenta subir la cola ya, sin esperar al siguiente intento
+    """
+    self._wake.set()
+
+  def _run(self):
+    while not self._stop.is_set():
+      try:
+        self.flush()
+      except Exception as e:
+        logger.error(f"Error subiendo la cola de documentos firmados: {e}", exc_info=True)
+      self._wake.wait(self.interval)
+      self._wake.clear()
+
+  def flush(self) -> int:
+    """
+    Intenta subir todos los lotes de la cola
+
+    Returns:
+      Lotes subidos
+    """
+    uploaded = 0
+    # servidores que no responden en este intento
+    down = set()
+
+    for entry_id in self.spool.entries():
+      if self._stop.is_set():
+        break
+
+      try:
+        job = self.spool.read_job(entry_id)
+      except SpoolError as e:
+        logger.error(f"\t{e}: se descarta")
+        self.spool.remove(entry_id)
+        continue
+
+      if job['url'] in down or job.get('next_attempt', 0) > time.time():
+        continue
+
+      client = self.client_factory(job)
+      if client is None:
+        continue
+
+      result, error = self._upload(entry_id, job, client)
+      if result:
+        logger.info(f"\tLote {job['batch_id']} de la cola subido")
+        self.spool.remove(entry_id)
+        uploaded += 1
+      elif error is not None and server_unreachable(error):
+        logger.info(f"\t{job['url']} sigue sin responder, el lote {job['batch_id']} sigue en la cola")
+        down.add(job['url'])
+      elif isinstance(error, (SpoolError, OdooTokenError)):
+        logger.error(f"\tLote {job['batch_id']} de la cola descartado: {error}")
+        self.spool.remove(entry_id)
+      else:
+        self._failed(entry_id, job, error)
+
+    return uploaded
+
+  def _failed(self, entry_id: str, job: Dict, error: Optional[Exception]):
+    """
+    Cuenta un intento fallido de subir un lote: lo aplaza o, agotados los
+    intentos, lo descarta
+    """
+    attempts = job.get('attempts', 0) + 1
+    if attempts >= SPOOL_MAX_ATTEMPTS:
+      logger.error(f"\tLote {job['batch_id']} de la cola descartado tras {attempts} intentos "
+                   f"({error or 'subida incompleta'})")
+      self.spool.remove(entry_id)
+      return
+
+    delay = min(SPOOL_MAX_BACKOFF, self.interval * 2 ** (attempts - 1))
+    job.update(attempts=attempts, next_attempt=time.time() + delay)
+    self.spool.update_job(entry_id, job)
+    logger.warning(f"\tLote {job['batch_id']} de la cola no se pudo subir "
+                   f"({error or 'subida incompleta'}), intento {attempts}/{SPOOL_MAX_ATTEMPTS}: "
+                   f"se reintentará en {delay:.0f} s")
+
+  def _upload(self, entry_id: str, job: Dict, client) -> Tuple[bool, Optional[Exception]]:
+    """
+    Sube los documentos de un lote de uno en uno: cada PDF se descifra 
+    justo antes de subirlo y se borra en claro justo después. Los que 
+    confirma el servidor salen de la cola (y se anotan en 'confirmed' del 
+    lote), así que un nuevo intento sólo sube los que faltan
+    """
+    batch_id = job['batch_id']
+    transfer = job.get('transfer', 'rpc')
+    confirmed = set(job.get('confirmed', []))
+    failed_count = 0
+
+    work_dir = Path(tempfile.mkdtemp(prefix='maya_spool_'))
+    try:
+      client.authenticate()
+      client.validate_batch_token(batch_id)
+
+      for document_id in self.spool.document_ids(entry_id):
+        doc = self.spool.read_document(entry_id, document_id, work_dir)
+        try:
+          uploaded = client.upload_document(doc, transfer)
+        finally:
+          Path(doc['signed_pdf_path']).unlink(missing_ok=True)
+
+        if not uploaded:
+          failed_count += 1
+          continue
+
+        confirmed.add(document_id)
+        job['confirmed'] = sorted(confirmed)
+        self.spool.update_job(entry_id, job)
+        self.spool.remove_document(entry_id, document_id)
+
+      client.finalize_batch(batch_id, len(confirmed), failed_count)
+      return failed_count == 0, None
+    except Exception as e:
+      return False, e
+    finally:
+      shutil.rmtree(work_dir, ignore_errors=True)
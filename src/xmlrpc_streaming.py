@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+"""
+XML-RPC en streaming para los PDFs de los lotes
+
+xmlrpc.client monta la respuesta entera en memoria: el XML, la cadena base64
+de cada PDF y, al decodificarla, los bytes. Aquí el base64 de los campos
+indicados (p.e. pdf_content) se decodifica por trozos según llega la
+respuesta, directamente a un fichero, y en la respuesta queda sólo un
+StreamedFile que apunta a él. La memoria no depende del tamaño de los PDFs
+
+En las peticiones pasa lo mismo con xmlrpc.client.dumps: el XML completo, con
+el base64 de cada PDF firmado, se monta como una única cadena. Con
+StreamingServerProxy los parámetros Base64File se codifican por trozos
+leyendo el fichero según se envía la petición (con Content-Length calculado
+de antemano)
+"""
+
+import binascii
+import base64
+import logging
+import os
+import secrets
+import tempfile
+import xmlrpc.client
+
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from odoo_transport import TimeoutTransport, TimeoutSafeTransport
+
+logger = logging.getLogger("maya_signer")
+
+# Tamaño de los trozos leídos de la respuesta
+STREAM_CHUNK_SIZE = 64 * 1024
+# Bytes del fichero codificados en base64 en cada trozo de la petición (múltiplo de 3)
+ENCODE_CHUNK_SIZE = 48 * 1024
+
+class StreamedFile(NamedTuple):
+  """
+  Valor de un campo decodificado a disco
+  """
+  path: Path
+  size: int
+
+class _Base64Sink:
+  """
+  Decodifica base64 por trozos a un fichero
+  """
+
+  def __init__(self, target_dir: Path):
+    fd, path = tempfile.mkstemp(dir=target_dir, prefix='download_', suffix='.part')
+    self.path = Path(path)
+    self.size = 0
+    self._file = os.fdopen(fd, 'wb')
+    self._pending = ''
+
+  def write(self, text: str):
+    # sólo se decodifican grupos completos de 4 caracteres, el resto espera al siguiente trozo
+    text = self._pending + ''.join(text.split())
+    usable = len(text) - len(text) % 4
+    if usable:
+      data = binascii.a2b_base64(text[:usable])
+      self._file.write(data)
+      self.size += len(data)
+    self._pending = text[usable:]
+
+  def close(self) -> StreamedFile:
+    try:
+      if self._pending:
+        raise xmlrpc.client.ResponseError("base64 incompleto en la respuesta")
+    finally:
+      self._file.close()
+    return StreamedFile(self.path, self.size)
+
+  def discard(self):
+    self._file.close()
+    self.path.unlink(missing_ok=True)
+
+class StreamingUnmarshaller(xmlrpc.client.Unmarshaller):
+  """
+  Unmarshaller de xmlrpc.client que decodifica a disco los campos indicados
+
+  Los valores string o base64 de los miembros de struct con esos nombres se
+  sustituyen por un StreamedFile. El resto de la respuesta se lee igual que
+  con xmlrpc.client
+  """
+
+  def __init__(self, target_dir: Path, file_fields: Iterable[str], **kwargs):
+    super().__init__(**kwargs)
+    self.target_dir = Path(target_dir)
+    self.file_fields = frozenset(file_fields)
+    # ficheros creados, para borrarlos si la respuesta no se llega a leer entera
+    self.files: List[Path] = []
+    self._member: Optional[str] = None
+    self._sink: Optional[_Base64Sink] = None
+
+  def start(self, tag, attrs):
+    super().start(tag, attrs)
+    if tag in ('string', 'base64') and self._member in self.file_fields:
+      self._sink = _Base64Sink(self.target_dir)
+      self.files.append(self._sink.path)
+
+  def data(self, text):
+    if self._sink is not None:
+      self._sink.write(text)
+    else:
+      super().data(text)
+
+  def end(self, tag):
+    if self._sink is not None and tag in ('string', 'base64'):
+      sink, self._sink = self._sink, None
+      self.append(sink.close())
+      self._value = 0
+      return
+
+    if tag == 'member':
+      self._member = None
+
+    result = super().end(tag)
+
+    if tag == 'name':
+      self._member = self._stack[-1]
+
+    return result
+
+  def discard(self):
+    """
+    Borra los ficheros creados
+    """
+    if self._sink is not None:
+      self._sink.discard()
+      self._sink = None
+    for path in self.files:
+      path.unlink(missing_ok=True)
+
+class _StreamingResponseMixin:
+  """
+  Transporte XML-RPC que lee la respuesta con StreamingUnmarshaller
+  """
+
+  def __init__(self, target_dir: Path, file_fields: Iterable[str], timeout=30, gzip_threshold=None):
+    super().__init__(timeout=timeout, gzip_threshold=gzip_threshold)
+    self.target_dir = Path(target_dir)
+    self.file_fields = tuple(file_fields)
+
+  def getparser(self):
+    unmarshaller = StreamingUnmarshaller(self.target_dir, self.file_fields,
+                                         use_datetime=self._use_datetime,
+                                         use_builtin_types=self._use_builtin_types)
+    return xmlrpc.client.ExpatParser(unmarshaller), unmarshaller
+
+  def parse_response(self, response):
+    # igual que Transport.parse_response, con trozos más grandes y borrando
+    # los ficheros a medias si la respuesta falla
+    stream = self._response_stream(response)
+    parser, unmarshaller = self.getparser()
+    try:
+      while True:
+        data = stream.read(STREAM_CHUNK_SIZE)
+        if not data:
+          break
+        parser.feed(data)
+
+      if stream is not response:
+        stream.close()
+      parser.close()
+      return unmarshaller.close()
+    except BaseException:
+      unmarshaller.discard()
+      raise
+
+class StreamingTransport(_StreamingResponseMixin, TimeoutTransport):
+  pass
+
+class StreamingSafeTransport(_StreamingResponseMixin, TimeoutSafeTransport):
+  pass
+
+class Base64File:
+  """
+  Parámetro de una petición que se envía como cadena base64 con el 
+  contenido de un fichero, codificándolo por trozos al enviarlo
+  """
+
+  def __init__(self, path: Path):
+    self.path = Path(path)
+
+  @property
+  def encoded_size(self) -> int:
+    """
+    Longitud del base64 del fichero
+    """
+    return 4 * ((self.path.stat().st_size + 2) // 3)
+
+  def iter_base64(self, chunk_size: int = ENCODE_CHUNK_SIZE) -> Iterator[bytes]:
+    with open(self.path, 'rb') as f:
+      while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+          break
+        yield base64.b64encode(chunk)
+
+class StreamingRequestBody:
+  """
+  Cuerpo de una petición XML-RPC con parámetros Base64File
+
+  Se puede recorrer varias veces (el transporte reintenta si la conexión 
+  keep-alive estaba cerrada) y su len() es el Content-Length, así que 
+  xmlrpc.client.Transport lo envía por trozos sin cambios
+  """
+
+  def __init__(self, params: tuple, methodname: str):
+    files = []
+    # cada fichero se sustituye en el XML por una marca que no puede estar en los datos
+    marker = f"maya-file-{secrets.token_hex(16)}-"
+
+    def replace(value):
+      if isinstance(value, Base64File):
+        files.append(value)
+        return f"{marker}{len(files) - 1}"
+      if isinstance(value, dict):
+        return {key: replace(item) for key, item in value.items()}
+      if isinstance(value, (list, tuple)):
+        return [replace(item) for item in value]
+      return value
+
+    xml = xmlrpc.client.dumps(tuple(replace(param) for param in params), methodname, allow_none=True)
+
+    self._parts: List[object] = []
+    for i, base64_file in enumerate(files):
+      before, xml = xml.split(f"<string>{marker}{i}</string>", 1)
+      self._parts.append(f"{before}<string>".encode('utf-8', 'xmlcharrefreplace'))
+      self._parts.append(base64_file)
+      xml = f"</string>{xml}"
+    self._parts.append(xml.encode('utf-8', 'xmlcharrefreplace'))
+
+  def __len__(self) -> int:
+    return sum(part.encoded_size if isinstance(part, Base64File) else len(part) for part in self._parts)
+
+  def __iter__(self) -> Iterator[bytes]:
+    for part in self._parts:
+      if isinstance(part, Base64File):
+        yield from part.iter_base64()
+      else:
+        yield part
+
+class StreamingServerProxy:
+  """
+  Proxy XML-RPC de un servicio de Odoo que envía los parámetros Base64File 
+  por trozos (ver StreamingRequestBody). Misma interfaz que ServerProxy
+  """
+
+  def __init__(self, url: str, service: str, timeout: int = 60):
+    parts = urlsplit(f'{url}/xmlrpc/2/{service}')
+    self._host = parts.netloc
+    self._handler = parts.path
+    transport_class = TimeoutSafeTransport if parts.scheme == 'https' else TimeoutTransport
+    self._transport = transport_class(timeout=timeout)
+
+  def call(self, methodname: str, *params):
+    body = StreamingRequestBody(params, methodname)
+    response = self._transport.request(self._host, self._handler, body)
+    return response[0] if len(response) == 1 else response
+
+  def __getattr__(self, name: str):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return lambda *params: self.call(name, *params)
+
+def make_streaming_proxy(url: str, service: str, target_dir: Path, file_fields: Iterable[str],
+                         timeout: int = 60, gzip_threshold: Optional[int] = None) -> xmlrpc.client.ServerProxy:
+  """
+  Crea un proxy XML-RPC de un servicio de Odoo que decodifica a ficheros de
+  target_dir los campos file_fields de las respuestas
+
+  Args:
+    url: URL base de Odoo
+    service: Servicio de Odoo ('object')
+    target_dir: Directorio donde se crean los ficheros
+    file_fields: Nombres de los campos (base64) que se decodifican a disco
+    timeout: Timeout de cada petición, en segundos
+    gzip_threshold: Tamaño a partir del que se comprimen las peticiones 
+      (None = sin comprimir)
+  """
+  transport_class = StreamingSafeTransport if url.startswith('https://') else StreamingTransport
+  transport = transport_class(target_dir, file_fields, timeout=timeout, gzip_threshold=gzip_threshold)
+  return xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/{service}', transport=transport, allow_none=True)
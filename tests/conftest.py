@@ -1,6 +1,8 @@
 import pytest
 
+import datetime
 import sys
+from io import BytesIO
 from pathlib import Path
 
 # También añadir src/ al path para que funcionen imports como:
@@ -43,3 +45,154 @@ def work_dir(tmp_path):
   d = tmp_path / "maya_signer_test"
   d.mkdir()
   return d
+
+@pytest.fixture(autouse=True)
+def clear_odoo_sessions():
+  """
+  Cada test empieza sin sesiones de Odoo guardadas de otros tests
+  """
+  from src.odoo_client import clear_session_cache
+  clear_session_cache()
+  yield
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+  """
+  Reintentos sin esperas y sin circuitos abiertos por otros tests
+  """
+  import odoo_retry
+  monkeypatch.setattr(odoo_retry, "RETRY_BASE_DELAY", 0.001)
+  odoo_retry.reset_circuit_breakers()
+
+@pytest.fixture(autouse=True)
+def clear_rate_limiters():
+  """
+  Cada test empieza con los limitadores de peticiones sin historial
+  """
+  import odoo_rate_limiter
+  odoo_rate_limiter.reset_rate_limiters()
+
+@pytest.fixture(scope="session")
+def p12_certificate(tmp_path_factory):
+  """
+  Certificado autofirmado en un .p12 con contraseña '1234'
+  """
+  from cryptography import x509
+  from cryptography.x509.oid import NameOID
+  from cryptography.hazmat.primitives import hashes, serialization
+  from cryptography.hazmat.primitives.asymmetric import rsa
+  from cryptography.hazmat.primitives.serialization import pkcs12
+
+  key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+  name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Firmante de prueba")])
+  now = datetime.datetime.now(datetime.timezone.utc)
+  certificate = (x509.CertificateBuilder()
+                 .subject_name(name).issuer_name(name).public_key(key.public_key())
+                 .serial_number(x509.random_serial_number())
+                 .not_valid_before(now - datetime.timedelta(days=1))
+                 .not_valid_after(now + datetime.timedelta(days=1))
+                 .add_extension(x509.KeyUsage(digital_signature=True, content_commitment=True,
+                                              key_encipherment=False, data_encipherment=False,
+                                              key_agreement=False, key_cert_sign=False, crl_sign=False,
+                                              encipher_only=False, decipher_only=False), critical=True)
+                 .sign(key, hashes.SHA256()))
+
+  path = tmp_path_factory.mktemp("cert") / "firma.p12"
+  path.write_bytes(pkcs12.serialize_key_and_certificates(
+    b"firma", key, certificate, None, serialization.BestAvailableEncryption(b"1234")))
+  return path
+
+@pytest.fixture
+def make_pdf():
+  """
+  Crea PDFs reales (con páginas en blanco) que pyHanko puede firmar
+  """
+  pytest.importorskip("pyhanko")
+  from pyhanko.pdf_utils import generic
+  from pyhanko.pdf_utils.writer import PdfFileWriter, PageObject
+
+  def make(pages=1) -> bytes:
+    writer = PdfFileWriter()
+    for _ in range(pages):
+      writer.insert_page(PageObject(contents=[], media_box=generic.ArrayObject(
+        [generic.NumberObject(x) for x in (0, 0, 595, 842)])))
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+  return make
+
+@pytest.fixture
+def restore_logging():
+  """
+  El worker reconfigura el logging raíz
+  """
+  import logging
+  handlers = logging.getLogger().handlers[:]
+  yield
+  logging.getLogger().handlers[:] = handlers
+
+SOFTHSM_MODULES = [
+  "/usr/lib/softhsm/libsofthsm2.so",
+  "/usr/lib/x86_64-linux-gnu/softhsm/libsofthsm2.so",
+  "/usr/local/lib/softhsm/libsofthsm2.so",
+  "/opt/homebrew/lib/softhsm/libsofthsm2.so",
+]
+
+@pytest.fixture(scope="session")
+def softhsm_token(p12_certificate, tmp_path_factory):
+  """
+  Token de SoftHSM con la clave y el certificado de p12_certificate, con las 
+  etiquetas del DNIe y PIN '1234'
+
+  Returns:
+    Módulo PKCS#11 y posición de la ranura del token (PKCS11_MODULE y PKCS11_SLOT)
+  """
+  import os
+  import shutil
+  import subprocess
+
+  module = os.environ.get("SOFTHSM2_MODULE") or next(
+    (path for path in SOFTHSM_MODULES if os.path.exists(path)), None)
+  if not module or not shutil.which("softhsm2-util"):
+    pytest.skip("SoftHSM no está instalado")
+  pkcs11 = pytest.importorskip("pkcs11")
+  from pkcs11 import Attribute
+  from pkcs11.util.rsa import decode_rsa_private_key
+  from pkcs11.util.x509 import decode_x509_certificate
+  from cryptography.hazmat.primitives import serialization
+  from cryptography.hazmat.primitives.serialization import pkcs12
+
+  # SoftHSM lee su configuración al cargarse: una vez por proceso
+  directory = tmp_path_factory.mktemp("softhsm")
+  (directory / "tokens").mkdir()
+  (directory / "softhsm2.conf").write_text(
+    f"directories.tokendir = {directory / 'tokens'}\nobjectstore.backend = file\n")
+  previous_conf = os.environ.get("SOFTHSM2_CONF")
+  os.environ["SOFTHSM2_CONF"] = str(directory / "softhsm2.conf")
+
+  subprocess.run(["softhsm2-util", "--init-token", "--free", "--label", "maya",
+                  "--pin", "1234", "--so-pin", "4321"], check=True, capture_output=True)
+
+  key, certificate, _ = pkcs12.load_key_and_certificates(p12_certificate.read_bytes(), b"1234")
+  lib = pkcs11.lib(module)
+  slots = lib.get_slots(token_present=True)
+  slot_no = next(i for i, slot in enumerate(slots) if slot.get_token().label == "maya")
+
+  with slots[slot_no].get_token().open(rw=True, user_pin="1234") as session:
+    private_key = decode_rsa_private_key(key.private_bytes(
+      serialization.Encoding.DER, serialization.PrivateFormat.TraditionalOpenSSL,
+      serialization.NoEncryption()))
+    private_key.update({Attribute.LABEL: "KprivFirmaDigital", Attribute.TOKEN: True,
+                        Attribute.PRIVATE: True})
+    session.create_object(private_key)
+    cert = decode_x509_certificate(certificate.public_bytes(serialization.Encoding.DER))
+    cert.update({Attribute.LABEL: "CertFirmaDigital", Attribute.TOKEN: True})
+    session.create_object(cert)
+
+  yield {"module": module, "slot": slot_no}
+
+  if previous_conf is None:
+    os.environ.pop("SOFTHSM2_CONF", None)
+  else:
+    os.environ["SOFTHSM2_CONF"] = previous_conf
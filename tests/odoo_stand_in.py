@@ -0,0 +1,1020 @@
+# -*- coding: utf-8 -*-
+
+"""
+Servidor Odoo de pega para pruebas locales
+
+Implementa en memoria lo mínimo de la API XML-RPC y JSON-RPC de Odoo (common y object),
+de las sesiones web (/web/session/authenticate, /web/content), del controlador
+de subida de Maya (/maya_signer/upload) y de los modelos maya_core.signature.batch y maya_core.signature.batch_document
+que usa OdooClient. También sirve como implementación de referencia de los 
+métodos de servidor que necesita Maya Signer (p.e. submit_signed_documents,
+o la mitad de servidor de la firma por resumen con pyHanko)
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import email.parser
+import email.policy
+import json
+import secrets
+import ssl
+import threading
+import xmlrpc.client
+
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+BATCH_MODEL = 'maya_core.signature.batch'
+DOCUMENT_MODEL = 'maya_core.signature.batch_document'
+
+# Firma por resumen: bytes reservados en el PDF para el CMS que firma el 
+# cliente, que lleva además la cadena de su certificado
+REMOTE_SIGNATURE_BYTES = 16 * 1024
+
+# Iteraciones PBKDF2 con las que Odoo guarda las claves API (KEY_CRYPT_CONTEXT)
+API_KEY_ROUNDS = 6000
+
+def human_size(size: int) -> str:
+  """
+  Tamaño legible, como lo devuelve Odoo para los binarios con bin_size
+  """
+  units = ('bytes', 'Kb', 'Mb', 'Gb', 'Tb')
+  i = 0
+  while size >= 1024 and i < len(units) - 1:
+    size /= 1024
+    i += 1
+  return "%0.2f %s" % (size, units[i])
+
+def missing_method(model: str, method: str) -> xmlrpc.client.Fault:
+  """
+  Fault que devuelve Odoo cuando se llama a un método que no existe
+  """
+  return xmlrpc.client.Fault(1, f"AttributeError: The method '{model}.{method}' does not exist")
+
+class _StandInHandler(BaseHTTPRequestHandler):
+  """
+  Atiende las peticiones XML-RPC (/xmlrpc/2/<servicio>), JSON-RPC (/jsonrpc) 
+  y las de la sesión web
+  """
+  protocol_version = 'HTTP/1.1'
+  # cabeceras y cuerpo en un único envío (evita la espera de Nagle + ACK retardado)
+  wbufsize = -1
+  # la petición en curso se atiende pero su respuesta se pierde (ver fail_requests)
+  _drop_response = False
+
+  def log_message(self, format, *args):
+    pass
+
+  def setup(self):
+    super().setup()
+    with self.server.stand_in._lock:
+      self.server.stand_in.connections += 1
+
+  def _reply(self, data: bytes, content_type: str):
+    stand_in = self.server.stand_in
+    if self._drop_response:
+      self.close_connection = True
+      return
+    self.send_response(200)
+    self.send_header('Content-Type', content_type)
+    if stand_in.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+      data = gzip.compress(data)
+      self.send_header('Content-Encoding', 'gzip')
+      with stand_in._lock:
+        stand_in.gzip_responses += 1
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _error(self, status: int):
+    self.send_response(status)
+    self.send_header('Content-Length', '0')
+    self.end_headers()
+
+  def _session_uid(self) -> Optional[int]:
+    cookie = self.headers.get('Cookie', '')
+    for part in cookie.split(';'):
+      name, _, value = part.strip().partition('=')
+      if name == 'session_id':
+        return self.server.stand_in.sessions.get(value)
+    return None
+
+  def do_POST(self):
+    length = int(self.headers.get('Content-Length', 0))
+    body = self.rfile.read(length)
+
+    # fallos de red simulados
+    stand_in = self.server.stand_in
+    with stand_in._lock:
+      stand_in.received_bytes += len(body)
+    with stand_in._lock:
+      failure = stand_in.fail_requests.pop(0) if stand_in.fail_requests else None
+    if failure == 'unavailable':
+      self._error(503)
+      return
+    self._drop_response = failure == 'drop'
+
+    # como un proxy inverso con gzip para las peticiones (Odoo por sí solo no las descomprime)
+    if stand_in.gzip and self.headers.get('Content-Encoding') == 'gzip':
+      body = gzip.decompress(body)
+      with stand_in._lock:
+        stand_in.gzip_requests += 1
+
+    path = self.path.split('?')[0].rstrip('/')
+    if path == '/jsonrpc':
+      self._jsonrpc(body)
+    elif path == '/web/session/authenticate':
+      self._web_authenticate(body)
+    elif path.startswith('/web/dataset/call_kw/'):
+      self._call_kw(body)
+    elif path == '/maya_signer/upload' and self.server.stand_in.upload_controller:
+      self._upload(body)
+    elif path.startswith('/web/') or path.startswith('/maya_signer/'):
+      self._error(404)
+    else:
+      self._xmlrpc(body)
+
+  def do_GET(self):
+    path = self.path.split('?')[0].rstrip('/')
+    if path.startswith('/web/content/'):
+      self._web_content(path)
+    else:
+      self._error(404)
+
+  def _web_authenticate(self, body: bytes):
+    stand_in = self.server.stand_in
+    params = json.loads(body).get('params', {})
+
+    # la sesión web no admite claves API, igual que en Odoo
+    if (params.get('db'), params.get('login')) != (stand_in.db, stand_in.username) or \
+       not stand_in.verify_password(params.get('password'), api_key=False):
+      reply = {'jsonrpc': '2.0', 'id': None, 'error': {
+        'code': 200, 'message': 'Odoo Server Error', 'data': {'message': 'Access Denied'}}}
+      self._reply(json.dumps(reply).encode('utf-8'), 'application/json')
+      return
+
+    session_id = secrets.token_hex(20)
+    stand_in.sessions[session_id] = stand_in.uid
+    stand_in.calls.append(('web', '', 'authenticate'))
+
+    data = json.dumps({'jsonrpc': '2.0', 'id': None, 'result': {'uid': stand_in.uid}}).encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Set-Cookie', f'session_id={session_id}; HttpOnly; Path=/')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _upload(self, body: bytes):
+    """
+    Referencia del controlador de subida de PDFs firmados en crudo
+
+    POST multipart/form-data con los campos document_id, token, 
+    signed_pdf_filename y el fichero (file). Valida el token del lote del 
+    documento, guarda el PDF firmado y lo copia al registro origen
+
+    Responde {'success': bool, 'error': str}
+    """
+    stand_in = self.server.stand_in
+    if self._session_uid() is None:
+      self._error(403)
+      return
+
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+      f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+    fields = {}
+    content = None
+    for part in message.iter_parts():
+      name = part.get_param('name', header='content-disposition')
+      if part.get_filename():
+        content = part.get_payload(decode=True)
+      else:
+        fields[name] = part.get_content().strip()
+
+    stand_in.calls.append(('web', DOCUMENT_MODEL, 'upload'))
+
+    key = fields.get('idempotency_key')
+    with stand_in._lock:
+      result = stand_in.replay(key)
+      if result is None:
+        stand_in.uploaded_bytes += len(content or b'')
+        result = stand_in.store_signed_pdf(int(fields['document_id']), fields.get('token'),
+                                           content, fields.get('signed_pdf_filename'))
+        if key:
+          stand_in.idempotency_results[key] = result
+
+    self._reply(json.dumps(result).encode('utf-8'), 'application/json')
+
+  def _web_content(self, path: str):
+    """
+    /web/content/<modelo>/<id>/<campo>: binario en crudo
+    """
+    stand_in = self.server.stand_in
+    if self._session_uid() is None:
+      self._error(403)
+      return
+
+    try:
+      _, _, _, model, record_id, field = path.split('/')
+      record = stand_in.get_record(model, int(record_id))
+    except (ValueError, KeyError):
+      self._error(404)
+      return
+
+    stand_in.calls.append(('web', model, 'content'))
+
+    value = record.get(field)
+    if not value:
+      self._error(404)
+      return
+
+    data = base64.b64decode(value)
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/pdf')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _call_kw(self, body: bytes):
+    """
+    Llamada a un modelo con la sesión web: sólo se comprueba la cookie
+    """
+    stand_in = self.server.stand_in
+    request = json.loads(body)
+    params = request.get('params', {})
+
+    if self._session_uid() is None:
+      reply = {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {
+        'code': 100, 'message': 'Odoo Session Expired',
+        'data': {'name': 'odoo.http.SessionExpiredException', 'message': 'Session expired'},
+      }}
+    else:
+      try:
+        result = stand_in.execute(params['model'], params['method'],
+                                  list(params.get('args', [])), dict(params.get('kwargs') or {}))
+        reply = {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+      except Exception as e:
+        message = e.faultString if isinstance(e, xmlrpc.client.Fault) else f"{type(e).__name__}: {e}"
+        reply = {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {
+          'code': 200, 'message': 'Odoo Server Error',
+          'data': {'name': type(e).__name__, 'message': message},
+        }}
+
+    self._reply(json.dumps(reply).encode('utf-8'), 'application/json')
+
+  def _jsonrpc(self, body: bytes):
+    stand_in = self.server.stand_in
+    request = json.loads(body)
+    params = request.get('params', {})
+
+    try:
+      result = stand_in.dispatch(params.get('service'), params.get('method'), tuple(params.get('args', [])))
+      reply = {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+    except Exception as e:
+      message = e.faultString if isinstance(e, xmlrpc.client.Fault) else f"{type(e).__name__}: {e}"
+      reply = {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {
+        'code': 200, 'message': 'Odoo Server Error',
+        'data': {'name': type(e).__name__, 'message': message},
+      }}
+
+    self._reply(json.dumps(reply).encode('utf-8'), 'application/json')
+
+  def _xmlrpc(self, body: bytes):
+    stand_in = self.server.stand_in
+    service = self.path.rstrip('/').split('/')[-1]
+
+    try:
+      params, method = xmlrpc.client.loads(body)
+      result = stand_in.dispatch(service, method, params)
+      response = xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True)
+    except xmlrpc.client.Fault as fault:
+      response = xmlrpc.client.dumps(fault, allow_none=True)
+    except Exception as e:
+      response = xmlrpc.client.dumps(xmlrpc.client.Fault(1, f"{type(e).__name__}: {e}"), allow_none=True)
+
+    self._reply(response.encode('utf-8'), 'text/xml')
+
+class _StandInServer(ThreadingHTTPServer):
+  daemon_threads = True
+  # cola de conexiones como la de un servidor real (socketserver usa 5), para
+  # los clientes que abren muchas conexiones a la vez
+  request_queue_size = 128
+
+class OdooStandIn:
+  """
+  Servidor Odoo en memoria
+  """
+
+  def __init__(self, db: str = 'testdb', username: str = 'user@test.com',
+               password: str = 'pass', uid: int = 42, bulk_submit: bool = True,
+               propagate: bool = True, upload_controller: bool = True,
+               ssl_context: Optional[ssl.SSLContext] = None,
+               api_key: Optional[str] = None, password_rounds: int = 0,
+               gzip: bool = False, delta_upload: bool = True, remote_signing: bool = True):
+    """
+    Args:
+      db, username, password: Credenciales válidas
+      uid: uid que devuelve authenticate
+      bulk_submit: Si False, el servidor no expone submit_signed_documents
+      propagate: Si False, el servidor no expone propagate_signed_pdf
+      upload_controller: Si False, el servidor no tiene /maya_signer/upload
+      ssl_context: Contexto de servidor para servir por https
+      api_key: Clave API válida del usuario (además de la contraseña)
+      password_rounds: Iteraciones PBKDF2 que cuesta verificar la contraseña, 
+        para simular el hash de Odoo (0 = sin coste)
+      gzip: Si True, descomprime las peticiones gzip y comprime las respuestas 
+        RPC si el cliente las acepta
+      delta_upload: Si False, el servidor no expone upload_signed_delta
+      remote_signing: Si False, el servidor no expone la firma por resumen 
+        (prepare_remote_signatures y finish_remote_signatures)
+    """
+    self.db = db
+    self.username = username
+    self.password = password
+    self.uid = uid
+    self.bulk_submit = bulk_submit
+    self.propagate = propagate
+    self.upload_controller = upload_controller
+    self.ssl_context = ssl_context
+    self.api_key = api_key
+    self.password_rounds = password_rounds
+    self.gzip = gzip
+    self.delta_upload = delta_upload
+    self.remote_signing = remote_signing
+
+    self.batches: Dict[int, Dict] = {}
+    self.documents: Dict[int, Dict] = {}
+    # registros de los modelos origen: (modelo, id) -> valores
+    self.records: Dict[Tuple[str, int], Dict] = {}
+    # llamadas recibidas: (servicio, modelo, método)
+    self.calls: List[Tuple[str, str, str]] = []
+    # sesiones web: session_id -> uid
+    self.sessions: Dict[str, int] = {}
+    # bytes recibidos en los cuerpos de todas las peticiones
+    self.received_bytes = 0
+    # bytes de PDF firmado recibidos por el controlador de subida
+    self.uploaded_bytes = 0
+    # bytes de las colas recibidas con upload_signed_delta
+    self.delta_bytes = 0
+    # firmas por resumen preparadas, a la espera del CMS: document_id -> 
+    # {'pdf', 'md_algorithm', 'document_digest', 'reserved_region_start', 'reserved_region_end'}
+    self.remote_signatures: Dict[int, Dict] = {}
+    # conexiones TCP aceptadas
+    self.connections = 0
+    # contraseñas o claves API verificadas
+    self.password_checks = 0
+    # peticiones recibidas y respuestas enviadas con gzip
+    self.gzip_requests = 0
+    self.gzip_responses = 0
+    # fallos de las próximas peticiones POST, en orden: 'unavailable' (503 sin 
+    # atenderla), 'drop' (se atiende pero se corta la conexión sin responder) o None
+    self.fail_requests: List[Optional[str]] = []
+    # resultados de las escrituras con clave de idempotencia: clave -> resultado
+    self.idempotency_results: Dict[str, object] = {}
+    # escrituras repetidas que no se han vuelto a aplicar
+    self.replayed = 0
+
+    self._lock = threading.Lock()
+    self._server = None
+    self._thread = None
+
+  # -- arranque --
+
+  def start(self) -> 'OdooStandIn':
+    self._server = _StandInServer(('127.0.0.1', 0), _StandInHandler)
+    self._server.stand_in = self
+    if self.ssl_context:
+      self._server.socket = self.ssl_context.wrap_socket(self._server.socket, server_side=True)
+    self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    if self._server:
+      self._server.shutdown()
+      self._server.server_close()
+      self._server = None
+
+  @property
+  def url(self) -> str:
+    host, port = self._server.server_address[:2]
+    scheme = 'https' if self.ssl_context else 'http'
+    return f"{scheme}://{host}:{port}"
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc):
+    self.stop()
+
+  # -- datos --
+
+  def add_batch(self, batch_id: int, token: str, pdfs: List[bytes],
+                res_model: str = 'account.move', name: Optional[str] = None) -> List[int]:
+    """
+    Crea un lote con un documento por PDF
+
+    Returns:
+      IDs de los documentos creados
+    """
+    document_ids = []
+    for pdf in pdfs:
+      doc_id = len(self.documents) + 1
+      self.documents[doc_id] = {
+        'id': doc_id,
+        'batch_id': batch_id,
+        'filename': f'doc_{doc_id}.pdf',
+        'state': 'unsigned',
+        'res_model': res_model,
+        'res_id': 100 + doc_id,
+        'pdf_content': base64.b64encode(pdf).decode(),
+        'signed_pdf': False,
+        'signed_pdf_filename': False,
+        'sign_date': False,
+      }
+      document_ids.append(doc_id)
+
+    self.batches[batch_id] = {
+      'id': batch_id,
+      'name': name or f'Lote {batch_id}',
+      'state': 'draft',
+      'token': token,
+      'document_ids': document_ids,
+      'success_count': 0,
+      'failed_count': 0,
+    }
+
+    return document_ids
+
+  def signed_pdf(self, document_id: int) -> Optional[bytes]:
+    """
+    PDF firmado almacenado en un documento del lote
+    """
+    content = self.documents[document_id].get('signed_pdf')
+    return base64.b64decode(content) if content else None
+
+  def get_record(self, model: str, record_id: int) -> Dict:
+    """
+    Registro de cualquier modelo (KeyError si no existe)
+    """
+    if model == DOCUMENT_MODEL:
+      return self.documents[record_id]
+    if model == BATCH_MODEL:
+      return self.batches[record_id]
+    return self.records[(model, record_id)]
+
+  def store_signed_pdf(self, document_id: int, token: str, content: bytes, filename: str) -> Dict:
+    """
+    Guarda un PDF firmado en su documento y en el registro origen, validando 
+    el token del lote del documento
+    """
+    document = self.documents.get(document_id)
+    if not document:
+      return {'success': False, 'error': 'Documento no encontrado'}
+
+    error = self._check_token(document['batch_id'], token)
+    if error:
+      return {'success': False, 'error': error}
+
+    if not content:
+      return {'success': False, 'error': 'PDF vacío'}
+
+    signed_pdf = base64.b64encode(content).decode()
+    document.update({
+      'signed_pdf': signed_pdf,
+      'signed_pdf_filename': filename,
+      'state': 'signed',
+      'sign_date': self._now(),
+    })
+
+    if document.get('res_model') and document.get('res_id'):
+      self.records.setdefault((document['res_model'], document['res_id']), {}).update({
+        'signed_pdf': signed_pdf,
+        'signed_pdf_filename': filename,
+        'signature_date': self._now(),
+        'signature_user_id': self.uid,
+      })
+
+    return {'success': True}
+
+  def count_calls(self, model: str, method: str) -> int:
+    return len([c for c in self.calls if c[1] == model and c[2] == method])
+
+  # -- despacho --
+
+  def dispatch(self, service: str, method: str, params: tuple):
+    if service == 'common':
+      if method == 'authenticate':
+        db, login, password, _ = params
+        self.calls.append(('common', '', 'authenticate'))
+        return self.uid if (db, login) == (self.db, self.username) and self.verify_password(password) else False
+      if method == 'version':
+        return {'server_version': '17.0', 'protocol_version': 1}
+      raise xmlrpc.client.Fault(1, f"Método desconocido: {method}")
+
+    if service == 'object' and method == 'execute_kw':
+      db, uid, password, model, model_method, args = params[:6]
+      kwargs = params[6] if len(params) > 6 else {}
+      self.check_access(db, uid, password)
+      return self.execute(model, model_method, list(args), dict(kwargs or {}))
+
+    raise xmlrpc.client.Fault(1, f"Servicio desconocido: {service}")
+
+  def check_access(self, db: str, uid: int, password: str):
+    if (db, uid) != (self.db, self.uid) or not self.verify_password(password):
+      raise xmlrpc.client.Fault(3, "Access Denied")
+
+  def verify_password(self, password: str, api_key: bool = True) -> bool:
+    """
+    Verifica una contraseña (o clave API) con el coste de hash configurado
+    """
+    with self._lock:
+      self.password_checks += 1
+
+    if password == self.password:
+      rounds = self.password_rounds
+    elif api_key and self.api_key and password == self.api_key:
+      rounds = API_KEY_ROUNDS if self.password_rounds else 0
+    else:
+      return False
+
+    if rounds:
+      hashlib.pbkdf2_hmac('sha512', password.encode('utf-8'), b'maya_signer', rounds)
+    return True
+
+  def replay(self, key: Optional[str]):
+    """
+    Resultado de una escritura ya aplicada con esa clave de idempotencia, o 
+    None si es nueva
+    """
+    if key and key in self.idempotency_results:
+      self.replayed += 1
+      return self.idempotency_results[key]
+    return None
+
+  def execute(self, model: str, method: str, args: list, kwargs: dict):
+    """
+    Ejecuta un método de un modelo
+
+    Con idempotency_key en el contexto, una llamada repetida con la misma 
+    clave devuelve el resultado de la primera sin volver a aplicarla
+    """
+    context = dict(kwargs.get('context') or {})
+    key = context.pop('idempotency_key', None)
+    if not key:
+      return self._execute(model, method, args, kwargs)
+
+    kwargs = dict(kwargs, context=context) if context else {k: v for k, v in kwargs.items() if k != 'context'}
+    with self._lock:
+      result = self.replay(key)
+    if result is None:
+      result = self._execute(model, method, args, kwargs)
+      with self._lock:
+        self.idempotency_results[key] = result
+    return result
+
+  def _execute(self, model: str, method: str, args: list, kwargs: dict):
+    self.calls.append(('object', model, method))
+
+    handler = getattr(self, f"_{model.replace('.', '_')}__{method}", None)
+    if handler is None:
+      if method == 'write' and model not in (BATCH_MODEL, DOCUMENT_MODEL):
+        return self._origin_write(model, *args)
+      raise missing_method(model, method)
+
+    with self._lock:
+      return handler(*args, **kwargs)
+
+  # -- utilidades --
+
+  @staticmethod
+  def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+  @staticmethod
+  def _read(records: List[Dict], fields: Optional[List[str]], context: Optional[Dict]) -> List[Dict]:
+    bin_size = (context or {}).get('bin_size')
+    result = []
+    for record in records:
+      values = {}
+      for field in (fields or list(record)):
+        value = record.get(field, False)
+        if bin_size and field in ('pdf_content', 'signed_pdf') and value:
+          value = human_size(len(base64.b64decode(value)))
+        values[field] = value
+      values['id'] = record['id']
+      result.append(values)
+    return result
+
+  @staticmethod
+  def _match(record: Dict, domain: List) -> bool:
+    for field, operator, value in domain:
+      current = record.get(field)
+      if operator == 'in' and current not in value:
+        return False
+      if operator == '=' and current != value:
+        return False
+      if operator == '!=' and current == value:
+        return False
+    return True
+
+  def _check_token(self, batch_id: int, token: str) -> Optional[str]:
+    batch = self.batches.get(batch_id)
+    if not batch:
+      return 'Lote no encontrado'
+    if batch['token'] != token:
+      return 'Token inválido'
+    return None
+
+  def _origin_write(self, model: str, ids: List[int], values: Dict) -> bool:
+    with self._lock:
+      for res_id in ids:
+        self.records.setdefault((model, res_id), {}).update(values)
+    return True
+
+  def _finalize(self, batch: Dict) -> Dict:
+    documents = [self.documents[i] for i in batch['document_ids']]
+    batch['success_count'] = len([d for d in documents if d['state'] == 'signed'])
+    batch['failed_count'] = len(documents) - batch['success_count']
+    batch['state'] = 'done' if batch['failed_count'] == 0 else 'error'
+    return {'success': True, 'state': batch['state']}
+
+  # -- maya_core.signature.batch --
+
+  def _maya_core_signature_batch__read(self, ids, fields=None, context=None):
+    return self._read([self.batches[i] for i in ids if i in self.batches], fields, context)
+
+  def _maya_core_signature_batch__write(self, ids, values, context=None):
+    for i in ids:
+      self.batches[i].update(values)
+    return True
+
+  def _maya_core_signature_batch__validate_session_token(self, batch_id, token):
+    error = self._check_token(batch_id, token)
+    if error:
+      return {'valid': False, 'error': error}
+    result = {'valid': True, 'batch_name': self.batches[batch_id]['name']}
+    if self.batches[batch_id].get('token_expires'):
+      result['expires_at'] = self.batches[batch_id]['token_expires']
+    return result
+
+  def _maya_core_signature_batch__finalize_batch(self, batch_id, token, success_count, failed_count):
+    error = self._check_token(batch_id, token)
+    if error:
+      return {'success': False, 'error': error}
+    batch = self.batches[batch_id]
+    batch['success_count'] = success_count
+    batch['failed_count'] = failed_count
+    batch['state'] = 'done' if failed_count == 0 else 'error'
+    return {'success': True, 'state': batch['state']}
+
+  def _maya_core_signature_batch__submit_signed_documents(self, batch_id, token, documents, finalize=True):
+    """
+    Referencia del método de servidor para la subida en bloque.
+
+    Recibe varios documentos firmados en una sola llamada, escribe cada PDF en 
+    su batch_document y en el registro origen (res_model/res_id) y, si finalize, 
+    cierra el lote
+
+    Args:
+      batch_id: ID del lote
+      token: Token de sesión del lote
+      documents: [{'document_id', 'signed_pdf' (base64), 'signed_pdf_filename', 
+                   'res_model', 'res_id'}, ...]
+      finalize: Si True, finaliza el lote tras guardar los documentos
+
+    Returns:
+      {'success': bool, 'success_count': int, 'failed_count': int, 
+       'errors': {document_id: str}, 'error': str (si falla el lote entero)}
+    """
+    if not self.bulk_submit:
+      raise missing_method(BATCH_MODEL, 'submit_signed_documents')
+
+    error = self._check_token(batch_id, token)
+    if error:
+      return {'success': False, 'error': error}
+
+    batch = self.batches[batch_id]
+    success_count = 0
+    errors = {}
+
+    for doc in documents:
+      document = self.documents.get(doc['document_id'])
+      if not document or document['batch_id'] != batch_id:
+        errors[str(doc['document_id'])] = 'Documento no pertenece al lote'
+        continue
+
+      document.update({
+        'signed_pdf': doc['signed_pdf'],
+        'signed_pdf_filename': doc['signed_pdf_filename'],
+        'state': 'signed',
+        'sign_date': self._now(),
+      })
+
+      if doc.get('res_model') and doc.get('res_id'):
+        self.records.setdefault((doc['res_model'], doc['res_id']), {}).update({
+          'signed_pdf': doc['signed_pdf'],
+          'signed_pdf_filename': doc['signed_pdf_filename'],
+          'signature_date': self._now(),
+          'signature_user_id': self.uid,
+        })
+
+      success_count += 1
+
+    result = {
+      'success': not errors,
+      'success_count': success_count,
+      'failed_count': len(errors),
+      'errors': errors,
+    }
+
+    if finalize:
+      result['state'] = self._finalize(batch)['state']
+
+    return result
+
+  @staticmethod
+  def _prepare_remote_signature(pdf: bytes, certificate: bytes, reason: str,
+                                location: str) -> Tuple[Dict, bytes]:
+    """
+    Prepara un PDF para la firma diferida de pyHanko: le añade el campo de 
+    firma en la última página (como PyHankoSigner.sign_pdf) con el hueco del 
+    CMS, y calcula el resumen del rango de bytes y los atributos firmados
+
+    Returns:
+      Lo que hay que guardar hasta recibir el CMS y los atributos firmados en DER
+    """
+    from asn1crypto import x509
+    from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+    from pyhanko.sign import signers
+    from pyhanko.sign.fields import SigFieldSpec
+    from pyhanko_certvalidator.registry import SimpleCertificateStore
+
+    md_algorithm = 'sha256'
+    # firmante sin clave: la firma la pone el cliente
+    external_signer = signers.ExternalSigner(
+      signing_cert=x509.Certificate.load(certificate),
+      cert_registry=SimpleCertificateStore(),
+      signature_value=256
+    )
+
+    writer = IncrementalPdfFileWriter(BytesIO(pdf))
+    pages = writer.root['/Pages']['/Kids']
+    page_width = float(pages[len(pages) - 1].get_object()['/MediaBox'][2])
+    pdf_signer = signers.PdfSigner(
+      signers.PdfSignatureMetadata(field_name='Signature', reason=reason, location=location,
+                                   md_algorithm=md_algorithm),
+      signer=external_signer,
+      new_field_spec=SigFieldSpec(sig_field_name='Signature', box=(15, 15, page_width - 15, 65),
+                                  on_page=len(pages) - 1)
+    )
+
+    async def prepare():
+      prepared_digest, _, output = await pdf_signer.async_digest_doc_for_signing(
+        writer, bytes_reserved=REMOTE_SIGNATURE_BYTES
+      )
+      signed_attrs = await external_signer.signed_attrs(
+        prepared_digest.document_digest, md_algorithm, use_pades=True
+      )
+      return prepared_digest, output, signed_attrs
+
+    prepared_digest, output, signed_attrs = asyncio.run(prepare())
+
+    return {
+      'pdf': output.getvalue(),
+      'md_algorithm': md_algorithm,
+      'document_digest': prepared_digest.document_digest,
+      'reserved_region_start': prepared_digest.reserved_region_start,
+      'reserved_region_end': prepared_digest.reserved_region_end,
+    }, signed_attrs.dump()
+
+  @staticmethod
+  def _finish_remote_signature(prepared: Dict, signature_cms: bytes) -> bytes:
+    """
+    Incrusta el CMS del cliente en el hueco del PDF preparado y comprueba 
+    que firma el resumen de ese PDF
+
+    Raises:
+      ValueError: Si el CMS no es una firma válida del documento preparado
+    """
+    from pyhanko.pdf_utils.reader import PdfFileReader
+    from pyhanko.sign.signers.pdf_byterange import PreparedByteRangeDigest
+    from pyhanko.sign.signers.pdf_signer import PdfTBSDocument
+    from pyhanko.sign.validation import validate_pdf_signature
+    from pyhanko_certvalidator import ValidationContext
+
+    output = BytesIO(prepared['pdf'])
+    prepared_digest = PreparedByteRangeDigest(
+      document_digest=prepared['document_digest'],
+      reserved_region_start=prepared['reserved_region_start'],
+      reserved_region_end=prepared['reserved_region_end'],
+    )
+    asyncio.run(PdfTBSDocument.async_finish_signing(output, prepared_digest=prepared_digest,
+                                                    signature_cms=signature_cms))
+
+    signed = output.getvalue()
+    # sólo la integridad y la firma: la confianza en el certificado es cosa de Odoo
+    status = validate_pdf_signature(PdfFileReader(BytesIO(signed)).embedded_signatures[-1],
+                                    ValidationContext(trust_roots=[]))
+    if not (status.intact and status.valid):
+      raise ValueError('La firma no corresponde al documento preparado')
+    return signed
+
+  def _maya_core_signature_batch__prepare_remote_signatures(self, batch_id, token, certificate,
+                                                            reason='', location=''):
+    """
+    Referencia del método de servidor de la firma por resumen (1ª mitad)
+
+    Prepara cada documento pendiente del lote para el certificado del 
+    usuario y guarda el PDF preparado con la posición del hueco de la firma 
+    hasta que llegue su CMS (ver finish_remote_signatures)
+
+    Args:
+      batch_id: ID del lote
+      token: Token de sesión del lote
+      certificate: Certificado de firma en DER (base64)
+      reason, location: Datos de la firma
+
+    Returns:
+      {'documents': [{'document_id', 'signed_attrs' (base64), 
+       'document_digest' (hex), 'md_algorithm'}], 'errors': {document_id: str}, 
+       'error': str (si falla el lote entero)}
+    """
+    if not self.remote_signing:
+      raise missing_method(BATCH_MODEL, 'prepare_remote_signatures')
+
+    error = self._check_token(batch_id, token)
+    if error:
+      return {'error': error}
+
+    documents = []
+    errors = {}
+
+    for doc_id in self.batches[batch_id]['document_ids']:
+      document = self.documents[doc_id]
+      if document['state'] != 'unsigned':
+        continue
+
+      try:
+        prepared, signed_attrs = self._prepare_remote_signature(
+          base64.b64decode(document['pdf_content']), base64.b64decode(certificate),
+          reason, location
+        )
+      except Exception as e:
+        errors[str(doc_id)] = f'No se pudo preparar la firma: {e}'
+        continue
+
+      self.remote_signatures[doc_id] = prepared
+      documents.append({
+        'document_id': doc_id,
+        'signed_attrs': base64.b64encode(signed_attrs).decode(),
+        'document_digest': prepared['document_digest'].hex(),
+        'md_algorithm': prepared['md_algorithm'],
+      })
+
+    return {'documents': documents, 'errors': errors}
+
+  def _maya_core_signature_batch__finish_remote_signatures(self, batch_id, token, signatures, finalize=True):
+    """
+    Referencia del método de servidor de la firma por resumen (2ª mitad)
+
+    Incrusta cada CMS en su PDF preparado y lo guarda en el documento del 
+    lote y en su registro origen, como submit_signed_documents
+
+    Args:
+      batch_id: ID del lote
+      token: Token de sesión del lote
+      signatures: [{'document_id', 'signature_cms' (base64)}, ...]
+      finalize: Si True, finaliza el lote tras guardar los documentos
+
+    Returns:
+      {'success': bool, 'success_count': int, 'failed_count': int, 
+       'errors': {document_id: str}, 'error': str (si falla el lote entero)}
+    """
+    if not self.remote_signing:
+      raise missing_method(BATCH_MODEL, 'finish_remote_signatures')
+
+    error = self._check_token(batch_id, token)
+    if error:
+      return {'success': False, 'error': error}
+
+    success_count = 0
+    errors = {}
+
+    for signature in signatures:
+      doc_id = signature['document_id']
+      prepared = self.remote_signatures.get(doc_id)
+      if prepared is None or self.documents[doc_id]['batch_id'] != batch_id:
+        errors[str(doc_id)] = 'Documento sin firma preparada en el lote'
+        continue
+
+      try:
+        signed = self._finish_remote_signature(prepared, base64.b64decode(signature['signature_cms']))
+      except Exception as e:
+        errors[str(doc_id)] = str(e)
+        continue
+
+      del self.remote_signatures[doc_id]
+      filename = self.documents[doc_id]['filename'].replace('.pdf', '_firmado.pdf')
+      self.store_signed_pdf(doc_id, token, signed, filename)
+      success_count += 1
+
+    result = {
+      'success': not errors,
+      'success_count': success_count,
+      'failed_count': len(errors),
+      'errors': errors,
+    }
+
+    if finalize:
+      result['state'] = self._finalize(self.batches[batch_id])['state']
+
+    return result
+
+  # -- maya_core.signature.batch_document --
+
+  def _maya_core_signature_batch_document__read(self, ids, fields=None, context=None):
+    return self._read([self.documents[i] for i in ids if i in self.documents], fields, context)
+
+  def _maya_core_signature_batch_document__search_read(self, domain, fields=None, context=None):
+    records = [d for d in self.documents.values() if self._match(d, domain)]
+    return self._read(records, fields, context)
+
+  def _maya_core_signature_batch_document__write(self, ids, values, context=None):
+    for i in ids:
+      self.documents[i].update(values)
+    return True
+
+  def _maya_core_signature_batch_document__upload_signed_delta(self, ids, token, values):
+    """
+    Referencia del método de servidor que recibe un PDF firmado como delta de 
+    su original (ver pdf_delta)
+
+    Comprueba que el original guardado tiene el SHA-256 (y tamaño) que indica 
+    el cliente, le añade la cola, verifica el SHA-256 del PDF reconstruido y lo 
+    guarda en el documento y en su registro origen, como el controlador de subida
+
+    Args:
+      ids: [ID del documento del lote]
+      token: Token de sesión del lote
+      values: {'original_sha256', 'original_size', 'signed_sha256', 
+               'tail' (base64), 'signed_pdf_filename'}
+
+    Returns:
+      {'success': bool, 'error': str, 'code': 'original_mismatch' si el 
+       original no coincide (el cliente debe subir el PDF completo)}
+    """
+    if not self.delta_upload:
+      raise missing_method(DOCUMENT_MODEL, 'upload_signed_delta')
+
+    document = self.documents.get(ids[0])
+    if not document:
+      return {'success': False, 'error': 'Documento no encontrado'}
+
+    original = base64.b64decode(document.get('pdf_content') or '')
+    if len(original) != values['original_size'] or \
+       hashlib.sha256(original).hexdigest() != values['original_sha256']:
+      return {'success': False, 'code': 'original_mismatch',
+              'error': 'El PDF original no coincide con el del servidor'}
+
+    tail = base64.b64decode(values['tail'])
+    signed = original + tail
+    if hashlib.sha256(signed).hexdigest() != values['signed_sha256']:
+      return {'success': False, 'error': 'El PDF firmado reconstruido no coincide'}
+
+    self.delta_bytes += len(tail)
+    return self.store_signed_pdf(ids[0], token, signed, values['signed_pdf_filename'])
+
+  def _maya_core_signature_batch_document__propagate_signed_pdf(self, ids):
+    """
+    Referencia del método de servidor que copia el PDF firmado de cada 
+    documento a su registro origen (res_model/res_id), como haría la escritura 
+    a través de SignatureMixin, sin que el cliente tenga que volver a subirlo
+
+    Args:
+      ids: IDs de los documentos del lote, ya firmados
+
+    Returns:
+      True
+    """
+    if not self.propagate:
+      raise missing_method(DOCUMENT_MODEL, 'propagate_signed_pdf')
+
+    for i in ids:
+      document = self.documents[i]
+      if document['state'] != 'signed' or not document['signed_pdf']:
+        raise xmlrpc.client.Fault(2, f"UserError: El documento {i} no está firmado")
+
+      if document.get('res_model') and document.get('res_id'):
+        self.records.setdefault((document['res_model'], document['res_id']), {}).update({
+          'signed_pdf': document['signed_pdf'],
+          'signed_pdf_filename': document['signed_pdf_filename'],
+          'signature_date': self._now(),
+          'signature_user_id': self.uid,
+        })
+
+    return True
@@ -0,0 +1,388 @@
+import pytest
+
+import hashlib
+import json
+import threading
+
+from io import BytesIO
+from types import SimpleNamespace
+
+pytest.importorskip("pyhanko")
+
+from asn1crypto import x509
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.validation import validate_pdf_signature
+from pyhanko_certvalidator import ValidationContext
+
+import signer_worker
+
+import hanko_signer
+
+from hanko_signer import PyHankoSigner, token_allows_parallel_sessions, load_pkcs11_cache
+from signer_worker import SignatureWorker
+
+def make_p12(directory) -> str:
+  """
+  Otro certificado autofirmado en un .p12 con contraseña '1234'
+  """
+  import datetime
+  from cryptography import x509 as crypto_x509
+  from cryptography.x509.oid import NameOID
+  from cryptography.hazmat.primitives import hashes, serialization
+  from cryptography.hazmat.primitives.asymmetric import rsa
+  from cryptography.hazmat.primitives.serialization import pkcs12
+
+  key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+  name = crypto_x509.Name([crypto_x509.NameAttribute(NameOID.COMMON_NAME, "Certificado renovado")])
+  now = datetime.datetime.now(datetime.timezone.utc)
+  certificate = (crypto_x509.CertificateBuilder()
+                 .subject_name(name).issuer_name(name).public_key(key.public_key())
+                 .serial_number(crypto_x509.random_serial_number())
+                 .not_valid_before(now - datetime.timedelta(days=1))
+                 .not_valid_after(now + datetime.timedelta(days=1))
+                 .sign(key, hashes.SHA256()))
+  path = directory / "renovado.p12"
+  path.write_bytes(pkcs12.serialize_key_and_certificates(
+    b"renovado", key, certificate, None, serialization.BestAvailableEncryption(b"1234")))
+  return path
+
+def signature_ok(pdf: bytes, certificate: bytes) -> bool:
+  trust = ValidationContext(trust_roots=[x509.Certificate.load(certificate)])
+  status = validate_pdf_signature(PdfFileReader(BytesIO(pdf)).embedded_signatures[-1], trust)
+  return status.intact and status.valid and status.trusted
+
+class TestSignPdfBatch:
+  """
+  Firma por lotes en dos fases
+  """
+
+  @pytest.mark.unit
+  def test_firma_el_lote(self, p12_certificate, make_pdf):
+    signer = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234")
+    pdfs = [make_pdf(pages) for pages in (1, 2, 3)]
+    progress = []
+
+    results = signer.sign_pdf_batch(pdfs + [b"no es un PDF"],
+                                    progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert isinstance(results[3], Exception)
+    for pdf, signed in zip(pdfs, results):
+      # actualización incremental, como sign_pdf
+      assert signed.startswith(pdf)
+      assert len(signed) == len(signer.sign_pdf(pdf))
+      assert signature_ok(signed, signer.signing_certificate())
+    assert progress[-1] == (4, 4)
+
+  @pytest.mark.unit
+  def test_firmas_seguidas(self, p12_certificate, make_pdf):
+    """
+    Primero se preparan todos los PDFs y después se firman uno tras otro
+    """
+    signer = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234")
+    events = []
+
+    prepare = signer._prepare_signature
+    async def recorded_prepare(*args):
+      result = await prepare(*args)
+      events.append("prepara")
+      return result
+
+    sign_raw = signer.signer.async_sign_raw
+    async def recorded_sign_raw(data, digest_algorithm, dry_run=False):
+      if not dry_run:
+        events.append("firma")
+      return await sign_raw(data, digest_algorithm, dry_run=dry_run)
+
+    signer._prepare_signature = recorded_prepare
+    signer.signer.async_sign_raw = recorded_sign_raw
+
+    results = signer.sign_pdf_batch([make_pdf() for _ in range(6)], max_workers=3)
+
+    assert events == ["prepara"] * 6 + ["firma"] * 6
+    assert all(signature_ok(signed, signer.signing_certificate()) for signed in results)
+
+class TestPkcs11Sessions:
+  """
+  Firma en paralelo en varias sesiones PKCS#11
+  """
+
+  @pytest.mark.unit
+  def test_tokens_en_paralelo(self):
+    pkcs11 = pytest.importorskip("pkcs11")
+    SlotFlag = pkcs11.SlotFlag
+
+    def token(flags):
+      return SimpleNamespace(slot=SimpleNamespace(flags=flags))
+
+    # lector de tarjetas (DNIe)
+    assert not token_allows_parallel_sessions(
+      token(SlotFlag.TOKEN_PRESENT | SlotFlag.REMOVABLE_DEVICE | SlotFlag.HW_SLOT))
+    # SoftHSM, HSM
+    assert token_allows_parallel_sessions(token(SlotFlag.TOKEN_PRESENT))
+    assert token_allows_parallel_sessions(token(SlotFlag.TOKEN_PRESENT | SlotFlag.HW_SLOT))
+
+  @pytest.mark.unit
+  def test_reparte_entre_sesiones(self, p12_certificate, make_pdf):
+    """
+    Cada firmante del pool firma su parte del lote, en su hilo
+    """
+    signer = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234")
+    # el firmante de otra "sesión"
+    signer._pool_signers = [PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234").signer]
+    threads = {}
+
+    for name, pool_signer in (("principal", signer.signer), ("adicional", signer._pool_signers[0])):
+      def recorded(sign_raw, name):
+        async def sign(data, digest_algorithm, dry_run=False):
+          if not dry_run:
+            threads.setdefault(name, set()).add(threading.get_ident())
+          return await sign_raw(data, digest_algorithm, dry_run=dry_run)
+        return sign
+      pool_signer.async_sign_raw = recorded(pool_signer.async_sign_raw, name)
+
+    progress = []
+    results = signer.sign_pdf_batch([make_pdf() for _ in range(5)],
+                                    progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert set(threads) == {"principal", "adicional"}
+    assert threads["principal"].isdisjoint(threads["adicional"])
+    assert sorted(progress) == [(done, 5) for done in range(1, 6)]
+    assert all(signature_ok(signed, signer.signing_certificate()) for signed in results)
+
+  @pytest.mark.integration
+  def test_softhsm(self, softhsm_token, make_pdf, tmp_path, monkeypatch):
+    monkeypatch.setenv("PKCS11_MODULE", softhsm_token["module"])
+    monkeypatch.setenv("PKCS11_SLOT", str(softhsm_token["slot"]))
+    monkeypatch.setattr(hanko_signer, "PKCS11_CACHE_FILE", tmp_path / "pkcs11_cache.json")
+
+    signer = PyHankoSigner(cert_password="1234", use_dnie=True, pkcs11_sessions=3)
+    try:
+      assert signer.cert_label == "CertFirmaDigital"
+      assert len(signer._pool_sessions) == 2
+      results = signer.sign_pdf_batch([make_pdf() for _ in range(6)])
+      assert all(signature_ok(signed, signer.signing_certificate()) for signed in results)
+    finally:
+      signer.close()
+    assert signer._pool_sessions == []
+
+    # con una sesión, como el DNIe, y lo encontrado en el token de la caché
+    signer = PyHankoSigner(cert_password="1234", use_dnie=True, pkcs11_sessions=1)
+    try:
+      assert signer._pool_sessions == []
+      cache = load_pkcs11_cache(hanko_signer.PKCS11_CACHE_FILE)
+      assert cache["slot"] == softhsm_token["slot"] and cache["cert_label"] == "CertFirmaDigital"
+      assert signature_ok(signer.sign_pdf_batch([make_pdf()])[0], signer.signing_certificate())
+    finally:
+      signer.close()
+
+class FakeToken:
+  """
+  Token PKCS#11 de pega en un lector de tarjetas: certificados por etiqueta
+  """
+
+  def __init__(self, serial: bytes, certificates: dict):
+    from pkcs11 import SlotFlag
+    self.serial = serial
+    self.certificates = certificates
+    self.slot = SimpleNamespace(flags=SlotFlag.TOKEN_PRESENT | SlotFlag.REMOVABLE_DEVICE | SlotFlag.HW_SLOT)
+    self.logins = 0
+
+  def open(self, user_pin=None):
+    from pkcs11.exceptions import PinIncorrect
+    if user_pin is not None:
+      if user_pin != "1234":
+        raise PinIncorrect()
+      self.logins += 1
+    return SimpleNamespace(token=self, close=lambda: None)
+
+@pytest.fixture
+def fake_pkcs11(tmp_path, p12_certificate, monkeypatch):
+  """
+  Módulo PKCS#11 de pega con un token en la ranura 0, y la caché en tmp_path
+  """
+  pytest.importorskip("pkcs11")
+  import pkcs11
+  from pkcs11.exceptions import PKCS11Error
+  from pyhanko.sign import pkcs11 as hanko_pkcs11
+
+  certificate = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234").signer.signing_cert
+  state = SimpleNamespace(token=FakeToken(b"0001", {"CertAutenticacion": certificate}),
+                          discoveries=0, probes=[], certificate=certificate)
+
+  class FakeSigner:
+    def __init__(self, pkcs11_session, cert_label=None, key_label=None, signing_cert=None):
+      self.session = pkcs11_session
+      self.cert_label = cert_label
+      self._signing_cert = None
+
+    @property
+    def signing_cert(self):
+      # como PKCS11Signer, carga los objetos una vez
+      if self._signing_cert is None:
+        state.probes.append(self.cert_label)
+        try:
+          self._signing_cert = self.session.token.certificates[self.cert_label]
+        except KeyError:
+          raise PKCS11Error(f"No hay certificado {self.cert_label}")
+      return self._signing_cert
+
+  def open_pkcs11_session(lib_location, slot_no=None, user_pin=None):
+    state.discoveries += 1
+    return [state.token][slot_no].open(user_pin=user_pin)
+
+  module = tmp_path / "opensc-pkcs11.so"
+  module.write_bytes(b"")
+  monkeypatch.setenv("PKCS11_MODULE", str(module))
+  monkeypatch.delenv("PKCS11_SLOT", raising=False)
+  monkeypatch.setattr(hanko_signer, "PKCS11_CACHE_FILE", tmp_path / "pkcs11_cache.json")
+  monkeypatch.setattr(hanko_pkcs11, "open_pkcs11_session", open_pkcs11_session)
+  monkeypatch.setattr(hanko_pkcs11, "PKCS11Signer", FakeSigner)
+  monkeypatch.setattr(pkcs11, "lib", lambda path: SimpleNamespace(
+    get_slots=lambda: [SimpleNamespace(get_token=lambda: state.token)]))
+  return state
+
+class TestPkcs11Cache:
+  """
+  Caché de lo encontrado en el token
+  """
+
+  @pytest.mark.unit
+  def test_descubre_y_reutiliza(self, fake_pkcs11):
+    signer = PyHankoSigner(cert_password="1234", use_dnie=True)
+
+    cache = load_pkcs11_cache(hanko_signer.PKCS11_CACHE_FILE)
+    assert signer.cert_label == "CertAutenticacion"
+    assert fake_pkcs11.probes == ["CertFirmaDigital", "CertAutenticacion"]
+    assert cache == {
+      "module": signer._pkcs11_module, "slot": 0, "token_serial": b"0001".hex(),
+      "cert_label": "CertAutenticacion", "key_label": "KprivFirmaDigital",
+      "fingerprint": hashlib.sha256(fake_pkcs11.certificate.dump()).hexdigest(),
+    }
+
+    fake_pkcs11.probes.clear()
+    signer = PyHankoSigner(cert_password="1234", use_dnie=True)
+
+    # sin buscar el módulo ni probar etiquetas
+    assert fake_pkcs11.discoveries == 1
+    assert fake_pkcs11.probes == ["CertAutenticacion"]
+    assert signer.cert_label == "CertAutenticacion"
+    assert signer.signing_certificate() == fake_pkcs11.certificate.dump()
+
+  @pytest.mark.unit
+  def test_otro_certificado(self, fake_pkcs11, tmp_path):
+    """
+    Con otro certificado en el token, se vuelve a buscar y se actualiza la caché
+    """
+    PyHankoSigner(cert_password="1234", use_dnie=True)
+    renewed = PyHankoSigner(cert_path=str(make_p12(tmp_path)), cert_password="1234").signer.signing_cert
+    fake_pkcs11.token.certificates = {"CertFirmaDigital": renewed}
+
+    signer = PyHankoSigner(cert_password="1234", use_dnie=True)
+
+    assert fake_pkcs11.discoveries == 2
+    assert signer.cert_label == "CertFirmaDigital"
+    cache = load_pkcs11_cache(hanko_signer.PKCS11_CACHE_FILE)
+    assert cache["cert_label"] == "CertFirmaDigital"
+    assert cache["fingerprint"] == hashlib.sha256(renewed.dump()).hexdigest()
+
+  @pytest.mark.unit
+  def test_otro_token(self, fake_pkcs11):
+    """
+    Con otra tarjeta en el lector no se le envía el PIN de la caché
+    """
+    PyHankoSigner(cert_password="1234", use_dnie=True)
+    fake_pkcs11.token = FakeToken(b"0002", {"CertAutenticacion": fake_pkcs11.certificate})
+
+    PyHankoSigner(cert_password="1234", use_dnie=True)
+
+    assert fake_pkcs11.discoveries == 2
+    assert fake_pkcs11.token.logins == 1
+    assert load_pkcs11_cache(hanko_signer.PKCS11_CACHE_FILE)["token_serial"] == b"0002".hex()
+
+  @pytest.mark.unit
+  def test_pin_incorrecto(self, fake_pkcs11):
+    """
+    Un PIN incorrecto no se vuelve a intentar buscando en el token
+    """
+    from pkcs11.exceptions import PinIncorrect
+    PyHankoSigner(cert_password="1234", use_dnie=True)
+
+    with pytest.raises(PinIncorrect):
+      PyHankoSigner(cert_password="0000", use_dnie=True)
+    assert fake_pkcs11.discoveries == 1
+
+  @pytest.mark.unit
+  def test_caches_que_no_valen(self, fake_pkcs11, monkeypatch):
+    path = hanko_signer.PKCS11_CACHE_FILE
+    path.write_text("{no es json")
+    assert load_pkcs11_cache(path) is None
+    path.write_text(json.dumps({"module": "/usr/lib/opensc-pkcs11.so"}))
+    assert load_pkcs11_cache(path) is None
+
+    PyHankoSigner(cert_password="1234", use_dnie=True)
+    # la configuración manda sobre la caché
+    monkeypatch.setenv("PKCS11_SLOT", "1")
+    with pytest.raises(IndexError):
+      PyHankoSigner(cert_password="1234", use_dnie=True)
+
+class TestWorkerBatches:
+  """
+  El worker firma los PDFs completos por grupos
+  """
+
+  @pytest.mark.integration
+  def test_grupos(self, work_dir, p12_certificate, make_pdf, restore_logging, monkeypatch):
+    monkeypatch.setattr(signer_worker, "SIGN_BATCH_SIZE", 2)
+    documents = []
+    for doc_id in range(1, 6):
+      (work_dir / f"unsigned_{doc_id}.pdf").write_bytes(make_pdf() if doc_id != 4 else b"roto")
+      documents.append({"document_id": doc_id, "filename": f"doc_{doc_id}.pdf",
+                        "res_model": "account.move", "res_id": 100 + doc_id})
+    (work_dir / "input.json").write_text(json.dumps({
+      "cert_path": str(p12_certificate), "cert_password": "1234", "use_dnie": False,
+      "documents": documents}))
+
+    assert SignatureWorker(work_dir).sign_documents() == 0
+
+    certificate = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234").signing_certificate()
+    results = json.loads((work_dir / "output.json").read_text())["results"]
+    status = json.loads((work_dir / "status.json").read_text())
+    assert [r["document_id"] for r in results] == [1, 2, 3, 4, 5]
+    assert [r["success"] for r in results] == [True, True, True, False, True]
+    assert status["status"] == "success" and status["progress"] == 5
+    for r in results:
+      if r["success"]:
+        assert signature_ok((work_dir / r["signed_filename"]).read_bytes(), certificate)
+
+  @pytest.mark.integration
+  @pytest.mark.slow
+  def test_varios_procesos(self, work_dir, p12_certificate, make_pdf, restore_logging, monkeypatch):
+    """
+    Con un P12, los grupos se reparten entre procesos y los resultados se 
+    juntan en el orden de los documentos
+    """
+    monkeypatch.setattr(signer_worker, "P12_PROCESSES", 2)
+    monkeypatch.setattr(signer_worker, "PARALLEL_MIN_DOCUMENTS", 2)
+    documents = []
+    for doc_id in range(1, 10):
+      if doc_id != 7:
+        (work_dir / f"unsigned_{doc_id}.pdf").write_bytes(make_pdf() if doc_id != 4 else b"roto")
+      documents.append({"document_id": doc_id, "filename": f"doc_{doc_id}.pdf",
+                        "res_model": "account.move", "res_id": 100 + doc_id})
+    (work_dir / "input.json").write_text(json.dumps({
+      "cert_path": str(p12_certificate), "cert_password": "1234", "use_dnie": False,
+      "documents": documents}))
+
+    assert SignatureWorker(work_dir).sign_documents() == 0
+
+    certificate = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234").signing_certificate()
+    results = json.loads((work_dir / "output.json").read_text())["results"]
+    status = json.loads((work_dir / "status.json").read_text())
+    # el 7 no tiene PDF: no tiene resultado
+    assert [r["document_id"] for r in results] == [1, 2, 3, 4, 5, 6, 8, 9]
+    assert [r["document_id"] for r in results if not r["success"]] == [4]
+    assert status["status"] == "success" and status["message"] == "Firmados 7 de 9 documentos"
+    assert "Firmando en 2 procesos" in (work_dir / "worker.log").read_text()
+    for r in results:
+      if r["success"]:
+        assert signature_ok((work_dir / r["signed_filename"]).read_bytes(), certificate)
@@ -4,6 +4,7 @@ que el cliente puede comunicarse con él correctamente.
 """
 
 import json
+from pathlib import Path
 import time
 import threading
 import pytest
@@ -12,6 +13,8 @@ from unittest.mock import patch, MagicMock
 from http.server import HTTPServer
 
 from src.maya_signer_service import MayaServiceHandler, MayaSignerService
+from subprocess_signature_manager import SubprocessSignatureManager
+from odoo_stand_in import OdooStandIn, BATCH_MODEL, DOCUMENT_MODEL
 
 
 TEST_PORT = 50399  # Puerto diferente al de producción
@@ -156,3 +159,53 @@ class TestClienteServicioIntegración:
     )
 
     assert response.status_code == 500
+
+
+def fake_sign_documents(manager, documents, work_dir=None, load_signed=True, **kwargs):
+  """
+  Sustituye al worker: "firma" cada PDF añadiéndole una cola y deja el 
+  output.json que lee SubprocessSignatureManager
+  """
+  results = []
+  for doc in documents:
+    original = Path(doc["pdf_path"]).read_bytes()
+    (work_dir / f"signed_{doc['id']}.pdf").write_bytes(original + b"\n%firma\n")
+    results.append({"document_id": doc["id"], "res_model": doc["res_model"], "res_id": doc["res_id"],
+                    "signed_filename": f"signed_{doc['id']}.pdf",
+                    "original_filename": doc["filename"], "success": True})
+  (work_dir / "output.json").write_text(json.dumps({"results": results}))
+
+  signed_documents = manager.read_results(work_dir, load_signed)
+  return {"success": True, "signed_documents": signed_documents,
+          "total_signed": len(signed_documents), "total_failed": 0, "error": None}
+
+
+class TestServicioSubida:
+
+  @pytest.mark.integration
+  def test_firmados_en_disco_se_suben_en_bloque(self, monkeypatch):
+    """
+    El servicio deja los firmados en disco y aun así se suben en bloque con 
+    submit_signed_documents, sin dos llamadas por documento
+    """
+    monkeypatch.setattr(SubprocessSignatureManager, "sign_documents", fake_sign_documents)
+
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF-1.7\n" + bytes([i]) * 1000 for i in range(3)])
+      service = FakeMayaSignerService()
+      service._spool_upload = MagicMock(return_value=False)
+      service.clear_credentials = MagicMock()
+
+      MayaSignerService.process_signature(
+        service,
+        {"batch": 7, "url": stand_in.url, "database": "testdb", "token": "tok_valid"},
+        {"username": "user@test.com", "password": "pass", "cert_password": "1234",
+         "cert_path": "/cert.p12", "use_dnie": False}
+      )
+
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 1
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+      for doc_id in ids:
+        assert stand_in.signed_pdf(doc_id).endswith(b"\n%firma\n")
+      service._spool_upload.assert_not_called()
@@ -0,0 +1,165 @@
+import pytest
+
+import asyncio
+import os
+import threading
+
+from odoo_client import OdooClient, OdooAuthenticationError, OdooTokenError
+
+from odoo_async_client import AsyncServerProxy, AsyncOdooOperations, get_async_pool, ASYNC_MAX_CONNECTIONS
+from odoo_stand_in import OdooStandIn, BATCH_MODEL, DOCUMENT_MODEL
+
+def async_proxy(stand_in, service="object", protocol="xmlrpc"):
+  return AsyncServerProxy(stand_in.url, service, protocol=protocol)
+
+class TestAsyncServerProxy:
+  """
+  Proxy asyncio contra el servidor de pega
+  """
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol", ["xmlrpc", "jsonrpc"])
+  def test_cientos_de_llamadas_en_un_loop(self, protocol):
+    """
+    300 llamadas a la vez en un único hilo, con las conexiones limitadas por el pool
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+
+      async def run():
+        uid = await async_proxy(stand_in, "common", protocol).authenticate(
+          "testdb", "user@test.com", "pass", {})
+        models = async_proxy(stand_in, "object", protocol)
+        results = await asyncio.gather(*(models.execute_kw("testdb", uid, "pass", BATCH_MODEL, "read",
+                                                           [[7]], {"fields": ["state"]})
+                                         for _ in range(300)))
+        return results, get_async_pool(stand_in.url).stats()
+
+      results, stats = asyncio.run(run())
+
+      assert all(result == [{"id": 7, "state": "draft"}] for result in results)
+      assert stand_in.connections <= ASYNC_MAX_CONNECTIONS
+      assert stats["reused"] >= 300 - ASYNC_MAX_CONNECTIONS
+      assert stats["in_use"] == 0
+
+  @pytest.mark.unit
+  def test_protocolo_desconocido(self):
+    with pytest.raises(ValueError):
+      AsyncServerProxy("http://localhost:8069", "object", protocol="soap")
+
+class TestAsyncOdooOperations:
+  """
+  Operaciones de un lote como corrutinas
+  """
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("bulk_submit", [True, False])
+  def test_muchos_lotes_en_un_loop(self, bulk_submit):
+    """
+    20 lotes completos a la vez en un único hilo, sin hilos de transferencia
+    """
+    with OdooStandIn() as stand_in:
+      pdfs = [b"%PDF-1.4 " + os.urandom(5_000) for _ in range(3)]
+      for batch_id in range(1, 21):
+        stand_in.add_batch(batch_id, f"tok_{batch_id}", pdfs)
+      threads = set(threading.enumerate())
+
+      async def run_batch(batch_id):
+        client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token=f"tok_{batch_id}",
+                            max_workers=4, bulk_submit=bulk_submit)
+        ops = AsyncOdooOperations(client)
+        await ops.authenticate(use_cache=False)
+        documents = await ops.download_unsigned_pdfs(batch_id, max_chunk_bytes=6_000)
+        signed = [{"document_id": doc["id"], "signed_pdf_bytes": doc["pdf_bytes"],
+                   "res_model": doc["res_model"], "res_id": doc["res_id"]} for doc in documents]
+        return await ops.upload_signed_pdfs(batch_id, signed), set(threading.enumerate()) - threads
+
+      async def run():
+        return await asyncio.gather(*(run_batch(batch_id) for batch_id in range(1, 21)))
+
+      results = asyncio.run(run())
+
+      assert all(uploaded for uploaded, _ in results)
+      # los únicos hilos nuevos son los del servidor de pega, uno por conexión
+      assert all("process_request" in thread.name for _, new in results for thread in new)
+      assert all(stand_in.batches[batch_id]["state"] == "done" for batch_id in range(1, 21))
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == (20 if bulk_submit else 0)
+
+  @pytest.mark.integration
+  def test_confirmados(self):
+    with OdooStandIn(bulk_submit=False) as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 2)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+      confirmed = set()
+
+      async def run():
+        ops = AsyncOdooOperations(client)
+        await ops.authenticate(use_cache=False)
+        return await ops.upload_signed_pdfs(7, [{"document_id": i, "signed_pdf_bytes": b"%PDF firmado"}
+                                                for i in ids + [999]], confirmed)
+
+      assert asyncio.run(run()) is False
+      assert confirmed == set(ids)
+      assert stand_in.batches[7]["state"] == "error"
+
+class TestAsyncEngine:
+  """
+  OdooClient con las llamadas RPC en el event loop compartido
+  """
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol,max_workers", [("xmlrpc", 1), ("xmlrpc", 4), ("jsonrpc", 4)])
+  def test_lote_completo(self, protocol, max_workers):
+    with OdooStandIn() as stand_in:
+      pdfs = [b"%PDF-1.4 " + os.urandom(20_000) for _ in range(6)]
+      ids = stand_in.add_batch(7, "tok_valid", pdfs)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          protocol=protocol, max_workers=max_workers, bulk_submit=False,
+                          engine="asyncio")
+      client.authenticate()
+
+      documents = client.download_unsigned_pdfs(7, chunked=True, max_chunk_bytes=50_000)
+      signed = [{"document_id": doc["id"], "signed_pdf_bytes": doc["pdf_bytes"],
+                 "res_model": doc["res_model"], "res_id": doc["res_id"]} for doc in documents]
+
+      assert client.upload_signed_pdfs(7, signed) is True
+      assert [doc["pdf_bytes"] for doc in documents] == pdfs
+      # las transferencias en paralelo son corrutinas, no hilos de OdooDownloadPool/OdooUploadPool
+      assert not [thread for thread in threading.enumerate() if thread.name.startswith("maya_")]
+      assert stand_in.batches[7]["state"] == "done"
+      assert all(stand_in.signed_pdf(i) == pdf for i, pdf in zip(ids, pdfs))
+
+  @pytest.mark.integration
+  def test_subida_en_bloque(self):
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 4)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          engine="asyncio")
+      client.authenticate(use_cache=False)
+
+      assert client.upload_signed_pdfs(7, [{"document_id": i, "signed_pdf_bytes": b"%PDF firmado",
+                                            "res_model": "account.move", "res_id": 100 + i}
+                                           for i in ids]) is True
+
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 1
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+
+  @pytest.mark.integration
+  def test_errores(self):
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+
+      with pytest.raises(OdooAuthenticationError):
+        OdooClient(stand_in.url, "testdb", "user@test.com", "mala", engine="asyncio").authenticate()
+
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_malo",
+                          engine="asyncio")
+      client.authenticate()
+      with pytest.raises(OdooTokenError):
+        client.validate_batch_token(7)
+
+  @pytest.mark.unit
+  def test_motor_desconocido(self):
+    with pytest.raises(ValueError):
+      OdooClient("http://localhost:8069", "db", "user", "pass", engine="gevent")
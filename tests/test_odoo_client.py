@@ -1,11 +1,16 @@
 import pytest
 
 import base64
+import os
+
+from pathlib import Path
 from unittest.mock import patch, MagicMock, PropertyMock
 
 from src.odoo_client import OdooClient, OdooTokenError, OdooAuthenticationError
 import xmlrpc.client
 
+from odoo_stand_in import OdooStandIn, BATCH_MODEL, DOCUMENT_MODEL
+
 def make_client(batch_token="tok_valid"):
   """
   Crea un OdooClient con xmlrpc mockeado
@@ -188,4 +193,794 @@ class TestDownloadUnsignedPdfs:
 
     # Solo el bueno debe pasar
     assert len(result) == 1
-    assert result[0]["id"] == 1
\ No newline at end of file
+    assert result[0]["id"] == 1
+
+class TestDownloadUnsignedPdfsChunked:
+  """
+  Descarga por bloques filtrada en el servidor
+  """
+  def _setup_client(self, metadata, *contents):
+    """
+    Helper: prepara un client con batch info, metadatos y bloques de contenido mockeados
+    """
+    client = make_client()
+    client.models = MagicMock()
+
+    client.models.execute_kw.side_effect = [
+        # 1ª llamada: validate_session_token
+        {"valid": True},
+        # 2ª llamada: read del batch
+        [{"name": "Lote 1", "document_ids": [1, 2, 3], "state": "draft"}],
+        # 3ª llamada: search_read de metadatos
+        metadata,
+        # resto: read del contenido de cada bloque
+        *contents
+    ]
+    return client
+
+  @pytest.mark.unit
+  def test_metadatos_filtran_firmados_en_servidor(self):
+    """
+    La búsqueda de metadatos excluye los firmados y pide sólo el tamaño del PDF
+    """
+    pdf_base64 = base64.b64encode(b"%PDF-1.4 content").decode()
+    metadata = [
+      {"id": 1, "filename": "a.pdf", "state": "unsigned",
+        "res_model": "m", "res_id": 1, "pdf_content": "16.00 bytes"},
+    ]
+
+    client = self._setup_client(metadata, [{"id": 1, "pdf_content": pdf_base64}])
+    result = client.download_unsigned_pdfs(42, chunked=True)
+
+    search_call = client.models.execute_kw.call_args_list[2]
+    args = search_call[0]
+    assert args[3:5] == ("maya_core.signature.batch_document", "search_read")
+    assert ("state", "!=", "signed") in args[5][0]
+    assert args[6]["context"] == {"bin_size": True}
+
+    assert len(result) == 1
+    assert result[0]["pdf_bytes"] == b"%PDF-1.4 content"
+    assert "pdf_content" not in result[0]
+
+  @pytest.mark.unit
+  def test_divide_en_bloques_segun_tamaño(self):
+    """
+    Los documentos se piden en bloques que no superan max_chunk_bytes
+    """
+    pdf_base64 = base64.b64encode(b"pdf").decode()
+    metadata = [
+      {"id": 1, "filename": "a.pdf", "state": "unsigned",
+        "res_model": "m", "res_id": 1, "pdf_content": "600.00 bytes"},
+      {"id": 2, "filename": "b.pdf", "state": "unsigned",
+        "res_model": "m", "res_id": 2, "pdf_content": "300.00 bytes"},
+      {"id": 3, "filename": "c.pdf", "state": "unsigned",
+        "res_model": "m", "res_id": 3, "pdf_content": "1.00 Kb"},
+    ]
+
+    client = self._setup_client(
+      metadata,
+      [{"id": 1, "pdf_content": pdf_base64}, {"id": 2, "pdf_content": pdf_base64}],
+      [{"id": 3, "pdf_content": pdf_base64}],
+    )
+    result = client.download_unsigned_pdfs(42, chunked=True, max_chunk_bytes=1000)
+
+    read_calls = client.models.execute_kw.call_args_list[3:]
+    assert [call[0][5][0] for call in read_calls] == [[1, 2], [3]]
+    assert [doc["id"] for doc in result] == [1, 2, 3]
+
+  @pytest.mark.unit
+  def test_ignora_documentos_sin_contenido(self):
+    """
+    Un binario vacío (False con bin_size) no se llega a pedir
+    """
+    pdf_base64 = base64.b64encode(b"pdf").decode()
+    metadata = [
+      {"id": 1, "filename": "a.pdf", "state": "unsigned",
+        "res_model": "m", "res_id": 1, "pdf_content": False},
+      {"id": 2, "filename": "b.pdf", "state": "unsigned",
+        "res_model": "m", "res_id": 2, "pdf_content": "3.00 bytes"},
+    ]
+
+    client = self._setup_client(metadata, [{"id": 2, "pdf_content": pdf_base64}])
+    result = client.download_unsigned_pdfs(42, chunked=True)
+
+    assert client.models.execute_kw.call_args_list[3][0][5][0] == [2]
+    assert [doc["id"] for doc in result] == [2]
+
+  @pytest.mark.unit
+  def test_interpreta_tamaños_de_odoo(self):
+    """
+    Los tamaños legibles de bin_size se convierten a bytes
+    """
+    assert OdooClient._parse_bin_size("300.00 bytes") == 300
+    assert OdooClient._parse_bin_size("1.50 Kb") == 1536
+    assert OdooClient._parse_bin_size("2.00 Mb") == 2 * 1024 * 1024
+    assert OdooClient._parse_bin_size(1234) == 1234
+    assert OdooClient._parse_bin_size("desconocido") is None
+    assert OdooClient._parse_bin_size(None) is None
+
+class TestSubmitSignedDocuments:
+  """
+  Subida en bloque contra el servidor de pega (tests/odoo_stand_in.py)
+  """
+
+  def _client(self, stand_in, **kwargs):
+    client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                        batch_token="tok_valid", **kwargs)
+    client.authenticate()
+    return client
+
+  def _signed(self, document_ids):
+    return [
+      {"document_id": i, "signed_pdf_bytes": f"%PDF firmado {i}".encode(),
+       "signed_filename": f"doc_{i}_firmado.pdf", "res_model": "account.move", "res_id": 100 + i}
+      for i in document_ids
+    ]
+
+  @pytest.mark.integration
+  def test_sube_en_pocas_llamadas_y_finaliza(self):
+    """
+    Todos los documentos, sus registros origen y el cierre del lote van en una llamada
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 5)
+      client = self._client(stand_in)
+
+      assert client.upload_signed_pdfs(7, self._signed(ids)) is True
+
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 1
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+      assert stand_in.signed_pdf(ids[0]) == b"%PDF firmado 1"
+      assert stand_in.records[("account.move", 101)]["signed_pdf_filename"] == "doc_1_firmado.pdf"
+
+  @pytest.mark.integration
+  def test_divide_en_varias_llamadas_por_tamaño(self):
+    """
+    Con max_chunk_bytes pequeño se hacen varias llamadas y sólo la última finaliza
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 4)
+      client = self._client(stand_in)
+
+      assert client.submit_signed_documents(7, self._signed(ids), max_chunk_bytes=30) is True
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 2
+      assert stand_in.batches[7]["state"] == "done"
+
+  @pytest.mark.integration
+  def test_confirmados_si_falla_a_medias(self):
+    """
+    Si una llamada falla, los documentos de las anteriores quedan confirmados
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 4)
+      client = self._client(stand_in)
+      confirmed = set()
+      submit = stand_in._maya_core_signature_batch__submit_signed_documents
+
+      def fail_second(batch_id, token, documents, finalize=True):
+        if stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") > 1:
+          raise RuntimeError("fallo del servidor")
+        return submit(batch_id, token, documents, finalize=finalize)
+
+      stand_in._maya_core_signature_batch__submit_signed_documents = fail_second
+
+      with pytest.raises(Exception):
+        client._submit_signed_documents(7, self._signed(ids), max_chunk_bytes=30, confirmed=confirmed)
+
+      assert confirmed == set(ids[:2])
+
+  @pytest.mark.integration
+  def test_sin_metodo_en_servidor_sube_documento_a_documento(self):
+    """
+    Si el servidor no expone submit_signed_documents se usan las escrituras de siempre
+    """
+    with OdooStandIn(bulk_submit=False) as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = self._client(stand_in)
+
+      assert client.upload_signed_pdfs(7, self._signed(ids)) is True
+
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 3
+      assert stand_in.count_calls(BATCH_MODEL, "finalize_batch") == 1
+      assert stand_in.signed_pdf(ids[2]) == b"%PDF firmado 3"
+
+      # el segundo lote ya no vuelve a probar el método
+      client.upload_signed_pdfs(7, self._signed(ids))
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 1
+
+  def _on_disk(self, tmp_path, documents):
+    on_disk = []
+    for doc in documents:
+      path = tmp_path / f"signed_{doc['document_id']}.pdf"
+      path.write_bytes(doc.pop("signed_pdf_bytes") + os.urandom(100))
+      on_disk.append(dict(doc, signed_pdf_path=str(path)))
+    return on_disk
+
+  @pytest.mark.integration
+  def test_documentos_en_disco(self, tmp_path, monkeypatch):
+    """
+    Los firmados que sólo están en disco también van en bloque, por trozos
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 4)
+      client = self._client(stand_in)
+      documents = self._on_disk(tmp_path, self._signed(ids))
+      expected = {doc["document_id"]: Path(doc["signed_pdf_path"]).read_bytes() for doc in documents}
+
+      with monkeypatch.context() as m:
+        m.setattr(Path, "read_bytes", lambda self: pytest.fail(f"{self} leído entero"))
+        assert client.submit_signed_documents(7, documents) is True
+
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 1
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+      for document_id, content in expected.items():
+        assert stand_in.signed_pdf(document_id) == content
+
+  @pytest.mark.integration
+  def test_documentos_en_disco_sin_trozos(self, tmp_path):
+    """
+    Con JSON-RPC los firmados en disco no van en bloque (no se leen enteros 
+    para montar la llamada): se suben uno a uno
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = self._client(stand_in, protocol="jsonrpc")
+      documents = self._signed(ids[:1]) + self._on_disk(tmp_path, self._signed(ids[1:]))
+
+      with pytest.raises(ValueError):
+        client.submit_signed_documents(7, documents)
+
+      assert client.upload_signed_pdfs(7, documents) is True
+
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 1
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 2
+      assert stand_in.count_calls(BATCH_MODEL, "finalize_batch") == 1
+      assert stand_in.batches[7]["state"] == "done"
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("max_workers", [1, 4])
+  def test_transfer_http_con_subida_en_bloque(self, tmp_path, monkeypatch, max_workers):
+    """
+    Con transfer 'http' los firmados en disco van en crudo al controlador y 
+    sólo los que están en memoria van en bloque
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 4)
+      client = self._client(stand_in, max_workers=max_workers)
+      documents = self._signed(ids[:1]) + self._on_disk(tmp_path, self._signed(ids[1:]))
+      expected = {doc["document_id"]: Path(doc["signed_pdf_path"]).read_bytes() for doc in documents[1:]}
+      submitted = []
+      submit = stand_in._maya_core_signature_batch__submit_signed_documents
+      monkeypatch.setattr(stand_in, "_maya_core_signature_batch__submit_signed_documents",
+                          lambda batch_id, token, docs, **kw: submitted.extend(d["document_id"] for d in docs)
+                          or submit(batch_id, token, docs, **kw))
+
+      with monkeypatch.context() as m:
+        m.setattr(Path, "read_bytes", lambda self: pytest.fail(f"{self} leído entero"))
+        assert client.upload_signed_pdfs(7, documents, transfer="http") is True
+
+      assert submitted == ids[:1]
+      assert stand_in.count_calls(DOCUMENT_MODEL, "upload") == 3
+      assert stand_in.uploaded_bytes == sum(len(content) for content in expected.values())
+      assert stand_in.count_calls(BATCH_MODEL, "finalize_batch") == 1
+      assert stand_in.batches[7]["state"] == "done"
+      for document_id, content in expected.items():
+        assert stand_in.signed_pdf(document_id) == content
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("transfer", ["http", "rpc"])
+  def test_subida_del_servicio_usa_delta(self, tmp_path, transfer):
+    """
+    upload_signed_pdfs con los firmados en disco y su original, como los 
+    deja el servicio (load_signed=False), sube sólo la cola aunque haya 
+    subida en bloque
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = self._client(stand_in, max_workers=4)
+      documents = []
+      for doc in self._signed(ids):
+        signed = tmp_path / f"signed_{doc['document_id']}.pdf"
+        signed.write_bytes(b"%PDF" + doc.pop("signed_pdf_bytes"))
+        (tmp_path / f"unsigned_{doc['document_id']}.pdf").write_bytes(b"%PDF")
+        documents.append(dict(doc, signed_pdf_path=str(signed),
+                              original_pdf_path=str(tmp_path / f"unsigned_{doc['document_id']}.pdf")))
+
+      assert client.upload_signed_pdfs(7, documents, transfer=transfer) is True
+
+      assert stand_in.count_calls(BATCH_MODEL, "submit_signed_documents") == 0
+      assert stand_in.count_calls(DOCUMENT_MODEL, "upload_signed_delta") == 3
+      assert stand_in.count_calls(DOCUMENT_MODEL, "upload") == 0
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+
+  @pytest.mark.integration
+  def test_token_invalido_lanza_error(self):
+    """
+    Si el servidor rechaza el token se lanza OdooTokenError
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "otro_token", [b"%PDF"])
+      client = self._client(stand_in)
+
+      with pytest.raises(OdooTokenError, match="Token inválido"):
+        client.submit_signed_documents(7, self._signed(ids))
+
+class TestSingleUpload:
+  """
+  Subida única del PDF firmado, copiado por el servidor al registro origen
+  """
+
+  def _upload(self, stand_in, single_upload=True):
+    ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 2)
+    client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                        batch_token="tok_valid", bulk_submit=False, single_upload=single_upload)
+    client.authenticate()
+
+    signed = [
+      {"document_id": i, "signed_pdf_bytes": b"%PDF firmado", "signed_filename": f"doc_{i}_firmado.pdf",
+       "res_model": "account.move", "res_id": 100 + i}
+      for i in ids
+    ]
+    assert client.upload_signed_pdfs(7, signed) is True
+    return ids
+
+  @pytest.mark.integration
+  def test_pdf_se_sube_una_vez_y_el_servidor_lo_copia(self):
+    """
+    El registro origen se actualiza con propagate_signed_pdf, sin escribir el PDF de nuevo
+    """
+    with OdooStandIn() as stand_in:
+      ids = self._upload(stand_in)
+
+      assert stand_in.count_calls("account.move", "write") == 0
+      assert stand_in.count_calls(DOCUMENT_MODEL, "propagate_signed_pdf") == 2
+      record = stand_in.records[("account.move", 100 + ids[0])]
+      assert base64.b64decode(record["signed_pdf"]) == b"%PDF firmado"
+
+  @pytest.mark.integration
+  def test_sin_metodo_en_servidor_escribe_el_registro_origen(self):
+    """
+    Si el servidor no tiene propagate_signed_pdf, se escribe el registro origen como siempre
+    """
+    with OdooStandIn(propagate=False) as stand_in:
+      ids = self._upload(stand_in)
+
+      assert stand_in.count_calls("account.move", "write") == 2
+      # sólo se prueba una vez por servidor
+      assert stand_in.count_calls(DOCUMENT_MODEL, "propagate_signed_pdf") == 1
+      assert stand_in.records[("account.move", 100 + ids[1])]["signed_pdf_filename"] == f"doc_{ids[1]}_firmado.pdf"
+
+  @pytest.mark.integration
+  def test_modo_desactivado_escribe_el_registro_origen(self):
+    """
+    Con single_upload=False se mantiene la doble escritura
+    """
+    with OdooStandIn() as stand_in:
+      self._upload(stand_in, single_upload=False)
+
+      assert stand_in.count_calls("account.move", "write") == 2
+      assert stand_in.count_calls(DOCUMENT_MODEL, "propagate_signed_pdf") == 0
+
+class TestJsonRpcTransport:
+  """
+  Mismo cliente con el transporte JSON-RPC (/jsonrpc)
+  """
+
+  def _client(self, stand_in):
+    client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                        batch_token="tok_valid", protocol="jsonrpc")
+    assert client.authenticate() is True
+    return client
+
+  @pytest.mark.integration
+  def test_descarga_y_sube_por_jsonrpc(self):
+    """
+    El ciclo descarga-subida funciona igual que con XML-RPC
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF uno", b"%PDF dos"])
+      client = self._client(stand_in)
+
+      documents = client.download_unsigned_pdfs(7, chunked=True)
+      assert [doc["pdf_bytes"] for doc in documents] == [b"%PDF uno", b"%PDF dos"]
+
+      signed = [
+        {"document_id": doc["id"], "signed_pdf_bytes": doc["pdf_bytes"] + b" firmado",
+         "signed_filename": "x.pdf", "res_model": doc["res_model"], "res_id": doc["res_id"]}
+        for doc in documents
+      ]
+      assert client.upload_signed_pdfs(7, signed) is True
+      assert stand_in.signed_pdf(ids[1]) == b"%PDF dos firmado"
+
+  @pytest.mark.integration
+  def test_errores_del_servidor_llegan_como_fault(self):
+    """
+    Los errores JSON-RPC se convierten en xmlrpc.client.Fault
+    """
+    with OdooStandIn(bulk_submit=False) as stand_in:
+      client = self._client(stand_in)
+
+      with pytest.raises(xmlrpc.client.Fault, match="does not exist"):
+        client.execute("maya_core.signature.batch", "metodo_inexistente")
+
+  @pytest.mark.integration
+  def test_credenciales_invalidas(self):
+    """
+    authenticate lanza OdooAuthenticationError si el servidor devuelve False
+    """
+    with OdooStandIn() as stand_in:
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "mala", protocol="jsonrpc")
+
+      with pytest.raises(OdooAuthenticationError):
+        client.authenticate()
+
+  @pytest.mark.unit
+  def test_protocolo_desconocido(self):
+    """
+    Un protocolo no soportado es un error de configuración
+    """
+    with pytest.raises(ValueError, match="Protocolo desconocido"):
+      OdooClient("https://maya.example.com", "db", "u", "p", protocol="soap")
+
+class TestStreamUnsignedPdfs:
+  """
+  Descarga en crudo por HTTP (/web/content) directamente a disco
+  """
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("max_workers", [1, 3])
+  def test_descarga_a_ficheros_sin_base64(self, tmp_path, max_workers):
+    """
+    Cada PDF pendiente acaba en target_dir/unsigned_<id>.pdf y el resultado sólo lleva la ruta
+    """
+    pdfs = [b"%PDF-1.4 " + bytes([i]) * 200_000 for i in range(4)]
+
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", pdfs)
+      stand_in.documents[ids[1]]["state"] = "signed"
+
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                          batch_token="tok_valid", max_workers=max_workers)
+      client.authenticate()
+
+      documents = client.download_unsigned_pdfs(7, target_dir=tmp_path, transfer="http")
+
+      assert [doc["id"] for doc in documents] == [ids[0], ids[2], ids[3]]
+      for doc, pdf in zip(documents, [pdfs[0], pdfs[2], pdfs[3]]):
+        assert "pdf_bytes" not in doc and "pdf_content" not in doc
+        assert doc["pdf_path"] == str(tmp_path / f"unsigned_{doc['id']}.pdf")
+        assert (tmp_path / f"unsigned_{doc['id']}.pdf").read_bytes() == pdf
+
+      # una única sesión web para todo el lote
+      assert len(stand_in.sessions) == 1
+
+  @pytest.mark.integration
+  def test_credenciales_web_invalidas(self, tmp_path):
+    """
+    Si la sesión web no se puede abrir se lanza OdooHttpError
+    """
+    from odoo_http import OdooHttpError
+
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+      client.authenticate()
+      # execute_kw sólo usa el uid, la sesión web necesita el login
+      client.username = "otro@test.com"
+
+      with pytest.raises(OdooHttpError, match="sesión web"):
+        client.download_unsigned_pdfs(7, target_dir=tmp_path, transfer="http")
+
+class TestUploadSignedFile:
+  """
+  Subida en crudo (multipart) de los PDFs firmados desde disco
+  """
+
+  def _signed_files(self, tmp_path, ids):
+    documents = []
+    for i in ids:
+      path = tmp_path / f"signed_{i}.pdf"
+      path.write_bytes(b"%PDF firmado " + bytes([i]) * 300_000)
+      documents.append({"document_id": i, "signed_pdf_path": str(path),
+                        "signed_filename": f"doc_{i}_firmado.pdf",
+                        "res_model": "account.move", "res_id": 100 + i})
+    return documents
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("max_workers", [1, 3])
+  def test_sube_desde_disco_sin_rpc(self, tmp_path, max_workers):
+    """
+    Los PDFs llegan al servidor en crudo y el lote se finaliza por RPC
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                          batch_token="tok_valid", max_workers=max_workers, bulk_submit=False)
+      client.authenticate()
+      documents = self._signed_files(tmp_path, ids)
+
+      assert client.upload_signed_pdfs(7, documents, transfer="http") is True
+
+      assert stand_in.count_calls(DOCUMENT_MODEL, "upload") == 3
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+      for doc in documents:
+        expected = (tmp_path / f"signed_{doc['document_id']}.pdf").read_bytes()
+        assert stand_in.signed_pdf(doc["document_id"]) == expected
+      assert stand_in.uploaded_bytes == sum(len(stand_in.signed_pdf(i)) for i in ids)
+
+  @pytest.mark.integration
+  def test_sin_controlador_sube_por_rpc(self, tmp_path):
+    """
+    Si el servidor no tiene /maya_signer/upload se lee el fichero y se sube por RPC
+    """
+    with OdooStandIn(upload_controller=False) as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 2)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          bulk_submit=False)
+      client.authenticate()
+
+      assert client.upload_signed_pdfs(7, self._signed_files(tmp_path, ids), transfer="http") is True
+
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 2
+      assert stand_in.signed_pdf(ids[0]).startswith(b"%PDF firmado")
+
+  @pytest.mark.integration
+  def test_token_invalido_cuenta_como_fallo(self, tmp_path):
+    """
+    El controlador rechaza el token y el documento cuenta como fallido
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+      client.authenticate()
+      client.batch_token = "otro"
+
+      assert client.upload_signed_file(self._signed_files(tmp_path, ids)[0]) is False
+      assert stand_in.documents[ids[0]]["state"] == "unsigned"
+
+class TestSessionCache:
+  """
+  Reutilización de la sesión autenticada entre lotes
+  """
+
+  def _client(self, stand_in, password="pass"):
+    return OdooClient(stand_in.url, "testdb", "user@test.com", password, batch_token="tok_valid")
+
+  @pytest.mark.integration
+  def test_lotes_seguidos_no_reautentican(self):
+    """
+    El segundo lote pasa directamente a validar el token
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+
+      for _ in range(3):
+        client = self._client(stand_in)
+        assert client.authenticate() is True
+        assert client.validate_batch_token(7)["valid"] is True
+
+      assert stand_in.count_calls("", "authenticate") == 1
+
+  @pytest.mark.integration
+  def test_otra_contrasena_no_usa_la_cache(self):
+    """
+    Con otra contraseña se autentica contra el servidor (y falla)
+    """
+    with OdooStandIn() as stand_in:
+      self._client(stand_in).authenticate()
+
+      with pytest.raises(OdooAuthenticationError):
+        self._client(stand_in, password="otra").authenticate()
+
+  @pytest.mark.integration
+  def test_caduca_con_el_ttl(self, monkeypatch):
+    """
+    Una sesión más antigua que SESSION_TTL no se reutiliza
+    """
+    import src.odoo_client as odoo_client
+
+    with OdooStandIn() as stand_in:
+      monkeypatch.setattr(odoo_client, "SESSION_TTL", -1)
+      self._client(stand_in).authenticate()
+      self._client(stand_in).authenticate()
+
+      assert stand_in.count_calls("", "authenticate") == 2
+
+  @pytest.mark.integration
+  def test_access_denied_invalida_la_sesion(self):
+    """
+    Si el servidor rechaza las credenciales guardadas, se olvida la sesión
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      self._client(stand_in).authenticate()
+      stand_in.password = "cambiada"
+
+      client = self._client(stand_in)
+      client.authenticate()
+      with pytest.raises(OdooTokenError):
+        client.validate_batch_token(7)
+
+      with pytest.raises(OdooAuthenticationError):
+        self._client(stand_in).authenticate()
+
+  @pytest.mark.integration
+  def test_reutiliza_y_renueva_la_sesion_web(self, tmp_path):
+    """
+    La cookie web se reutiliza entre lotes y, si caduca, se abre otra
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF uno", b"%PDF dos"])
+
+      for _ in range(2):
+        client = self._client(stand_in)
+        client.authenticate()
+        documents = client.download_unsigned_pdfs(7, target_dir=tmp_path, transfer="http")
+        assert len(documents) == 2
+
+      assert stand_in.calls.count(("common", "", "authenticate")) == 1
+      assert stand_in.calls.count(("web", "", "authenticate")) == 1
+
+      stand_in.sessions.clear()
+      client = self._client(stand_in)
+      client.authenticate()
+      assert len(client.download_unsigned_pdfs(7, target_dir=tmp_path, transfer="http")) == 2
+      assert stand_in.calls.count(("web", "", "authenticate")) == 2
+
+class TestAuthModes:
+  """
+  Autenticación con contraseña, clave API o sesión web
+  """
+
+  def _cycle(self, client, batch_id):
+    """
+    Autentica, descarga y sube (documento a documento) un lote
+    """
+    client.authenticate()
+    client.validate_batch_token(batch_id)
+    documents = client.download_unsigned_pdfs(batch_id, chunked=True)
+    signed = [{"document_id": doc["id"], "signed_pdf_bytes": doc["pdf_bytes"] + b" firmado",
+               "signed_filename": doc["filename"], "res_model": doc["res_model"],
+               "res_id": doc["res_id"]} for doc in documents]
+    return client.upload_signed_pdfs(batch_id, signed)
+
+  @pytest.mark.unit
+  def test_modo_desconocido(self):
+    with pytest.raises(ValueError):
+      OdooClient("http://localhost:8069", "testdb", "user", "pass", auth_mode="kerberos")
+
+  @pytest.mark.integration
+  def test_modo_password_verifica_en_cada_llamada(self):
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                          batch_token="tok_valid", bulk_submit=False)
+
+      assert self._cycle(client, 7) is True
+      assert stand_in.password_checks > 6
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("max_workers", [1, 3])
+  def test_modo_session_verifica_una_vez(self, max_workers):
+    """
+    Con la sesión web la contraseña sólo se verifica al autenticar
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          bulk_submit=False, auth_mode="session", max_workers=max_workers)
+
+      assert self._cycle(client, 7) is True
+      assert stand_in.password_checks == 1
+      assert stand_in.signed_pdf(ids[0]) == b"%PDF firmado"
+      assert stand_in.batches[7]["state"] == "done"
+
+  @pytest.mark.integration
+  def test_modo_session_renueva_la_sesion_caducada(self):
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                          batch_token="tok_valid", auth_mode="session")
+      client.authenticate()
+      stand_in.sessions.clear()
+
+      assert client.validate_batch_token(7)["valid"] is True
+      assert stand_in.password_checks == 2
+
+  @pytest.mark.integration
+  def test_modo_session_credenciales_invalidas(self):
+    with OdooStandIn() as stand_in:
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "otra", auth_mode="session")
+
+      with pytest.raises(OdooAuthenticationError):
+        client.authenticate()
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("max_workers", [1, 3])
+  def test_modo_api_key(self, max_workers):
+    """
+    La clave API sustituye a la contraseña en las llamadas RPC
+    """
+    with OdooStandIn(api_key="clave_api") as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "clave_api",
+                          batch_token="tok_valid", auth_mode="api_key", max_workers=max_workers)
+
+      assert self._cycle(client, 7) is True
+      assert stand_in.batches[7]["state"] == "done"
+
+class TestTokenValidationCache:
+  """
+  Validación del token una sola vez por trabajo
+  """
+
+  def _client(self, stand_in, **kwargs):
+    client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid", **kwargs)
+    client.authenticate()
+    return client
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("max_workers", [1, 3])
+  def test_un_lote_valida_una_vez(self, max_workers):
+    """
+    Validación inicial, descarga y subida comparten la misma validación
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = self._client(stand_in, max_workers=max_workers, bulk_submit=False)
+
+      client.validate_batch_token(7)
+      documents = client.download_unsigned_pdfs(7, chunked=True)
+      signed = [{"document_id": doc["id"], "signed_pdf_bytes": b"%PDF firmado",
+                 "signed_filename": doc["filename"]} for doc in documents]
+      assert client.upload_signed_pdfs(7, signed) is True
+
+      assert stand_in.count_calls(BATCH_MODEL, "validate_session_token") == 1
+
+  @pytest.mark.integration
+  def test_force_vuelve_al_servidor(self):
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = self._client(stand_in)
+
+      client.validate_batch_token(7)
+      client.validate_batch_token(7, force=True)
+
+      assert stand_in.count_calls(BATCH_MODEL, "validate_session_token") == 2
+
+  @pytest.mark.integration
+  def test_caducidad_del_servidor(self):
+    """
+    Con una caducidad ya pasada, cada validación va al servidor
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      stand_in.batches[7]["token_expires"] = "2000-01-01 00:00:00"
+      client = self._client(stand_in)
+
+      client.validate_batch_token(7)
+      client.validate_batch_token(7)
+
+      assert stand_in.count_calls(BATCH_MODEL, "validate_session_token") == 2
+
+  @pytest.mark.integration
+  def test_error_de_token_revalida(self):
+    """
+    Si una llamada falla por el token, la siguiente validación va al servidor
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = self._client(stand_in)
+      client.validate_batch_token(7)
+      stand_in.batches[7]["token"] = "revocado"
+
+      with pytest.raises(OdooTokenError):
+        client.submit_signed_documents(7, [{"document_id": ids[0], "signed_pdf_bytes": b"%PDF"}])
+
+      with pytest.raises(OdooTokenError):
+        client.validate_batch_token(7)
+      assert stand_in.count_calls(BATCH_MODEL, "validate_session_token") == 2
@@ -0,0 +1,225 @@
+import pytest
+
+import threading
+import time
+import xmlrpc.client
+
+from src.odoo_client import OdooClient
+
+# mismo módulo que importa odoo_client (los limitadores son globales del módulo)
+import odoo_rate_limiter
+from odoo_rate_limiter import (AimdConcurrency, OdooRateLimiter, TokenBucket, get_rate_limiter,
+                               is_overload, rate_limiter_stats)
+from odoo_http import OdooHttpError
+from odoo_stand_in import OdooStandIn
+
+class FakeClock:
+  """
+  Reloj de time.monotonic/time.sleep que sólo avanza al dormir
+  """
+  def __init__(self):
+    self.now = 1000.0
+
+  def monotonic(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+  fake = FakeClock()
+  monkeypatch.setattr(odoo_rate_limiter.time, "monotonic", fake.monotonic)
+  monkeypatch.setattr(odoo_rate_limiter.time, "sleep", fake.sleep)
+  return fake
+
+class TestTokenBucket:
+  """
+  Límite de peticiones por segundo
+  """
+
+  @pytest.mark.unit
+  def test_rafaga_y_ritmo(self, clock):
+    bucket = TokenBucket(rate=10, burst=5)
+
+    waits = [bucket.acquire() for _ in range(10)]
+
+    # las 5 primeras salen en ráfaga, el resto a 10 por segundo
+    assert waits[:5] == [0.0] * 5
+    assert all(w == pytest.approx(0.1) for w in waits[5:])
+    assert clock.now == pytest.approx(1000.5)
+
+  @pytest.mark.unit
+  def test_se_recarga_con_el_tiempo(self, clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    for _ in range(5):
+      bucket.acquire()
+
+    clock.now += 10
+
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+
+class TestAimdConcurrency:
+  """
+  Concurrencia con aumento aditivo y reducción multiplicativa
+  """
+
+  @pytest.mark.unit
+  def test_aumenta_uno_por_ronda(self):
+    concurrency = AimdConcurrency(initial=4, maximum=6)
+
+    for _ in range(5):
+      concurrency.release(concurrency.acquire(), overloaded=False)
+    assert int(concurrency.limit) == 5
+
+    for _ in range(100):
+      concurrency.release(concurrency.acquire(), overloaded=False)
+    assert concurrency.limit == 6
+
+  @pytest.mark.unit
+  def test_reduce_a_la_mitad_una_vez_por_tanda(self, clock):
+    concurrency = AimdConcurrency(initial=8, minimum=1)
+    started = [concurrency.acquire() for _ in range(4)]
+    clock.now += 1
+
+    # cuatro peticiones en vuelo que fallan a la vez: una sola reducción
+    for s in started:
+      concurrency.release(s, overloaded=True)
+    assert concurrency.limit == 4
+    assert concurrency.decreases == 1
+
+    clock.now += 1
+    concurrency.release(concurrency.acquire(), overloaded=True)
+    clock.now += 1
+    concurrency.release(concurrency.acquire(), overloaded=True)
+    clock.now += 1
+    concurrency.release(concurrency.acquire(), overloaded=True)
+    assert concurrency.limit == 1
+
+  @pytest.mark.unit
+  def test_limita_peticiones_en_vuelo(self):
+    concurrency = AimdConcurrency(initial=2, maximum=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+      started = concurrency.acquire()
+      with lock:
+        active.append(1)
+        peak.append(len(active))
+      time.sleep(0.01)
+      with lock:
+        active.pop()
+      concurrency.release(started, overloaded=False)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    assert max(peak) == 2
+    assert concurrency.in_flight == 0
+
+class TestOdooRateLimiter:
+  """
+  Limitador compartido de las llamadas a un servidor
+  """
+
+  @pytest.mark.unit
+  def test_senales_de_saturacion(self):
+    assert is_overload(TimeoutError())
+    assert is_overload(xmlrpc.client.ProtocolError("host", 503, "Service Unavailable", {}))
+    assert is_overload(xmlrpc.client.ProtocolError("host", 429, "Too Many Requests", {}))
+    assert is_overload(OdooHttpError("Error HTTP 502", 502))
+
+    assert not is_overload(xmlrpc.client.Fault(1, "ValidationError"))
+    assert not is_overload(OdooHttpError("Error HTTP 403", 403))
+    assert not is_overload(ConnectionRefusedError())
+
+  @pytest.mark.unit
+  def test_respuesta_lenta_reduce(self, clock):
+    limiter = OdooRateLimiter(slow_call=5, initial=4)
+
+    with limiter.slot():
+      clock.now += 6
+
+    assert limiter.stats()["limit"] == 2
+    assert limiter.stats()["overloaded"] == 1
+
+  @pytest.mark.unit
+  def test_transferencia_lenta_no_reduce(self, clock):
+    """
+    Una transferencia larga no es señal de saturación, pero sus errores sí
+    """
+    limiter = OdooRateLimiter(slow_call=5, initial=4)
+
+    with limiter.slot(transfer=True):
+      clock.now += 60
+
+    assert limiter.stats()["limit"] == 4
+    assert limiter.stats()["overloaded"] == 0
+
+    with pytest.raises(TimeoutError):
+      with limiter.slot(transfer=True):
+        raise TimeoutError()
+
+    assert limiter.stats()["limit"] == 2
+
+  @pytest.mark.unit
+  def test_error_reduce_y_se_propaga(self):
+    limiter = OdooRateLimiter(initial=4)
+
+    with pytest.raises(TimeoutError):
+      with limiter.slot():
+        raise TimeoutError()
+
+    with pytest.raises(xmlrpc.client.Fault):
+      with limiter.slot():
+        raise xmlrpc.client.Fault(1, "ValidationError")
+
+    stats = limiter.stats()
+    assert stats["limit"] == 2
+    assert stats["calls"] == 2
+    assert stats["in_flight"] == 0
+
+  @pytest.mark.integration
+  def test_compartido_por_todos_los_clientes(self):
+    """
+    Todos los clientes (y sus clones) de un servidor usan el mismo limitador
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      limiter = get_rate_limiter(stand_in.url)
+
+      for _ in range(2):
+        client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+        client.authenticate()
+        client.clone().validate_batch_token(7, force=True)
+
+      assert limiter.stats()["calls"] == 2
+      assert rate_limiter_stats()[stand_in.url]["calls"] == 2
+
+  @pytest.mark.integration
+  def test_servidor_saturado_reduce_concurrencia(self):
+    """
+    Los 503 del servidor reducen las peticiones simultáneas de todo el proceso
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 4)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          max_workers=4, bulk_submit=False)
+      client.authenticate()
+      client.validate_batch_token(7)
+      stand_in.fail_requests = ["unavailable"] * 2
+
+      signed = [{"document_id": i, "signed_pdf_bytes": b"%PDF firmado", "signed_filename": "f.pdf"}
+                for i in ids]
+      assert client.upload_signed_pdfs(7, signed) is True
+
+      stats = get_rate_limiter(stand_in.url).stats()
+      assert stats["overloaded"] == 2
+      assert 1 <= stats["decreases"] <= 2
+      assert stats["in_flight"] == 0
+      assert stand_in.batches[7]["state"] == "done"
@@ -0,0 +1,259 @@
+import pytest
+
+import base64
+import http.client
+import xmlrpc.client
+
+from src.odoo_client import OdooClient
+
+# mismo módulo que importa odoo_client (los circuit breakers son globales del módulo)
+import odoo_retry
+from odoo_retry import (CircuitBreaker, CircuitOpenError, call_with_retry, get_circuit_breaker,
+                        is_transient, is_unprocessed, backoff_delay, BREAKER_THRESHOLD)
+from odoo_http import OdooHttpError
+from odoo_stand_in import OdooStandIn, DOCUMENT_MODEL, BATCH_MODEL
+
+def make_client(stand_in, protocol="xmlrpc", **kwargs):
+  client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                      protocol=protocol, bulk_submit=False, **kwargs)
+  client.authenticate()
+  return client
+
+def signed(ids):
+  return [{"document_id": i, "signed_pdf_bytes": b"%%PDF firmado %d" % i,
+           "signed_filename": f"doc_{i}_firmado.pdf", "res_model": "account.move", "res_id": 100 + i}
+          for i in ids]
+
+class TestRetryEngine:
+  """
+  Reintentos con espera exponencial y circuit breaker
+  """
+
+  @pytest.mark.unit
+  def test_errores_pasajeros(self):
+    assert is_transient(ConnectionResetError())
+    assert is_transient(http.client.RemoteDisconnected())
+    assert is_transient(TimeoutError())
+    assert is_transient(xmlrpc.client.ProtocolError("host", 503, "Service Unavailable", {}))
+    assert is_transient(OdooHttpError("Error HTTP 502", 502))
+
+    assert not is_transient(xmlrpc.client.Fault(3, "Access Denied"))
+    assert not is_transient(xmlrpc.client.ProtocolError("host", 404, "Not Found", {}))
+    assert not is_transient(OdooHttpError("Error HTTP 403", 403))
+    assert not is_transient(FileNotFoundError())
+    assert not is_transient(CircuitOpenError())
+
+  @pytest.mark.unit
+  def test_errores_sin_procesar(self):
+    """
+    Sólo estos errores permiten reintentar una llamada no idempotente
+    """
+    assert is_unprocessed(ConnectionRefusedError())
+    assert is_unprocessed(xmlrpc.client.ProtocolError("host", 503, "Service Unavailable", {}))
+    assert is_unprocessed(OdooHttpError("Error HTTP 429", 429))
+
+    assert not is_unprocessed(ConnectionResetError())
+    assert not is_unprocessed(TimeoutError())
+    assert not is_unprocessed(OdooHttpError("Error HTTP 502", 502))
+
+  @pytest.mark.unit
+  def test_espera_exponencial_con_jitter(self, monkeypatch):
+    monkeypatch.setattr(odoo_retry, "RETRY_BASE_DELAY", 1.0)
+    monkeypatch.setattr(odoo_retry, "RETRY_MAX_DELAY", 4.0)
+
+    for retry, delay in [(0, 1.0), (1, 2.0), (2, 4.0), (5, 4.0)]:
+      delays = {backoff_delay(retry) for _ in range(20)}
+      assert all(delay / 2 <= d <= delay for d in delays)
+      assert len(delays) > 1
+
+  @pytest.mark.unit
+  def test_reintenta_hasta_que_funciona(self):
+    errors = [ConnectionResetError(), TimeoutError()]
+
+    def action():
+      if errors:
+        raise errors.pop(0)
+      return "ok"
+
+    assert call_with_retry(action, "http://odoo") == "ok"
+    assert get_circuit_breaker("http://odoo").failures == 0
+
+  @pytest.mark.unit
+  def test_no_reintenta_fault(self):
+    calls = []
+
+    def action():
+      calls.append(1)
+      raise xmlrpc.client.Fault(1, "ValidationError")
+
+    with pytest.raises(xmlrpc.client.Fault):
+      call_with_retry(action, "http://odoo")
+    assert len(calls) == 1
+
+  @pytest.mark.unit
+  def test_no_idempotente_sin_procesar(self):
+    """
+    Una llamada no idempotente no se repite si pudo llegar al servidor
+    """
+    calls = []
+
+    def action():
+      calls.append(1)
+      raise ConnectionResetError()
+
+    with pytest.raises(ConnectionResetError):
+      call_with_retry(action, "http://odoo", retry_if=is_unprocessed)
+    assert len(calls) == 1
+
+    errors = [ConnectionRefusedError(), OdooHttpError("Error HTTP 503", 503)]
+
+    def refused():
+      if errors:
+        raise errors.pop(0)
+      return "ok"
+
+    assert call_with_retry(refused, "http://odoo", retry_if=is_unprocessed) == "ok"
+
+  @pytest.mark.unit
+  def test_agota_los_intentos(self):
+    calls = []
+
+    def action():
+      calls.append(1)
+      raise ConnectionResetError()
+
+    with pytest.raises(ConnectionResetError):
+      call_with_retry(action, "http://odoo", attempts=3)
+    assert len(calls) == 3
+
+  @pytest.mark.unit
+  def test_circuit_breaker(self, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(odoo_retry.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+      breaker.before_call()
+
+    # pasado el cooldown pasa una única llamada de prueba
+    now[0] += 31
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+      breaker.before_call()
+
+    # si falla, se vuelve a abrir
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+      breaker.before_call()
+
+    now[0] += 31
+    breaker.before_call()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.before_call()
+
+class TestResilientUpload:
+  """
+  Subida de los PDFs firmados con fallos de red simulados en el servidor de pega
+  """
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol", ["xmlrpc", "jsonrpc"])
+  def test_servidor_no_disponible(self, protocol):
+    """
+    Un 503 pasajero del proxy se reintenta y el lote se sube entero
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 2)
+      client = make_client(stand_in, protocol)
+      client.validate_batch_token(7)
+      stand_in.fail_requests = ["unavailable", "unavailable"]
+
+      assert client.upload_signed_pdfs(7, signed(ids)) is True
+
+      assert stand_in.fail_requests == []
+      assert stand_in.batches[7]["state"] == "done"
+      assert [stand_in.signed_pdf(i) for i in ids] == [b"%%PDF firmado %d" % i for i in ids]
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol", ["xmlrpc", "jsonrpc"])
+  def test_respuesta_perdida_de_un_write(self, protocol):
+    """
+    Si el write llega pero se pierde la respuesta, se reintenta: escribe los 
+    mismos valores
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = make_client(stand_in, protocol)
+      client.validate_batch_token(7)
+      stand_in.fail_requests = ["drop"]
+
+      assert client.upload_signed_pdfs(7, signed(ids)) is True
+
+      assert stand_in.replayed == 1
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 1
+      assert stand_in.batches[7]["state"] == "done"
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol", ["xmlrpc", "jsonrpc"])
+  def test_finalize_batch_rechazado_se_reintenta(self, protocol):
+    """
+    finalize_batch no es idempotente, pero si el servidor la rechazó con un 
+    503 no la procesó y se reintenta
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = make_client(stand_in, protocol)
+      client.validate_batch_token(7)
+      # write del documento, propagate_signed_pdf y finalize_batch
+      stand_in.fail_requests = [None, None, "unavailable"]
+
+      assert client.upload_signed_pdfs(7, signed(ids)) is True
+
+      assert stand_in.fail_requests == []
+      assert stand_in.count_calls(BATCH_MODEL, "finalize_batch") == 1
+      assert stand_in.count_calls(BATCH_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+
+  @pytest.mark.integration
+  def test_subida_http_reintentada(self, tmp_path):
+    """
+    La subida en crudo al controlador también se reintenta sin duplicarse
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = make_client(stand_in)
+      client.validate_batch_token(7)
+      client._get_http_session()
+      path = tmp_path / "firmado.pdf"
+      path.write_bytes(b"%PDF firmado")
+      stand_in.fail_requests = ["unavailable", "drop"]
+
+      assert client.upload_signed_pdfs(7, [{"document_id": ids[0], "signed_pdf_path": str(path),
+                                            "signed_filename": "firmado.pdf"}], transfer="http") is True
+
+      assert stand_in.replayed == 1
+      assert stand_in.uploaded_bytes == len(b"%PDF firmado")
+      assert stand_in.signed_pdf(ids[0]) == b"%PDF firmado"
+
+  @pytest.mark.integration
+  def test_circuito_abierto(self):
+    """
+    Con el servidor caído el circuito se abre y el resto de documentos no 
+    espera a agotar sus reintentos
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 5)
+      client = make_client(stand_in)
+      client.validate_batch_token(7)
+      stand_in.fail_requests = ["unavailable"] * 100
+
+      assert client.upload_signed_pdfs(7, signed(ids)) is False
+
+      assert get_circuit_breaker(stand_in.url).is_open
+      assert 100 - len(stand_in.fail_requests) == BREAKER_THRESHOLD
+      assert all(stand_in.signed_pdf(i) is None for i in ids)
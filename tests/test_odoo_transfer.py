@@ -0,0 +1,226 @@
+import pytest
+
+import base64
+import threading
+import xmlrpc.client
+from unittest.mock import patch, MagicMock
+
+from src.odoo_client import OdooClient
+from src.odoo_transfer import OdooDownloadPool, OdooUploadPool
+
+def make_client(batch_token="tok_valid", max_workers=4):
+  """
+  Crea un OdooClient con xmlrpc mockeado
+  """
+  with patch("src.odoo_client.xmlrpc.client.ServerProxy"):
+    client = OdooClient(
+        url="https://maya.example.com",
+        db="testdb",
+        username="user@test.com",
+        password="pass",
+        batch_token=batch_token,
+        max_workers=max_workers
+    )
+
+  client.uid = 42
+
+  return client
+
+class FakeOdoo:
+  """
+  Simula las respuestas de execute_kw de Odoo, registrando desde qué hilo llegan
+  """
+  def __init__(self, documents):
+    self.documents = {doc["id"]: doc for doc in documents}
+    self.threads = set()
+    self.lock = threading.Lock()
+    self.written = {}
+    self.finalized = None
+
+  def execute_kw(self, db, uid, password, model, method, args, kwargs):
+    with self.lock:
+      self.threads.add(threading.current_thread().name)
+
+    if method == "validate_session_token":
+      return {"valid": True}
+    if model == "maya_core.signature.batch" and method == "read":
+      return [{"name": "Lote 1", "document_ids": list(self.documents), "state": "draft"}]
+    if method == "search_read":
+      return [
+        {"id": doc["id"], "filename": doc["filename"], "state": "unsigned",
+         "res_model": "m", "res_id": doc["id"], "pdf_content": f"{len(doc['pdf_bytes'])} bytes"}
+        for doc in self.documents.values()
+      ]
+    if method == "read":
+      return [
+        {"id": i, "pdf_content": base64.b64encode(self.documents[i]["pdf_bytes"]).decode()}
+        for i in args[0]
+      ]
+    if method == "write":
+      ids, values = args
+      if values.get("signed_pdf") == base64.b64encode(b"falla").decode():
+        raise ConnectionError("Conexión perdida")
+      with self.lock:
+        self.written.setdefault(model, []).extend(ids)
+      return True
+    if method == "propagate_signed_pdf":
+      raise xmlrpc.client.Fault(1, f"The method '{model}.{method}' does not exist")
+    if method == "finalize_batch":
+      # se registra cuántas escrituras había cuando se finalizó
+      self.finalized = (args[2], args[3], len(self.written.get("maya_core.signature.batch_document", [])))
+      return {"success": True}
+    raise AssertionError(f"Llamada inesperada {model}.{method}")
+
+def attach(client, fake):
+  """
+  Conecta el cliente y sus clones al servidor simulado
+  """
+  client.models = MagicMock()
+  client.models.execute_kw.side_effect = fake.execute_kw
+
+  original_clone = client.clone
+
+  def clone():
+    with patch("src.odoo_client.xmlrpc.client.ServerProxy"):
+      worker = original_clone()
+    worker.models = MagicMock()
+    worker.models.execute_kw.side_effect = fake.execute_kw
+    return worker
+
+  client.clone = clone
+
+class TestOdooDownloadPool:
+  """
+  Descarga concurrente de bloques
+  """
+
+  @pytest.mark.unit
+  def test_descarga_todos_los_bloques_en_orden(self):
+    """
+    El resultado mantiene el orden del lote aunque los bloques lleguen desordenados
+    """
+    documents = [
+      {"id": i, "filename": f"doc_{i}.pdf", "pdf_bytes": f"%PDF-{i}".encode()}
+      for i in range(1, 11)
+    ]
+    fake = FakeOdoo(documents)
+    client = make_client()
+    attach(client, fake)
+
+    pool = OdooDownloadPool(client, max_workers=3, max_chunk_bytes=12)
+    result = pool.download_unsigned_pdfs(42)
+
+    assert [doc["id"] for doc in result] == list(range(1, 11))
+    assert all(doc["pdf_bytes"] == f"%PDF-{doc['id']}".encode() for doc in result)
+    # los bloques se descargan desde los hilos del pool
+    assert any(name.startswith("maya_download") for name in fake.threads)
+
+  @pytest.mark.unit
+  def test_informa_progreso(self):
+    """
+    El progreso llega por progress_callback hasta el total de documentos
+    """
+    documents = [
+      {"id": i, "filename": f"doc_{i}.pdf", "pdf_bytes": b"%PDF"} for i in range(1, 5)
+    ]
+    client = make_client()
+    attach(client, FakeOdoo(documents))
+    client.progress_callback = MagicMock()
+
+    OdooDownloadPool(client, max_workers=2, max_chunk_bytes=4).download_unsigned_pdfs(42)
+
+    messages = [call[0][0] for call in client.progress_callback.call_args_list]
+    assert messages[-1] == "Descargando de Maya:  4/4 documentos"
+
+  @pytest.mark.unit
+  def test_error_en_un_bloque_se_propaga(self):
+    """
+    Si falla la descarga de un bloque, falla la descarga del lote
+    """
+    documents = [
+      {"id": i, "filename": f"doc_{i}.pdf", "pdf_bytes": b"%PDF"} for i in range(1, 5)
+    ]
+    fake = FakeOdoo(documents)
+    client = make_client()
+    attach(client, fake)
+
+    original = fake.execute_kw
+    def falla_en_read(db, uid, password, model, method, args, kwargs):
+      if method == "read" and model == "maya_core.signature.batch_document":
+        raise ConnectionError("Conexión perdida")
+      return original(db, uid, password, model, method, args, kwargs)
+    fake.execute_kw = falla_en_read
+
+    with pytest.raises(ConnectionError):
+      OdooDownloadPool(client, max_workers=2, max_chunk_bytes=4).download_unsigned_pdfs(42)
+
+  @pytest.mark.unit
+  def test_cliente_usa_el_pool_si_hay_varios_hilos(self):
+    """
+    download_unsigned_pdfs(chunked=True) delega en el pool cuando max_workers > 1
+    """
+    client = make_client(max_workers=3)
+
+    with patch("odoo_transfer.OdooDownloadPool.download_unsigned_pdfs", return_value=[]) as mock_pool:
+      client.download_unsigned_pdfs(42, chunked=True)
+
+    mock_pool.assert_called_once_with(42, None)
+
+class TestOdooUploadPool:
+  """
+  Subida concurrente de documentos firmados
+  """
+
+  def _signed(self, ids, failing=()):
+    return [
+      {"document_id": i, "signed_pdf_bytes": b"falla" if i in failing else b"%PDF firmado",
+       "signed_filename": f"doc_{i}_firmado.pdf", "res_model": "account.move", "res_id": 100 + i}
+      for i in ids
+    ]
+
+  @pytest.mark.unit
+  def test_sube_todos_y_finaliza_al_terminar(self):
+    """
+    Se suben todos los documentos y el lote se finaliza cuando no queda ninguna subida en curso
+    """
+    fake = FakeOdoo([])
+    client = make_client()
+    attach(client, fake)
+
+    result = OdooUploadPool(client, max_workers=3).upload_signed_pdfs(42, self._signed(range(1, 9)))
+
+    assert result is True
+    assert sorted(fake.written["maya_core.signature.batch_document"]) == list(range(1, 9))
+    assert sorted(fake.written["account.move"]) == list(range(101, 109))
+    assert fake.finalized == (8, 0, 8)
+    assert any(name.startswith("maya_upload") for name in fake.threads)
+
+  @pytest.mark.unit
+  def test_cuenta_fallos_por_documento(self):
+    """
+    Un documento que falla no impide subir el resto y se cuenta como fallo
+    """
+    fake = FakeOdoo([])
+    client = make_client()
+    attach(client, fake)
+
+    result = OdooUploadPool(client, max_workers=2).upload_signed_pdfs(
+      42, self._signed(range(1, 5), failing={3}))
+
+    assert result is False
+    assert sorted(fake.written["maya_core.signature.batch_document"]) == [1, 2, 4]
+    assert fake.finalized == (3, 1, 3)
+
+  @pytest.mark.unit
+  def test_cliente_usa_el_pool_si_hay_varios_hilos(self):
+    """
+    upload_signed_pdfs delega en el pool cuando max_workers > 1 y no hay subida en bloque
+    """
+    client = make_client(max_workers=2)
+    client.bulk_submit = False
+    documents = self._signed([1, 2])
+
+    with patch("odoo_transfer.OdooUploadPool.upload_signed_pdfs", return_value=True) as mock_pool:
+      assert client.upload_signed_pdfs(42, documents) is True
+
+    mock_pool.assert_called_once_with(42, documents, "rpc", None)
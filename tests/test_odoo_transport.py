@@ -0,0 +1,221 @@
+import pytest
+
+import base64
+import gzip
+import io
+import logging
+import os
+import shutil
+import ssl
+import subprocess
+import threading
+import xmlrpc.client
+
+from src.odoo_client import OdooClient
+
+# mismo módulo que importa odoo_client (los pools son globales del módulo)
+from odoo_transport import get_connection_pool, connection_pool_stats, GzipResponseReader, GZIP_THRESHOLD
+from odoo_stand_in import OdooStandIn
+
+def make_client(stand_in, protocol="xmlrpc"):
+  return OdooClient(stand_in.url, "testdb", "user@test.com", "pass",
+                    batch_token="tok_valid", protocol=protocol)
+
+@pytest.fixture
+def tls_contexts(tmp_path):
+  """
+  Contextos TLS de servidor y cliente con un certificado autofirmado para 127.0.0.1
+  """
+  if not shutil.which("openssl"):
+    pytest.skip("openssl no disponible")
+
+  cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+  subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                  "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                  "-keyout", str(key), "-out", str(cert)], check=True, capture_output=True)
+
+  server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+  server_context.load_cert_chain(cert, key)
+  return server_context, cert
+
+class TestConnectionPool:
+  """
+  Pool de conexiones keep-alive compartido entre clientes e hilos
+  """
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol", ["xmlrpc", "jsonrpc"])
+  def test_clientes_sucesivos_comparten_conexion(self, protocol):
+    """
+    Los clientes de lotes sucesivos reutilizan la conexión abierta
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+
+      for _ in range(3):
+        client = make_client(stand_in, protocol)
+        client.authenticate(use_cache=False)
+        client.validate_batch_token(7)
+
+      stats = get_connection_pool(stand_in.url).stats()
+      assert stand_in.connections == 1
+      assert stats["created"] == 1
+      assert stats["reused"] == 5
+      assert stats["in_use"] == 0
+      assert stats["idle"] == 1
+      assert stand_in.url in connection_pool_stats()
+
+  @pytest.mark.integration
+  def test_hilos_concurrentes(self):
+    """
+    Varios hilos usan el mismo cliente a la vez sin compartir conexión
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = make_client(stand_in)
+      client.authenticate(use_cache=False)
+      errors = []
+
+      def work():
+        try:
+          for _ in range(10):
+            assert client.validate_batch_token(7)["valid"] is True
+        except Exception as e:
+          errors.append(e)
+
+      threads = [threading.Thread(target=work) for _ in range(6)]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+
+      stats = get_connection_pool(stand_in.url).stats()
+      assert errors == []
+      assert stats["in_use"] == 0
+      assert stand_in.connections == stats["created"] <= 7
+
+  @pytest.mark.integration
+  def test_conexion_ociosa_caduca(self):
+    """
+    Una conexión ociosa más tiempo del permitido se cierra y se abre otra
+    """
+    with OdooStandIn() as stand_in:
+      pool = get_connection_pool(stand_in.url)
+      pool.idle_timeout = 0
+      client = make_client(stand_in)
+
+      client.authenticate(use_cache=False)
+      client.authenticate(use_cache=False)
+
+      assert stand_in.connections == 2
+      assert pool.stats()["expired"] == 1
+
+  @pytest.mark.integration
+  def test_reanuda_sesion_tls(self, tls_contexts):
+    """
+    Las conexiones nuevas reanudan la sesión TLS en lugar de repetir el handshake completo
+    """
+    server_context, cert = tls_contexts
+
+    with OdooStandIn(ssl_context=server_context) as stand_in:
+      pool = get_connection_pool(stand_in.url)
+      pool.ssl_context.load_verify_locations(cert)
+      pool.idle_timeout = 0
+
+      for _ in range(3):
+        assert make_client(stand_in).authenticate(use_cache=False) is True
+
+      stats = pool.stats()
+      assert stats["tls_handshakes"] == 1
+      assert stats["tls_resumed"] == 2
+
+class FakeResponse(io.BytesIO):
+  def __init__(self, data, headers=None):
+    super().__init__(data)
+    self._headers = headers or {}
+
+  def getheader(self, name, default=None):
+    return self._headers.get(name, default)
+
+class TestGzip:
+  """
+  Compresión gzip de las peticiones (opcional) y de las respuestas
+  """
+
+  @pytest.mark.unit
+  def test_lee_respuesta_por_trozos(self):
+    data = b"<value>" * 100_000
+    reader = GzipResponseReader(FakeResponse(gzip.compress(data)))
+
+    chunks = list(iter(lambda: reader.read(1024), b""))
+
+    assert b"".join(chunks) == data
+    assert max(len(chunk) for chunk in chunks) <= 1024
+    assert reader.size == len(data)
+    assert reader.wire_size < len(data) // 100
+
+  @pytest.mark.unit
+  def test_respuesta_cortada(self):
+    reader = GzipResponseReader(FakeResponse(gzip.compress(os.urandom(5000))[:-20]))
+
+    with pytest.raises(xmlrpc.client.ResponseError):
+      reader.read()
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol", ["xmlrpc", "jsonrpc"])
+  def test_sin_umbral_no_comprime_peticiones(self, protocol):
+    """
+    Por defecto las peticiones van sin comprimir, pero se aceptan respuestas gzip
+    """
+    with OdooStandIn(gzip=True) as stand_in:
+      stand_in.add_batch(7, "tok_valid", [b"%PDF" + os.urandom(10_000)])
+      client = make_client(stand_in, protocol)
+      client.authenticate(use_cache=False)
+
+      assert client.validate_batch_token(7)["valid"] is True
+      assert stand_in.gzip_requests == 0
+      assert stand_in.gzip_responses >= 2
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol", ["xmlrpc", "jsonrpc"])
+  def test_comprime_peticiones_grandes(self, protocol, tmp_path, caplog):
+    """
+    Con gzip_threshold sólo se comprimen las peticiones que lo superan, y se 
+    registra la compresión de cada una
+    """
+    with OdooStandIn(gzip=True) as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF" + b"\x00" * 50_000] * 2)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          protocol=protocol, single_upload=False, gzip_threshold=GZIP_THRESHOLD)
+      client.authenticate(use_cache=False)
+      assert stand_in.gzip_requests == 0
+
+      documents = client.download_unsigned_pdfs(7, target_dir=tmp_path, transfer="rpc")
+      signed = [{"document_id": doc["id"], "signed_pdf_bytes": b"%PDF firmado" + b"\x01" * 50_000,
+                 "signed_filename": "firmado.pdf", "res_model": "account.move", "res_id": 1}
+                for doc in documents]
+      with caplog.at_level(logging.DEBUG, logger="maya_signer"):
+        assert client.upload_signed_pdfs(7, signed, transfer="rpc") is True
+
+      assert [doc["pdf_size"] for doc in documents] == [50_004] * 2
+      assert stand_in.signed_pdf(ids[0]) == signed[0]["signed_pdf_bytes"]
+      assert stand_in.gzip_requests >= 1
+      assert "gzip petición" in caplog.text
+      assert "gzip respuesta" in caplog.text
+
+  @pytest.mark.integration
+  def test_sube_desde_disco_sin_comprimir(self, tmp_path):
+    """
+    Los cuerpos en streaming (PDFs firmados desde disco) no se comprimen
+    """
+    with OdooStandIn(gzip=True) as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          gzip_threshold=GZIP_THRESHOLD)
+      client.authenticate(use_cache=False)
+      path = tmp_path / "firmado.pdf"
+      path.write_bytes(b"%PDF firmado" + b"\x00" * 50_000)
+
+      assert client.upload_signed_pdfs(7, [{"document_id": ids[0], "signed_pdf_path": str(path),
+                                            "signed_filename": "firmado.pdf"}], transfer="rpc") is True
+      assert stand_in.signed_pdf(ids[0]) == path.read_bytes()
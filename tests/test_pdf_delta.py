@@ -0,0 +1,151 @@
+import pytest
+
+import base64
+import hashlib
+import os
+
+from src.odoo_client import OdooClient
+
+from pdf_delta import incremental_delta
+from odoo_stand_in import OdooStandIn, DOCUMENT_MODEL
+
+# actualización incremental como la que añade pyHanko al firmar
+SIGNATURE_UPDATE = b"\n10 0 obj\n<< /Type /Sig /Contents <" + b"0" * 8192 + b"> >>\nendobj\nxref\n%%EOF\n"
+
+class TestIncrementalDelta:
+  """
+  Cola que la firma añade al PDF original
+  """
+
+  @pytest.mark.unit
+  def test_cola_del_firmado(self, tmp_path):
+    original = b"%PDF-1.7\n" + os.urandom(200_000) + b"\n%%EOF\n"
+    (tmp_path / "original.pdf").write_bytes(original)
+    (tmp_path / "firmado.pdf").write_bytes(original + SIGNATURE_UPDATE)
+
+    delta = incremental_delta(tmp_path / "original.pdf", tmp_path / "firmado.pdf", chunk_size=4096)
+
+    assert delta.tail == SIGNATURE_UPDATE
+    assert delta.original_size == len(original)
+    assert delta.original_sha256 == hashlib.sha256(original).hexdigest()
+    assert delta.signed_sha256 == hashlib.sha256(original + SIGNATURE_UPDATE).hexdigest()
+
+  @pytest.mark.unit
+  @pytest.mark.parametrize("signed", [b"%PDF-1.7 reescrito", b"%PDF-1.7\n", b"%PDF"])
+  def test_no_es_incremental(self, tmp_path, signed):
+    """
+    Si el firmado no empieza por el original (o no le añade nada) no hay delta
+    """
+    (tmp_path / "original.pdf").write_bytes(b"%PDF-1.7\n")
+    (tmp_path / "firmado.pdf").write_bytes(signed)
+
+    assert incremental_delta(tmp_path / "original.pdf", tmp_path / "firmado.pdf") is None
+
+class TestDeltaUpload:
+  """
+  Subida de los PDFs firmados como delta contra el servidor de pega
+  """
+
+  def _signed_files(self, tmp_path, stand_in, ids):
+    documents = []
+    for i in ids:
+      original = base64.b64decode(stand_in.documents[i]["pdf_content"])
+      (tmp_path / f"unsigned_{i}.pdf").write_bytes(original)
+      (tmp_path / f"signed_{i}.pdf").write_bytes(original + SIGNATURE_UPDATE)
+      documents.append({"document_id": i, "signed_pdf_path": str(tmp_path / f"signed_{i}.pdf"),
+                        "original_pdf_path": str(tmp_path / f"unsigned_{i}.pdf"),
+                        "signed_filename": f"doc_{i}_firmado.pdf",
+                        "res_model": "account.move", "res_id": 100 + i})
+    return documents
+
+  def _batch(self, stand_in):
+    return stand_in.add_batch(7, "tok_valid", [b"%PDF-1.7\n" + os.urandom(2 * 1024 * 1024) for _ in range(3)])
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("transfer", ["http", "rpc"])
+  def test_sube_solo_la_cola(self, tmp_path, transfer):
+    with OdooStandIn() as stand_in:
+      ids = self._batch(stand_in)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          bulk_submit=False)
+      client.authenticate()
+      documents = self._signed_files(tmp_path, stand_in, ids)
+
+      assert client.upload_signed_pdfs(7, documents, transfer=transfer) is True
+
+      assert stand_in.delta_bytes == len(SIGNATURE_UPDATE) * len(ids)
+      assert stand_in.uploaded_bytes == 0
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+      for doc in documents:
+        expected = (tmp_path / f"signed_{doc['document_id']}.pdf").read_bytes()
+        assert stand_in.signed_pdf(doc["document_id"]) == expected
+        assert stand_in.get_record("account.move", doc["res_id"])["signed_pdf_filename"] == doc["signed_filename"]
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("max_workers", [1, 4])
+  def test_sube_solo_la_cola_con_subida_en_bloque(self, tmp_path, max_workers):
+    """
+    Con la subida en bloque los firmados con original van como delta y el 
+    resto en bloque; el lote se finaliza una vez con todos
+    """
+    with OdooStandIn() as stand_in:
+      ids = self._batch(stand_in)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          max_workers=max_workers)
+      client.authenticate()
+      documents = self._signed_files(tmp_path, stand_in, ids[:2])
+      documents.append({"document_id": ids[2], "signed_pdf_bytes": b"%PDF firmado en memoria",
+                        "signed_filename": "doc_firmado.pdf"})
+
+      assert client.upload_signed_pdfs(7, documents) is True
+
+      assert stand_in.delta_bytes == len(SIGNATURE_UPDATE) * 2
+      assert stand_in.uploaded_bytes == 0
+      # sólo viajan las colas, ningún PDF completo
+      assert stand_in.received_bytes < 2 * 1024 * 1024
+      assert stand_in.count_calls("maya_core.signature.batch", "submit_signed_documents") == 1
+      assert stand_in.count_calls("maya_core.signature.batch", "finalize_batch") == 1
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 0
+      assert stand_in.batches[7]["state"] == "done"
+      assert stand_in.batches[7]["success_count"] == 3
+      for doc in documents[:2]:
+        expected = (tmp_path / f"signed_{doc['document_id']}.pdf").read_bytes()
+        assert stand_in.signed_pdf(doc["document_id"]) == expected
+      assert stand_in.signed_pdf(ids[2]) == b"%PDF firmado en memoria"
+
+  @pytest.mark.integration
+  def test_servidor_sin_delta(self, tmp_path):
+    """
+    Si el servidor no admite deltas se sube el PDF completo
+    """
+    with OdooStandIn(delta_upload=False) as stand_in:
+      ids = self._batch(stand_in)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          bulk_submit=False)
+      client.authenticate()
+      documents = self._signed_files(tmp_path, stand_in, ids)
+
+      assert client.upload_signed_pdfs(7, documents, transfer="http") is True
+
+      assert stand_in.count_calls(DOCUMENT_MODEL, "upload_signed_delta") == 1
+      assert stand_in.uploaded_bytes == sum(os.path.getsize(doc["signed_pdf_path"]) for doc in documents)
+      assert stand_in.signed_pdf(ids[0]) == (tmp_path / f"signed_{ids[0]}.pdf").read_bytes()
+
+  @pytest.mark.integration
+  def test_original_distinto(self, tmp_path):
+    """
+    Si el original del servidor no coincide se sube el PDF completo
+    """
+    with OdooStandIn() as stand_in:
+      ids = self._batch(stand_in)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          bulk_submit=False)
+      client.authenticate()
+      documents = self._signed_files(tmp_path, stand_in, ids[:1])
+      stand_in.documents[ids[0]]["pdf_content"] = "JVBERi0xLjQK"
+
+      assert client.upload_signed_pdfs(7, documents) is True
+
+      assert stand_in.delta_bytes == 0
+      assert stand_in.signed_pdf(ids[0]) == (tmp_path / f"signed_{ids[0]}.pdf").read_bytes()
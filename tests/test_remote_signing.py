@@ -0,0 +1,185 @@
+import pytest
+
+import base64
+import datetime
+import json
+
+from io import BytesIO
+
+pytest.importorskip("pyhanko")
+
+from asn1crypto import cms, tsp, x509 as asn1_x509
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.validation import validate_pdf_signature
+from pyhanko_certvalidator import ValidationContext
+
+from hanko_signer import PyHankoSigner
+from odoo_client import OdooClient, OdooTokenError
+from signer_worker import SignatureWorker, MODE_CERTIFICATE, MODE_DIGEST
+from odoo_stand_in import OdooStandIn, BATCH_MODEL
+
+def with_attribute(signed_attrs: bytes, name: str, value) -> bytes:
+  """
+  Atributos firmados con un atributo añadido o cambiado
+  """
+  attrs = [attr for attr in cms.CMSAttributes.load(signed_attrs) if attr["type"].native != name]
+  attrs.append(cms.CMSAttribute({"type": name, "values": [value]}))
+  return cms.CMSAttributes(attrs).dump()
+
+def foreign_certificate_reference():
+  """
+  signing-certificate-v2 de un certificado que no es el del firmante
+  """
+  return tsp.SigningCertificateV2({"certs": [{"cert_hash": b"\x01" * 32}]})
+
+def validate(pdf: bytes, certificate: bytes):
+  signature = PdfFileReader(BytesIO(pdf)).embedded_signatures[-1]
+  trust = ValidationContext(trust_roots=[asn1_x509.Certificate.load(certificate)])
+  return validate_pdf_signature(signature, trust)
+
+class TestRemoteSigning:
+  """
+  Firma por resumen contra el servidor de pega: el servidor prepara los PDFs
+  y el cliente sólo firma los atributos
+  """
+
+  @pytest.mark.integration
+  def test_ida_y_vuelta(self, p12_certificate, make_pdf):
+    with OdooStandIn() as stand_in:
+      pdfs = [make_pdf(), make_pdf(pages=3)]
+      ids = stand_in.add_batch(7, "tok_valid", pdfs)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+      client.authenticate()
+      signer = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234")
+      certificate = signer.signing_certificate()
+
+      prepared = client.prepare_remote_signatures(7, certificate)
+      signatures = [{
+        "document_id": doc["document_id"],
+        "signature_cms": base64.b64encode(signer.sign_signed_attributes(
+          base64.b64decode(doc["signed_attrs"]), doc["md_algorithm"])).decode()
+      } for doc in prepared]
+
+      assert [doc["document_id"] for doc in prepared] == ids
+      # sólo viajan los atributos y el CMS, no los PDFs
+      assert all(len(base64.b64decode(doc["signed_attrs"])) < 1024 for doc in prepared)
+      assert client.finish_remote_signatures(7, signatures) is True
+
+      assert stand_in.batches[7]["state"] == "done"
+      assert not stand_in.remote_signatures
+      for doc_id, pdf in zip(ids, pdfs):
+        signed = stand_in.signed_pdf(doc_id)
+        # actualización incremental del original
+        assert signed.startswith(pdf)
+        status = validate(signed, certificate)
+        assert status.intact and status.valid and status.trusted
+        assert base64.b64decode(stand_in.get_record("account.move", 100 + doc_id)["signed_pdf"]) == signed
+
+  @pytest.mark.integration
+  def test_firma_de_otro_documento(self, p12_certificate, make_pdf):
+    """
+    El servidor no acepta un CMS que no firma el resumen de su PDF preparado
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [make_pdf(), make_pdf(pages=2)])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+      client.authenticate()
+      signer = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234")
+
+      first, second = client.prepare_remote_signatures(7, signer.signing_certificate())
+      cms = signer.sign_signed_attributes(base64.b64decode(first["signed_attrs"]))
+
+      assert client.finish_remote_signatures(7, [
+        {"document_id": second["document_id"], "signature_cms": base64.b64encode(cms).decode()}
+      ]) is False
+      assert stand_in.signed_pdf(ids[1]) is None
+      assert stand_in.batches[7]["state"] == "error"
+
+  @pytest.mark.integration
+  def test_servidor_sin_firma_por_resumen(self, p12_certificate, make_pdf):
+    with OdooStandIn(remote_signing=False) as stand_in:
+      stand_in.add_batch(7, "tok_valid", [make_pdf()])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+      client.authenticate()
+
+      assert client.prepare_remote_signatures(7, b"certificado") is None
+      # no se vuelve a preguntar
+      assert client.prepare_remote_signatures(7, b"certificado") is None
+      assert stand_in.count_calls(BATCH_MODEL, "prepare_remote_signatures") == 1
+
+  @pytest.mark.integration
+  def test_token_rechazado(self, p12_certificate, make_pdf):
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [make_pdf()])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_malo")
+      client.authenticate()
+
+      with pytest.raises(OdooTokenError):
+        client.prepare_remote_signatures(7, PyHankoSigner(cert_path=str(p12_certificate),
+                                                          cert_password="1234").signing_certificate())
+
+  @pytest.mark.unit
+  @pytest.mark.parametrize("attribute,value", [
+    ("signing_certificate_v2", foreign_certificate_reference()),
+    ("content_type", "signed_data"),
+    ("message_digest", b"\0" * 20),
+    ("signing_time", cms.Time({"utc_time": datetime.datetime(2001, 1, 1, tzinfo=datetime.timezone.utc)})),
+  ])
+  def test_atributos_rechazados(self, p12_certificate, make_pdf, attribute, value):
+    """
+    El firmante no firma atributos de otro certificado, de algo que no es un 
+    documento, con un resumen que no es del algoritmo o con otra hora
+    """
+    with OdooStandIn() as stand_in:
+      stand_in.add_batch(7, "tok_valid", [make_pdf()])
+      signer = PyHankoSigner(cert_path=str(p12_certificate), cert_password="1234")
+      prepared = stand_in._maya_core_signature_batch__prepare_remote_signatures(
+        7, "tok_valid", base64.b64encode(signer.signing_certificate()).decode())["documents"][0]
+      signed_attrs = base64.b64decode(prepared["signed_attrs"])
+
+      changed = with_attribute(signed_attrs, attribute, value)
+
+      # los atributos sin tocar sí se firman
+      assert signer.sign_signed_attributes(signed_attrs)
+      with pytest.raises(ValueError):
+        signer.sign_signed_attributes(changed)
+
+class TestWorkerDigestMode:
+  """
+  Modos del worker para la firma por resumen
+  """
+
+  def _run(self, work_dir, input_data):
+    (work_dir / "input.json").write_text(json.dumps(input_data))
+    returncode = SignatureWorker(work_dir).sign_documents()
+    status = json.loads((work_dir / "status.json").read_text())
+    results = json.loads((work_dir / "output.json").read_text())["results"] if returncode == 0 else []
+    return returncode, status, results
+
+  @pytest.mark.integration
+  def test_certificado_y_resumenes(self, work_dir, p12_certificate, make_pdf, restore_logging):
+    credentials = {"cert_path": str(p12_certificate), "cert_password": "1234", "use_dnie": False}
+
+    returncode, _, results = self._run(work_dir, dict(credentials, mode=MODE_CERTIFICATE, documents=[]))
+    assert returncode == 0
+    certificate = base64.b64decode(results[0]["certificate"])
+
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [make_pdf(), make_pdf()])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid")
+      client.authenticate()
+      prepared = client.prepare_remote_signatures(7, certificate)
+      # atributos de otro certificado
+      prepared[1] = dict(prepared[1], signed_attrs=base64.b64encode(
+        with_attribute(base64.b64decode(prepared[1]["signed_attrs"]), "signing_certificate_v2",
+                       foreign_certificate_reference())).decode())
+
+      returncode, status, results = self._run(work_dir, dict(credentials, mode=MODE_DIGEST, documents=prepared))
+
+      assert returncode == 0 and status["status"] == "success"
+      assert [r["success"] for r in results] == [True, False]
+      assert client.finish_remote_signatures(7, [{"document_id": r["document_id"],
+                                                  "signature_cms": r["signature_cms"]}
+                                                 for r in results if r["success"]]) is True
+      assert validate(stand_in.signed_pdf(ids[0]), certificate).valid
+      assert stand_in.signed_pdf(ids[1]) is None
@@ -173,3 +173,70 @@ class TestCleanup:
     """
     no_existe = tmp_path / "no_existe"
     manager.cleanup(no_existe)  # No debe lanzar
+
+
+class TestPrepareWorkDirectoryConFicheros:
+  """
+  Documentos ya descargados a disco ('pdf_path')
+  """
+
+  def test_usa_los_ficheros_ya_descargados(self, manager, tmp_path):
+    """
+    Los PDFs descargados en el directorio de trabajo no se vuelven a escribir,
+    y los que están en otro sitio se mueven
+    """
+    work_dir = manager.create_work_directory()
+    in_place = work_dir / "unsigned_1.pdf"
+    in_place.write_bytes(b"%PDF uno")
+    elsewhere = tmp_path / "descargado.pdf"
+    elsewhere.write_bytes(b"%PDF dos")
+
+    documents = [
+      {"id": 1, "filename": "a.pdf", "pdf_path": str(in_place)},
+      {"id": 2, "filename": "b.pdf", "pdf_path": str(elsewhere)},
+    ]
+
+    assert manager.prepare_work_directory(documents, work_dir) == work_dir
+    assert (work_dir / "unsigned_1.pdf").read_bytes() == b"%PDF uno"
+    assert (work_dir / "unsigned_2.pdf").read_bytes() == b"%PDF dos"
+    assert not elsewhere.exists()
+
+    manager.cleanup(work_dir)
+
+
+class TestReadResultsSinCargar:
+  """
+  Resultados con los PDFs firmados en disco
+  """
+
+  def test_devuelve_rutas_en_lugar_de_bytes(self, manager, work_dir):
+    """
+    Con load_signed=False no se cargan los firmados en memoria
+    """
+    (work_dir / "signed_1.pdf").write_bytes(b"%PDF firmado")
+    (work_dir / "output.json").write_text(json.dumps({"results": [
+      {"document_id": 1, "signed_filename": "signed_1.pdf", "original_filename": "a.pdf",
+       "res_model": "m", "res_id": 5, "success": True}
+    ]}))
+
+    result = manager.read_results(work_dir, load_signed=False)
+
+    assert result[0]["signed_pdf_path"] == str(work_dir / "signed_1.pdf")
+    assert "signed_pdf_bytes" not in result[0]
+
+  def test_incluye_el_original(self, manager, work_dir):
+    """
+    Si el PDF sin firmar sigue en el directorio, se indica para subir sólo el delta
+    """
+    (work_dir / "unsigned_1.pdf").write_bytes(b"%PDF")
+    (work_dir / "signed_1.pdf").write_bytes(b"%PDF firmado")
+    (work_dir / "signed_2.pdf").write_bytes(b"%PDF firmado")
+    (work_dir / "output.json").write_text(json.dumps({"results": [
+      {"document_id": i, "signed_filename": f"signed_{i}.pdf", "original_filename": "a.pdf", "success": True}
+      for i in (1, 2)
+    ]}))
+
+    result = manager.read_results(work_dir, load_signed=False)
+
+    assert result[0]["original_pdf_path"] == str(work_dir / "unsigned_1.pdf")
+    assert "original_pdf_path" not in result[1]
@@ -0,0 +1,267 @@
+import pytest
+
+import base64
+import os
+import stat
+
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from odoo_client import OdooClient, OdooTokenError
+import upload_spool
+from upload_spool import UploadSpool, SpoolFlusher, SpoolError, server_unreachable, SPOOL_KEY_FILE
+from odoo_stand_in import OdooStandIn, DOCUMENT_MODEL
+
+@pytest.fixture(autouse=True)
+def no_keyring(monkeypatch):
+  """
+  Las pruebas no tocan el llavero del sistema
+  """
+  monkeypatch.setattr(upload_spool, "keyring", None)
+
+class FakeKeyring:
+  def __init__(self):
+    self.passwords = {}
+
+  def get_password(self, service, user):
+    return self.passwords.get((service, user))
+
+  def set_password(self, service, user, password):
+    self.passwords[(service, user)] = password
+
+def signed_files(tmp_path, ids):
+  documents = []
+  for i in ids:
+    path = tmp_path / f"signed_{i}.pdf"
+    path.write_bytes(b"%PDF firmado " + os.urandom(2000))
+    documents.append({"document_id": i, "signed_pdf_path": str(path),
+                      "signed_filename": f"doc_{i}_firmado.pdf",
+                      "res_model": "account.move", "res_id": 100 + i})
+  return documents
+
+def client_factory(job):
+  return OdooClient(job["url"], job["db"], job["username"], "pass",
+                    batch_token=job["token"], protocol=job["protocol"])
+
+def job(url, batch_id=7, token="tok_valid"):
+  return {"url": url, "db": "testdb", "username": "user@test.com", "batch_id": batch_id,
+          "token": token, "protocol": "xmlrpc", "auth_mode": "password", "transfer": "rpc"}
+
+class TestUploadSpool:
+  """
+  Cola cifrada de lotes firmados
+  """
+
+  @pytest.mark.unit
+  def test_guarda_y_lee_cifrado(self, tmp_path):
+    spool = UploadSpool(tmp_path / "spool")
+    documents = signed_files(tmp_path, [1, 2])
+    changes = []
+    spool.on_change = lambda: changes.append(len(spool))
+
+    entry_id = spool.add(job("http://odoo"), documents)
+
+    assert spool.entries() == [entry_id]
+    assert len(spool) == 1 and spool.document_count() == 2
+    assert changes == [1]
+    # en disco no hay nada en claro
+    for path in (tmp_path / "spool" / entry_id).iterdir():
+      data = path.read_bytes()
+      assert b"%PDF" not in data and b"tok_valid" not in data
+
+    assert spool.read_job(entry_id)["token"] == "tok_valid"
+    target = tmp_path / "descifrados"
+    target.mkdir()
+    assert spool.document_ids(entry_id) == [1, 2]
+    for original in documents:
+      doc = spool.read_document(entry_id, original["document_id"], target)
+      assert doc["signed_filename"] == original["signed_filename"]
+      assert stat.S_IMODE(os.stat(doc["signed_pdf_path"]).st_mode) == 0o600
+      assert open(doc["signed_pdf_path"], "rb").read() == open(original["signed_pdf_path"], "rb").read()
+
+    spool.remove_document(entry_id, 1)
+    assert spool.document_ids(entry_id) == [2]
+    assert changes == [1, 1]
+
+    spool.remove(entry_id)
+    assert len(spool) == 0 and changes == [1, 1, 0]
+
+  @pytest.mark.unit
+  def test_clave_local(self, tmp_path):
+    spool = UploadSpool(tmp_path / "spool")
+    entry_id = spool.add(job("http://odoo"), [{"document_id": 1, "signed_pdf_bytes": b"%PDF"}])
+
+    # fuera del directorio de la cola
+    key_file = tmp_path / SPOOL_KEY_FILE
+    assert stat.S_IMODE(key_file.stat().st_mode) == 0o600
+    assert not (tmp_path / "spool" / SPOOL_KEY_FILE).exists()
+    # la misma clave al volver a abrir la cola
+    assert UploadSpool(tmp_path / "spool").read_job(entry_id)["batch_id"] == 7
+
+    with pytest.raises(SpoolError):
+      UploadSpool(tmp_path / "spool", key=Fernet.generate_key()).read_job(entry_id)
+
+  @pytest.mark.unit
+  def test_clave_en_el_llavero(self, tmp_path, monkeypatch):
+    fake_keyring = FakeKeyring()
+    monkeypatch.setattr(upload_spool, "keyring", fake_keyring)
+
+    entry_id = UploadSpool(tmp_path / "spool").add(job("http://odoo"), [{"document_id": 1,
+                                                                        "signed_pdf_bytes": b"%PDF"}])
+
+    assert len(fake_keyring.passwords) == 1
+    assert not (tmp_path / SPOOL_KEY_FILE).exists()
+    assert UploadSpool(tmp_path / "spool").read_job(entry_id)["batch_id"] == 7
+
+  @pytest.mark.unit
+  def test_mueve_la_clave_antigua(self, tmp_path, monkeypatch):
+    """
+    La clave que guardaban las versiones anteriores dentro de la cola pasa al llavero
+    """
+    key = Fernet.generate_key()
+    entry_id = UploadSpool(tmp_path / "spool", key=key).add(job("http://odoo"), [{"document_id": 1,
+                                                                                 "signed_pdf_bytes": b"%PDF"}])
+    (tmp_path / "spool" / SPOOL_KEY_FILE).write_bytes(key)
+    fake_keyring = FakeKeyring()
+    monkeypatch.setattr(upload_spool, "keyring", fake_keyring)
+
+    assert UploadSpool(tmp_path / "spool").read_job(entry_id)["batch_id"] == 7
+    assert list(fake_keyring.passwords.values()) == [key.decode("ascii")]
+    assert not (tmp_path / "spool" / SPOOL_KEY_FILE).exists()
+
+  @pytest.mark.unit
+  def test_orden_y_entradas_a_medias(self, tmp_path):
+    spool = UploadSpool(tmp_path / "spool")
+    first = spool.add(job("http://odoo", batch_id=1), [])
+    second = spool.add(job("http://odoo", batch_id=2), [])
+    (tmp_path / "spool" / ".partial_x").mkdir()
+
+    assert spool.entries() == [first, second]
+
+  @pytest.mark.unit
+  def test_servidor_inalcanzable(self):
+    try:
+      try:
+        raise ConnectionRefusedError("sin conexión")
+      except ConnectionRefusedError as e:
+        raise OdooTokenError(f"Error validando token: {e}")
+    except OdooTokenError as e:
+      wrapped = e
+
+    assert server_unreachable(wrapped)
+    assert not server_unreachable(OdooTokenError("Validación falló: token caducado"))
+
+class TestSpoolFlusher:
+  """
+  Subida de la cola cuando vuelve el servidor
+  """
+
+  @pytest.mark.integration
+  def test_sube_cuando_vuelve(self, tmp_path):
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 2)
+      spool = UploadSpool(tmp_path / "spool")
+      documents = signed_files(tmp_path, ids)
+      spool.add(job(stand_in.url), documents)
+      flusher = SpoolFlusher(spool, client_factory)
+
+      # el servidor sigue caído: el lote sigue en la cola
+      stand_in.fail_requests = ["unavailable"]
+      assert flusher.flush() == 0
+      assert len(spool) == 1
+
+      assert flusher.flush() == 1
+      assert len(spool) == 0
+      assert stand_in.batches[7]["state"] == "done"
+      for doc in documents:
+        expected = open(doc["signed_pdf_path"], "rb").read()
+        assert stand_in.signed_pdf(doc["document_id"]) == expected
+        assert base64.b64decode(stand_in.get_record("account.move", doc["res_id"])["signed_pdf"]) == expected
+
+  @pytest.mark.integration
+  def test_sin_credenciales_espera(self, tmp_path):
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      spool = UploadSpool(tmp_path / "spool")
+      spool.add(job(stand_in.url), signed_files(tmp_path, ids))
+
+      assert SpoolFlusher(spool, lambda job: None).flush() == 0
+      assert len(spool) == 1
+
+  @pytest.mark.integration
+  def test_token_rechazado_se_descarta(self, tmp_path):
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      spool = UploadSpool(tmp_path / "spool")
+      spool.add(job(stand_in.url, token="tok_caducado"), signed_files(tmp_path, ids))
+
+      assert SpoolFlusher(spool, client_factory).flush() == 0
+      assert len(spool) == 0
+      assert stand_in.signed_pdf(ids[0]) is None
+
+  @pytest.mark.integration
+  def test_subida_incompleta_se_aplaza_y_se_descarta(self, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_spool, "SPOOL_MAX_ATTEMPTS", 2)
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"])
+      spool = UploadSpool(tmp_path / "spool")
+      # el documento 999 no es del lote: el servidor responde pero la subida queda a medias
+      entry_id = spool.add(job(stand_in.url), signed_files(tmp_path, [ids[0], 999]))
+      flusher = SpoolFlusher(spool, client_factory, interval=60)
+
+      assert flusher.flush() == 0
+      assert len(spool) == 1
+      assert spool.read_job(entry_id)["attempts"] == 1
+      # el documento subido sale de la cola
+      assert spool.document_ids(entry_id) == [999]
+      assert spool.read_job(entry_id)["confirmed"] == [ids[0]]
+
+      # aplazado: el siguiente intento no llama al servidor
+      calls = len(stand_in.calls)
+      assert flusher.flush() == 0
+      assert len(stand_in.calls) == calls
+
+      spool.update_job(entry_id, dict(spool.read_job(entry_id), next_attempt=0))
+      assert flusher.flush() == 0
+      assert len(spool) == 0
+
+  @pytest.mark.integration
+  def test_descifra_de_uno_en_uno(self, tmp_path, monkeypatch):
+    """
+    Cada PDF está en claro en disco sólo mientras se sube
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      spool = UploadSpool(tmp_path / "spool")
+      spool.add(job(stand_in.url), signed_files(tmp_path, ids))
+      in_clear = []
+      upload_document = OdooClient.upload_document
+
+      def check_upload(client, doc, transfer):
+        in_clear.append(sorted(path.name for path in Path(doc["signed_pdf_path"]).parent.iterdir()))
+        return upload_document(client, doc, transfer)
+
+      monkeypatch.setattr(OdooClient, "upload_document", check_upload)
+
+      assert SpoolFlusher(spool, client_factory).flush() == 1
+
+      assert in_clear == [[f"signed_{i}.pdf"] for i in ids]
+      assert stand_in.batches[7]["state"] == "done"
+      assert stand_in.batches[7]["success_count"] == 3
+
+  @pytest.mark.integration
+  def test_cuenta_los_confirmados_antes_de_la_cola(self, tmp_path):
+    """
+    Los documentos que el servidor confirmó antes de guardar el lote no se 
+    vuelven a subir, pero cuentan al finalizar
+    """
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      spool = UploadSpool(tmp_path / "spool")
+      spool.add(dict(job(stand_in.url), confirmed=ids[:2]), signed_files(tmp_path, ids[2:]))
+
+      assert SpoolFlusher(spool, client_factory).flush() == 1
+
+      assert stand_in.count_calls(DOCUMENT_MODEL, "write") == 1
+      assert stand_in.batches[7]["success_count"] == 3
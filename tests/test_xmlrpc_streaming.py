@@ -0,0 +1,217 @@
+import pytest
+
+import base64
+import os
+import tracemalloc
+import xmlrpc.client
+
+from src.odoo_client import OdooClient
+
+from xmlrpc_streaming import StreamingUnmarshaller, StreamedFile, StreamingRequestBody, Base64File
+from odoo_stand_in import OdooStandIn, DOCUMENT_MODEL
+
+def response_chunks(records, chunk_size=8192):
+  """
+  Genera por trozos la respuesta XML-RPC de un read con pdf_content, sin
+  tener nunca la respuesta entera en memoria
+  """
+  yield b"<?xml version='1.0'?><methodResponse><params><param><value><array><data>"
+  for record_id, pdf in records:
+    yield (f"<value><struct><member><name>id</name><value><int>{record_id}</int></value></member>"
+           f"<member><name>filename</name><value><string>doc_{record_id}.pdf</string></value></member>"
+           f"<member><name>pdf_content</name><value><string>").encode()
+    # múltiplos de 3 bytes para que cada trozo se codifique por separado
+    step = max(3, chunk_size // 4 * 3)
+    for i in range(0, len(pdf), step):
+      yield base64.b64encode(pdf[i:i + step])
+    yield b"</string></value></member></struct></value>"
+  yield b"</data></array></value></param></params></methodResponse>"
+
+def parse(chunks, target_dir):
+  unmarshaller = StreamingUnmarshaller(target_dir, ["pdf_content"])
+  parser = xmlrpc.client.ExpatParser(unmarshaller)
+  for chunk in chunks:
+    parser.feed(chunk)
+  parser.close()
+  return unmarshaller.close()[0]
+
+class TestStreamingUnmarshaller:
+  """
+  Decodificación a disco de los campos base64 de una respuesta XML-RPC
+  """
+
+  @pytest.mark.unit
+  def test_decodifica_a_ficheros(self, tmp_path):
+    pdfs = [(1, b"%PDF uno " + os.urandom(1000)), (2, b"%PDF dos " + os.urandom(77))]
+
+    # trozos pequeños y partidos por la mitad para que el base64 llegue cortado
+    chunks = [half for chunk in response_chunks(pdfs, chunk_size=16)
+              for half in (chunk[:len(chunk) // 2 + 1], chunk[len(chunk) // 2 + 1:])]
+    records = parse(chunks, tmp_path)
+
+    for record, (record_id, pdf) in zip(records, pdfs):
+      assert record["id"] == record_id
+      assert record["filename"] == f"doc_{record_id}.pdf"
+      assert isinstance(record["pdf_content"], StreamedFile)
+      assert record["pdf_content"].size == len(pdf)
+      assert record["pdf_content"].path.read_bytes() == pdf
+
+  @pytest.mark.unit
+  def test_otros_campos_sin_cambios(self, tmp_path):
+    """
+    Los campos que no se piden a disco (y pdf_content vacío) se leen como siempre
+    """
+    body = xmlrpc.client.dumps(({"id": 3, "pdf_content": False, "data": "texto"},), methodresponse=True)
+
+    record = parse([body.encode()], tmp_path)
+
+    assert record == {"id": 3, "pdf_content": False, "data": "texto"}
+    assert list(tmp_path.iterdir()) == []
+
+  @pytest.mark.unit
+  def test_fault(self, tmp_path):
+    body = xmlrpc.client.dumps(xmlrpc.client.Fault(3, "Access Denied"))
+
+    with pytest.raises(xmlrpc.client.Fault):
+      parse([body.encode()], tmp_path)
+
+  @pytest.mark.unit
+  def test_respuesta_cortada_borra_ficheros(self, tmp_path):
+    chunks = list(response_chunks([(1, os.urandom(5000))]))[:-3]
+    unmarshaller = StreamingUnmarshaller(tmp_path, ["pdf_content"])
+    parser = xmlrpc.client.ExpatParser(unmarshaller)
+    for chunk in chunks:
+      parser.feed(chunk)
+
+    unmarshaller.discard()
+
+    assert list(tmp_path.iterdir()) == []
+
+  @pytest.mark.slow
+  def test_memoria_no_depende_del_tamano(self, tmp_path):
+    """
+    Decodificar 40 MB de PDFs no necesita más que unos pocos trozos en memoria
+    """
+    pdf = b"%PDF" + b"\x00" * (20 * 1024 * 1024)
+
+    tracemalloc.start()
+    try:
+      records = parse(response_chunks([(1, pdf), (2, pdf)]), tmp_path)
+      _, peak = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+
+    assert [record["pdf_content"].size for record in records] == [len(pdf)] * 2
+    assert peak < 1024 * 1024
+
+class TestDownloadToFilesRpc:
+  """
+  Descarga por XML-RPC de los PDFs directamente al directorio de trabajo
+  """
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol,max_workers", [("xmlrpc", 1), ("xmlrpc", 3), ("jsonrpc", 1)])
+  def test_descarga_a_ficheros(self, tmp_path, protocol, max_workers):
+    with OdooStandIn() as stand_in:
+      pdfs = [b"%PDF-1.4 " + os.urandom(200_000 + i) for i in range(4)]
+      ids = stand_in.add_batch(7, "tok_valid", pdfs + [b""])
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          protocol=protocol, max_workers=max_workers)
+      client.authenticate()
+
+      documents = client.download_unsigned_pdfs(7, max_chunk_bytes=300_000,
+                                                 target_dir=tmp_path, transfer="rpc")
+
+      assert [doc["id"] for doc in documents] == ids[:4]
+      for doc, pdf in zip(documents, pdfs):
+        assert doc["pdf_path"] == str(tmp_path / f"unsigned_{doc['id']}.pdf")
+        assert doc["pdf_size"] == len(pdf)
+        assert "pdf_bytes" not in doc and "pdf_content" not in doc
+        assert (tmp_path / f"unsigned_{doc['id']}.pdf").read_bytes() == pdf
+      assert sorted(path.name for path in tmp_path.iterdir()) == \
+        sorted(f"unsigned_{i}.pdf" for i in ids[:4])
+
+class TestStreamingRequestBody:
+  """
+  Peticiones XML-RPC con el base64 de ficheros codificado al enviarlas
+  """
+
+  @pytest.mark.unit
+  def test_mismo_xml_que_dumps(self, tmp_path):
+    """
+    El cuerpo equivale a xmlrpc.client.dumps con el base64 de cada fichero
+    """
+    first, second = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    first.write_bytes(os.urandom(100_001))
+    second.write_bytes(b"")
+    params = ("testdb", 42, "pass", "modelo", "write",
+              [[1], {"signed_pdf": Base64File(first), "otro": Base64File(second), "nombre": "año.pdf"}])
+
+    body = StreamingRequestBody(params, "execute_kw")
+    data = b"".join(body)
+
+    assert len(body) == len(data)
+    # se puede volver a recorrer para reintentar la petición
+    assert b"".join(body) == data
+
+    (loaded, method) = xmlrpc.client.loads(data)
+    assert method == "execute_kw"
+    values = loaded[5][1]
+    assert base64.b64decode(values["signed_pdf"]) == first.read_bytes()
+    assert values["otro"] == ""
+    assert values["nombre"] == "año.pdf"
+
+  @pytest.mark.slow
+  def test_memoria_no_depende_del_tamano(self, tmp_path):
+    """
+    Enviar un PDF de 30 MB no necesita más que unos pocos trozos en memoria
+    """
+    path = tmp_path / "grande.pdf"
+    with open(path, "wb") as f:
+      f.truncate(30 * 1024 * 1024)
+
+    tracemalloc.start()
+    try:
+      body = StreamingRequestBody(("db", 1, "pass", "m", "write", [[1], {"pdf": Base64File(path)}]), "execute_kw")
+      sent = sum(len(chunk) for chunk in body)
+      _, peak = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+
+    assert sent == len(body)
+    assert peak < 1024 * 1024
+
+class TestUploadFromFilesRpc:
+  """
+  Subida por XML-RPC de los PDFs firmados desde disco
+  """
+
+  def _signed_files(self, tmp_path, ids):
+    documents = []
+    for i in ids:
+      path = tmp_path / f"signed_{i}.pdf"
+      path.write_bytes(b"%PDF firmado " + os.urandom(150_000))
+      documents.append({"document_id": i, "signed_pdf_path": str(path),
+                        "signed_filename": f"doc_{i}_firmado.pdf",
+                        "res_model": "account.move", "res_id": 100 + i})
+    return documents
+
+  @pytest.mark.integration
+  @pytest.mark.parametrize("protocol,max_workers,single_upload", [
+    ("xmlrpc", 1, True), ("xmlrpc", 3, True), ("xmlrpc", 1, False), ("jsonrpc", 1, True)])
+  def test_sube_desde_disco(self, tmp_path, protocol, max_workers, single_upload):
+    with OdooStandIn() as stand_in:
+      ids = stand_in.add_batch(7, "tok_valid", [b"%PDF"] * 3)
+      client = OdooClient(stand_in.url, "testdb", "user@test.com", "pass", batch_token="tok_valid",
+                          protocol=protocol, max_workers=max_workers, single_upload=single_upload)
+      client.authenticate()
+      documents = self._signed_files(tmp_path, ids)
+
+      assert client.upload_signed_pdfs(7, documents, transfer="rpc") is True
+
+      assert stand_in.count_calls(DOCUMENT_MODEL, "upload") == 0
+      assert stand_in.batches[7]["state"] == "done"
+      for doc in documents:
+        expected = (tmp_path / f"signed_{doc['document_id']}.pdf").read_bytes()
+        assert stand_in.signed_pdf(doc["document_id"]) == expected
+        assert base64.b64decode(stand_in.get_record("account.move", doc["res_id"])["signed_pdf"]) == expected